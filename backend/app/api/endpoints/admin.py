@@ -1,68 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from typing import List
+from sqlalchemy import select, func, and_, tuple_
+from typing import List, Optional
 from datetime import datetime, timedelta
-import json
 
-from app.core.database import get_db_session
+from app.core.config import settings
+from app.core.database import get_db_session, get_read_db_session
 from app.utils.auth_dependencies import get_current_admin
 from app.models.user import User, UserRole
-from app.models.order import Order, OrderItem, OrderStatus
-from app.schemas.order import OrderResponse, OrderItemResponse, OrderStatusUpdateRequest, OrderAssignCourierRequest
+from app.services.principal_cache import Principal
+from app.models.order import Order, OrderStatus, DeliveryType
+from app.schemas.order import (
+    OrderFeedResponse, OrderStatusUpdateRequest, OrderAssignCourierRequest,
+    OrderBulkStatusUpdateRequest, OrderBulkStatusUpdateResponse
+)
+from app.services.metrics import dashboard_statistics
+from app.services.order_events import publish_order_event, publish_order_events
+from app.services.order_state import (
+    apply_transition, apply_bulk_transition, admin_transition, build_bulk_status_response, ASSIGN_COURIER
+)
+from app.services.order_projection import build_order_responses
+from app.utils.cursor import encode_cursor, decode_cursor, prefix_upper_bound
 
 router = APIRouter()
 
-def parse_delivery_address(delivery_address_str):
-    """Парсит адрес доставки из строки или JSON."""
-    if not delivery_address_str:
-        return None, None, None, None, None
-    
-    try:
-        address_data = json.loads(delivery_address_str)
-        return (
-            address_data.get('address'),
-            address_data.get('entrance'),
-            address_data.get('floor'),
-            address_data.get('apartment'),
-            address_data.get('comment')
-        )
-    except (json.JSONDecodeError, TypeError):
-        # Если не JSON, то это старый формат - просто строка
-        return delivery_address_str, None, None, None, None
-
 @router.get("/dashboard")
 async def admin_dashboard(
-    db: AsyncSession = Depends(get_db_session)
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Панель управления администратора."""
     
     try:
-        # Получаем общее количество заказов
-        total_orders_query = select(func.count(Order.id))
-        total_orders_result = await db.execute(total_orders_query)
-        total_orders = total_orders_result.scalar() or 0
-        
-        # Получаем общую выручку
-        total_revenue_query = select(func.sum(Order.total_amount)).where(
-            Order.status == OrderStatus.DELIVERED
-        )
-        total_revenue_result = await db.execute(total_revenue_query)
-        total_revenue = total_revenue_result.scalar() or 0
-        
-        # Получаем количество активных пользователей
-        active_users_query = select(func.count(User.id)).where(
-            and_(User.is_active == True, User.role == UserRole.CLIENT)
-        )
-        active_users_result = await db.execute(active_users_query)
-        active_users = active_users_result.scalar() or 0
-        
-        # Получаем средний чек (только для доставленных заказов)
-        avg_check_query = select(func.avg(Order.total_amount)).where(
-            Order.status == OrderStatus.DELIVERED
-        )
-        avg_check_result = await db.execute(avg_check_query)
-        avg_check = avg_check_result.scalar() or 0
+        # Показатели из сверток, которые обновляются вместе с заказами и пользователями
+        statistics = await dashboard_statistics(db)
         
         # Получаем последние заказы для отображения в таблице
         recent_orders_query = select(Order).order_by(Order.created_at.desc()).limit(5)
@@ -99,12 +69,7 @@ async def admin_dashboard(
                 "name": "Администратор",
                 "role": "admin"
             },
-            "statistics": {
-                "total_orders": total_orders,
-                "total_revenue": float(total_revenue),
-                "active_users": active_users,
-                "average_check": float(avg_check)
-            },
+            "statistics": statistics,
             "recent_orders": recent_orders_data,
             "quick_actions": [
                 {"name": "Заказы", "url": "/admin/orders", "icon": "orders"},
@@ -164,90 +129,103 @@ def _calculate_time_ago(created_at: datetime) -> str:
     except Exception as e:
         return "Неизвестно"
 
-@router.get("/orders", response_model=List[OrderResponse])
+@router.get("/orders", response_model=OrderFeedResponse)
 async def get_all_orders(
-    current_user: User = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db_session)
+    cursor: Optional[str] = Query(None, description="Курсор из next_cursor предыдущей страницы"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    status: Optional[OrderStatus] = Query(None),
+    delivery_type: Optional[DeliveryType] = Query(None),
+    courier_id: Optional[int] = Query(None),
+    date_from: Optional[datetime] = Query(None, description="Заказы, созданные не раньше"),
+    date_to: Optional[datetime] = Query(None, description="Заказы, созданные раньше"),
+    phone: Optional[str] = Query(None, min_length=1, max_length=15, description="Префикс телефона клиента"),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
 ):
-    """Получение всех заказов для администратора."""
-    # Получаем все заказы, отсортированные по дате создания
-    query = select(Order).order_by(Order.created_at.desc())
+    """
+    Лента заказов для администратора с keyset-пагинацией по (created_at, id).
+    Каждая страница читается по индексу с позиции курсора, поэтому время ответа
+    не зависит от глубины прокрутки истории.
+    """
+    try:
+        position = decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    query = select(Order)
+    
+    # Фильтры (каждому соответствует составной индекс с хвостом (created_at, id))
+    if status:
+        query = query.where(Order.status == status)
+    if delivery_type:
+        query = query.where(Order.delivery_type == delivery_type)
+    if courier_id is not None:
+        query = query.where(Order.assigned_courier_id == courier_id)
+    if date_from:
+        query = query.where(Order.created_at >= date_from)
+    if date_to:
+        query = query.where(Order.created_at < date_to)
+    if phone:
+        query = query.where(
+            Order.customer_phone >= phone,
+            Order.customer_phone < prefix_upper_bound(phone)
+        )
+    
+    # Продолжаем с позиции курсора
+    if position:
+        cursor_created_at, cursor_id = position
+        # Сравнение кортежей (row values) позволяет SQLite/PostgreSQL начать чтение индекса сразу с позиции курсора
+        query = query.where(tuple_(Order.created_at, Order.id) < tuple_(cursor_created_at, cursor_id))
+    
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
     result = await db.execute(query)
     orders = result.scalars().all()
     
-    # Формируем ответ с полной информацией о заказах
-    orders_response = []
-    for order in orders:
-        # Получаем товары для каждого заказа
-        items_query = select(OrderItem).where(OrderItem.order_id == order.id)
-        items_result = await db.execute(items_query)
-        items = items_result.scalars().all()
-        
-        items_response = [
-            OrderItemResponse(
-                id=item.id,
-                dish_name=item.dish_name,
-                quantity=item.quantity,
-                price=item.price,
-                total_price=item.total_price,
-                modifiers=[mod['name'] for mod in (item.modifiers or [])]
-            )
-            for item in items
-        ]
-        
-        # Парсим адрес доставки
-        delivery_address, delivery_entrance, delivery_floor, delivery_apartment, delivery_comment = parse_delivery_address(order.delivery_address)
-        
-        orders_response.append(OrderResponse(
-            id=order.id,
-            order_number=order.order_number,
-            status=order.status,
-            delivery_type=order.delivery_type,
-            payment_method=order.payment_method,
-            total_amount=order.total_amount,
-            delivery_address=delivery_address,
-            delivery_entrance=delivery_entrance,
-            delivery_floor=delivery_floor,
-            delivery_apartment=delivery_apartment,
-            delivery_comment=delivery_comment,
-            customer_name=order.customer_name,
-            customer_phone=order.customer_phone,
-            items=items_response,
-            created_at=order.created_at.isoformat()
-        ))
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    next_cursor = encode_cursor(orders[-1].created_at, orders[-1].id) if has_more else None
     
-    return orders_response
+    return OrderFeedResponse(
+        orders=await build_order_responses(db, orders),
+        next_cursor=next_cursor,
+        has_more=has_more
+    )
+
+@router.patch("/orders/bulk-status", response_model=OrderBulkStatusUpdateResponse)
+async def bulk_update_order_status(
+    request: OrderBulkStatusUpdateRequest,
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """
+    Массовая смена статуса заказов администратором (например, подтвердить все новые заказы).
+    Все переходы выполняются в одной транзакции; для каждого заказа возвращается исход,
+    как у PATCH /orders/{order_id}/status.
+    """
+    result = await apply_bulk_transition(db, request.order_ids, admin_transition(request.status))
+    
+    await db.commit()
+    await publish_order_events(db, "status_changed", [(change.order, change.previous_status) for change in result.applied])
+    
+    return build_bulk_status_response(request.order_ids, request.status, result)
 
 @router.patch("/orders/{order_id}/status")
 async def update_order_status(
     order_id: int,
     request: OrderStatusUpdateRequest,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Обновление статуса заказа администратором."""
-    # Получаем заказ
-    query = select(Order).where(Order.id == order_id)
-    result = await db.execute(query)
-    order = result.scalar_one_or_none()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
-    # Обновляем статус
-    old_status = order.status
-    order.status = request.status
-    order.updated_at = datetime.now()
-    
-    # Обновляем временные метки в зависимости от статуса
-    if request.status == OrderStatus.CONFIRMED and old_status == OrderStatus.PENDING:
-        order.confirmed_at = datetime.now()
-    elif request.status == OrderStatus.READY and old_status == OrderStatus.PREPARING:
-        order.ready_at = datetime.now()
-    elif request.status == OrderStatus.DELIVERED:
-        order.delivered_at = datetime.now()
+    # Администратор может выставить любой статус; UPDATE применится, только если статус
+    # не успел измениться после чтения
+    result = await apply_transition(db, order_id, admin_transition(request.status))
+    order = result.order
+    old_status = result.previous_status
     
     await db.commit()
+    await publish_order_event(db, "status_changed", order, old_status)
     
     return {
         "message": f"Статус заказа {order.order_number} изменен с {old_status} на {request.status}",
@@ -257,8 +235,8 @@ async def update_order_status(
 
 @router.get("/couriers", response_model=List[dict])
 async def get_available_couriers(
-    current_user: User = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db_session)
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение списка доступных курьеров."""
     query = select(User).where(
@@ -281,25 +259,10 @@ async def get_available_couriers(
 async def assign_courier_to_order(
     order_id: int,
     request: OrderAssignCourierRequest,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Назначение курьера на заказ."""
-    # Получаем заказ
-    order_query = select(Order).where(Order.id == order_id)
-    order_result = await db.execute(order_query)
-    order = order_result.scalar_one_or_none()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
-    # Проверяем, что заказ готов к доставке
-    if order.status != OrderStatus.READY:
-        raise HTTPException(
-            status_code=400, 
-            detail="Курьера можно назначить только на готовый заказ"
-        )
-    
     # Проверяем, что курьер существует и активен
     courier_query = select(User).where(
         User.id == request.courier_id,
@@ -312,12 +275,12 @@ async def assign_courier_to_order(
     if not courier:
         raise HTTPException(status_code=404, detail="Курьер не найден или неактивен")
     
-    # Назначаем курьера и меняем статус на "доставляется"
-    order.assigned_courier_id = request.courier_id
-    order.status = OrderStatus.DELIVERING
-    order.updated_at = datetime.now()
+    # Назначаем курьера и меняем статус на "доставляется", если заказ готов и свободен
+    result = await apply_transition(db, order_id, ASSIGN_COURIER, courier_id=request.courier_id)
+    order = result.order
     
     await db.commit()
+    await publish_order_event(db, "courier_assigned", order, result.previous_status)
     
     return {
         "message": f"Курьер {courier.name} назначен на заказ {order.order_number}",
@@ -328,8 +291,8 @@ async def assign_courier_to_order(
 
 @router.get("/users")
 async def get_all_users(
-    current_user: User = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db_session)
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение всех пользователей."""
     query = select(User).order_by(User.created_at.desc())
@@ -361,7 +324,7 @@ async def get_all_users(
     }
 
 @router.get("/menu")
-async def get_menu_management(current_user: User = Depends(get_current_admin)):
+async def get_menu_management(current_user: Principal = Depends(get_current_admin)):
     """Управление меню."""
     return {
         "message": "Управление меню - в разработке",
@@ -375,8 +338,8 @@ async def get_menu_management(current_user: User = Depends(get_current_admin)):
 
 @router.get("/analytics")
 async def get_analytics(
-    current_user: User = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db_session)
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Аналитика и отчеты."""
     
@@ -452,8 +415,8 @@ async def get_analytics(
 
 @router.get("/notifications")
 async def get_notifications(
-    current_user: User = Depends(get_current_admin),
-    db: AsyncSession = Depends(get_db_session)
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение уведомлений для администратора."""
     try:
@@ -497,6 +460,6 @@ async def get_notifications(
         }
 
 @router.post("/menu/dishes")
-async def create_dish(current_user: User = Depends(get_current_admin)):
+async def create_dish(current_user: Principal = Depends(get_current_admin)):
     """Создание нового блюда."""
     return {"message": "Create dish endpoint - coming soon"}
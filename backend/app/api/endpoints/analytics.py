@@ -1,20 +1,102 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import Literal, Optional
+
+from app.core.config import settings
+from app.core.database import get_read_db_session
 from app.utils.auth_dependencies import get_current_admin
-from app.models.user import User
+from app.services.principal_cache import Principal
+from app.services.analytics import resolve_range, dashboard_report, orders_report, utm_report
+from app.services.customer_segments import SEGMENTS, segment_report
+from app.services.sales_cube import sales_heatmap
+from app.services.geo_bins import geo_tile
 
 router = APIRouter()
 
+# Отчеты читают только заранее посчитанные таблицы (order_rollups, sales_cube, order_geo_bins, customer_segments), таблица orders не сканируется
+
 @router.get("/dashboard")
-async def analytics_dashboard(current_user: User = Depends(get_current_admin)):
-    """Аналитический дашборд."""
-    return {"message": "Analytics dashboard - coming soon"}
+async def analytics_dashboard(
+    date_from: Optional[date] = Query(None, description="Первый день периода (по умолчанию — 30 дней назад)"),
+    date_to: Optional[date] = Query(None, description="Последний день периода включительно (по умолчанию — сегодня)"),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
+):
+    """Аналитический дашборд: показатели периода, сравнение с предыдущим и разбивки."""
+    return await dashboard_report(db, resolve_range(date_from, date_to))
 
 @router.get("/orders")
-async def order_analytics(current_user: User = Depends(get_current_admin)):
-    """Аналитика по заказам."""
-    return {"message": "Order analytics - coming soon"}
+async def order_analytics(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    granularity: Literal["day", "hour", "weekday", "hour_of_day"] = Query("day"),
+    dimension: Literal[
+        "all", "status", "delivery_type", "payment_method", "utm_source", "utm_medium", "utm_campaign"
+    ] = Query("all", description="Разбивка ряда по измерению"),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
+):
+    """Аналитика по заказам: ряд по дням, часам, дням недели или часам суток."""
+    report_range = resolve_range(date_from, date_to)
+    if granularity == "hour" and report_range.days > settings.ANALYTICS_MAX_HOURLY_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Почасовой ряд доступен для периода не длиннее {settings.ANALYTICS_MAX_HOURLY_DAYS} дней"
+        )
+    return await orders_report(db, report_range, granularity, dimension)
 
 @router.get("/utm")
-async def utm_analytics(current_user: User = Depends(get_current_admin)):
+async def utm_analytics(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    dimension: Literal["utm_source", "utm_medium", "utm_campaign"] = Query("utm_source"),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
+):
     """Аналитика по UTM меткам."""
-    return {"message": "UTM analytics - coming soon"}
+    return await utm_report(db, resolve_range(date_from, date_to), dimension)
+
+@router.get("/sales-heatmap")
+async def sales_heatmap_analytics(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    measure: Literal["quantity", "revenue", "orders_count"] = Query(
+        "quantity", description="orders_count — заказы с блюдом: без фильтра по блюду заказ учитывается по каждому блюду"
+    ),
+    category_id: Optional[int] = Query(None),
+    dish_id: Optional[int] = Query(None),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
+):
+    """Тепловая карта продаж доставленных заказов по дням недели и часам."""
+    report_range = resolve_range(date_from, date_to)
+    return await sales_heatmap(db, report_range.date_from, report_range.date_to, measure, category_id, dish_id)
+
+@router.get("/geo/tiles/{zoom}/{x}/{y}")
+async def geo_tile_analytics(
+    zoom: int,
+    x: int,
+    y: int,
+    date_from: Optional[date] = Query(None, description="Без дат — за все время; с датами — месяцы целиком"),
+    date_to: Optional[date] = Query(None),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
+):
+    """Плотность доставленных заказов в тайле карты (XYZ): ячейки геохеша с числом заказов и суммой."""
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="Дата начала периода позже даты окончания")
+    return await geo_tile(db, zoom, x, y, date_from, date_to)
+
+@router.get("/rfm")
+async def rfm_analytics(
+    segment: Optional[str] = Query(None, description="Ключ сегмента; без него — все клиенты"),
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_read_db_session)
+):
+    """RFM-сегменты клиентов из последнего расчета (segment_customers.py)."""
+    if segment and segment not in SEGMENTS:
+        raise HTTPException(status_code=400, detail=f"Неизвестный сегмент. Доступны: {', '.join(SEGMENTS)}")
+    return await segment_report(db, segment, limit, offset)
@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Optional
+import json
+
+from app.core.config import settings
+from app.core.database import async_read_session_maker
+from app.services.auth import AuthService
+from app.services.principal_cache import Principal
+from app.services.order_events import order_events, subscription_filter, RESYNC
+
+router = APIRouter()
+
+# Закрытие WebSocket при неверном токене (коды 4000-4999 зарезервированы для приложения)
+WS_UNAUTHORIZED = 4401
+
+
+async def authenticate_stream(token: Optional[str]) -> Optional[Principal]:
+    """
+    Пользователь для потока событий. Сессия открывается только на проверку токена (при промахе
+    кеша пользователей) и не держит подключение к базе, пока открыт поток.
+    """
+    if not token:
+        return None
+    async with async_read_session_maker() as db:
+        user = await AuthService(db).get_current_principal(token)
+    if not user or not user.is_active:
+        return None
+    return user
+
+
+@router.get("/orders/stream")
+async def stream_order_events(
+    request: Request,
+    token: Optional[str] = Query(None, description="JWT, если клиент (EventSource) не может передать заголовок Authorization"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """
+    Server-Sent Events с изменениями заказов для роли пользователя: кухня получает заказы
+    своего экрана, курьер — свободные и свои заказы, клиент — свои, администратор — все.
+    После переподключения браузер передает Last-Event-ID и получает пропущенные события;
+    событие resync означает, что список нужно перечитать целиком.
+    """
+    user = await authenticate_stream(credentials.credentials if credentials else token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+
+    subscription = order_events.subscribe(subscription_filter(user), last_event_id)
+
+    async def event_stream():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                item = await subscription.get(timeout=settings.ORDER_EVENTS_HEARTBEAT_SECONDS)
+                if item is None:
+                    yield ": ping\n\n"
+                    continue
+                event, message = item
+                if event is None:
+                    yield f"event: {RESYNC}\ndata: {{}}\n\n"
+                else:
+                    yield f"id: {event.id}\nevent: {event.type}\ndata: {message}\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/orders/ws")
+async def order_events_websocket(
+    websocket: WebSocket,
+    token: Optional[str] = Query(None),
+    last_event_id: Optional[str] = Query(None)
+):
+    """
+    WebSocket с теми же событиями, что и /orders/stream. Каждое сообщение — JSON события
+    заказа, {"type": "resync"} (перечитать список) или {"type": "ping"}.
+    """
+    user = await authenticate_stream(token)
+    if not user:
+        await websocket.close(code=WS_UNAUTHORIZED)
+        return
+
+    await websocket.accept()
+    subscription = order_events.subscribe(subscription_filter(user), last_event_id)
+    try:
+        while True:
+            item = await subscription.get(timeout=settings.ORDER_EVENTS_HEARTBEAT_SECONDS)
+            if item is None:
+                await websocket.send_text(json.dumps({"type": "ping"}))
+                continue
+            event, message = item
+            await websocket.send_text(json.dumps({"type": RESYNC}) if event is None else message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        subscription.close()
@@ -2,38 +2,24 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_, and_
 from typing import List
-from datetime import datetime
-import json
 
 from app.core.database import get_db_session
 from app.utils.auth_dependencies import get_current_kitchen
-from app.models.user import User
-from app.models.order import Order, OrderItem, OrderStatus
-from app.schemas.order import OrderResponse, OrderItemResponse, OrderStatusUpdateRequest
+from app.services.principal_cache import Principal
+from app.models.order import Order, OrderStatus
+from app.schemas.order import OrderResponse, OrderStatusUpdateRequest, OrderBulkStatusUpdateRequest, OrderBulkStatusUpdateResponse
+from app.services.order_events import publish_order_event, publish_order_events
+from app.services.order_state import (
+    apply_transition, apply_bulk_transition, build_bulk_status_response,
+    START_COOKING, MARK_READY, COMPLETE_PICKUP, KITCHEN_TRANSITIONS
+)
+from app.services.order_projection import fetch_order_responses
 
 router = APIRouter()
 
-def parse_delivery_address(delivery_address_str):
-    """Парсит адрес доставки из строки или JSON."""
-    if not delivery_address_str:
-        return None, None, None, None, None
-    
-    try:
-        address_data = json.loads(delivery_address_str)
-        return (
-            address_data.get('address'),
-            address_data.get('entrance'),
-            address_data.get('floor'),
-            address_data.get('apartment'),
-            address_data.get('comment')
-        )
-    except (json.JSONDecodeError, TypeError):
-        # Если не JSON, то это старый формат - просто строка
-        return delivery_address_str, None, None, None, None
-
 @router.get("/orders", response_model=List[OrderResponse])
 async def get_kitchen_orders(
-    current_user: User = Depends(get_current_kitchen),
+    current_user: Principal = Depends(get_current_kitchen),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Получение заказов для кухни (подтвержденные, готовящиеся и готовые на самовывоз)."""
@@ -44,80 +30,21 @@ async def get_kitchen_orders(
             and_(Order.status == OrderStatus.READY, Order.delivery_type == 'pickup')
         )
     ).order_by(Order.confirmed_at.asc())  # Сортируем по времени подтверждения
-    
-    result = await db.execute(query)
-    orders = result.scalars().all()
-    
-    # Формируем ответ с полной информацией о заказах
-    orders_response = []
-    for order in orders:
-        # Получаем товары для каждого заказа
-        items_query = select(OrderItem).where(OrderItem.order_id == order.id)
-        items_result = await db.execute(items_query)
-        items = items_result.scalars().all()
-        
-        items_response = [
-            OrderItemResponse(
-                id=item.id,
-                dish_name=item.dish_name,
-                quantity=item.quantity,
-                price=item.price,
-                total_price=item.total_price,
-                modifiers=[mod['name'] for mod in (item.modifiers or [])]
-            )
-            for item in items
-        ]
-        
-        # Парсим адрес доставки
-        delivery_address, delivery_entrance, delivery_floor, delivery_apartment, delivery_comment = parse_delivery_address(order.delivery_address)
-        
-        orders_response.append(OrderResponse(
-            id=order.id,
-            order_number=order.order_number,
-            status=order.status,
-            delivery_type=order.delivery_type,
-            payment_method=order.payment_method,
-            total_amount=order.total_amount,
-            delivery_address=delivery_address,
-            delivery_entrance=delivery_entrance,
-            delivery_floor=delivery_floor,
-            delivery_apartment=delivery_apartment,
-            delivery_comment=delivery_comment,
-            customer_name=order.customer_name,
-            customer_phone=order.customer_phone,
-            items=items_response,
-            created_at=order.created_at.isoformat()
-        ))
-    
-    return orders_response
+    return await fetch_order_responses(db, query)
 
 @router.patch("/orders/{order_id}/start-cooking")
 async def start_cooking(
     order_id: int,
-    current_user: User = Depends(get_current_kitchen),
+    current_user: Principal = Depends(get_current_kitchen),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Начать приготовление заказа."""
-    # Получаем заказ
-    query = select(Order).where(Order.id == order_id)
-    result = await db.execute(query)
-    order = result.scalar_one_or_none()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
-    # Проверяем, что заказ можно начать готовить
-    if order.status != OrderStatus.CONFIRMED:
-        raise HTTPException(
-            status_code=400, 
-            detail="Можно начать готовить только подтвержденный заказ"
-        )
-    
-    # Меняем статус на "готовится"
-    order.status = OrderStatus.PREPARING
-    order.updated_at = datetime.now()
+    # Подтвержденный заказ переводим в "готовится" одним условным UPDATE
+    result = await apply_transition(db, order_id, START_COOKING)
+    order = result.order
     
     await db.commit()
+    await publish_order_event(db, "status_changed", order, result.previous_status)
     
     return {
         "message": f"Начато приготовление заказа {order.order_number}",
@@ -128,31 +55,16 @@ async def start_cooking(
 @router.patch("/orders/{order_id}/mark-ready")
 async def mark_order_ready(
     order_id: int,
-    current_user: User = Depends(get_current_kitchen),
+    current_user: Principal = Depends(get_current_kitchen),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Отметить заказ как готовый."""
-    # Получаем заказ
-    query = select(Order).where(Order.id == order_id)
-    result = await db.execute(query)
-    order = result.scalar_one_or_none()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
-    # Проверяем, что заказ готовится
-    if order.status != OrderStatus.PREPARING:
-        raise HTTPException(
-            status_code=400, 
-            detail="Можно отметить готовым только готовящийся заказ"
-        )
-    
-    # Меняем статус на "готов"
-    order.status = OrderStatus.READY
-    order.ready_at = datetime.now()
-    order.updated_at = datetime.now()
+    # Готовящийся заказ переводим в "готов"
+    result = await apply_transition(db, order_id, MARK_READY)
+    order = result.order
     
     await db.commit()
+    await publish_order_event(db, "status_changed", order, result.previous_status)
     
     return {
         "message": f"Заказ {order.order_number} готов к выдаче",
@@ -163,90 +75,70 @@ async def mark_order_ready(
 @router.patch("/orders/{order_id}/pickup-complete")
 async def complete_pickup_order(
     order_id: int,
-    current_user: User = Depends(get_current_kitchen),
+    current_user: Principal = Depends(get_current_kitchen),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Отметить заказ на самовывоз как выданный."""
-    # Получаем заказ
-    query = select(Order).where(Order.id == order_id)
-    result = await db.execute(query)
-    order = result.scalar_one_or_none()
+    # Готовый заказ на самовывоз переводим в "доставлен" (для самовывоза это означает "выдан")
+    result = await apply_transition(db, order_id, COMPLETE_PICKUP)
+    order = result.order
     
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
-    # Проверяем, что это заказ на самовывоз и он готов
-    if order.delivery_type != 'pickup':
-        raise HTTPException(
-            status_code=400, 
-            detail="Этот endpoint только для заказов на самовывоз"
-        )
+    await db.commit()
+    await publish_order_event(db, "status_changed", order, result.previous_status)
     
-    if order.status != OrderStatus.READY:
+    return {
+        "message": f"Заказ {order.order_number} выдан клиенту",
+        "order_id": order_id,
+        "new_status": OrderStatus.DELIVERED
+    }
+
+@router.patch("/orders/bulk-status", response_model=OrderBulkStatusUpdateResponse)
+async def bulk_update_cooking_status(
+    request: OrderBulkStatusUpdateRequest,
+    current_user: Principal = Depends(get_current_kitchen),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """
+    Массовая смена статуса приготовления (например, начать готовить сразу все подтвержденные).
+    Переходы те же, что у PATCH /orders/{order_id}/status, выполняются в одной транзакции;
+    для каждого заказа возвращается, применился ли переход и почему нет.
+    """
+    transition = KITCHEN_TRANSITIONS.get(request.status)
+    if not transition:
         raise HTTPException(
             status_code=400, 
-            detail="Можно выдать только готовый заказ"
+            detail="Кухня может устанавливать только статусы: подтвержден, готовится, готов"
         )
     
-    # Меняем статус на "доставлен" (для самовывоза это означает "выдан")
-    order.status = OrderStatus.DELIVERED
-    order.delivered_at = datetime.now()
-    order.updated_at = datetime.now()
+    result = await apply_bulk_transition(db, request.order_ids, transition)
     
     await db.commit()
+    await publish_order_events(db, "status_changed", [(change.order, change.previous_status) for change in result.applied])
     
-    return {
-        "message": f"Заказ {order.order_number} выдан клиенту",
-        "order_id": order_id,
-        "new_status": OrderStatus.DELIVERED
-    }
+    return build_bulk_status_response(request.order_ids, request.status, result)
 
 @router.patch("/orders/{order_id}/status")
 async def update_cooking_status(
     order_id: int, 
     request: OrderStatusUpdateRequest,
-    current_user: User = Depends(get_current_kitchen),
+    current_user: Principal = Depends(get_current_kitchen),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Обновление статуса приготовления заказа."""
-    # Получаем заказ
-    query = select(Order).where(Order.id == order_id)
-    result = await db.execute(query)
-    order = result.scalar_one_or_none()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
     # Кухня может менять статус только между CONFIRMED, PREPARING и READY
-    allowed_statuses = [OrderStatus.CONFIRMED, OrderStatus.PREPARING, OrderStatus.READY]
-    if request.status not in allowed_statuses:
+    transition = KITCHEN_TRANSITIONS.get(request.status)
+    if not transition:
         raise HTTPException(
             status_code=400, 
             detail="Кухня может устанавливать только статусы: подтвержден, готовится, готов"
         )
     
-    # Проверяем логику переходов
-    if order.status == OrderStatus.CONFIRMED and request.status not in [OrderStatus.PREPARING]:
-        raise HTTPException(
-            status_code=400, 
-            detail="Из статуса 'подтвержден' можно перейти только в 'готовится'"
-        )
-    elif order.status == OrderStatus.PREPARING and request.status not in [OrderStatus.READY, OrderStatus.CONFIRMED]:
-        raise HTTPException(
-            status_code=400, 
-            detail="Из статуса 'готовится' можно перейти только в 'готов' или вернуться в 'подтвержден'"
-        )
-    
-    # Обновляем статус
-    old_status = order.status
-    order.status = request.status
-    order.updated_at = datetime.now()
-    
-    # Обновляем временные метки
-    if request.status == OrderStatus.READY:
-        order.ready_at = datetime.now()
+    result = await apply_transition(db, order_id, transition)
+    order = result.order
+    old_status = result.previous_status
     
     await db.commit()
+    await publish_order_event(db, "status_changed", order, old_status)
     
     return {
         "message": f"Статус заказа {order.order_number} изменен с {old_status} на {request.status}",
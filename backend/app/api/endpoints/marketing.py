@@ -1,25 +1,112 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from datetime import datetime
+from typing import Dict, Optional
+from pydantic import BaseModel, Field
+import json
+from app.core.database import get_db_session
 from app.utils.auth_dependencies import get_current_admin
-from app.models.user import User
+from app.models.notification import PushCampaign, PushCampaignStatus
+from app.services.principal_cache import Principal
+from app.services.push_campaigns import campaign_progress, push_campaign_runner
 
 router = APIRouter()
 
+# Схема создания push-рассылки
+class PushCampaignCreateRequest(BaseModel):
+    title: str = Field(..., min_length=1, max_length=200, description="Заголовок уведомления")
+    body: str = Field(..., min_length=1, max_length=1000, description="Текст уведомления")
+    data: Optional[Dict[str, str]] = Field(None, description="Данные для приложения (например, экран, который открыть)")
+
 @router.get("/banners")
-async def get_banners(current_user: User = Depends(get_current_admin)):
+async def get_banners(current_user: Principal = Depends(get_current_admin)):
     """Получение списка баннеров."""
     return {"message": "Get banners endpoint - coming soon"}
 
 @router.post("/banners")
-async def create_banner(current_user: User = Depends(get_current_admin)):
+async def create_banner(current_user: Principal = Depends(get_current_admin)):
     """Создание нового баннера."""
     return {"message": "Create banner endpoint - coming soon"}
 
 @router.get("/promo-codes")
-async def get_promo_codes(current_user: User = Depends(get_current_admin)):
+async def get_promo_codes(current_user: Principal = Depends(get_current_admin)):
     """Получение списка промокодов."""
     return {"message": "Get promo codes endpoint - coming soon"}
 
 @router.post("/promo-codes")
-async def create_promo_code(current_user: User = Depends(get_current_admin)):
+async def create_promo_code(current_user: Principal = Depends(get_current_admin)):
     """Создание нового промокода."""
     return {"message": "Create promo code endpoint - coming soon"}
+
+@router.post("/push-campaigns", status_code=status.HTTP_201_CREATED)
+async def create_push_campaign(
+    request: PushCampaignCreateRequest,
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """Push-рассылка всем зарегистрированным клиентам; отправляется в фоне, прогресс — GET /push-campaigns/{id}."""
+    campaign = PushCampaign(
+        title=request.title,
+        body=request.body,
+        data=json.dumps(request.data, ensure_ascii=False, sort_keys=True) if request.data else None,
+        created_by_id=current_user.id
+    )
+    db.add(campaign)
+    await db.commit()
+    await db.refresh(campaign)
+    push_campaign_runner.wake()
+    return campaign_progress(campaign)
+
+@router.get("/push-campaigns")
+async def get_push_campaigns(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """Последние push-рассылки с прогрессом."""
+    campaigns = (await db.execute(
+        select(PushCampaign).order_by(PushCampaign.id.desc()).limit(limit)
+    )).scalars().all()
+    return {"campaigns": [campaign_progress(campaign) for campaign in campaigns]}
+
+@router.get("/push-campaigns/{campaign_id}")
+async def get_push_campaign(
+    campaign_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """Прогресс push-рассылки."""
+    campaign = await db.get(PushCampaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Рассылка не найдена")
+    return campaign_progress(campaign)
+
+@router.post("/push-campaigns/{campaign_id}/cancel")
+async def cancel_push_campaign(
+    campaign_id: int,
+    current_user: Principal = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """Отмена рассылки: идущая остановится после текущей страницы получателей."""
+    campaign = await db.get(PushCampaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Рассылка не найдена")
+
+    result = await db.execute(
+        update(PushCampaign)
+        .where(
+            PushCampaign.id == campaign_id,
+            PushCampaign.status.in_([PushCampaignStatus.PENDING.value, PushCampaignStatus.RUNNING.value])
+        )
+        .values(
+            status=PushCampaignStatus.CANCELLED.value,
+            # Ожидающая рассылка завершается сразу; идущую завершит исполнитель
+            finished_at=datetime.utcnow() if campaign.status == PushCampaignStatus.PENDING.value else None
+        )
+    )
+    if result.rowcount != 1:
+        raise HTTPException(status_code=400, detail="Рассылка уже завершена")
+    await db.commit()
+    await db.refresh(campaign)
+    return campaign_progress(campaign)
@@ -1,30 +1,67 @@
-from fastapi import APIRouter, Depends, Query, HTTPException, status
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from app.core.database import get_db_session
+from app.core.config import settings
+from app.core.database import get_db_session, get_read_db_session
 from app.schemas.menu import CategoryResponse, DishResponse, DishDetailResponse, DishCreateRequest, DishUpdateRequest, AddonResponse, AddonCreateRequest, AddonUpdateRequest
 from app.services.menu import MenuService
+from app.services.menu_cache import menu_cache
+from app.utils.http_cache import make_etag, cache_control, conditional_response
 
 router = APIRouter()
 
+async def check_menu_not_modified(
+    request: Request,
+    response: Response,
+    public: bool = True
+) -> Optional[Response]:
+    """
+    Условный GET для чтений меню. ETag строится из хеша содержимого снимка меню
+    и URL запроса, поэтому проверка совпадения не требует запросов к базе.
+    Возвращает 304-ответ или None, если нужно отдать тело.
+    """
+    if not menu_cache.enabled:
+        return None
+
+    snapshot = await menu_cache.get()
+    etag = make_etag(snapshot.digest, request.url.path, request.url.query)
+    return conditional_response(
+        request,
+        response,
+        etag,
+        cache_control(settings.MENU_HTTP_MAX_AGE, settings.MENU_HTTP_STALE_WHILE_REVALIDATE, public=public)
+    )
+
 @router.get("/categories", response_model=List[CategoryResponse])
 async def get_categories(
-    db: AsyncSession = Depends(get_db_session)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение списка всех категорий блюд."""
+    not_modified = await check_menu_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    
     menu_service = MenuService(db)
     return await menu_service.get_categories()
 
 @router.get("/dishes", response_model=List[DishResponse])
 async def get_dishes(
+    request: Request,
+    response: Response,
     category_id: Optional[int] = Query(None),
     search: Optional[str] = Query(None),
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     show_all: bool = Query(False, description="Показать все блюда, включая недоступные (для админки)"),
-    db: AsyncSession = Depends(get_db_session)
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение списка блюд с фильтрацией и поиском."""
+    not_modified = await check_menu_not_modified(request, response, public=not show_all)
+    if not_modified:
+        return not_modified
+    
     menu_service = MenuService(db)
     return await menu_service.get_dishes(
         category_id=category_id,
@@ -37,9 +74,15 @@ async def get_dishes(
 @router.get("/dishes/{dish_id}", response_model=DishDetailResponse)
 async def get_dish(
     dish_id: int,
-    db: AsyncSession = Depends(get_db_session)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение детальной информации о блюде."""
+    not_modified = await check_menu_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    
     menu_service = MenuService(db)
     dish_data = await menu_service.get_dish_by_id(dish_id)
     if dish_data is None:
@@ -95,20 +138,32 @@ async def toggle_dish_availability(
 # CRUD операции для добавок
 @router.get("/addons", response_model=List[AddonResponse])
 async def get_addons(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(None, description="Фильтр по категории добавок"),
     show_all: bool = Query(False, description="Показать все добавки, включая неактивные"),
-    db: AsyncSession = Depends(get_db_session)
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение списка добавок."""
+    not_modified = await check_menu_not_modified(request, response, public=not show_all)
+    if not_modified:
+        return not_modified
+    
     menu_service = MenuService(db)
     return await menu_service.get_addons(category=category, show_all=show_all)
 
 @router.get("/addons/{addon_id}", response_model=AddonResponse)
 async def get_addon(
     addon_id: int,
-    db: AsyncSession = Depends(get_db_session)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db_session)
 ):
     """Получение добавки по ID."""
+    not_modified = await check_menu_not_modified(request, response)
+    if not_modified:
+        return not_modified
+    
     menu_service = MenuService(db)
     addon = await menu_service.get_addon_by_id(addon_id)
     if addon is None:
@@ -1,87 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from decimal import Decimal
 from datetime import datetime
-import random
-import string
-import json
 from typing import List
 
+from app.core.config import settings
 from app.core.database import get_db_session
-from app.schemas.order import OrderCreateRequest, OrderResponse, OrderItemResponse
+from app.schemas.order import OrderCreateRequest, OrderResponse, OrderQuoteRequest, OrderQuoteResponse
+from app.services.order_projection import build_order_response, fetch_order_response, fetch_order_responses
+from app.services.order_events import publish_order_event
+from app.services.order_state import apply_transition, CANCEL
+from app.services.order_numbers import order_number_allocator
+from app.services.order_writer import insert_order
+from app.services.pricing import PricingEngine, quote_cart
 from app.utils.auth_dependencies import get_current_user_optional
 from app.models.user import User
-from app.models.order import Order, OrderItem, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
-from app.models.menu import Dish, Variant
-from app.models.promo_code import PromoCode, DiscountType
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
 
 router = APIRouter()
 
-def parse_delivery_address(delivery_address_str):
-    """Парсит адрес доставки из строки или JSON."""
-    if not delivery_address_str:
-        return None, None, None, None, None
-    
-    try:
-        address_data = json.loads(delivery_address_str)
-        return (
-            address_data.get('address'),
-            address_data.get('entrance'),
-            address_data.get('floor'),
-            address_data.get('apartment'),
-            address_data.get('comment')
-        )
-    except (json.JSONDecodeError, TypeError):
-        # Если не JSON, то это старый формат - просто строка
-        return delivery_address_str, None, None, None, None
-
-def generate_order_number():
-    """Генерация уникального номера заказа."""
-    current_year = datetime.now().year
-    random_part = ''.join(random.choices(string.digits, k=6))
-    return f"ORD-{current_year}-{random_part}"
-
-async def calculate_order_totals(items_data: List[dict], promo_code: str = None, db: AsyncSession = None):
-    """Расчет общей стоимости заказа с учетом промокода."""
-    subtotal = Decimal('0')
-    
-    # Суммируем стоимость всех товаров
-    for item_data in items_data:
-        subtotal += item_data['total_price']
-    
-    discount_amount = Decimal('0')
-    promo_discount = Decimal('0')
-    
-    # Применяем промокод если есть
-    if promo_code and db:
-        query = select(PromoCode).where(
-            PromoCode.code == promo_code.upper(),
-            PromoCode.is_active == True
-        )
-        result = await db.execute(query)
-        promo = result.scalar_one_or_none()
-        
-        if promo:
-            # Проверяем минимальную сумму заказа
-            if not promo.min_order_amount or subtotal >= promo.min_order_amount:
-                if promo.discount_type == DiscountType.PERCENTAGE:
-                    discount_amount = subtotal * (promo.discount_value / 100)
-                    if promo.max_discount_amount:
-                        discount_amount = min(discount_amount, promo.max_discount_amount)
-                else:  # FIXED
-                    discount_amount = min(promo.discount_value, subtotal)
-                
-                promo_discount = promo.discount_value
-    
-    total_amount = subtotal - discount_amount
-    
-    return {
-        'subtotal': subtotal,
-        'discount_amount': discount_amount,
-        'promo_discount': promo_discount,
-        'total_amount': max(total_amount, Decimal('0'))
-    }
+@router.post("/quote", response_model=OrderQuoteResponse)
+async def quote_order(
+    request: OrderQuoteRequest,
+    db: AsyncSession = Depends(get_db_session)
+):
+    """Расчет стоимости корзины (сумма, скидка, доставка, итог) без создания заказа."""
+    return await quote_cart(db, request)
 
 @router.post("/", response_model=OrderResponse)
 async def create_order(
@@ -112,54 +56,30 @@ async def create_order(
             detail="Для самовывоза необходимо указать адрес ресторана"
         )
     
-    # Подготавливаем данные товаров
-    items_data = []
+    # Цены всех позиций и промокод: количество запросов не зависит от размера корзины.
+    # Блюда читаются из базы, а не из снимка меню: снимок этого воркера может не знать
+    # о новой цене или отключенном блюде, измененных через другой воркер
+    pricing = await PricingEngine(db, use_menu_snapshot=False).price_cart(
+        request.items, request.promo_code, request.delivery_type
+    )
     
-    for item_request in request.items:
-        # Получаем информацию о блюде
-        dish_query = select(Dish).where(Dish.id == item_request.dish_id, Dish.is_available == True)
-        dish_result = await db.execute(dish_query)
-        dish = dish_result.scalar_one_or_none()
-        
-        if not dish:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Блюдо с ID {item_request.dish_id} не найдено или недоступно"
-            )
-        
-        # Рассчитываем цену с модификаторами
-        item_price = dish.price
-        modifiers_info = []
-        
-        if item_request.modifiers:
-            variants_query = select(Variant).where(Variant.id.in_(item_request.modifiers))
-            variants_result = await db.execute(variants_query)
-            variants = variants_result.scalars().all()
-            
-            for variant in variants:
-                item_price += variant.price
-                modifiers_info.append({
-                    "id": variant.id,
-                    "name": variant.name,
-                    "price": variant.price
-                })
-        
-        total_price = item_price * item_request.quantity
-        
-        items_data.append({
-            'dish': dish,
-            'quantity': item_request.quantity,
-            'price': item_price,
-            'total_price': total_price,
-            'modifiers': modifiers_info
-        })
+    if not pricing.is_min_order_met:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Минимальная сумма заказа: {settings.MIN_ORDER_AMOUNT:.0f} ₸"
+        )
     
-    # Расчет общей стоимости
-    totals = await calculate_order_totals(items_data, request.promo_code, db)
+    # Координаты адреса доставки: из запроса или из сохраненного адреса профиля
+    delivery_latitude, delivery_longitude = None, None
+    if request.delivery_type == DeliveryType.DELIVERY:
+        if request.delivery_latitude is not None and request.delivery_longitude is not None:
+            delivery_latitude, delivery_longitude = request.delivery_latitude, request.delivery_longitude
+        elif current_user and current_user.address_latitude is not None and current_user.address_longitude is not None:
+            delivery_latitude, delivery_longitude = current_user.address_latitude, current_user.address_longitude
     
     # Создаем заказ
     order_data = {
-        'order_number': generate_order_number(),
+        'order_number': await order_number_allocator.next_number(db),
         'user_id': current_user.id if current_user else None,
         'customer_name': current_user.name if current_user else request.name,
         'customer_phone': current_user.phone if current_user else request.phone,
@@ -168,75 +88,33 @@ async def create_order(
         'payment_method': request.payment_method,
         'delivery_address': request.delivery_address,
         'pickup_address': request.pickup_address,
+        'delivery_latitude': delivery_latitude,
+        'delivery_longitude': delivery_longitude,
         'status': OrderStatus.PENDING,
         'payment_status': PaymentStatus.PENDING,
-        'subtotal': totals['subtotal'],
-        'discount_amount': totals['discount_amount'],
-        'total_amount': totals['total_amount'],
-        'promo_code': request.promo_code.upper() if request.promo_code else None,
-        'promo_discount': totals['promo_discount'],
+        'subtotal': pricing.subtotal,
+        'discount_amount': pricing.discount_amount,
+        'delivery_fee': pricing.delivery_fee,
+        'total_amount': pricing.total_amount,
+        'promo_code': pricing.promo_code,
+        'promo_discount': pricing.promo_discount,
         'customer_comment': request.comment,
+        'utm_source': request.utm_source,
+        'utm_medium': request.utm_medium,
+        'utm_campaign': request.utm_campaign,
         'created_at': datetime.now()
     }
     
-    order = Order(**order_data)
-    db.add(order)
-    await db.flush()
-    
-    # Создаем позиции заказа
-    order_items = []
-    for item_data in items_data:
-        order_item = OrderItem(
-            order_id=order.id,
-            dish_id=item_data['dish'].id,
-            dish_name=item_data['dish'].name,
-            dish_price=item_data['dish'].price,
-            quantity=item_data['quantity'],
-            price=item_data['price'],
-            total_price=item_data['total_price'],
-            modifiers=item_data['modifiers']
-        )
-        order_items.append(order_item)
-        db.add(order_item)
+    # Заказ и позиции записываются двумя пакетными INSERT в одной короткой транзакции
+    order, order_items = await insert_order(db, order_data, pricing.items)
     
     # Счетчик использований промокода обновляется при применении промокода, не здесь
     
     await db.commit()
-    await db.refresh(order)
-    
-    # Формируем ответ
-    items_response = [
-        OrderItemResponse(
-            id=item.id,
-            dish_name=item.dish_name,
-            quantity=item.quantity,
-            price=item.price,
-            total_price=item.total_price,
-            modifiers=[mod['name'] for mod in (item.modifiers or [])]
-        )
-        for item in order_items
-    ]
     
-    # Парсим адрес доставки
-    delivery_address, delivery_entrance, delivery_floor, delivery_apartment, delivery_comment = parse_delivery_address(order.delivery_address)
-    
-    return OrderResponse(
-        id=order.id,
-        order_number=order.order_number,
-        status=order.status,
-        delivery_type=order.delivery_type,
-        payment_method=order.payment_method,
-        total_amount=order.total_amount,
-        delivery_address=delivery_address,
-        delivery_entrance=delivery_entrance,
-        delivery_floor=delivery_floor,
-        delivery_apartment=delivery_apartment,
-        delivery_comment=delivery_comment,
-        customer_name=order.customer_name,
-        customer_phone=order.customer_phone,
-        items=items_response,
-        created_at=order.created_at.isoformat()
-    )
+    response = build_order_response(order, order_items)
+    await publish_order_event(db, "created", order, response=response)
+    return response
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_orders(
@@ -247,53 +125,9 @@ async def get_orders(
     if not current_user:
         raise HTTPException(status_code=401, detail="Необходима авторизация")
     
-    # Получаем заказы пользователя
+    # Получаем заказы пользователя вместе с позициями (2 запроса на любой объем истории)
     query = select(Order).where(Order.user_id == current_user.id).order_by(Order.created_at.desc())
-    result = await db.execute(query)
-    orders = result.scalars().all()
-    
-    # Формируем ответ с полной информацией о заказах
-    orders_response = []
-    for order in orders:
-        # Получаем товары для каждого заказа
-        items_query = select(OrderItem).where(OrderItem.order_id == order.id)
-        items_result = await db.execute(items_query)
-        items = items_result.scalars().all()
-        
-        items_response = [
-            OrderItemResponse(
-                id=item.id,
-                dish_name=item.dish_name,
-                quantity=item.quantity,
-                price=item.price,
-                total_price=item.total_price,
-                modifiers=[mod['name'] for mod in (item.modifiers or [])]
-            )
-            for item in items
-        ]
-        
-        # Парсим адрес доставки
-        delivery_address, delivery_entrance, delivery_floor, delivery_apartment, delivery_comment = parse_delivery_address(order.delivery_address)
-        
-        orders_response.append(OrderResponse(
-            id=order.id,
-            order_number=order.order_number,
-            status=order.status,
-            delivery_type=order.delivery_type,
-            payment_method=order.payment_method,
-            total_amount=order.total_amount,
-            delivery_address=delivery_address,
-            delivery_entrance=delivery_entrance,
-            delivery_floor=delivery_floor,
-            delivery_apartment=delivery_apartment,
-            delivery_comment=delivery_comment,
-            customer_name=order.customer_name,
-            customer_phone=order.customer_phone,
-            items=items_response,
-            created_at=order.created_at.isoformat()
-        ))
-    
-    return orders_response
+    return await fetch_order_responses(db, query)
 
 @router.get("/{order_id}")
 async def get_order(
@@ -313,43 +147,7 @@ async def get_order(
     if current_user and order.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Нет доступа к этому заказу")
     
-    # Получаем позиции заказа
-    items_query = select(OrderItem).where(OrderItem.order_id == order_id)
-    items_result = await db.execute(items_query)
-    items = items_result.scalars().all()
-    
-    items_response = [
-        OrderItemResponse(
-            id=item.id,
-            dish_name=item.dish_name,
-            quantity=item.quantity,
-            price=item.price,
-            total_price=item.total_price,
-            modifiers=[mod['name'] for mod in (item.modifiers or [])]
-        )
-        for item in items
-    ]
-    
-    # Парсим адрес доставки
-    delivery_address, delivery_entrance, delivery_floor, delivery_apartment, delivery_comment = parse_delivery_address(order.delivery_address)
-    
-    return OrderResponse(
-        id=order.id,
-        order_number=order.order_number,
-        status=order.status,
-        delivery_type=order.delivery_type,
-        payment_method=order.payment_method,
-        total_amount=order.total_amount,
-        delivery_address=delivery_address,
-        delivery_entrance=delivery_entrance,
-        delivery_floor=delivery_floor,
-        delivery_apartment=delivery_apartment,
-        delivery_comment=delivery_comment,
-        customer_name=order.customer_name,
-        customer_phone=order.customer_phone,
-        items=items_response,
-        created_at=order.created_at.isoformat()
-    )
+    return await fetch_order_response(db, order)
 
 @router.patch("/{order_id}/cancel")
 async def cancel_order(
@@ -361,28 +159,10 @@ async def cancel_order(
     if not current_user:
         raise HTTPException(status_code=401, detail="Необходима авторизация")
     
-    query = select(Order).where(Order.id == order_id)
-    result = await db.execute(query)
-    order = result.scalar_one_or_none()
-    
-    if not order:
-        raise HTTPException(status_code=404, detail="Заказ не найден")
-    
-    # Проверяем права доступа
-    if order.user_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Нет доступа к этому заказу")
-    
-    # Проверяем, можно ли отменить заказ
-    if order.status not in [OrderStatus.PENDING, OrderStatus.CONFIRMED]:
-        raise HTTPException(
-            status_code=400, 
-            detail="Заказ нельзя отменить на текущем этапе"
-        )
-    
-    # Отменяем заказ
-    order.status = OrderStatus.CANCELLED
-    order.updated_at = datetime.now()
+    # Отменить можно только свой заказ, пока он ожидает подтверждения или подтвержден
+    result = await apply_transition(db, order_id, CANCEL, user_id=current_user.id)
     
     await db.commit()
+    await publish_order_event(db, "cancelled", result.order, result.previous_status)
     
     return {"message": "Заказ успешно отменен", "order_id": order_id}
@@ -8,6 +8,7 @@ from app.core.database import get_db_session
 from app.models.promo_code import PromoCode, DiscountType
 from app.models.promo_code_usage import PromoCodeUsage
 from app.models.user import User
+from app.services.pricing import quote_cache
 from app.utils.auth_dependencies import get_current_user_optional
 
 router = APIRouter()
@@ -288,6 +289,7 @@ async def create_promo_code(
     
     db.add(promo_code)
     await db.commit()
+    quote_cache.clear()
     await db.refresh(promo_code)
     
     return promo_code
@@ -322,6 +324,7 @@ async def update_promo_code(
     promo_code.is_active = request.is_active
     
     await db.commit()
+    quote_cache.clear()
     await db.refresh(promo_code)
     
     return promo_code
@@ -342,6 +345,7 @@ async def delete_promo_code(
     
     await db.delete(promo_code)
     await db.commit()
+    quote_cache.clear()
     
     return {"message": "Промокод удален"}
 
@@ -361,6 +365,7 @@ async def toggle_promo_code(
     
     promo_code.is_active = not promo_code.is_active
     await db.commit()
+    quote_cache.clear()
     await db.refresh(promo_code)
     
     return promo_code
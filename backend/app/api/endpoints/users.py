@@ -1,32 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, desc, or_, func
-import json
 from app.core.database import get_db_session
 from app.utils.auth_dependencies import get_current_admin, get_current_user
 from app.models.user import User, UserRole
-from app.schemas.user import UserProfileUpdate, UserProfileResponse, NewsletterSubscription, AddressUpdate, UserListResponse, UserRoleUpdate, UserListItem, UserStatusUpdate
+from app.services.principal_cache import Principal, principal_cache
+from app.schemas.user import UserProfileUpdate, UserProfileResponse, NewsletterSubscription, FcmTokenUpdate, AddressUpdate, UserListResponse, UserRoleUpdate, UserListItem, UserStatusUpdate
 
 router = APIRouter()
 
-def parse_delivery_address(delivery_address_str):
-    """Парсит адрес доставки из строки или JSON."""
-    if not delivery_address_str:
-        return None, None, None, None, None
-    
-    try:
-        address_data = json.loads(delivery_address_str)
-        return (
-            address_data.get('address'),
-            address_data.get('entrance'),
-            address_data.get('floor'),
-            address_data.get('apartment'),
-            address_data.get('comment')
-        )
-    except (json.JSONDecodeError, TypeError):
-        # Если не JSON, то это старый формат - просто строка
-        return delivery_address_str, None, None, None, None
-
 @router.get("/", response_model=UserListResponse)
 async def get_users(
     page: int = 1,
@@ -34,7 +16,7 @@ async def get_users(
     search: str = None,
     role: str = None,
     is_active: bool = None,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Получение списка пользователей с пагинацией, поиском и фильтрацией (только для администратора)."""
@@ -123,7 +105,7 @@ async def get_users(
 @router.get("/{user_id}", response_model=UserProfileResponse)
 async def get_user(
     user_id: int, 
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Получение информации о пользователе (только для администратора)."""
@@ -141,7 +123,7 @@ async def get_user(
 async def update_user_role(
     user_id: int,
     role_data: UserRoleUpdate,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Изменение роли пользователя (только для администратора)."""
@@ -160,6 +142,7 @@ async def update_user_role(
         # Обновляем роль
         user.role = UserRole(role_data.role.value)
         await db.commit()
+        principal_cache.invalidate(user_id)
         await db.refresh(user)
         
         return {
@@ -180,7 +163,7 @@ async def update_user_role(
 async def update_user_status(
     user_id: int,
     status_data: UserStatusUpdate,
-    current_user: User = Depends(get_current_admin),
+    current_user: Principal = Depends(get_current_admin),
     db: AsyncSession = Depends(get_db_session)
 ):
     """Изменение статуса активности пользователя (только для администратора)."""
@@ -199,6 +182,7 @@ async def update_user_status(
         # Обновляем статус
         user.is_active = status_data.is_active
         await db.commit()
+        principal_cache.invalidate(user_id)
         await db.refresh(user)
         
         action = "активирован" if status_data.is_active else "деактивирован"
@@ -234,6 +218,7 @@ async def update_profile(
             setattr(current_user, field, value)
         
         await db.commit()
+        principal_cache.invalidate(current_user.id)
         await db.refresh(current_user)
         
         return current_user
@@ -305,6 +290,39 @@ async def delete_address(
         await db.rollback()
         raise HTTPException(status_code=400, detail=f"Ошибка удаления адреса: {str(e)}")
 
+@router.put("/me/fcm-token")
+async def update_fcm_token(
+    token_data: FcmTokenUpdate,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """Регистрация устройства для push-уведомлений."""
+    try:
+        # Устройство могло быть привязано к другому аккаунту (выход и вход под другим номером)
+        await db.execute(
+            update(User)
+            .where(User.fcm_token == token_data.token, User.id != current_user.id)
+            .values(fcm_token=None)
+        )
+        current_user.fcm_token = token_data.token
+        
+        await db.commit()
+        
+        return {"message": "Устройство зарегистрировано для push-уведомлений"}
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Ошибка регистрации устройства: {str(e)}")
+
+@router.delete("/me/fcm-token")
+async def delete_fcm_token(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db_session)
+):
+    """Отключение push-уведомлений (выход из приложения на устройстве)."""
+    current_user.fcm_token = None
+    await db.commit()
+    return {"message": "Push-уведомления отключены"}
+
 @router.get("/me/orders")
 async def get_my_orders(
     current_user: User = Depends(get_current_user),
@@ -312,56 +330,13 @@ async def get_my_orders(
 ):
     """Получение заказов текущего пользователя."""
     from sqlalchemy import select
-    from app.models.order import Order, OrderItem
-    from app.schemas.order import OrderResponse, OrderItemResponse
+    from app.models.order import Order
+    from app.services.order_projection import fetch_order_responses
     
     # Получаем заказы пользователя
     query = select(Order).where(Order.user_id == current_user.id).order_by(Order.created_at.desc())
-    result = await db.execute(query)
-    orders = result.scalars().all()
-    
-    # Формируем ответ с полной информацией о заказах
-    orders_response = []
-    for order in orders:
-        # Получаем товары для каждого заказа
-        items_query = select(OrderItem).where(OrderItem.order_id == order.id)
-        items_result = await db.execute(items_query)
-        items = items_result.scalars().all()
-        
-        items_response = [
-            OrderItemResponse(
-                id=item.id,
-                dish_name=item.dish_name,
-                quantity=item.quantity,
-                price=item.price,
-                total_price=item.total_price,
-                modifiers=[mod['name'] for mod in (item.modifiers or [])]
-            )
-            for item in items
-        ]
-        
-        # Парсим адрес доставки
-        delivery_address, delivery_entrance, delivery_floor, delivery_apartment, delivery_comment = parse_delivery_address(order.delivery_address)
-        
-        orders_response.append(OrderResponse(
-            id=order.id,
-            order_number=order.order_number,
-            status=order.status,
-            delivery_type=order.delivery_type,
-            payment_method=order.payment_method,
-            total_amount=order.total_amount,
-            delivery_address=delivery_address,
-            delivery_entrance=delivery_entrance,
-            delivery_floor=delivery_floor,
-            delivery_apartment=delivery_apartment,
-            delivery_comment=delivery_comment,
-            customer_name=order.customer_name,
-            customer_phone=order.customer_phone,
-            items=items_response,
-            created_at=order.created_at.isoformat()
-        ))
     
-    return orders_response
+    return await fetch_order_responses(db, query)
 
 @router.post("/me/newsletter")
 async def subscribe_newsletter(
@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.endpoints import auth, menu, orders, admin, courier, kitchen, analytics, marketing, users, promo_codes
+from app.api.endpoints import auth, menu, orders, admin, courier, kitchen, analytics, marketing, users, promo_codes, events
 
 # Главный роутер API
 api_router = APIRouter()
@@ -64,3 +64,9 @@ api_router.include_router(
     prefix="/promo-codes", 
     tags=["promo-codes"]
 )
+
+api_router.include_router(
+    events.router, 
+    prefix="/events", 
+    tags=["events"]
+)
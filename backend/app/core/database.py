@@ -1,20 +1,17 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import event, create_engine
-from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
-import sqlite3
 from typing import AsyncGenerator, Generator
 
 from app.core.config import settings
+from app.core.db_backend import create_engines, create_read_engine, is_sqlite
+from app.core.sqlite_profile import sqlite_pragmas
 
-# Создание асинхронного движка для SQLite
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,  # Логирование SQL запросов в режиме отладки
-    future=True,
-    connect_args={"check_same_thread": False}  # Для SQLite
-)
+# Асинхронный движок приложения и синхронный для миграций: SQLite (aiosqlite) или PostgreSQL (asyncpg).
+# Для SQLite на каждом подключении применяется профиль PRAGMA (WAL, busy_timeout, synchronous и т.д.);
+# некорректные значения в настройках останавливают запуск приложения.
+engine, sync_engine = create_engines(settings.DATABASE_URL, settings)
+SQLITE_PRAGMAS = sqlite_pragmas(settings) if is_sqlite(settings.DATABASE_URL) else []
 
 # Создание фабрики сессий
 async_session_maker = async_sessionmaker(
@@ -23,11 +20,17 @@ async_session_maker = async_sessionmaker(
     expire_on_commit=False
 )
 
-# Синхронный движок для совместимости
-sync_engine = create_engine(
-    settings.DATABASE_URL.replace("sqlite+aiosqlite://", "sqlite:///"),
-    echo=settings.DEBUG,
-    connect_args={"check_same_thread": False}
+# Движок для чтения (GET-запросы меню, админки, аналитики): реплика или SQLite в режиме mode=ro.
+# Если отдельного пути чтения нет, используется основной движок.
+read_engine = (
+    create_read_engine(settings.DATABASE_URL, settings.DATABASE_READ_URL, settings)
+    if settings.DATABASE_SPLIT_READS else None
+) or engine
+
+async_read_session_maker = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
 )
 
 # Синхронная фабрика сессий
@@ -37,16 +40,6 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 Base = declarative_base()
 
 
-# Включение поддержки внешних ключей для SQLite
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    """Включение внешних ключей для SQLite при подключении."""
-    if isinstance(dbapi_connection, sqlite3.Connection):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
-        cursor.close()
-
-
 async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency для получения асинхронной сессии базы данных.
@@ -62,6 +55,20 @@ async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_db_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency для сессии только для чтения: Depends(get_read_db_session) в GET-эндпоинтах.
+    Запросы идут через отдельный движок и не занимают подключения, нужные оформлению заказов.
+    Реплика может немного отставать, поэтому данные, только что записанные в этом же
+    запросе, нужно читать через get_db_session.
+    """
+    async with async_read_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 def get_db() -> Generator[Session, None, None]:
     """
     Dependency для получения синхронной сессии базы данных.
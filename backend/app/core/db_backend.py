@@ -0,0 +1,129 @@
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from typing import Any, Dict, Optional, Tuple, Union
+
+from app.core.sqlite_profile import sqlite_pragmas, install_sqlite_profile
+
+# Драйверы по умолчанию для каждой поддерживаемой базы: (асинхронный, синхронный)
+DRIVERS = {
+    "sqlite": ("sqlite+aiosqlite", "sqlite+pysqlite"),
+    "postgresql": ("postgresql+asyncpg", "postgresql+psycopg2"),
+}
+
+
+def _backend(url: URL) -> str:
+    backend = url.get_backend_name()
+    if backend not in DRIVERS:
+        raise ValueError(f"Неподдерживаемая база данных: {backend}. Поддерживаются: {', '.join(DRIVERS)}")
+    return backend
+
+
+def async_database_url(database_url: Union[str, URL]) -> URL:
+    """URL для асинхронного движка: postgresql:// и sqlite:// получают асинхронный драйвер."""
+    url = make_url(database_url)
+    return url.set(drivername=DRIVERS[_backend(url)][0])
+
+
+def sync_database_url(database_url: Union[str, URL]) -> URL:
+    """URL для синхронного движка (миграции, скрипты) с той же базой, хостом и параметрами."""
+    url = make_url(database_url)
+    return url.set(drivername=DRIVERS[_backend(url)][1])
+
+
+def is_sqlite(database_url: Union[str, URL]) -> bool:
+    return make_url(database_url).get_backend_name() == "sqlite"
+
+
+def upsert_statement(dialect_name: str, table):
+    """INSERT ... ON CONFLICT для текущей базы (SQLite и PostgreSQL поддерживают одинаковый синтаксис)."""
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def read_only_database_url(database_url: Union[str, URL]) -> Optional[URL]:
+    """
+    URL только для чтения к тому же файлу SQLite: файл открывается как URI с mode=ro, и
+    любая запись на таком подключении завершается ошибкой. Для базы в памяти и для
+    PostgreSQL (реплика задается отдельным DSN) возвращает None.
+    """
+    url = async_database_url(database_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    if url.database.startswith("file:"):
+        return url.update_query_dict({"mode": "ro", "uri": "true"})
+    return url.set(database=f"file:{url.database}").update_query_dict({"mode": "ro", "uri": "true"})
+
+
+def engine_options(database_url: Union[str, URL], settings, is_async: bool = True) -> Dict[str, Any]:
+    """
+    Параметры create_engine для базы из URL.
+
+    SQLite: один файл и одно подключение на поток, пул не настраивается, профиль PRAGMA
+    ставится отдельно. PostgreSQL: пул подключений с запасом на пики, проверкой подключения
+    перед выдачей (pre-ping) и пересозданием старых подключений; для asyncpg — размер кеша
+    подготовленных выражений на подключение (0 для PgBouncer в режиме transaction).
+    """
+    url = make_url(database_url)
+    options: Dict[str, Any] = {"echo": settings.DEBUG}
+
+    if _backend(url) == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        return options
+
+    options.update(
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+    )
+    if is_async:
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+            "server_settings": {"application_name": settings.APP_NAME},
+        }
+    return options
+
+
+def create_engines(database_url: Union[str, URL], settings) -> Tuple[AsyncEngine, Engine]:
+    """
+    Асинхронный движок приложения и синхронный движок для миграций с одной и той же базой.
+    Профиль PRAGMA подключается только для SQLite.
+    """
+    engine = create_async_engine(
+        async_database_url(database_url),
+        **engine_options(database_url, settings, is_async=True)
+    )
+    sync_engine = create_engine(
+        sync_database_url(database_url),
+        **engine_options(database_url, settings, is_async=False)
+    )
+
+    if is_sqlite(database_url):
+        pragmas = sqlite_pragmas(settings)
+        install_sqlite_profile(engine, pragmas)
+        install_sqlite_profile(sync_engine, pragmas)
+
+    return engine, sync_engine
+
+
+def create_read_engine(database_url: Union[str, URL], read_database_url: Union[str, URL, None], settings) -> Optional[AsyncEngine]:
+    """
+    Движок для чтения: реплика из read_database_url или, для файла SQLite, отдельное
+    подключение к тому же файлу в режиме только для чтения (в WAL читатели не ждут писателя).
+    None — отдельного пути чтения нет, чтение идет через основной движок.
+    """
+    url = make_url(read_database_url) if read_database_url else read_only_database_url(database_url)
+    if url is None:
+        return None
+
+    read_engine = create_async_engine(async_database_url(url), **engine_options(url, settings, is_async=True))
+    if is_sqlite(url):
+        # journal_mode хранится в файле базы и на подключении только для чтения не меняется
+        pragmas = [(name, value) for name, value in sqlite_pragmas(settings) if name != "journal_mode"]
+        install_sqlite_profile(read_engine, pragmas)
+    return read_engine
@@ -0,0 +1,99 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from typing import Any, Dict, List, Tuple
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_LEVELS = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+TEMP_STORES = {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}
+
+
+def sqlite_pragmas(settings) -> List[Tuple[str, Any]]:
+    """
+    Список PRAGMA профиля SQLite из настроек, в порядке применения.
+    При недопустимых значениях — ValueError со всеми ошибками сразу, чтобы приложение
+    не стартовало с профилем, который SQLite молча проигнорирует.
+    """
+    journal_mode = settings.SQLITE_JOURNAL_MODE.upper()
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+    temp_store = settings.SQLITE_TEMP_STORE.upper()
+
+    errors = []
+    if journal_mode not in JOURNAL_MODES:
+        errors.append(f"SQLITE_JOURNAL_MODE={settings.SQLITE_JOURNAL_MODE!r}, допустимо: {', '.join(JOURNAL_MODES)}")
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        errors.append(f"SQLITE_SYNCHRONOUS={settings.SQLITE_SYNCHRONOUS!r}, допустимо: {', '.join(SYNCHRONOUS_LEVELS)}")
+    if temp_store not in TEMP_STORES:
+        errors.append(f"SQLITE_TEMP_STORE={settings.SQLITE_TEMP_STORE!r}, допустимо: {', '.join(TEMP_STORES)}")
+    for name in ("SQLITE_BUSY_TIMEOUT_MS", "SQLITE_CACHE_SIZE_KIB", "SQLITE_MMAP_SIZE_BYTES"):
+        if getattr(settings, name) < 0:
+            errors.append(f"{name} не может быть отрицательным")
+    if errors:
+        raise ValueError("Некорректный профиль SQLite: " + "; ".join(errors))
+
+    return [
+        # journal_mode первым: WAL сохраняется в файле базы, остальные PRAGMA действуют на подключение
+        ("journal_mode", journal_mode),
+        ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+        ("synchronous", synchronous),
+        # Отрицательное значение cache_size — размер в КиБ, а не в страницах
+        ("cache_size", -settings.SQLITE_CACHE_SIZE_KIB),
+        ("mmap_size", settings.SQLITE_MMAP_SIZE_BYTES),
+        ("temp_store", temp_store),
+        ("foreign_keys", "ON" if settings.SQLITE_FOREIGN_KEYS else "OFF"),
+    ]
+
+
+def install_sqlite_profile(engine, pragmas: List[Tuple[str, Any]]):
+    """
+    Применение PRAGMA к каждому новому подключению движка (синхронного или асинхронного).
+    Для aiosqlite слушатель получает адаптированное подключение, поэтому проверка на
+    sqlite3.Connection здесь не подходит: движок выбирается явно.
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+            if name == "journal_mode":
+                # journal_mode возвращает строку с результатом, ее нужно дочитать
+                cursor.fetchall()
+        cursor.close()
+
+    return set_sqlite_pragmas
+
+
+def _normalize(name: str, value: Any) -> Any:
+    """Значение PRAGMA в том виде, в каком оно задается в настройках."""
+    if name == "journal_mode":
+        return str(value).upper()
+    if name == "synchronous":
+        return {v: k for k, v in SYNCHRONOUS_LEVELS.items()}.get(value, value)
+    if name == "temp_store":
+        return {v: k for k, v in TEMP_STORES.items()}.get(value, value)
+    if name == "foreign_keys" and isinstance(value, int):
+        return "ON" if value else "OFF"
+    return value
+
+
+async def read_sqlite_pragmas(engine: AsyncEngine, pragmas: List[Tuple[str, Any]]) -> Dict[str, Any]:
+    """Фактические значения PRAGMA профиля на одном из подключений пула."""
+    active = {}
+    async with engine.connect() as conn:
+        for name, _ in pragmas:
+            value = (await conn.exec_driver_sql(f"PRAGMA {name}")).scalar()
+            active[name] = _normalize(name, value)
+    return active
+
+
+def profile_mismatches(pragmas: List[Tuple[str, Any]], active: Dict[str, Any]) -> Dict[str, Tuple[Any, Any]]:
+    """
+    PRAGMA, значение которых отличается от заданного: {имя: (ожидалось, фактически)}.
+    Например, WAL недоступен для базы в памяти, а mmap_size ограничен сборкой SQLite.
+    """
+    return {
+        name: (expected, active.get(name))
+        for name, expected in pragmas
+        if active.get(name) != _normalize(name, expected)
+    }
@@ -1,9 +1,12 @@
 from app.models.user import User
 from app.models.menu import Category, Dish, VariantGroup, Variant, Addon
-from app.models.order import Order, OrderItem
+from app.models.order import Order, OrderItem, OrderNumberSequence
 from app.models.promo_code import PromoCode, DiscountType
 from app.models.promo_code_usage import PromoCodeUsage
 from app.models.banner import Banner
+from app.models.metrics import OrderRollup, SalesCube, OrderGeoBin, MetricCounter
+from app.models.customer_segment import CustomerSegment
+from app.models.notification import NotificationJob, PushCampaign
 
 # Импорт Base для создания таблиц
 from app.core.database import Base
@@ -18,8 +21,16 @@ __all__ = [
     "Addon",
     "Order", 
     "OrderItem", 
+    "OrderNumberSequence",
     "PromoCode",
     "DiscountType",
     "PromoCodeUsage",
-    "Banner"
+    "Banner",
+    "OrderRollup",
+    "SalesCube",
+    "OrderGeoBin",
+    "MetricCounter",
+    "CustomerSegment",
+    "NotificationJob",
+    "PushCampaign"
 ]
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, Float, Numeric, ForeignKey
+from app.core.database import Base
+
+
+class CustomerSegment(Base):
+    """
+    RFM-сегмент клиента по доставленным заказам. Таблица целиком пересчитывается пакетной
+    задачей (segment_customers.py); клиент определяется телефоном из заказа, поэтому гости
+    без аккаунта тоже попадают в сегменты.
+    """
+    __tablename__ = "customer_segments"
+
+    customer_phone = Column(String(15), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
+    customer_name = Column(String(100), nullable=True)  # Имя из последнего заказа
+
+    last_order_at = Column(DateTime(timezone=True), nullable=False)
+    recency_days = Column(Float, nullable=False)  # Дней с последнего заказа на момент расчета
+    frequency = Column(Integer, nullable=False)  # Число доставленных заказов
+    monetary = Column(Numeric(14, 2), nullable=False)  # Сумма доставленных заказов
+
+    # Квинтили от 1 до 5 (5 — лучшие: недавние, частые, крупные покупатели)
+    r_score = Column(SmallInteger, nullable=False)
+    f_score = Column(SmallInteger, nullable=False)
+    m_score = Column(SmallInteger, nullable=False)
+    segment = Column(String(30), nullable=False, index=True)
+
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<CustomerSegment(phone='{self.customer_phone}', rfm={self.r_score}{self.f_score}{self.m_score}, segment='{self.segment}')>"
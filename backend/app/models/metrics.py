@@ -0,0 +1,90 @@
+from sqlalchemy import Column, Integer, SmallInteger, String, Date, DateTime, Numeric, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class OrderRollup(Base):
+    """
+    Свертка заказов по времени создания в разрезе одного измерения.
+
+    period — all (одна корзина за все время), day или hour; bucket_start — начало дня или часа.
+    dimension — all (итого, value пустое), status, delivery_type, payment_method, utm_source,
+    utm_medium или utm_campaign; value — значение измерения (пустая строка, если не задано).
+    Строки обновляются в той же транзакции, что создает заказ или меняет его статус (см. services/metrics).
+    """
+    __tablename__ = "order_rollups"
+
+    # Порядок ключа: диапазон по времени внутри (period, dimension) читается подряд по индексу
+    period = Column(String(10), primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    value = Column(String(100), primary_key=True)
+
+    orders_count = Column(Integer, nullable=False, default=0)  # Все заказы, кроме строк status — заказы в этом статусе
+    total_amount = Column(Numeric(14, 2), nullable=False, default=0)  # Сумма этих заказов
+    delivered_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)  # Сумма доставленных (выданных) заказов
+    cancelled_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<OrderRollup(period='{self.period}', dimension='{self.dimension}', value='{self.value}', bucket='{self.bucket_start}', count={self.orders_count})>"
+
+
+class SalesCube(Base):
+    """
+    Куб продаж блюд по доставленным заказам: день и час создания заказа, категория и блюдо.
+    День недели хранится рядом с датой, чтобы тепловая карта группировалась без функций над датой.
+    Строки меняются, когда заказ становится доставленным или перестает им быть (см. services/sales_cube).
+    """
+    __tablename__ = "sales_cube"
+
+    sale_date = Column(Date, primary_key=True)
+    hour = Column(SmallInteger, primary_key=True)  # 0..23
+    category_id = Column(Integer, primary_key=True)
+    dish_id = Column(Integer, primary_key=True)
+    weekday = Column(SmallInteger, nullable=False)  # 0 — понедельник
+
+    orders_count = Column(Integer, nullable=False, default=0)  # Заказы, в которых было блюдо
+    quantity = Column(Integer, nullable=False, default=0)  # Проданные порции
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)  # Сумма позиций (без скидок на заказ)
+
+    # Срезы по категории или блюду за период
+    __table_args__ = (
+        Index("ix_sales_cube_category_date", "category_id", "sale_date"),
+        Index("ix_sales_cube_dish_date", "dish_id", "sale_date"),
+    )
+
+    def __repr__(self):
+        return f"<SalesCube(date='{self.sale_date}', hour={self.hour}, dish_id={self.dish_id}, quantity={self.quantity})>"
+
+
+class OrderGeoBin(Base):
+    """
+    Число и сумма доставленных заказов с доставкой в ячейке геохеша (services/geo_bins).
+    Одна точка адреса учитывается на каждом уровне precision; month — начало месяца создания
+    заказа или 1970-01-01 для корзины за все время. Ячейки тайла читаются диапазонами по префиксу.
+    """
+    __tablename__ = "order_geo_bins"
+
+    precision = Column(SmallInteger, primary_key=True)
+    month = Column(Date, primary_key=True)
+    geohash = Column(String(12), primary_key=True)
+
+    orders_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(14, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<OrderGeoBin(precision={self.precision}, month='{self.month}', geohash='{self.geohash}', count={self.orders_count})>"
+
+
+class MetricCounter(Base):
+    """Именованный счетчик (например, число активных клиентов), который поддерживается при изменениях."""
+    __tablename__ = "metric_counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<MetricCounter(name='{self.name}', value={self.value})>"
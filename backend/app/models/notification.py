@@ -0,0 +1,92 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
+from sqlalchemy.sql import func
+from enum import Enum
+from app.core.database import Base
+
+
+class NotificationChannel(str, Enum):
+    SMS = "sms"
+    PUSH = "push"
+
+
+class NotificationJobStatus(str, Enum):
+    PENDING = "pending"  # Ждет отправки (next_attempt_at — не раньше какого момента)
+    SENDING = "sending"  # Забрано диспетчером до next_attempt_at; после этого считается брошенным
+    FAILED = "failed"  # Попытки исчерпаны или получатель недействителен
+
+
+class NotificationJob(Base):
+    """
+    Задание на отправку SMS или push в очереди уведомлений.
+
+    Задание добавляется в той же транзакции, что и изменение, ради которого оно отправляется,
+    поэтому не теряется при перезапуске. Диспетчер (services/notifications) забирает задания
+    пакетами и удаляет отправленные; в таблице остаются ожидающие и неудачные.
+    """
+    __tablename__ = "notification_jobs"
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String(10), nullable=False)
+    recipient = Column(String(255), nullable=False)  # Телефон для SMS, FCM-токен для push
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    title = Column(String(200), nullable=True)
+    body = Column(Text, nullable=False)
+    data = Column(Text, nullable=True)  # JSON с данными push-уведомления
+
+    status = Column(String(10), nullable=False, default=NotificationJobStatus.PENDING.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)  # UTC
+    claimed_by = Column(String(32), nullable=True)  # Метка диспетчера, забравшего задание
+    last_error = Column(String(500), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Выборка готовых к отправке заданий по порядку времени
+        Index("ix_notification_jobs_due", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<NotificationJob(id={self.id}, channel='{self.channel}', status='{self.status}', attempts={self.attempts})>"
+
+
+class PushCampaignStatus(str, Enum):
+    PENDING = "pending"  # Создана, ждет свободного исполнителя
+    RUNNING = "running"  # Рассылается; heartbeat_at обновляется после каждой страницы получателей
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+
+class PushCampaign(Base):
+    """
+    Push-рассылка всем клиентам с зарегистрированным устройством.
+
+    Получатели перебираются по возрастанию id пользователя (keyset), cursor_user_id — последний
+    обработанный id: после перезапуска рассылка продолжается с него, а не с начала.
+    Счетчики и курсор меняются одним UPDATE после каждой страницы (см. services/push_campaigns).
+    """
+    __tablename__ = "push_campaigns"
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String(200), nullable=False)
+    body = Column(Text, nullable=False)
+    data = Column(Text, nullable=True)  # JSON с данными push-уведомления
+    created_by_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+
+    status = Column(String(10), nullable=False, default=PushCampaignStatus.PENDING.value, index=True)
+    recipients_total = Column(Integer, nullable=True)  # Клиентов с устройством на момент старта
+    cursor_user_id = Column(Integer, nullable=False, default=0)
+    sent_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)  # Отклонено провайдером без повтора
+    invalid_count = Column(Integer, nullable=False, default=0)  # Недействительные токены (удалены у пользователей)
+    retried_count = Column(Integer, nullable=False, default=0)  # Переданы в очередь notification_jobs для повтора
+    batches_count = Column(Integer, nullable=False, default=0)
+    last_error = Column(String(500), nullable=True)
+
+    claimed_by = Column(String(32), nullable=True)  # Метка процесса, который ведет рассылку
+    heartbeat_at = Column(DateTime, nullable=True)  # UTC; давно не обновлялся — исполнитель упал
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime, nullable=True)  # UTC
+    finished_at = Column(DateTime, nullable=True)  # UTC
+
+    def __repr__(self):
+        return f"<PushCampaign(id={self.id}, status='{self.status}', sent={self.sent_count}/{self.recipients_total})>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum, JSON, Numeric
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Enum as SQLEnum, JSON, Numeric, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum
@@ -26,11 +26,14 @@ class PaymentMethod(str, Enum):
     CARD = "card"  # Банковская карта
     CASH = "cash"  # Наличные
 
+# Номер заказа: префикс филиала (до 12 символов), день и номер за день (5-7 цифр) — до 29 символов
+ORDER_NUMBER_LENGTH = 32
+
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_number = Column(String(20), unique=True, index=True, nullable=False)  # Например: ORD-2024-001
+    order_number = Column(String(ORDER_NUMBER_LENGTH), unique=True, index=True, nullable=False)  # Например: ORD-20240115-00042
     
     # Связь с пользователем (может быть None для гостевых заказов)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -44,6 +47,8 @@ class Order(Base):
     delivery_type = Column(SQLEnum(DeliveryType), nullable=False)
     delivery_address = Column(Text, nullable=True)  # JSON с адресом
     pickup_address = Column(String(200), nullable=True)  # Адрес ресторана для самовывоза
+    delivery_latitude = Column(Float, nullable=True)  # Координаты адреса доставки (для карты заказов)
+    delivery_longitude = Column(Float, nullable=True)
     
     # Статусы
     status = Column(SQLEnum(OrderStatus), default=OrderStatus.PENDING)
@@ -72,18 +77,30 @@ class Order(Base):
     utm_medium = Column(String(100), nullable=True)
     utm_campaign = Column(String(100), nullable=True)
     
-    # Временные метки
+    # Временные метки (журнал переходов: когда заказ впервые попал в статус, см. order_state)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     confirmed_at = Column(DateTime(timezone=True), nullable=True)
+    preparing_at = Column(DateTime(timezone=True), nullable=True)
     ready_at = Column(DateTime(timezone=True), nullable=True)
+    delivering_at = Column(DateTime(timezone=True), nullable=True)
     delivered_at = Column(DateTime(timezone=True), nullable=True)
+    cancelled_at = Column(DateTime(timezone=True), nullable=True)
     
     # Отношения
     user = relationship("User", foreign_keys=[user_id])
     assigned_courier = relationship("User", foreign_keys=[assigned_courier_id])
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    # Составные индексы для keyset-пагинации ленты заказов по (created_at, id) с фильтрами
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_orders_delivery_type_created_at_id", "delivery_type", "created_at", "id"),
+        Index("ix_orders_courier_created_at_id", "assigned_courier_id", "created_at", "id"),
+        Index("ix_orders_customer_phone", "customer_phone"),
+    )
+
     def __repr__(self):
         return f"<Order(id={self.id}, number='{self.order_number}', status='{self.status}')>"
 
@@ -91,7 +108,7 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
     dish_id = Column(Integer, ForeignKey("dishes.id"), nullable=False)
     
     # Информация о блюде на момент заказа (для истории)
@@ -113,3 +130,15 @@ class OrderItem(Base):
 
     def __repr__(self):
         return f"<OrderItem(id={self.id}, dish='{self.dish_name}', quantity={self.quantity})>"
+
+class OrderNumberSequence(Base):
+    """Счетчик номеров заказов в пределах области (префикс и день), например ORD-20240115."""
+    __tablename__ = "order_number_sequences"
+
+    scope = Column(String(50), primary_key=True)
+    last_value = Column(Integer, nullable=False, default=0)  # Последний выданный (зарезервированный) номер
+    
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<OrderNumberSequence(scope='{self.scope}', last_value={self.last_value})>"
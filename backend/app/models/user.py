@@ -45,6 +45,7 @@ class User(Base):
     # Настройки подписок
     # newsletter_subscribed = Column(Boolean, default=False)  # Временно отключено
     # sms_notifications = Column(Boolean, default=True)  # Временно отключено
+    fcm_token = Column(String(255), nullable=True, index=True)  # Токен устройства для push-уведомлений (FCM)
     
     # Служебные поля
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -24,6 +24,7 @@ class OrderItemRequest(BaseModel):
     dish_id: int
     quantity: int = Field(ge=1, description="Количество (минимум 1)")
     modifiers: List[int] = Field(default=[], description="ID модификаторов")
+    addons: List[int] = Field(default=[], description="ID добавок")
 
 class OrderCreateRequest(BaseModel):
     items: List[OrderItemRequest]
@@ -31,10 +32,15 @@ class OrderCreateRequest(BaseModel):
     payment_method: PaymentMethod
     delivery_address: Optional[str] = Field(None, description="Адрес доставки (обязателен для delivery)")
     pickup_address: Optional[str] = Field(None, description="Адрес ресторана (обязателен для pickup)")
+    delivery_latitude: Optional[float] = Field(None, ge=-90, le=90, description="Широта адреса доставки (по умолчанию — из профиля)")
+    delivery_longitude: Optional[float] = Field(None, ge=-180, le=180, description="Долгота адреса доставки")
     phone: Optional[str] = Field(None, description="Телефон (если не авторизован)")
     name: Optional[str] = Field(None, description="Имя (если не авторизован)")
     comment: Optional[str] = Field(None, description="Комментарий к заказу")
     promo_code: Optional[str] = Field(None, description="Промокод")
+    utm_source: Optional[str] = Field(None, max_length=100, description="UTM-метка источника перехода")
+    utm_medium: Optional[str] = Field(None, max_length=100)
+    utm_campaign: Optional[str] = Field(None, max_length=100)
 
 class OrderItemResponse(BaseModel):
     id: int
@@ -71,5 +77,53 @@ class OrderResponse(BaseModel):
 class OrderStatusUpdateRequest(BaseModel):
     status: OrderStatus
 
+class OrderBulkStatusUpdateRequest(OrderStatusUpdateRequest):
+    order_ids: List[int] = Field(..., min_length=1, max_length=500, description="Заказы, которые переводятся в status (до 500)")
+
+class OrderBulkStatusResult(BaseModel):
+    order_id: int
+    success: bool
+    order_number: Optional[str] = None
+    previous_status: Optional[OrderStatus] = None
+    new_status: Optional[OrderStatus] = None
+    error_code: Optional[int] = Field(None, description="HTTP-код, который вернул бы PATCH /status для этого заказа")
+    detail: Optional[str] = None
+
+class OrderBulkStatusUpdateResponse(BaseModel):
+    status: OrderStatus
+    updated: int
+    failed: int
+    results: List[OrderBulkStatusResult]
+
 class OrderAssignCourierRequest(BaseModel):
     courier_id: int
+
+class OrderFeedResponse(BaseModel):
+    orders: List[OrderResponse]
+    next_cursor: Optional[str] = Field(None, description="Курсор следующей страницы (None - страниц больше нет)")
+    has_more: bool = False
+
+class OrderQuoteRequest(BaseModel):
+    items: List[OrderItemRequest]
+    delivery_type: DeliveryType
+    promo_code: Optional[str] = Field(None, description="Промокод")
+
+class OrderQuoteItemResponse(BaseModel):
+    dish_id: int
+    dish_name: str
+    quantity: int
+    price: Decimal
+    total_price: Decimal
+    modifiers: List[str] = []
+
+class OrderQuoteResponse(BaseModel):
+    items: List[OrderQuoteItemResponse]
+    subtotal: Decimal
+    discount_amount: Decimal
+    promo_code: Optional[str] = None
+    promo_applied: bool = False
+    delivery_fee: Decimal
+    total_amount: Decimal
+    min_order_amount: Decimal
+    is_min_order_met: bool
+    free_delivery_amount: Decimal
@@ -66,6 +66,9 @@ class UserProfileResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class FcmTokenUpdate(BaseModel):
+    token: str = Field(..., min_length=1, max_length=255, description="FCM-токен устройства для push-уведомлений")
+
 class NewsletterSubscription(BaseModel):
     email: str = Field(..., description="Email для подписки на рассылку")
 
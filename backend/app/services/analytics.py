@@ -0,0 +1,206 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, case
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.models.metrics import OrderRollup
+from app.services.metrics import MEASURES
+
+# Гранулярность отчета -> период сверток, из которого она читается.
+# По дням недели и часам суток строки не хранятся: они собираются из дневных и часовых корзин
+GRANULARITIES = {"day": "day", "hour": "hour", "weekday": "day", "hour_of_day": "hour"}
+UTM_DIMENSIONS = ("utm_source", "utm_medium", "utm_campaign")
+
+
+@dataclass(frozen=True)
+class ReportRange:
+    """Период отчета: дни с date_from по date_to включительно."""
+    date_from: date
+    date_to: date
+
+    @property
+    def days(self) -> int:
+        return (self.date_to - self.date_from).days + 1
+
+    @property
+    def start(self) -> datetime:
+        return datetime.combine(self.date_from, time())
+
+    @property
+    def end(self) -> datetime:
+        return datetime.combine(self.date_to + timedelta(days=1), time())
+
+    def previous(self) -> "ReportRange":
+        """Предыдущий период той же длины, вплотную к текущему."""
+        return ReportRange(self.date_from - timedelta(days=self.days), self.date_from - timedelta(days=1))
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"date_from": self.date_from.isoformat(), "date_to": self.date_to.isoformat()}
+
+
+def resolve_range(date_from: Optional[date], date_to: Optional[date], max_days: Optional[int] = None) -> ReportRange:
+    """Период из параметров запроса; по умолчанию — последние ANALYTICS_DEFAULT_DAYS дней."""
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="Дата начала периода позже даты окончания")
+
+    report_range = ReportRange(date_from, date_to)
+    max_days = max_days or settings.ANALYTICS_MAX_RANGE_DAYS
+    if report_range.days > max_days:
+        raise HTTPException(status_code=400, detail=f"Период отчета не может быть длиннее {max_days} дней")
+    return report_range
+
+
+def _measures(values: Sequence[Any]) -> Dict[str, Any]:
+    """Показатели из сумм MEASURES плюс производные: средний чек и доля отмен."""
+    orders_count, total_amount, delivered_count, revenue, cancelled_count = (value or 0 for value in values)
+    return {
+        "orders_count": int(orders_count),
+        "total_amount": round(float(total_amount), 2),
+        "delivered_count": int(delivered_count),
+        "revenue": round(float(revenue), 2),
+        "cancelled_count": int(cancelled_count),
+        "average_check": round(float(revenue) / delivered_count, 2) if delivered_count else 0.0,
+        "cancellation_rate": round(cancelled_count * 100 / orders_count, 1) if orders_count else 0.0,
+    }
+
+
+EMPTY_MEASURES = _measures([0] * len(MEASURES))
+
+
+def _compare(current: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Изменение показателей к предыдущему периоду в процентах (None, если в предыдущем был ноль)."""
+    return {
+        name: round((current[name] - previous[name]) * 100 / previous[name], 1) if previous[name] else None
+        for name in current
+    }
+
+
+def _with_comparison(current: Dict[str, Any], previous: Dict[str, Any]) -> Dict[str, Any]:
+    return {"current": current, "previous": previous, "change_percent": _compare(current, previous)}
+
+
+def _value(value: str) -> Optional[str]:
+    return value or None  # Пустая строка в свертках — значение не задано
+
+
+async def rollup_totals(db: AsyncSession, dimensions: Sequence[str], report_range: ReportRange) -> Dict[str, Dict[Optional[str], Dict[str, Any]]]:
+    """
+    Итоги текущего и предыдущего периода по значениям измерений одним запросом:
+    суммы дневных корзин на отрезке [начало предыдущего периода, конец текущего),
+    для текущего периода — условные суммы.
+    Возвращает {измерение: {значение: {"current": ..., "previous": ..., "change_percent": ...}}}.
+    """
+    previous = report_range.previous()
+    in_current = OrderRollup.bucket_start >= report_range.start
+    rows = (await db.execute(
+        select(
+            OrderRollup.dimension, OrderRollup.value,
+            *(func.sum(case((in_current, getattr(OrderRollup, name)), else_=0)) for name in MEASURES),
+            *(func.sum(getattr(OrderRollup, name)) for name in MEASURES)
+        )
+        .where(
+            OrderRollup.period == "day",
+            OrderRollup.dimension.in_(dimensions),
+            OrderRollup.bucket_start >= previous.start,
+            OrderRollup.bucket_start < report_range.end,
+        )
+        .group_by(OrderRollup.dimension, OrderRollup.value)
+    )).all()
+
+    count = len(MEASURES)
+    totals: Dict[str, Dict[Optional[str], Dict[str, Any]]] = {dimension: {} for dimension in dimensions}
+    for row in rows:
+        current = [value or 0 for value in row[2:2 + count]]
+        both = [value or 0 for value in row[2 + count:]]
+        totals[row.dimension][_value(row.value)] = _with_comparison(
+            _measures(current), _measures([total - part for total, part in zip(both, current)])
+        )
+    return totals
+
+
+async def rollup_series(db: AsyncSession, dimension: str, granularity: str, report_range: ReportRange) -> List[Dict[str, Any]]:
+    """
+    Ряд показателей по корзинам периода. Для day и hour корзина — начало дня или часа
+    (корзины без заказов пропускаются), для weekday — день недели (0 — понедельник),
+    для hour_of_day — час суток.
+    """
+    rows = (await db.execute(
+        select(OrderRollup.bucket_start, OrderRollup.value, *(getattr(OrderRollup, name) for name in MEASURES))
+        .where(
+            OrderRollup.period == GRANULARITIES[granularity],
+            OrderRollup.dimension == dimension,
+            OrderRollup.bucket_start >= report_range.start,
+            OrderRollup.bucket_start < report_range.end,
+        )
+        .order_by(OrderRollup.bucket_start, OrderRollup.value)
+    )).all()
+
+    if granularity in ("day", "hour"):
+        return [
+            {"bucket": row.bucket_start.isoformat(), "value": _value(row.value), **_measures(row[2:])}
+            for row in rows
+        ]
+
+    # Свертка дневных (часовых) строк по дню недели (часу суток) в памяти: не больше 366 * 24 строк на значение
+    buckets: Dict[tuple, List[Any]] = defaultdict(lambda: [0] * len(MEASURES))
+    for row in rows:
+        bucket = row.bucket_start.weekday() if granularity == "weekday" else row.bucket_start.hour
+        sums = buckets[(bucket, row.value)]
+        for index, value in enumerate(row[2:]):
+            sums[index] += value or 0
+    return [
+        {"bucket": bucket, "value": _value(value), **_measures(sums)}
+        for (bucket, value), sums in sorted(buckets.items())
+    ]
+
+
+async def dashboard_report(db: AsyncSession, report_range: ReportRange) -> Dict[str, Any]:
+    """Показатели периода с разбивкой по статусам, типам доставки и способам оплаты и дневной ряд."""
+    totals = await rollup_totals(db, ("all", "status", "delivery_type", "payment_method"), report_range)
+    summary = totals["all"].get(None) or _with_comparison(EMPTY_MEASURES, EMPTY_MEASURES)
+    return {
+        "period": report_range.as_dict(),
+        "previous_period": report_range.previous().as_dict(),
+        "summary": summary,
+        "by_status": totals["status"],
+        "by_delivery_type": totals["delivery_type"],
+        "by_payment_method": totals["payment_method"],
+        "daily": await rollup_series(db, "all", "day", report_range),
+    }
+
+
+async def orders_report(db: AsyncSession, report_range: ReportRange, granularity: str, dimension: str) -> Dict[str, Any]:
+    """Ряд показателей заказов по корзинам и итоги по значениям измерения со сравнением."""
+    totals = await rollup_totals(db, (dimension,), report_range)
+    return {
+        "period": report_range.as_dict(),
+        "previous_period": report_range.previous().as_dict(),
+        "granularity": granularity,
+        "dimension": dimension,
+        "totals": totals[dimension],
+        "series": await rollup_series(db, dimension, granularity, report_range),
+    }
+
+
+async def utm_report(db: AsyncSession, report_range: ReportRange, dimension: str) -> Dict[str, Any]:
+    """Источники (каналы, кампании) заказов: показатели, доля заказов и сравнение с предыдущим периодом."""
+    totals = (await rollup_totals(db, (dimension,), report_range))[dimension]
+    all_orders = sum(item["current"]["orders_count"] for item in totals.values())
+    items = [
+        {"value": value, "share_percent": round(item["current"]["orders_count"] * 100 / all_orders, 1) if all_orders else 0.0, **item}
+        for value, item in totals.items()
+    ]
+    items.sort(key=lambda item: (-item["current"]["orders_count"], item["value"] or ""))
+    return {
+        "period": report_range.as_dict(),
+        "previous_period": report_range.previous().as_dict(),
+        "dimension": dimension,
+        "items": items,
+    }
+
@@ -1,28 +1,25 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from passlib.context import CryptContext
-from jose import JWTError, jwt
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta
+from typing import Optional
 from app.models.user import User
 from app.schemas.auth import LoginRequest, RegisterRequest, RegistrationInitRequest, VerifyCodeRequest
 from app.core.config import settings
+from app.services.notifications import enqueue_sms, notification_dispatcher
+from app.services.password_hasher import password_hasher
+from app.services.principal_cache import Principal, principal_cache
+from app.services.token_verifier import token_verifier
 import secrets
 import string
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 class AuthService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        """Проверка пароля."""
-        return pwd_context.verify(plain_password, hashed_password)
-
-    def get_password_hash(self, password: str) -> str:
-        """Хеширование пароля."""
-        return pwd_context.hash(password)
+    async def get_password_hash(self, password: str) -> str:
+        """Хеширование пароля (в пуле потоков bcrypt; при перегрузке — 429)."""
+        return await password_hasher.hash(password)
 
     def create_access_token(self, data: dict, expires_delta: timedelta = None):
         """Создание JWT токена."""
@@ -34,10 +31,7 @@ class AuthService:
                 minutes=settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
             )
         to_encode.update({"exp": expire})
-        encoded_jwt = jwt.encode(
-            to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM
-        )
-        return encoded_jwt
+        return token_verifier.encode(to_encode)
 
     async def get_user_by_phone(self, phone: str) -> User:
         """Получение пользователя по номеру телефона."""
@@ -48,7 +42,7 @@ class AuthService:
 
     async def create_user(self, user_data: RegisterRequest) -> User:
         """Создание нового пользователя."""
-        hashed_password = self.get_password_hash(user_data.password)
+        hashed_password = await self.get_password_hash(user_data.password)
         
         db_user = User(
             phone=user_data.phone,
@@ -67,8 +61,13 @@ class AuthService:
         user = await self.get_user_by_phone(phone)
         if not user:
             return None
-        if not self.verify_password(password, user.hashed_password):
+        is_valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+        if not is_valid:
             return None
+        if new_hash:
+            # Стоимость bcrypt изменилась: сохраняем хеш с новой стоимостью, пока пароль известен
+            user.hashed_password = new_hash
+            await self.db.commit()
         return user
 
     async def login(self, request: LoginRequest):
@@ -149,7 +148,7 @@ class AuthService:
         verification_code = self.generate_verification_code()
         
         # Создание нового пользователя с кодом
-        hashed_password = self.get_password_hash(request.password)
+        hashed_password = await self.get_password_hash(request.password)
         
         db_user = User(
             phone=request.phone,
@@ -204,19 +203,21 @@ class AuthService:
 
     async def request_sms(self, phone: str):
         """Запрос SMS кода."""
-        # В реальном проекте здесь будет отправка SMS через Twilio
         sms_code = self.generate_sms_code()
         
-        # Логирование кода для разработки
-        print(f"SMS код для {phone}: {sms_code}")
-        
         # Сохранение кода в базе (если пользователь существует)
         user = await self.get_user_by_phone(phone)
         if user:
             user.verification_code = sms_code
             user.sms_code_expires = datetime.utcnow() + timedelta(minutes=10)
+            # SMS уходит через очередь уведомлений (Twilio при SMS_ENABLED, в разработке — в лог);
+            # ответ не ждет провайдера. На чужие номера SMS не отправляются: кода для них нет,
+            # а отправка позволила бы гонять платные SMS на произвольные номера
+            await enqueue_sms(self.db, phone, f"Код подтверждения APPETIT: {sms_code}", user_id=user.id)
             await self.db.commit()
+            notification_dispatcher.wake()
         
+        # Ответ одинаковый, есть пользователь или нет
         return {"message": "SMS код отправлен"}
 
     async def verify_sms(self, phone: str, code: str):
@@ -252,19 +253,36 @@ class AuthService:
             }
         }
 
-    async def get_current_user(self, token: str) -> User:
-        """Получение текущего пользователя по токену."""
+    def decode_user_id(self, token: str) -> Optional[int]:
+        """Id пользователя из токена (None — токен недействителен); повторный токен — из кеша проверенных."""
+        payload = token_verifier.verify(token)
+        if payload is None:
+            return None
+        user_id = payload.get("sub")
+        if user_id is None:
+            return None
         try:
-            payload = jwt.decode(
-                token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
-            )
-            user_id: str = payload.get("sub")
-            if user_id is None:
-                return None
-        except JWTError:
+            return int(user_id)
+        except (TypeError, ValueError):
+            return None
+
+    async def get_current_user(self, token: str) -> User:
+        """Получение текущего пользователя по токену (полная модель, для профиля и заказов)."""
+        user_id = self.decode_user_id(token)
+        if user_id is None:
             return None
         
         result = await self.db.execute(
-            select(User).where(User.id == int(user_id))
+            select(User).where(User.id == user_id)
         )
-        return result.scalar_one_or_none()
\ No newline at end of file
+        user = result.scalar_one_or_none()
+        if user:
+            principal_cache.put(Principal.from_user(user))
+        return user
+
+    async def get_current_principal(self, token: str) -> Optional[Principal]:
+        """Пользователь для авторизации по токену: из кеша, без чтения users при попадании."""
+        user_id = self.decode_user_id(token)
+        if user_id is None:
+            return None
+        return await principal_cache.load(self.db, user_id)
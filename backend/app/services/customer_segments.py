@@ -0,0 +1,236 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert, func
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.customer_segment import CustomerSegment
+from app.models.order import Order, OrderStatus
+
+# Сегменты RFM: ключ -> подпись для админки
+SEGMENTS = {
+    "champions": "Чемпионы",
+    "loyal_customers": "Лояльные",
+    "potential_loyalists": "Потенциально лояльные",
+    "new_customers": "Новые",
+    "promising": "Перспективные",
+    "need_attention": "Требуют внимания",
+    "about_to_sleep": "Засыпающие",
+    "at_risk": "В зоне риска",
+    "cant_lose": "Нельзя потерять",
+    "hibernating": "Спящие",
+}
+SEGMENT_KEYS = list(SEGMENTS)
+
+# Сегмент по оценкам давности R (строки) и частоты F (столбцы) от 1 до 5
+_SEGMENT_GRID = [
+    ["hibernating", "hibernating", "at_risk", "at_risk", "cant_lose"],
+    ["hibernating", "hibernating", "at_risk", "at_risk", "cant_lose"],
+    ["about_to_sleep", "about_to_sleep", "need_attention", "loyal_customers", "loyal_customers"],
+    ["promising", "potential_loyalists", "potential_loyalists", "loyal_customers", "loyal_customers"],
+    ["new_customers", "potential_loyalists", "potential_loyalists", "champions", "champions"],
+]
+SEGMENT_GRID = np.array([[SEGMENT_KEYS.index(name) for name in row] for row in _SEGMENT_GRID], dtype=np.int8)
+
+QUINTILES = (0.2, 0.4, 0.6, 0.8)
+SECONDS_PER_DAY = 86400.0
+
+
+class RFMAccumulator:
+    """
+    Колоночные накопители показателей по клиентам. Заказы добавляются порциями и сразу
+    сворачиваются векторными операциями (bincount, maximum.at), поэтому память растет
+    с числом клиентов, а не заказов. Код клиента — позиция телефона в index.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.index: Dict[str, int] = {}
+        self.orders = 0
+        self.tzinfo = None
+        self.frequency = np.zeros(capacity, dtype=np.int64)
+        self.monetary = np.zeros(capacity, dtype=np.float64)
+        self.last_seen = np.full(capacity, -np.inf)  # Время последнего заказа, секунды эпохи
+        self.user_ids = np.full(capacity, -1, dtype=np.int64)  # -1 — гость
+        self.names = np.empty(capacity, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def _reserve(self, size: int):
+        capacity = len(self.frequency)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        grow = capacity - len(self.frequency)
+        self.frequency = np.concatenate([self.frequency, np.zeros(grow, dtype=np.int64)])
+        self.monetary = np.concatenate([self.monetary, np.zeros(grow, dtype=np.float64)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(grow, -np.inf)])
+        self.user_ids = np.concatenate([self.user_ids, np.full(grow, -1, dtype=np.int64)])
+        self.names = np.concatenate([self.names, np.empty(grow, dtype=object)])
+
+    def add_chunk(self, rows: Sequence[Tuple[str, Optional[int], str, datetime, Any]]):
+        """Порция строк (телефон, user_id, имя, время заказа, сумма)."""
+        if not rows:
+            return
+        count = len(rows)
+        phones, user_ids, names, created, amounts = zip(*rows)
+        if self.tzinfo is None:
+            self.tzinfo = created[0].tzinfo
+
+        index = self.index
+        codes = np.fromiter((index.setdefault(phone, len(index)) for phone in phones), dtype=np.int64, count=count)
+        stamps = np.fromiter((at.timestamp() for at in created), dtype=np.float64, count=count)
+        amounts = np.fromiter(amounts, dtype=np.float64, count=count)
+        size = len(index)
+        self._reserve(size)
+
+        self.frequency[:size] += np.bincount(codes, minlength=size)
+        self.monetary[:size] += np.bincount(codes, weights=amounts, minlength=size)
+        np.maximum.at(self.last_seen, codes, stamps)
+
+        # Имя и аккаунт берутся из самого позднего заказа клиента
+        latest = stamps >= self.last_seen[codes]
+        self.user_ids[codes[latest]] = np.fromiter(
+            (-1 if user_id is None else user_id for user_id in user_ids), dtype=np.int64, count=count
+        )[latest]
+        self.names[codes[latest]] = np.array(names, dtype=object)[latest]
+        self.orders += count
+
+
+def quintile_scores(values: np.ndarray, higher_is_better: bool = True) -> np.ndarray:
+    """
+    Оценка 1..5 по квинтилям распределения. Одинаковые значения получают одну оценку,
+    поэтому при большом числе совпадений (например, один заказ у большинства) часть оценок пустует.
+    """
+    edges = np.quantile(values, QUINTILES)
+    below = np.searchsorted(edges, values, side="left")  # Число границ строго меньше значения
+    scores = below + 1 if higher_is_better else 5 - below
+    return scores.astype(np.int8)
+
+
+def score_customers(recency_days: np.ndarray, frequency: np.ndarray, monetary: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Оценки R, F, M и коды сегментов (индексы SEGMENT_KEYS) для массивов по клиентам."""
+    r_scores = quintile_scores(recency_days, higher_is_better=False)
+    f_scores = quintile_scores(frequency)
+    m_scores = quintile_scores(monetary)
+    return r_scores, f_scores, m_scores, SEGMENT_GRID[r_scores - 1, f_scores - 1]
+
+
+async def compute_customer_segments(
+    db: AsyncSession,
+    as_of: Optional[datetime] = None,
+    chunk_size: int = 50_000,
+    batch_size: int = 5000
+) -> Dict[str, Any]:
+    """
+    Пакетный расчет RFM-сегментов по доставленным заказам и перезапись customer_segments.
+    Заказы читаются потоком порциями по chunk_size строк, в памяти держатся только
+    накопители по клиентам и одна порция. Commit выполняет вызывающий код.
+    """
+    as_of = as_of or datetime.now()
+    accumulator = RFMAccumulator()
+    result = await db.stream(
+        select(Order.customer_phone, Order.user_id, Order.customer_name, Order.created_at, Order.total_amount)
+        .where(Order.status == OrderStatus.DELIVERED, Order.created_at.is_not(None))
+        .execution_options(yield_per=chunk_size)
+    )
+    async for rows in result.partitions():
+        accumulator.add_chunk(rows)
+
+    await db.execute(delete(CustomerSegment))
+    size = len(accumulator)
+    summary = {"orders": accumulator.orders, "customers": size, "segments": {key: 0 for key in SEGMENT_KEYS}}
+    if not size:
+        return summary
+
+    frequency = accumulator.frequency[:size]
+    monetary = np.round(accumulator.monetary[:size], 2)
+    last_seen = accumulator.last_seen[:size]
+    recency_days = np.maximum(as_of.timestamp() - last_seen, 0) / SECONDS_PER_DAY
+    r_scores, f_scores, m_scores, segments = score_customers(recency_days, frequency, monetary)
+
+    phones = list(accumulator.index)  # Порядок вставки совпадает с кодами клиентов
+    for start in range(0, size, batch_size):
+        stop = min(start + batch_size, size)
+        await db.execute(insert(CustomerSegment), [
+            {
+                "customer_phone": phones[code],
+                "user_id": int(accumulator.user_ids[code]) if accumulator.user_ids[code] >= 0 else None,
+                "customer_name": accumulator.names[code],
+                "last_order_at": datetime.fromtimestamp(last_seen[code], accumulator.tzinfo),
+                "recency_days": round(float(recency_days[code]), 2),
+                "frequency": int(frequency[code]),
+                "monetary": Decimal(str(monetary[code])),
+                "r_score": int(r_scores[code]),
+                "f_score": int(f_scores[code]),
+                "m_score": int(m_scores[code]),
+                "segment": SEGMENT_KEYS[segments[code]],
+                "computed_at": as_of,
+            }
+            for code in range(start, stop)
+        ])
+
+    counts = np.bincount(segments, minlength=len(SEGMENT_KEYS))
+    summary["segments"] = {key: int(count) for key, count in zip(SEGMENT_KEYS, counts)}
+    return summary
+
+
+async def segment_report(db: AsyncSession, segment: Optional[str], limit: int, offset: int) -> Dict[str, Any]:
+    """Сводка по сегментам и клиенты выбранного сегмента (или всех) по убыванию суммы покупок."""
+    rows = (await db.execute(
+        select(
+            CustomerSegment.segment,
+            func.count().label("customers"),
+            func.avg(CustomerSegment.recency_days).label("recency_days"),
+            func.avg(CustomerSegment.frequency).label("frequency"),
+            func.avg(CustomerSegment.monetary).label("monetary"),
+            func.sum(CustomerSegment.monetary).label("total_monetary"),
+            func.max(CustomerSegment.computed_at).label("computed_at"),
+        ).group_by(CustomerSegment.segment)
+    )).all()
+    total = sum(row.customers for row in rows)
+    computed_at = max((row.computed_at for row in rows), default=None)
+    by_segment = {row.segment: row for row in rows}
+
+    query = select(CustomerSegment).order_by(CustomerSegment.monetary.desc(), CustomerSegment.customer_phone)
+    if segment:
+        query = query.where(CustomerSegment.segment == segment)
+    customers = (await db.execute(query.offset(offset).limit(limit))).scalars().all()
+
+    segments: List[Dict[str, Any]] = []
+    for key, label in SEGMENTS.items():
+        row = by_segment.get(key)
+        segments.append({
+            "segment": key,
+            "label": label,
+            "customers": row.customers if row else 0,
+            "share_percent": round(row.customers * 100 / total, 1) if row and total else 0.0,
+            "avg_recency_days": round(float(row.recency_days), 1) if row else None,
+            "avg_frequency": round(float(row.frequency), 2) if row else None,
+            "avg_monetary": round(float(row.monetary), 2) if row else None,
+            "total_monetary": float(row.total_monetary) if row else 0.0,
+        })
+
+    return {
+        "computed_at": computed_at.isoformat() if computed_at else None,
+        "customers_total": total,
+        "segments": segments,
+        "customers": [
+            {
+                "phone": customer.customer_phone,
+                "name": customer.customer_name,
+                "user_id": customer.user_id,
+                "last_order_at": customer.last_order_at.isoformat(),
+                "recency_days": customer.recency_days,
+                "frequency": customer.frequency,
+                "monetary": float(customer.monetary),
+                "rfm": f"{customer.r_score}{customer.f_score}{customer.m_score}",
+                "segment": customer.segment,
+                "segment_label": SEGMENTS[customer.segment],
+            }
+            for customer in customers
+        ],
+    }
@@ -0,0 +1,142 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Set
+import re
+
+
+# Приведение русского и казахского текста к единой форме:
+# регистр, ё/е и казахские буквы, которые часто набирают без специальной раскладки
+_FOLD_TABLE = str.maketrans({
+    "ё": "е",
+    "ә": "а",
+    "ғ": "г",
+    "қ": "к",
+    "ң": "н",
+    "ө": "о",
+    "ұ": "у",
+    "ү": "у",
+    "һ": "х",
+    "і": "и",
+})
+
+_TOKEN_RE = re.compile(r"\w+")
+
+NAME_WEIGHT = 3.0  # Совпадение в названии важнее совпадения в описании
+DESCRIPTION_WEIGHT = 1.0
+EXACT_FACTOR = 1.0
+PREFIX_FACTOR = 0.8
+TYPO_FACTOR = 0.5
+MIN_PREFIX_LENGTH = 2  # Поиск по префиксу начинается со второго символа
+MIN_TYPO_LENGTH = 4  # Короткие слова с опечаткой совпадают со слишком многими словами
+
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста для поиска."""
+    return text.casefold().translate(_FOLD_TABLE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбиение текста на нормализованные слова."""
+    return _TOKEN_RE.findall(normalize_text(text)) if text else []
+
+
+def _deletions(token: str) -> Set[str]:
+    """Окрестность слова: само слово и все варианты с одним удаленным символом."""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class DishSearchIndex:
+    """
+    Инвертированный индекс блюд по названию и описанию.
+
+    Строится вместе со снимком меню, поэтому пересобирается при любом изменении блюд.
+    Каждое слово запроса ищется точно, по префиксу (для поиска по мере ввода)
+    и, если ничего не нашлось, с одной опечаткой (удаление, вставка, замена или
+    перестановка соседних букв). Блюдо должно совпасть со всеми словами запроса;
+    результаты сортируются по релевантности, при равенстве — в порядке меню.
+    """
+
+    def __init__(self, dishes: Iterable):
+        # Блюда добавляются в порядке меню, поэтому каждый список в _postings упорядочен по позиции
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._rank: Dict[int, int] = {}
+
+        for position, dish in enumerate(dishes):
+            self._rank[dish.id] = position
+            for text, weight in ((dish.description, DESCRIPTION_WEIGHT), (dish.name, NAME_WEIGHT)):
+                for token in tokenize(text):
+                    postings = self._postings.setdefault(token, {})
+                    if postings.get(dish.id, 0) < weight:
+                        postings[dish.id] = weight
+
+        self._tokens = sorted(self._postings)
+
+        self._typo_neighbours: Dict[str, List[str]] = {}
+        for token in self._tokens:
+            if len(token) >= MIN_TYPO_LENGTH - 1:
+                for variant in _deletions(token):
+                    self._typo_neighbours.setdefault(variant, []).append(token)
+
+    def __len__(self) -> int:
+        return len(self._rank)
+
+    def _prefixed(self, term: str) -> List[str]:
+        """Все слова индекса, начинающиеся с term (бинарный поиск по отсортированному словарю)."""
+        start = bisect_left(self._tokens, term)
+        end = bisect_left(self._tokens, term + "\U0010ffff", start)
+        return self._tokens[start:end]
+
+    def _collect(self, tokens: Iterable[str], factor_for) -> Dict[int, float]:
+        """Максимальная оценка каждого блюда по совпавшим словам индекса."""
+        postings = [(self._postings[token], factor_for(token)) for token in tokens]
+        if len(postings) == 1:
+            token_postings, factor = postings[0]
+            if factor == 1.0:
+                return dict(token_postings)
+            return {dish_id: weight * factor for dish_id, weight in token_postings.items()}
+
+        scores: Dict[int, float] = {}
+        for token_postings, factor in postings:
+            for dish_id, weight in token_postings.items():
+                score = weight * factor
+                if scores.get(dish_id, 0) < score:
+                    scores[dish_id] = score
+        # Восстанавливаем порядок меню, который нарушило объединение нескольких списков
+        return {dish_id: scores[dish_id] for dish_id in sorted(scores, key=self._rank.__getitem__)}
+
+    def _match_term(self, term: str) -> Dict[int, float]:
+        """Оценки блюд для одного слова запроса."""
+        if len(term) >= MIN_PREFIX_LENGTH:
+            tokens = self._prefixed(term)
+        else:
+            tokens = [term] if term in self._postings else []
+
+        if tokens:
+            return self._collect(tokens, lambda token: EXACT_FACTOR if token == term else PREFIX_FACTOR)
+
+        if len(term) < MIN_TYPO_LENGTH:
+            return {}
+
+        candidates = set()
+        for variant in _deletions(term):
+            candidates.update(self._typo_neighbours.get(variant, ()))
+        return self._collect(candidates, lambda token: TYPO_FACTOR) if candidates else {}
+
+    def search(self, query: str) -> List[int]:
+        """ID блюд, подходящих под запрос, по убыванию релевантности."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        scores = None
+        for term in dict.fromkeys(terms):
+            matches = self._match_term(term)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {dish_id: score + matches[dish_id] for dish_id, score in scores.items() if dish_id in matches}
+            if not scores:
+                return []
+
+        # Списки блюд хранятся в порядке меню, а сортировка устойчива,
+        # поэтому при равной оценке блюда остаются в порядке меню
+        return sorted(scores, key=scores.__getitem__, reverse=True)
@@ -0,0 +1,199 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert, func, and_, or_
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import math
+
+from app.core.db_backend import upsert_statement
+from app.models.metrics import OrderGeoBin
+from app.models.order import Order, OrderStatus, DeliveryType
+from app.utils.geohash import Bounds, encode, decode_center, next_prefix, cell_size, covering
+
+GEO_PRECISIONS = (4, 5, 6, 7)  # От ~39x20 км до ~150x150 м
+ALL_TIME = date(1970, 1, 1)  # Корзина month за все время
+TILE_COLUMNS = 32  # Не больше стольких ячеек по ширине тайла
+TILE_PREFIXES = 16  # Максимум диапазонов по префиксу в запросе одного тайла
+# Тайл z=17 по ширине — две ячейки точности 7, по высоте (сжатой в Web Mercator на cos широты) —
+# не меньше одной до ~60° широты. Мельче в тайл не попадает ни один центр ячейки, и он пустой
+MAX_ZOOM = 17
+
+# (точность, месяц, геохеш) -> [заказы, сумма]
+GeoDeltas = Dict[Tuple[int, date, str], List[Any]]
+
+
+def _new_deltas() -> GeoDeltas:
+    return defaultdict(lambda: [0, Decimal("0")])
+
+
+def _add_order(deltas: GeoDeltas, order, sign: int):
+    """Вклад заказа во все уровни: геохеш максимальной точности кодируется один раз, остальные — его префиксы."""
+    if order.delivery_latitude is None or order.delivery_longitude is None:
+        return
+    geohash = encode(order.delivery_latitude, order.delivery_longitude, max(GEO_PRECISIONS))
+    created_at: datetime = order.created_at
+    amount = sign * Decimal(str(order.total_amount or 0))
+    for month in (ALL_TIME, created_at.date().replace(day=1)):
+        for precision in GEO_PRECISIONS:
+            delta = deltas[(precision, month, geohash[:precision])]
+            delta[0] += sign
+            delta[1] += amount
+
+
+def _rows(deltas: GeoDeltas) -> List[Dict[str, Any]]:
+    return [
+        {"precision": precision, "month": month, "geohash": geohash, "orders_count": count, "revenue": revenue}
+        for (precision, month, geohash), (count, revenue) in deltas.items()
+        if count or revenue
+    ]
+
+
+async def record_geo_changes(db: AsyncSession, changes: Iterable[Tuple[Order, Any]]):
+    """
+    Учет в ячейках заказов с доставкой (заказ после перехода, предыдущий статус), которые стали
+    доставленными или перестали ими быть. Координаты уже есть в заказе после UPDATE ... RETURNING,
+    поэтому для пакета достаточно одного INSERT ... ON CONFLICT; остальные переходы запросов не делают.
+    """
+    deltas = _new_deltas()
+    for order, previous_status in changes:
+        if order.delivery_type != DeliveryType.DELIVERY:
+            continue
+        was_delivered = previous_status is not None and OrderStatus(previous_status) == OrderStatus.DELIVERED
+        is_delivered = OrderStatus(order.status) == OrderStatus.DELIVERED
+        if was_delivered != is_delivered:
+            _add_order(deltas, order, 1 if is_delivered else -1)
+    rows = _rows(deltas)
+    if not rows:
+        return
+    statement = upsert_statement(db.bind.dialect.name, OrderGeoBin).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[OrderGeoBin.precision, OrderGeoBin.month, OrderGeoBin.geohash],
+        set_={
+            "orders_count": OrderGeoBin.orders_count + statement.excluded.orders_count,
+            "revenue": OrderGeoBin.revenue + statement.excluded.revenue,
+        }
+    )
+    await db.execute(statement)
+
+
+async def rebuild_geo_bins(db: AsyncSession, batch_size: int = 5000) -> Dict[str, int]:
+    """Пересчет ячеек с нуля по доставленным заказам с координатами. Commit выполняет вызывающий код."""
+    deltas = _new_deltas()
+    orders = 0
+    result = await db.stream(
+        select(Order.delivery_latitude, Order.delivery_longitude, Order.created_at, Order.total_amount)
+        .where(
+            Order.status == OrderStatus.DELIVERED,
+            Order.delivery_type == DeliveryType.DELIVERY,
+            Order.delivery_latitude.is_not(None),
+            Order.delivery_longitude.is_not(None),
+            Order.created_at.is_not(None),
+        )
+        .execution_options(yield_per=batch_size)
+    )
+    async for row in result:
+        _add_order(deltas, row, 1)
+        orders += 1
+
+    await db.execute(delete(OrderGeoBin))
+    rows = _rows(deltas)
+    for start in range(0, len(rows), batch_size):
+        await db.execute(insert(OrderGeoBin), rows[start:start + batch_size])
+    return {"orders": orders, "bins": len(rows)}
+
+
+def tile_bounds(zoom: int, x: int, y: int) -> Bounds:
+    """Границы тайла XYZ (Web Mercator, как у OpenStreetMap и Leaflet) в градусах."""
+    if not 0 <= zoom <= MAX_ZOOM or not (0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom):
+        raise HTTPException(status_code=400, detail="Тайл вне допустимого диапазона")
+    tiles = 2 ** zoom
+
+    def latitude(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / tiles))))
+
+    return latitude(y + 1), x / tiles * 360.0 - 180.0, latitude(y), (x + 1) / tiles * 360.0 - 180.0
+
+
+def precision_for_zoom(zoom: int) -> int:
+    """Самая мелкая точность, при которой по ширине тайла не больше TILE_COLUMNS ячеек."""
+    min_width = 360.0 / 2 ** zoom / TILE_COLUMNS
+    fitting = [precision for precision in GEO_PRECISIONS if cell_size(precision)[1] >= min_width]
+    return max(fitting) if fitting else min(GEO_PRECISIONS)
+
+
+def tile_prefixes(bounds: Bounds, precision: int) -> List[str]:
+    """Самые мелкие префиксы (не больше TILE_PREFIXES), покрывающие тайл; пустой список — весь мир."""
+    for prefix_precision in range(precision, 0, -1):
+        prefixes = covering(bounds, prefix_precision, limit=TILE_PREFIXES)
+        if len(prefixes) <= TILE_PREFIXES:
+            return prefixes
+    return []
+
+
+async def geo_tile(
+    db: AsyncSession,
+    zoom: int,
+    x: int,
+    y: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None
+) -> Dict[str, Any]:
+    """
+    Ячейки с заказами внутри тайла. Без дат читается корзина за все время, с датами —
+    помесячные корзины (месяцы date_from и date_to целиком). Запрос — несколько диапазонов
+    первичного ключа по префиксам геохеша, поэтому его стоимость зависит от числа ячеек в тайле,
+    а не от числа заказов.
+    """
+    bounds = tile_bounds(zoom, x, y)
+    precision = precision_for_zoom(zoom)
+
+    filters = [OrderGeoBin.precision == precision]
+    if date_from or date_to:
+        filters.append(OrderGeoBin.month > ALL_TIME)
+        if date_from:
+            filters.append(OrderGeoBin.month >= date_from.replace(day=1))
+        if date_to:
+            filters.append(OrderGeoBin.month <= date_to.replace(day=1))
+    else:
+        filters.append(OrderGeoBin.month == ALL_TIME)
+    prefixes = tile_prefixes(bounds, precision)
+    if prefixes:
+        ranges = []
+        for prefix in prefixes:
+            end = next_prefix(prefix)
+            ranges.append(and_(OrderGeoBin.geohash >= prefix, OrderGeoBin.geohash < end) if end else OrderGeoBin.geohash >= prefix)
+        filters.append(or_(*ranges))
+
+    rows = (await db.execute(
+        select(
+            OrderGeoBin.geohash,
+            func.sum(OrderGeoBin.orders_count).label("orders_count"),
+            func.sum(OrderGeoBin.revenue).label("revenue"),
+        ).where(*filters).group_by(OrderGeoBin.geohash)
+    )).all()
+
+    min_lat, min_lon, max_lat, max_lon = bounds
+    bins = []
+    for row in rows:
+        latitude, longitude = decode_center(row.geohash)
+        # Префиксы покрывают тайл с запасом: лишние ячейки по краям отбрасываются
+        if row.orders_count and min_lat <= latitude < max_lat and min_lon <= longitude < max_lon:
+            bins.append({
+                "geohash": row.geohash,
+                "lat": round(latitude, 6),
+                "lng": round(longitude, 6),
+                "orders_count": int(row.orders_count),
+                "revenue": round(float(row.revenue or 0), 2),
+            })
+
+    return {
+        "zoom": zoom,
+        "x": x,
+        "y": y,
+        "precision": precision,
+        "bounds": {"min_lat": min_lat, "min_lng": min_lon, "max_lat": max_lat, "max_lng": max_lon},
+        "max_count": max((item["orders_count"] for item in bins), default=0),
+        "bins": bins,
+    }
@@ -3,17 +3,27 @@ from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import insert
-from typing import List, Optional
+from typing import List, Optional, Union
 from fastapi import HTTPException, status
 from app.models.menu import Category, Dish, VariantGroup, Variant, Addon, dish_addon_table, dish_variant_table
 from app.schemas.menu import DishCreateRequest, DishUpdateRequest, AddonCreateRequest, AddonUpdateRequest
+from app.services.menu_cache import menu_cache, DishSnapshot, AddonSnapshot
 
 class MenuService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    async def _commit(self):
+        """Коммит изменений меню с инвалидацией снимка меню."""
+        await self.db.commit()
+        menu_cache.invalidate()
+
     async def get_categories(self) -> List[Category]:
         """Получение всех активных категорий."""
+        if menu_cache.enabled:
+            snapshot = await menu_cache.get()
+            return list(snapshot.active_categories)
+
         result = await self.db.execute(
             select(Category)
             .where(Category.is_active == True)
@@ -30,6 +40,9 @@ class MenuService:
         show_all: bool = False
     ) -> List[Dish]:
         """Получение блюд с фильтрацией."""
+        if menu_cache.enabled:
+            return await self._get_dishes_from_snapshot(category_id, search, page, limit, show_all)
+
         query = select(Dish).options(selectinload(Dish.category))
         
         # Фильтр по категории
@@ -59,8 +72,38 @@ class MenuService:
         result = await self.db.execute(query)
         return result.scalars().all()
 
-    async def get_dish_by_id(self, dish_id: int) -> Optional[dict]:
+    async def _get_dishes_from_snapshot(
+        self,
+        category_id: Optional[int],
+        search: Optional[str],
+        page: int,
+        limit: int,
+        show_all: bool
+    ) -> List[DishSnapshot]:
+        """Фильтрация блюд по снимку меню без обращения к базе."""
+        snapshot = await menu_cache.get()
+        dishes = snapshot.dishes
+
+        if search:
+            # Поиск по индексу снимка: результаты уже отсортированы по релевантности
+            dishes_by_id = snapshot.dishes_by_id
+            dishes = [dishes_by_id[dish_id] for dish_id in snapshot.search_index.search(search)]
+
+        if category_id:
+            dishes = [dish for dish in dishes if dish.category_id == category_id]
+
+        if not show_all:
+            dishes = [dish for dish in dishes if dish.is_available]
+
+        offset = (page - 1) * limit
+        return list(dishes[offset:offset + limit])
+
+    async def get_dish_by_id(self, dish_id: int) -> Optional[Union[dict, DishSnapshot]]:
         """Получение блюда по ID с группами вариантов и добавками."""
+        if menu_cache.enabled:
+            snapshot = await menu_cache.get()
+            return snapshot.dishes_by_id.get(dish_id)
+
         result = await self.db.execute(
             select(Dish)
             .options(
@@ -150,7 +193,7 @@ class MenuService:
             await self.db.flush()  # Получаем ID блюда без коммита
             
             # Сохраняем блюдо сначала
-            await self.db.commit()
+            await self._commit()
             await self.db.refresh(new_dish)
             
             # Связываем с добавками если указаны
@@ -165,7 +208,7 @@ class MenuService:
                 if missing_addon_ids:
                     # Удаляем созданное блюдо если добавки не найдены
                     await self.db.delete(new_dish)
-                    await self.db.commit()
+                    await self._commit()
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
                         detail=f"Добавки с ID {list(missing_addon_ids)} не найдены"
@@ -191,7 +234,7 @@ class MenuService:
                 if missing_variant_ids:
                     # Удаляем созданное блюдо если варианты не найдены
                     await self.db.delete(new_dish)
-                    await self.db.commit()
+                    await self._commit()
                     raise HTTPException(
                         status_code=status.HTTP_404_NOT_FOUND,
                         detail=f"Варианты с ID {list(missing_variant_ids)} не найдены"
@@ -207,7 +250,7 @@ class MenuService:
             
             # Финальный коммит для связей
             if dish_data.addon_ids or dish_data.variant_ids:
-                await self.db.commit()
+                await self._commit()
             return new_dish
         except HTTPException:
             # Переподнимаем HTTPException без изменений
@@ -301,7 +344,7 @@ class MenuService:
                 dish.variants = []
 
         try:
-            await self.db.commit()
+            await self._commit()
             await self.db.refresh(dish)
             return dish
         except IntegrityError as e:
@@ -332,7 +375,7 @@ class MenuService:
             # Используем правильный метод для удаления в async SQLAlchemy
             from sqlalchemy import delete
             await self.db.execute(delete(Dish).where(Dish.id == dish_id))
-            await self.db.commit()
+            await self._commit()
             return True
         except IntegrityError:
             await self.db.rollback()
@@ -353,7 +396,7 @@ class MenuService:
         dish.is_available = not dish.is_available
         
         try:
-            await self.db.commit()
+            await self._commit()
             await self.db.refresh(dish)
             return dish
         except IntegrityError:
@@ -368,8 +411,16 @@ class MenuService:
         self, 
         category: Optional[str] = None,
         show_all: bool = False
-    ) -> List[Addon]:
+    ) -> List[Union[Addon, AddonSnapshot]]:
         """Получение добавок с фильтрацией."""
+        if menu_cache.enabled:
+            snapshot = await menu_cache.get()
+            return [
+                addon for addon in snapshot.addons
+                if (not category or addon.category == category)
+                and (show_all or addon.is_active)
+            ]
+
         query = select(Addon)
         
         # Фильтр по категории
@@ -386,8 +437,12 @@ class MenuService:
         result = await self.db.execute(query)
         return result.scalars().all()
 
-    async def get_addon_by_id(self, addon_id: int) -> Optional[Addon]:
+    async def get_addon_by_id(self, addon_id: int) -> Optional[Union[Addon, AddonSnapshot]]:
         """Получение добавки по ID."""
+        if menu_cache.enabled:
+            snapshot = await menu_cache.get()
+            return snapshot.addons_by_id.get(addon_id)
+
         result = await self.db.execute(
             select(Addon).where(Addon.id == addon_id)
         )
@@ -404,7 +459,7 @@ class MenuService:
 
         try:
             self.db.add(new_addon)
-            await self.db.commit()
+            await self._commit()
             await self.db.refresh(new_addon)
             return new_addon
         except IntegrityError:
@@ -429,7 +484,7 @@ class MenuService:
             setattr(addon, field, value)
 
         try:
-            await self.db.commit()
+            await self._commit()
             await self.db.refresh(addon)
             return addon
         except IntegrityError:
@@ -451,7 +506,7 @@ class MenuService:
         try:
             from sqlalchemy import delete
             await self.db.execute(delete(Addon).where(Addon.id == addon_id))
-            await self.db.commit()
+            await self._commit()
             return True
         except IntegrityError:
             await self.db.rollback()
@@ -472,7 +527,7 @@ class MenuService:
         addon.is_active = not addon.is_active
         
         try:
-            await self.db.commit()
+            await self._commit()
             await self.db.refresh(addon)
             return addon
         except IntegrityError:
@@ -0,0 +1,294 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+from dataclasses import dataclass
+from decimal import Decimal
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional, Tuple
+import asyncio
+import hashlib
+import time
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.menu import Category, Dish, Variant, Addon
+from app.services.dish_search import DishSearchIndex
+
+
+# Неизменяемые структуры снимка меню.
+# Поля совпадают с атрибутами моделей, поэтому схемы ответов (from_attributes) принимают их напрямую.
+
+@dataclass(frozen=True, slots=True)
+class CategorySnapshot:
+    id: int
+    name: str
+    description: Optional[str]
+    image: Optional[str]
+    sort_order: int
+    is_active: bool
+
+
+@dataclass(frozen=True, slots=True)
+class VariantSnapshot:
+    id: int
+    name: str
+    price: Decimal
+    group_id: int
+    is_default: bool
+    sort_order: int
+
+
+@dataclass(frozen=True, slots=True)
+class VariantGroupSnapshot:
+    id: int
+    name: str
+    is_required: bool
+    is_multiple: bool
+    sort_order: int
+    variants: Tuple[VariantSnapshot, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class AddonSnapshot:
+    id: int
+    name: str
+    price: Decimal
+    category: Optional[str]
+    is_active: bool
+
+
+@dataclass(frozen=True, slots=True)
+class DishSnapshot:
+    id: int
+    name: str
+    description: Optional[str]
+    price: Decimal
+    image: Optional[str]
+    weight: Optional[str]
+    category_id: int
+    category_name: str
+    is_available: bool
+    is_popular: bool
+    sort_order: int
+    variant_groups: Tuple[VariantGroupSnapshot, ...]
+    addons: Tuple[AddonSnapshot, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class MenuSnapshot:
+    """Полный граф меню: категория → блюдо → группа вариантов → вариант/добавка."""
+    version: int
+    built_at: float
+    digest: str  # Хеш содержимого: одинаковое меню дает одинаковый digest в любом процессе
+    categories: Tuple[CategorySnapshot, ...]
+    dishes: Tuple[DishSnapshot, ...]
+    dishes_by_id: Mapping[int, DishSnapshot]
+    addons: Tuple[AddonSnapshot, ...]
+    addons_by_id: Mapping[int, AddonSnapshot]
+    search_index: DishSearchIndex
+
+    @property
+    def active_categories(self) -> Tuple[CategorySnapshot, ...]:
+        return tuple(category for category in self.categories if category.is_active)
+
+
+def _sort_key(obj) -> tuple:
+    return (obj.sort_order or 0, obj.name)
+
+
+def _addon_sort_key(addon: AddonSnapshot) -> tuple:
+    # Как ORDER BY category, name в SQLite: добавки без категории идут первыми
+    return (addon.category is not None, addon.category or "", addon.name)
+
+
+def _build_addon(addon: Addon) -> AddonSnapshot:
+    return AddonSnapshot(
+        id=addon.id,
+        name=addon.name,
+        price=addon.price if addon.price is not None else Decimal("0"),
+        category=addon.category,
+        is_active=bool(addon.is_active)
+    )
+
+
+def _build_dish(dish: Dish) -> DishSnapshot:
+    """Материализация блюда с группировкой его вариантов по группам."""
+    groups = {}
+    for variant in dish.variants:
+        groups.setdefault(variant.group_id, (variant.group, []))[1].append(
+            VariantSnapshot(
+                id=variant.id,
+                name=variant.name,
+                price=variant.price if variant.price is not None else Decimal("0"),
+                group_id=variant.group_id,
+                is_default=bool(variant.is_default),
+                sort_order=variant.sort_order or 0
+            )
+        )
+
+    variant_groups = tuple(sorted(
+        (
+            VariantGroupSnapshot(
+                id=group.id,
+                name=group.name,
+                is_required=bool(group.is_required),
+                is_multiple=bool(group.is_multiple),
+                sort_order=group.sort_order or 0,
+                variants=tuple(sorted(variants, key=lambda v: v.sort_order))
+            )
+            for group, variants in groups.values()
+        ),
+        key=lambda g: g.sort_order
+    ))
+
+    addons = tuple(_build_addon(addon) for addon in dish.addons)
+
+    return DishSnapshot(
+        id=dish.id,
+        name=dish.name,
+        description=dish.description,
+        price=dish.price,
+        image=dish.image,
+        weight=dish.weight,
+        category_id=dish.category_id,
+        category_name=dish.category.name if dish.category else "",
+        is_available=bool(dish.is_available),
+        is_popular=bool(dish.is_popular),
+        sort_order=dish.sort_order or 0,
+        variant_groups=variant_groups,
+        addons=addons
+    )
+
+
+def _dish_graph_query():
+    return select(Dish).options(
+        selectinload(Dish.category),
+        selectinload(Dish.variants).selectinload(Variant.group),
+        selectinload(Dish.addons)
+    )
+
+
+async def load_dish_snapshots(db: AsyncSession, dish_ids: Iterable[int]) -> Mapping[int, DishSnapshot]:
+    """
+    Загрузка выбранных блюд в виде снимков без кеша: один запрос WHERE id IN (...)
+    и пакетная подгрузка связей, независимо от количества блюд.
+    """
+    dish_ids = set(dish_ids)
+    if not dish_ids:
+        return {}
+
+    result = await db.execute(_dish_graph_query().where(Dish.id.in_(dish_ids)))
+    return {dish.id: _build_dish(dish) for dish in result.scalars().all()}
+
+
+async def build_menu_snapshot(db: AsyncSession, version: int) -> MenuSnapshot:
+    """Загрузка всего меню несколькими запросами и сборка неизменяемого снимка."""
+    categories_result = await db.execute(select(Category))
+    categories = tuple(sorted(
+        (
+            CategorySnapshot(
+                id=category.id,
+                name=category.name,
+                description=category.description,
+                image=category.image,
+                sort_order=category.sort_order or 0,
+                is_active=bool(category.is_active)
+            )
+            for category in categories_result.scalars().all()
+        ),
+        key=_sort_key
+    ))
+
+    dishes_result = await db.execute(_dish_graph_query())
+    dishes = tuple(sorted(
+        (_build_dish(dish) for dish in dishes_result.scalars().all()),
+        key=_sort_key
+    ))
+
+    addons_result = await db.execute(select(Addon))
+    addons = tuple(sorted(
+        (_build_addon(addon) for addon in addons_result.scalars().all()),
+        key=_addon_sort_key
+    ))
+
+    # repr неизменяемых dataclass детерминирован, поэтому хеш зависит только от содержимого меню
+    digest = hashlib.sha256(repr((categories, dishes, addons)).encode()).hexdigest()[:32]
+
+    return MenuSnapshot(
+        version=version,
+        built_at=time.monotonic(),
+        digest=digest,
+        categories=categories,
+        dishes=dishes,
+        dishes_by_id=MappingProxyType({dish.id: dish for dish in dishes}),
+        addons=addons,
+        addons_by_id=MappingProxyType({addon.id: addon for addon in addons}),
+        search_index=DishSearchIndex(dishes)
+    )
+
+
+class MenuSnapshotCache:
+    """
+    Кеш снимка меню в памяти процесса.
+
+    Любое изменение меню вызывает invalidate(), который увеличивает счетчик версий.
+    Следующее чтение видит, что снимок устарел, и пересобирает его под блокировкой;
+    новый снимок подменяет старый одной операцией присваивания, поэтому читатели
+    всегда видят целостный граф. TTL ограничивает расхождение между процессами,
+    запущенными в нескольких воркерах.
+
+    Снимок всегда собирается через основную базу (session_maker), а не через сессию
+    запроса: реплика для чтения может отставать, и собранный из нее снимок получил бы
+    новую версию со старым меню и жил бы до следующего изменения или TTL.
+    """
+
+    def __init__(self, enabled: bool, ttl_seconds: float, session_maker=async_session_maker):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.session_maker = session_maker
+        self._version = 0
+        self._snapshot: Optional[MenuSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self):
+        """Отметить снимок устаревшим (вызывается после изменения меню)."""
+        self._version += 1
+
+    def reset(self):
+        """Сброс снимка и блокировки (для тестов и смены event loop)."""
+        self._snapshot = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self, snapshot: Optional[MenuSnapshot]) -> bool:
+        if snapshot is None or snapshot.version != self._version:
+            return False
+        return self.ttl_seconds <= 0 or time.monotonic() - snapshot.built_at < self.ttl_seconds
+
+    async def get(self) -> MenuSnapshot:
+        """Актуальный снимок меню; пересобирается только после изменений или по TTL."""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог пересобрать другой запрос
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+
+            # Если меню изменится во время сборки, версия снимка отстанет
+            # и следующее чтение пересоберет его еще раз
+            async with self.session_maker() as db:
+                snapshot = await build_menu_snapshot(db, self._version)
+            self._snapshot = snapshot
+            return snapshot
+
+
+menu_cache = MenuSnapshotCache(
+    enabled=settings.CACHE_ENABLED,
+    ttl_seconds=settings.MENU_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,201 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event, select, delete, insert, func, inspect
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Tuple
+
+from app.core.db_backend import upsert_statement
+from app.models.metrics import OrderRollup, MetricCounter
+from app.models.order import Order, OrderStatus
+from app.models.user import User, UserRole
+
+ALL_TIME = datetime(1970, 1, 1)  # Корзина периода all
+PERIODS = ("all", "day", "hour")
+DIMENSIONS = ("all", "status", "delivery_type", "payment_method", "utm_source", "utm_medium", "utm_campaign")
+MEASURES = ("orders_count", "total_amount", "delivered_count", "revenue", "cancelled_count")
+ACTIVE_CLIENTS = "active_clients"  # Активные пользователи с ролью клиента
+
+# (период, измерение, начало корзины, значение) -> приращения MEASURES
+RollupDeltas = Dict[Tuple[str, str, datetime, str], List[Any]]
+
+
+def _new_deltas() -> RollupDeltas:
+    return defaultdict(lambda: [0, Decimal("0"), 0, Decimal("0"), 0])
+
+
+def bucket_starts(created_at: datetime) -> Dict[str, datetime]:
+    """Корзины заказа, созданного в created_at, для каждого периода."""
+    return {
+        "all": ALL_TIME,
+        "day": created_at.replace(hour=0, minute=0, second=0, microsecond=0),
+        "hour": created_at.replace(minute=0, second=0, microsecond=0),
+    }
+
+
+def dimension_values(order) -> Dict[str, str]:
+    """Значения измерений заказа (Order или строка выборки с теми же полями); пустая строка — не задано."""
+    values = {"all": ""}
+    for dimension in DIMENSIONS[1:]:
+        value = getattr(order, dimension)
+        values[dimension] = (value.value if hasattr(value, "value") else value) or ""
+    return values
+
+
+def _add_order(deltas: RollupDeltas, order, status, sign: int):
+    """Вклад заказа в статусе status во все свертки (sign=-1 — снять вклад)."""
+    status = OrderStatus(status)
+    amount = sign * Decimal(str(order.total_amount or 0))
+    delivered = status == OrderStatus.DELIVERED
+    values = dimension_values(order)
+    values["status"] = status.value
+    for period, bucket_start in bucket_starts(order.created_at or datetime.now()).items():
+        for dimension, value in values.items():
+            delta = deltas[(period, dimension, bucket_start, value)]
+            delta[0] += sign
+            delta[1] += amount
+            if delivered:
+                delta[2] += sign
+                delta[3] += amount
+            if status == OrderStatus.CANCELLED:
+                delta[4] += sign
+
+
+def _rows(deltas: RollupDeltas) -> List[Dict[str, Any]]:
+    return [
+        {"period": period, "dimension": dimension, "bucket_start": bucket_start, "value": value, **dict(zip(MEASURES, measures))}
+        for (period, dimension, bucket_start, value), measures in deltas.items()
+        if any(measures)
+    ]
+
+
+async def _apply_deltas(db: AsyncSession, deltas: RollupDeltas):
+    """Все изменения сверток одним многострочным INSERT ... ON CONFLICT DO UPDATE."""
+    rows = _rows(deltas)
+    if not rows:
+        return
+    statement = upsert_statement(db.bind.dialect.name, OrderRollup).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[OrderRollup.period, OrderRollup.dimension, OrderRollup.bucket_start, OrderRollup.value],
+        set_={name: getattr(OrderRollup, name) + getattr(statement.excluded, name) for name in MEASURES}
+    )
+    await db.execute(statement)
+
+
+async def record_order_created(db: AsyncSession, order: Order):
+    """Учет нового заказа в свертках. Вызывается в транзакции, которая записывает заказ."""
+    deltas = _new_deltas()
+    _add_order(deltas, order, order.status or OrderStatus.PENDING, 1)
+    await _apply_deltas(db, deltas)
+
+
+async def record_status_changes(db: AsyncSession, changes: Iterable[Tuple[Order, Any]]):
+    """
+    Перенос заказов (заказ после перехода, предыдущий статус) между статусами в свертках.
+    Вызывается в транзакции перехода; для пакета переходов — один запрос.
+    Строки, где приращения взаимно гасятся (например, число заказов по типу доставки), не пишутся.
+    """
+    deltas = _new_deltas()
+    for order, previous_status in changes:
+        if previous_status is None or OrderStatus(previous_status) == OrderStatus(order.status):
+            continue
+        _add_order(deltas, order, previous_status, -1)
+        _add_order(deltas, order, order.status, 1)
+    await _apply_deltas(db, deltas)
+
+
+async def dashboard_statistics(db: AsyncSession) -> Dict[str, Any]:
+    """
+    Показатели панели администратора из сверток: два чтения по первичному ключу
+    (итоговая строка периода all и один счетчик) вместо агрегатов по всей истории.
+    """
+    totals = (await db.execute(
+        select(OrderRollup.orders_count, OrderRollup.delivered_count, OrderRollup.revenue)
+        .where(OrderRollup.period == "all", OrderRollup.dimension == "all")
+    )).first()
+    active_users = (await db.execute(
+        select(MetricCounter.value).where(MetricCounter.name == ACTIVE_CLIENTS)
+    )).scalar()
+
+    delivered_count = totals.delivered_count if totals else 0
+    revenue = float(totals.revenue or 0) if totals else 0.0
+
+    return {
+        "total_orders": totals.orders_count if totals else 0,
+        "total_revenue": revenue,
+        "active_users": active_users or 0,
+        "average_check": revenue / delivered_count if delivered_count else 0.0
+    }
+
+
+async def rebuild_metrics(db: AsyncSession, batch_size: int = 5000) -> Dict[str, int]:
+    """
+    Пересчет сверток и счетчиков с нуля по таблицам orders и users (после миграции,
+    ручных правок в базе или сбоя). Заказы читаются потоком, агрегируются в памяти
+    по корзинам и записываются заново. Commit выполняет вызывающий код.
+    """
+    deltas = _new_deltas()
+    orders = 0
+    result = await db.stream(
+        select(Order.created_at, Order.status, Order.total_amount, *(getattr(Order, name) for name in DIMENSIONS[2:]))
+        .execution_options(yield_per=batch_size)
+    )
+    async for row in result:
+        if row.created_at is None or row.status is None:
+            continue
+        _add_order(deltas, row, row.status, 1)
+        orders += 1
+
+    await db.execute(delete(OrderRollup))
+    rows = _rows(deltas)
+    for start in range(0, len(rows), batch_size):
+        await db.execute(insert(OrderRollup), rows[start:start + batch_size])
+
+    active_clients = (await db.execute(
+        select(func.count(User.id)).where(User.role == UserRole.CLIENT, User.is_active == True)
+    )).scalar() or 0
+    await db.execute(delete(MetricCounter).where(MetricCounter.name == ACTIVE_CLIENTS))
+    await db.execute(insert(MetricCounter).values(name=ACTIVE_CLIENTS, value=active_clients))
+
+    return {"orders": orders, "rollup_rows": len(rows), ACTIVE_CLIENTS: active_clients}
+
+
+# Счетчик активных клиентов меняется в той же транзакции, что и пользователь (ORM-события
+# срабатывают при flush для любых изменений User через сессию)
+
+def _is_active_client(role, is_active) -> bool:
+    return role == UserRole.CLIENT and is_active is not False
+
+
+def _previous_value(user: User, name: str):
+    history = inspect(user).attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(user, name)
+
+
+def _adjust_counter(connection, name: str, delta: int):
+    statement = upsert_statement(connection.dialect.name, MetricCounter).values(name=name, value=delta)
+    statement = statement.on_conflict_do_update(
+        index_elements=[MetricCounter.name],
+        set_={"value": MetricCounter.value + delta, "updated_at": func.now()}
+    )
+    connection.execute(statement)
+
+
+@event.listens_for(User, "after_insert")
+def _user_inserted(mapper, connection, user: User):
+    if _is_active_client(user.role, user.is_active):
+        _adjust_counter(connection, ACTIVE_CLIENTS, 1)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, user: User):
+    was_active_client = _is_active_client(_previous_value(user, "role"), _previous_value(user, "is_active"))
+    is_active_client = _is_active_client(user.role, user.is_active)
+    if was_active_client != is_active_client:
+        _adjust_counter(connection, ACTIVE_CLIENTS, 1 if is_active_client else -1)
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, user: User):
+    if _is_active_client(_previous_value(user, "role"), _previous_value(user, "is_active")):
+        _adjust_counter(connection, ACTIVE_CLIENTS, -1)
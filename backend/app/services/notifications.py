@@ -0,0 +1,509 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, case
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import random
+import secrets
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.notification import NotificationJob, NotificationChannel, NotificationJobStatus
+from app.models.user import User
+
+FCM_MULTICAST_LIMIT = 500  # Максимум токенов в одном send_each_for_multicast
+SMS_BODY_REMOVED = "[текст удален после неудачной отправки]"  # В SMS бывают коды подтверждения
+CLAIM_BATCHES_PER_WORKER = 2  # Пакетов отправки на воркера за одну выборку
+
+
+class DeliveryError(Exception):
+    """
+    Ошибка отправки одного сообщения. retryable=False — повтор не поможет (неверный номер,
+    сообщение отклонено); invalid_recipient — токен устройства больше не действует и его нужно забыть.
+    """
+
+    def __init__(self, message: str, retryable: bool = True, invalid_recipient: bool = False):
+        super().__init__(message)
+        self.retryable = retryable and not invalid_recipient
+        self.invalid_recipient = invalid_recipient
+
+
+class LocalTransport:
+    """
+    Транспорт без внешних провайдеров: сообщения остаются в памяти (и печатаются при log=True).
+    Используется в разработке, когда SMS_ENABLED и FCM_ENABLED выключены, и в тестах:
+    fail() задает ошибки следующих отправок, invalid_tokens — «удаленные» устройства,
+    latency — задержку провайдера.
+    """
+
+    def __init__(self, latency: float = 0.0, log: bool = False):
+        self.latency = latency
+        self.log = log
+        self.sms: List[Tuple[str, str]] = []
+        self.pushes: List[Tuple[List[str], Optional[str], str, Dict[str, str]]] = []
+        self.invalid_tokens: set = set()
+        self._failures: Deque[DeliveryError] = deque()
+
+    def fail(self, times: int = 1, retryable: bool = True, message: str = "Провайдер недоступен"):
+        """Следующие times отправок (SMS или пакет push) завершатся ошибкой."""
+        self._failures.extend(DeliveryError(message, retryable=retryable) for _ in range(times))
+
+    async def _call(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._failures:
+            raise self._failures.popleft()
+
+    async def send_sms(self, phone: str, text: str):
+        await self._call()
+        self.sms.append((phone, text))
+        if self.log:
+            print(f"📨 SMS для {phone}: {text}")
+
+    async def send_push(self, tokens: List[str], title: Optional[str], body: str,
+                        data: Dict[str, str]) -> List[Optional[DeliveryError]]:
+        await self._call()
+        self.pushes.append((list(tokens), title, body, data))
+        if self.log:
+            print(f"📨 Push на {len(tokens)} устройств: {title or ''} {body}")
+        return [
+            DeliveryError("Токен не зарегистрирован", invalid_recipient=True) if token in self.invalid_tokens else None
+            for token in tokens
+        ]
+
+
+class ProviderTransport:
+    """
+    SMS через Twilio и push через Firebase Cloud Messaging. SDK синхронные, поэтому вызовы
+    выполняются в потоках; клиенты создаются при первой отправке. Выключенный канал
+    (SMS_ENABLED / FCM_ENABLED) отправляется через fallback (по умолчанию LocalTransport с логом).
+    """
+
+    def __init__(self, sms_enabled: bool, push_enabled: bool, fallback=None):
+        self.sms_enabled = sms_enabled
+        self.push_enabled = push_enabled
+        self.fallback = fallback or LocalTransport(log=True)
+        self._twilio = None
+        self._firebase_app = None
+
+    def _get_twilio(self):
+        if self._twilio is None:
+            from twilio.rest import Client  # Зависимость нужна только при SMS_ENABLED
+            self._twilio = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        return self._twilio
+
+    def _get_firebase_app(self):
+        if self._firebase_app is None:
+            import firebase_admin
+            from firebase_admin import credentials
+            self._firebase_app = firebase_admin.initialize_app(
+                credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH), name="appetit-notifications"
+            )
+        return self._firebase_app
+
+    async def send_sms(self, phone: str, text: str):
+        if not self.sms_enabled:
+            return await self.fallback.send_sms(phone, text)
+
+        from twilio.base.exceptions import TwilioRestException
+
+        def send():
+            self._get_twilio().messages.create(to=phone, from_=settings.TWILIO_PHONE_NUMBER, body=text)
+
+        try:
+            await asyncio.to_thread(send)
+        except TwilioRestException as e:
+            # 4xx — ошибка в самом сообщении (номер, текст), повтор не поможет; кроме 429
+            raise DeliveryError(f"Twilio {e.status}: {e.msg}", retryable=e.status == 429 or e.status >= 500)
+        except Exception as e:
+            raise DeliveryError(f"Twilio: {e}")
+
+    async def send_push(self, tokens: List[str], title: Optional[str], body: str,
+                        data: Dict[str, str]) -> List[Optional[DeliveryError]]:
+        if not self.push_enabled:
+            return await self.fallback.send_push(tokens, title, body, data)
+
+        from firebase_admin import messaging
+
+        def send():
+            message = messaging.MulticastMessage(
+                tokens=tokens,
+                notification=messaging.Notification(title=title, body=body),
+                data=data or None
+            )
+            return messaging.send_each_for_multicast(message, app=self._get_firebase_app())
+
+        try:
+            batch = await asyncio.to_thread(send)
+        except Exception as e:
+            raise DeliveryError(f"FCM: {e}")
+
+        results: List[Optional[DeliveryError]] = []
+        for response in batch.responses:
+            if response.success:
+                results.append(None)
+            elif isinstance(response.exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+                results.append(DeliveryError(f"FCM: {response.exception}", invalid_recipient=True))
+            else:
+                results.append(DeliveryError(f"FCM: {response.exception}"))
+        return results
+
+
+class NotificationDispatcher:
+    """
+    Отправка заданий из notification_jobs пулом asyncio-воркеров.
+
+    Выборщик читает id готовых заданий и, если они есть, одним UPDATE ставит им свою метку и аренду
+    (next_attempt_at = сейчас + lease), поэтому несколько процессов не заберут одно задание,
+    а задания упавшего процесса после аренды вернутся в очередь. Push с одинаковым содержимым
+    объединяются в multicast до batch_size токенов, SMS отправляются по одному. За одну выборку
+    забирается не больше workers * CLAIM_BATCHES_PER_WORKER пакетов — столько, сколько воркеры
+    отправят задолго до конца аренды; пакет, аренда которого истекла в очереди, не отправляется,
+    а результат записывается только для заданий, которые все еще помечены меткой этой выборки.
+    Неудача — повтор с экспоненциальной паузой (со случайным разбросом ±20%), после max_attempts — failed.
+    Доставка — «хотя бы один раз»: если процесс упадет между отправкой и записью результата,
+    сообщение уйдет повторно.
+    """
+
+    def __init__(
+        self,
+        transport,
+        session_maker=async_session_maker,
+        workers: int = 4,
+        batch_size: int = FCM_MULTICAST_LIMIT,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 5.0,
+        retry_max_seconds: float = 900.0,
+        lease_seconds: float = 120.0,
+        poll_seconds: float = 2.0
+    ):
+        self.transport = transport
+        self.session_maker = session_maker
+        self.workers = max(1, workers)
+        self.batch_size = max(1, min(batch_size, FCM_MULTICAST_LIMIT))
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._in_progress = 0
+        self._counters = {
+            "claimed": 0, "sent": 0, "retried": 0, "failed": 0, "batches": 0, "invalid_tokens": 0, "expired": 0
+        }
+
+    # --- Жизненный цикл ---
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.workers)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._claim_loop())]
+        self._tasks += [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Остановка воркеров. Забранные, но не отправленные задания вернутся в очередь после аренды."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._wakeup = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def wake(self):
+        """Проверить очередь сейчас, не дожидаясь poll_seconds (вызывается после commit новых заданий)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _claim_loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                batches = await self.claim()
+            except Exception as e:
+                print(f"⚠️ Не удалось выбрать уведомления из очереди: {e}")
+                batches = []
+            for batch in batches:
+                # Очередь ограничена числом воркеров: новые задания не забираются, пока старые ждут
+                await self._queue.put(batch)
+            if not batches:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _worker(self):
+        while True:
+            batch = await self._queue.get()
+            try:
+                await self.deliver(batch)
+            except Exception as e:
+                print(f"⚠️ Ошибка отправки уведомлений: {e}")
+            finally:
+                self._queue.task_done()
+
+    # --- Выборка и отправка ---
+
+    async def claim(self) -> List[List[Any]]:
+        """
+        Забрать готовые задания (не больше batch_size и workers * CLAIM_BATCHES_PER_WORKER пакетов)
+        и разбить их на пакеты отправки.
+        """
+        token = secrets.token_hex(8)
+        now = datetime.utcnow()
+        claimable = (
+            NotificationJob.status.in_([NotificationJobStatus.PENDING.value, NotificationJobStatus.SENDING.value]),
+            NotificationJob.next_attempt_at <= now
+        )
+        async with self.session_maker() as db:
+            # Сначала только чтение: пустая очередь не берет блокировку записи при каждом опросе
+            due = (await db.execute(
+                select(
+                    NotificationJob.id, NotificationJob.channel,
+                    NotificationJob.title, NotificationJob.body, NotificationJob.data
+                )
+                .where(*claimable)
+                .order_by(NotificationJob.next_attempt_at, NotificationJob.id)
+                .limit(self.batch_size)
+            )).all()
+            if not due:
+                return []
+            # 500 SMS — 500 пакетов: забранные сверх того, что воркеры успеют отправить, ждали бы
+            # в очереди до конца аренды и уходили бы повторно через другую выборку
+            batches = self._split(due)[:self.workers * CLAIM_BATCHES_PER_WORKER]
+            ids = [job.id for batch in batches for job in batch]
+
+            # Условие повторяется в UPDATE: задание, которое успел забрать другой процесс, не перехватывается
+            await db.execute(
+                update(NotificationJob)
+                .where(NotificationJob.id.in_(ids), *claimable)
+                .values(
+                    status=NotificationJobStatus.SENDING.value,
+                    claimed_by=token,
+                    attempts=NotificationJob.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            jobs = (await db.execute(
+                select(
+                    NotificationJob.id, NotificationJob.channel, NotificationJob.recipient,
+                    NotificationJob.title, NotificationJob.body, NotificationJob.data, NotificationJob.attempts,
+                    NotificationJob.claimed_by, NotificationJob.next_attempt_at
+                )
+                .where(NotificationJob.claimed_by == token)
+                .order_by(NotificationJob.id)
+            )).all()
+            await db.commit()
+
+        self._counters["claimed"] += len(jobs)
+        return self._split(jobs)
+
+    def _split(self, jobs: Sequence[Any]) -> List[List[Any]]:
+        """Пакеты отправки в порядке заданий: SMS по одному, push с одинаковым содержимым — до batch_size."""
+        batches: List[List[Any]] = []
+        pushes: Dict[Tuple, List[Any]] = {}
+        for job in jobs:
+            if job.channel != NotificationChannel.PUSH.value:
+                batches.append([job])
+                continue
+            key = (job.title, job.body, job.data)
+            group = pushes.get(key)
+            if group is None or len(group) >= self.batch_size:
+                group = pushes[key] = []
+                batches.append(group)
+            group.append(job)
+        return batches
+
+    async def deliver(self, jobs: Sequence[Any]):
+        """Отправка одного пакета (одно SMS или один multicast) и запись результата."""
+        self._in_progress += 1
+        try:
+            first = jobs[0]
+            if first.next_attempt_at <= datetime.utcnow():
+                # Аренда истекла, пока пакет ждал воркера: задания могла забрать другая выборка
+                self._counters["expired"] += len(jobs)
+                return
+            try:
+                if first.channel == NotificationChannel.PUSH.value:
+                    errors = await self.transport.send_push(
+                        [job.recipient for job in jobs], first.title, first.body, json.loads(first.data or "{}")
+                    )
+                else:
+                    await self.transport.send_sms(first.recipient, first.body)
+                    errors = [None]
+            except DeliveryError as e:
+                errors = [e] * len(jobs)
+            except Exception as e:
+                errors = [DeliveryError(str(e))] * len(jobs)
+            self._counters["batches"] += 1
+            await self._record(jobs, errors)
+        finally:
+            self._in_progress -= 1
+
+    def retry_delay(self, attempts: int) -> float:
+        """Пауза перед следующей попыткой после attempts неудачных."""
+        delay = self.retry_base_seconds * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+        return min(self.retry_max_seconds, delay)
+
+    async def _record(self, jobs: Sequence[Any], errors: Sequence[Optional[DeliveryError]]):
+        sent: List[int] = []
+        retries: Dict[Tuple[int, str], List[int]] = defaultdict(list)
+        failed: Dict[str, List[int]] = defaultdict(list)
+        invalid_tokens: List[str] = []
+        for job, error in zip(jobs, errors):
+            if error is None:
+                sent.append(job.id)
+                continue
+            message = str(error)[:500]
+            if error.invalid_recipient and job.channel == NotificationChannel.PUSH.value:
+                invalid_tokens.append(job.recipient)
+            if error.retryable and job.attempts < self.max_attempts:
+                retries[(job.attempts, message)].append(job.id)
+            else:
+                failed[message].append(job.id)
+
+        # Задание, аренда которого истекла и которое забрала другая выборка, записывает она
+        claimed = NotificationJob.claimed_by == jobs[0].claimed_by
+        now = datetime.utcnow()
+        async with self.session_maker() as db:
+            if sent:
+                await db.execute(delete(NotificationJob).where(NotificationJob.id.in_(sent), claimed))
+            for (attempts, message), ids in retries.items():
+                await db.execute(
+                    update(NotificationJob)
+                    .where(NotificationJob.id.in_(ids), claimed)
+                    .values(
+                        status=NotificationJobStatus.PENDING.value,
+                        claimed_by=None,
+                        next_attempt_at=now + timedelta(seconds=self.retry_delay(attempts)),
+                        last_error=message
+                    )
+                )
+            for message, ids in failed.items():
+                await db.execute(
+                    update(NotificationJob)
+                    .where(NotificationJob.id.in_(ids), claimed)
+                    .values(
+                        status=NotificationJobStatus.FAILED.value,
+                        claimed_by=None,
+                        last_error=message,
+                        # Неотправленное SMS остается в таблице для разбора — без кода подтверждения
+                        body=case(
+                            (NotificationJob.channel == NotificationChannel.SMS.value, SMS_BODY_REMOVED),
+                            else_=NotificationJob.body
+                        )
+                    )
+                )
+            if invalid_tokens:
+                # Устройство удалило приложение или токен обновился: больше не отправляем на него
+                await db.execute(
+                    update(User).where(User.fcm_token.in_(invalid_tokens)).values(fcm_token=None)
+                )
+            await db.commit()
+
+        self._counters["sent"] += len(sent)
+        self._counters["retried"] += sum(len(ids) for ids in retries.values())
+        self._counters["failed"] += sum(len(ids) for ids in failed.values())
+        self._counters["invalid_tokens"] += len(invalid_tokens)
+
+    async def run_once(self) -> int:
+        """
+        Одна выборка и отправка всех ее пакетов (не больше workers одновременно), без фоновых задач —
+        для скриптов и тестов. Возвращает число забранных заданий.
+        """
+        batches = await self.claim()
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def send(batch):
+            async with semaphore:
+                await self.deliver(batch)
+
+        await asyncio.gather(*(send(batch) for batch in batches))
+        return sum(len(batch) for batch in batches)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики процесса для /health и мониторинга."""
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "in_progress": self._in_progress,
+            "waiting_batches": self._queue.qsize() if self._queue else 0,
+            **self._counters,
+        }
+
+
+async def enqueue_sms(db: AsyncSession, phone: str, text: str, user_id: Optional[int] = None):
+    """
+    Добавить SMS в очередь в транзакции вызывающего; отправится после его commit
+    (notification_dispatcher.wake() после commit — без ожидания следующего опроса).
+    """
+    await enqueue(db, [{
+        "channel": NotificationChannel.SMS.value,
+        "recipient": phone,
+        "user_id": user_id,
+        "body": text,
+    }])
+
+
+async def enqueue_push(
+    db: AsyncSession,
+    recipients: Sequence[Tuple[Optional[int], str]],
+    title: Optional[str],
+    body: str,
+    data: Optional[Dict[str, str]] = None
+):
+    """Добавить push на устройства recipients — пары (id пользователя, FCM-токен) — одним INSERT."""
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True) if data else None
+    await enqueue(db, [
+        {
+            "channel": NotificationChannel.PUSH.value,
+            "recipient": token,
+            "user_id": user_id,
+            "title": title,
+            "body": body,
+            "data": payload,
+        }
+        for user_id, token in recipients
+    ])
+
+
+async def enqueue(db: AsyncSession, jobs: List[Dict[str, Any]]):
+    if not jobs:
+        return
+    now = datetime.utcnow()
+    # У всех строк одинаковый набор ключей — иначе executemany отбросит лишние
+    rows = [
+        {"title": None, "data": None, "user_id": None, **job,
+         "status": NotificationJobStatus.PENDING.value, "attempts": 0, "next_attempt_at": now}
+        for job in jobs
+    ]
+    await db.execute(insert(NotificationJob), rows)
+
+
+def create_notification_transport():
+    """Транспорт по настройкам: провайдеры для включенных каналов, иначе LocalTransport."""
+    if settings.SMS_ENABLED or settings.FCM_ENABLED:
+        return ProviderTransport(sms_enabled=settings.SMS_ENABLED, push_enabled=settings.FCM_ENABLED)
+    return LocalTransport(log=True)
+
+
+notification_dispatcher = NotificationDispatcher(
+    transport=create_notification_transport(),
+    workers=settings.NOTIFICATION_WORKERS,
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    max_attempts=settings.NOTIFICATION_MAX_ATTEMPTS,
+    retry_base_seconds=settings.NOTIFICATION_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.NOTIFICATION_RETRY_MAX_SECONDS,
+    lease_seconds=settings.NOTIFICATION_LEASE_SECONDS,
+    poll_seconds=settings.NOTIFICATION_POLL_SECONDS
+)
@@ -0,0 +1,405 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Optional, Sequence, Set, Tuple
+import asyncio
+import json
+import secrets
+import time
+
+from app.core.config import settings
+from app.models.order import Order, OrderStatus, DeliveryType
+from app.models.user import UserRole
+from app.schemas.order import OrderResponse
+from app.services.order_projection import build_order_responses, fetch_order_response
+from app.services.principal_cache import Principal
+
+RESYNC = "resync"  # Служебное событие: подписчик пропустил события и должен перечитать список целиком
+
+
+@dataclass(frozen=True)
+class OrderEvent:
+    """Изменение заказа. order — полное представление заказа после изменения (OrderResponse в JSON)."""
+    type: str  # created, status_changed, courier_assigned, cancelled
+    order_id: int
+    order_number: str
+    status: str
+    previous_status: Optional[str]
+    delivery_type: str
+    assigned_courier_id: Optional[int]
+    user_id: Optional[int]
+    order: Optional[Dict[str, Any]]
+    occurred_at: str
+    id: str = ""
+
+
+def _value(enum_or_str) -> Optional[str]:
+    return getattr(enum_or_str, "value", enum_or_str)
+
+
+def in_kitchen_view(status: Optional[str], delivery_type: str) -> bool:
+    """Заказ на экране кухни: подтвержденные, готовящиеся и готовые на самовывоз (как в get_kitchen_orders)."""
+    return status in (OrderStatus.CONFIRMED.value, OrderStatus.PREPARING.value) or (
+        status == OrderStatus.READY.value and delivery_type == DeliveryType.PICKUP.value
+    )
+
+
+def is_available_for_couriers(status: Optional[str], delivery_type: str, courier_id: Optional[int]) -> bool:
+    """Заказ в списке свободных заказов курьеров (как в get_available_orders)."""
+    return status == OrderStatus.READY.value and delivery_type == DeliveryType.DELIVERY.value and courier_id is None
+
+
+def subscription_filter(user: Principal) -> Callable[[OrderEvent], bool]:
+    """
+    Какие события получает пользователь: только заказы, которые появились на его экране,
+    изменились на нем или с него ушли. Администратор получает все события.
+    """
+    role = user.role
+
+    if role == UserRole.ADMIN:
+        return lambda event: True
+
+    if role == UserRole.KITCHEN:
+        return lambda event: (
+            in_kitchen_view(event.status, event.delivery_type)
+            or in_kitchen_view(event.previous_status, event.delivery_type)
+        )
+
+    if role == UserRole.COURIER:
+        return lambda event: (
+            event.assigned_courier_id == user.id
+            or is_available_for_couriers(event.status, event.delivery_type, event.assigned_courier_id)
+            # Заказ забрал другой курьер — он должен исчезнуть из списка свободных
+            or is_available_for_couriers(event.previous_status, event.delivery_type, None)
+        )
+
+    return lambda event: event.user_id is not None and event.user_id == user.id
+
+
+class InMemoryEventBackend:
+    """Доставка событий внутри одного процесса."""
+
+    def __init__(self):
+        self._deliver: Optional[Callable[[str], None]] = None
+
+    async def start(self, deliver: Callable[[str], None], resync: Optional[Callable[[], None]] = None):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, message: str):
+        if self._deliver:
+            self._deliver(message)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory", "listening": self._deliver is not None,
+            "delivery_errors": 0, "reconnects": 0, "last_error": None,
+        }
+
+
+class RedisEventBackend:
+    """
+    Доставка событий между воркерами через Redis Pub/Sub: каждый воркер публикует в общий канал
+    и получает из него все события, включая свои. Клиент Redis можно передать готовым
+    (например, локальную замену Redis в тестах), иначе он создается по REDIS_URL.
+
+    Ошибка обработки одного сообщения логируется и не останавливает слушателя. При потере
+    соединения с Redis слушатель переподписывается с паузой от reconnect_min_seconds, удваивая ее
+    до reconnect_max_seconds; события, опубликованные за это время, до воркера не дошли, поэтому
+    после переподписки вызывается resync — подписчики получают RESYNC. Пока соединения нет,
+    stats() и /health показывают, что слушатель не работает.
+    """
+
+    def __init__(
+        self,
+        url: str = "",
+        channel: str = "",
+        client=None,
+        reconnect_min_seconds: float = 0.5,
+        reconnect_max_seconds: float = 30.0
+    ):
+        self.url = url or settings.REDIS_URL
+        self.channel = channel or settings.ORDER_EVENTS_CHANNEL
+        self.reconnect_min_seconds = reconnect_min_seconds
+        self.reconnect_max_seconds = reconnect_max_seconds
+        self._client = client
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._delivery_errors = 0
+        self._reconnects = 0
+        self._last_error: Optional[str] = None
+
+    def _get_client(self):
+        if self._client is None:
+            import redis.asyncio as redis  # Зависимость нужна только для этого бэкенда
+            self._client = redis.from_url(self.url)
+        return self._client
+
+    async def start(self, deliver: Callable[[str], None], resync: Optional[Callable[[], None]] = None):
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen(deliver, resync))
+
+    async def _subscribe(self):
+        self._pubsub = self._get_client().pubsub()
+        await self._pubsub.subscribe(self.channel)
+
+    async def _close_pubsub(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass  # Соединение уже разорвано
+
+    @property
+    def listening(self) -> bool:
+        return self._listener is not None and not self._listener.done() and self._pubsub is not None
+
+    async def _listen(self, deliver: Callable[[str], None], resync: Optional[Callable[[], None]]):
+        delay = self.reconnect_min_seconds
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    self._reconnects += 1
+                    delay = self.reconnect_min_seconds
+                    print("🔄 Слушатель событий заказов снова подписан на Redis")
+                    if resync:
+                        resync()
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = message["data"]
+                    try:
+                        deliver(data.decode() if isinstance(data, bytes) else data)
+                    except Exception as e:
+                        # Битое сообщение пропускаем, остальные события доставляются дальше
+                        self._delivery_errors += 1
+                        self._last_error = f"{type(e).__name__}: {e}"
+                        print(f"⚠️ Не удалось доставить событие заказа: {self._last_error}")
+                raise ConnectionError("Подписка на канал закрыта")
+            except Exception as e:
+                self._last_error = f"{type(e).__name__}: {e}"
+                print(f"❌ Слушатель событий заказов потерял Redis: {self._last_error}, повтор через {delay:g} с")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_seconds)
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub:
+            try:
+                await self._pubsub.unsubscribe(self.channel)
+            except Exception as e:
+                print(f"⚠️ Не удалось отписаться от событий заказов: {e}")
+            await self._close_pubsub()
+
+    async def publish(self, message: str):
+        await self._get_client().publish(self.channel, message)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "listening": self.listening,
+            "delivery_errors": self._delivery_errors,
+            "reconnects": self._reconnects,
+            "last_error": self._last_error,
+        }
+
+
+class OrderEventSubscription:
+    """
+    Очередь событий одного подключения. Если клиент не успевает забирать события,
+    очередь очищается и клиент получает RESYNC вместо того, чтобы тормозить остальных.
+    """
+
+    def __init__(self, bus: "OrderEventBus", accepts: Callable[[OrderEvent], bool], queue_size: int):
+        self._bus = bus
+        self.accepts = accepts
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def push(self, item: Tuple[Optional[OrderEvent], str]):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, RESYNC))
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Optional[OrderEvent], str]]:
+        """Следующее событие и его JSON; (None, RESYNC) — нужна полная перезагрузка; None — истек timeout."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self._bus._subscribers.discard(self)
+
+
+class OrderEventBus:
+    """
+    Шина событий заказов: роутеры публикуют изменения после commit, экраны кухни,
+    курьеров и администратора получают их через WebSocket/SSE вместо опроса полных списков.
+
+    Событие сериализуется один раз при публикации, дальше подписчикам рассылается готовая
+    строка JSON. Последние события хранятся в памяти, чтобы переподключившийся клиент
+    (Last-Event-ID) получил пропущенное без полной перезагрузки.
+    """
+
+    def __init__(self, backend=None, history_size: int = 1000, queue_size: int = 256):
+        self.backend = backend or InMemoryEventBackend()
+        self.queue_size = queue_size
+        self._history: Deque[Tuple[OrderEvent, str]] = deque(maxlen=history_size)
+        self._subscribers: Set[OrderEventSubscription] = set()
+        self._started = False
+
+    async def start(self):
+        if not self._started:
+            await self.backend.start(self._deliver, self._resync)
+            self._started = True
+
+    async def stop(self):
+        if self._started:
+            await self.backend.stop()
+            self._started = False
+
+    async def use_backend(self, backend):
+        """Замена бэкенда (выбор по настройкам при старте приложения, тесты)."""
+        await self.stop()
+        self.backend = backend
+        self._history.clear()
+        await self.start()
+
+    def _deliver(self, message: str):
+        data = json.loads(message)
+        event = OrderEvent(**data)
+        self._history.append((event, message))
+        for subscription in list(self._subscribers):
+            if subscription.accepts(event):
+                subscription.push((event, message))
+
+    def _resync(self):
+        """
+        Бэкенд пропускал события (переподключение к Redis): история неполная, и каждый
+        подписчик должен перечитать список целиком.
+        """
+        self._history.clear()
+        for subscription in list(self._subscribers):
+            subscription.push((None, RESYNC))
+
+    async def publish(self, event: OrderEvent) -> OrderEvent:
+        if not self._started:
+            await self.start()
+        event = OrderEvent(**{**asdict(event), "id": f"{time.time_ns()}-{secrets.token_hex(3)}"})
+        await self.backend.publish(json.dumps(asdict(event), ensure_ascii=False, default=str))
+        return event
+
+    def subscribe(self, accepts: Callable[[OrderEvent], bool], last_event_id: Optional[str] = None) -> OrderEventSubscription:
+        """
+        Подписка с фильтром. При last_event_id сначала выдаются пропущенные события из истории;
+        если такого события в истории уже нет — RESYNC.
+        """
+        subscription = OrderEventSubscription(self, accepts, self.queue_size)
+        if last_event_id:
+            ids = [event.id for event, _ in self._history]
+            if last_event_id in ids:
+                for event, message in list(self._history)[ids.index(last_event_id) + 1:]:
+                    if accepts(event):
+                        subscription.push((event, message))
+            else:
+                subscription.push((None, RESYNC))
+        self._subscribers.add(subscription)
+        return subscription
+
+    @property
+    def subscribers_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def healthy(self) -> bool:
+        """False — шина запущена, но бэкенд больше не получает события."""
+        return not self._started or self.backend.stats()["listening"]
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние шины для /health."""
+        return {"running": self._started, "subscribers": self.subscribers_count, **self.backend.stats()}
+
+
+def make_order_event(
+    event_type: str,
+    order: Order,
+    previous_status=None,
+    response: Optional[OrderResponse] = None
+) -> OrderEvent:
+    return OrderEvent(
+        type=event_type,
+        order_id=order.id,
+        order_number=order.order_number,
+        status=_value(order.status),
+        previous_status=_value(previous_status),
+        delivery_type=_value(order.delivery_type),
+        assigned_courier_id=order.assigned_courier_id,
+        user_id=order.user_id,
+        order=response.model_dump(mode="json") if response else None,
+        occurred_at=datetime.now().isoformat()
+    )
+
+
+async def publish_order_event(
+    db: AsyncSession,
+    event_type: str,
+    order: Order,
+    previous_status=None,
+    response: Optional[OrderResponse] = None
+):
+    """
+    Публикация изменения заказа после commit. Представление заказа собирается один раз
+    (один запрос позиций, если response не передан) и рассылается всем подписчикам.
+    Ошибка доставки не должна отменять уже выполненное изменение, поэтому она только логируется.
+    """
+    try:
+        if response is None:
+            response = await fetch_order_response(db, order)
+        await order_events.publish(make_order_event(event_type, order, previous_status, response))
+    except Exception as e:
+        print(f"⚠️ Не удалось опубликовать событие заказа {order.id}: {e}")
+
+
+async def publish_order_events(db: AsyncSession, event_type: str, changes: Sequence[Tuple[Order, Any]]):
+    """
+    Публикация пакета изменений (заказ, предыдущий статус) после commit: представления
+    всех заказов собираются одним запросом позиций.
+    """
+    if not changes:
+        return
+    try:
+        responses = await build_order_responses(db, [order for order, _ in changes])
+    except Exception as e:
+        print(f"⚠️ Не удалось собрать события заказов: {e}")
+        return
+    for (order, previous_status), response in zip(changes, responses):
+        await publish_order_event(db, event_type, order, previous_status, response)
+
+
+def create_event_backend():
+    """Бэкенд по настройкам: memory — один процесс, redis — несколько воркеров."""
+    if settings.ORDER_EVENTS_BACKEND == "redis":
+        return RedisEventBackend()
+    return InMemoryEventBackend()
+
+
+order_events = OrderEventBus(
+    backend=create_event_backend(),
+    history_size=settings.ORDER_EVENTS_HISTORY_SIZE,
+    queue_size=settings.ORDER_EVENTS_QUEUE_SIZE
+)
@@ -0,0 +1,90 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import func
+from datetime import date
+from typing import Dict, Optional, Tuple
+import asyncio
+
+from app.core.config import settings
+from app.core.db_backend import upsert_statement
+from app.models.order import OrderNumberSequence, ORDER_NUMBER_LENGTH
+
+ORDER_NUMBER_PREFIX_MAX_LENGTH = 12
+
+
+class OrderNumberAllocator:
+    """
+    Выдача номеров заказов вида ORD-20240115-00042.
+
+    Номера идут по порядку в пределах области: префикс (филиал) и день. Воркер
+    резервирует в таблице order_number_sequences сразу блок номеров одним атомарным
+    UPSERT ... RETURNING и дальше выдает их из памяти, поэтому обычно номер не стоит
+    ни одного запроса, а уникальность гарантирована без повторных попыток.
+    Неиспользованный остаток блока при перезапуске процесса пропадает (пропуски в нумерации допустимы).
+    """
+
+    def __init__(self, prefix: str, block_size: int):
+        # Проверка при запуске: длинный префикс иначе обнаружился бы ошибкой INSERT каждого заказа
+        if not prefix or len(prefix) > ORDER_NUMBER_PREFIX_MAX_LENGTH:
+            raise ValueError(
+                f"ORDER_NUMBER_PREFIX должен содержать от 1 до {ORDER_NUMBER_PREFIX_MAX_LENGTH} символов: {prefix!r}"
+            )
+        self.prefix = prefix
+        self.block_size = max(1, block_size)
+        self._blocks: Dict[str, Tuple[int, int]] = {}  # Область -> (следующий номер, последний номер блока)
+        self._lock = asyncio.Lock()
+
+    def reset(self):
+        """Сброс зарезервированных блоков (для тестов и смены event loop)."""
+        self._blocks = {}
+        self._lock = asyncio.Lock()
+
+    def scope_for(self, day: date) -> str:
+        return f"{self.prefix}-{day:%Y%m%d}"
+
+    async def _reserve_block(self, db: AsyncSession, scope: str) -> int:
+        """
+        Резервирование следующего блока в отдельной короткой транзакции, независимой
+        от транзакции заказа. Возвращает последний номер зарезервированного блока.
+        """
+        statement = upsert_statement(db.bind.dialect.name, OrderNumberSequence).values(scope=scope, last_value=self.block_size)
+        statement = statement.on_conflict_do_update(
+            index_elements=[OrderNumberSequence.scope],
+            set_={
+                "last_value": OrderNumberSequence.last_value + self.block_size,
+                "updated_at": func.now()
+            }
+        ).returning(OrderNumberSequence.last_value)
+
+        async with AsyncSession(db.bind) as session:
+            last_value = (await session.execute(statement)).scalar_one()
+            await session.commit()
+        return last_value
+
+    async def next_number(self, db: AsyncSession, day: Optional[date] = None) -> str:
+        """
+        Следующий номер заказа. Вызывается до начала записи заказа: в SQLite резервирование
+        блока ждало бы блокировку записи, которую держит собственная транзакция вызывающего.
+        """
+        scope = self.scope_for(day or date.today())
+
+        async with self._lock:
+            next_value, last_value = self._blocks.get(scope, (1, 0))
+            if next_value > last_value:
+                last_value = await self._reserve_block(db, scope)
+                next_value = last_value - self.block_size + 1
+                # Блоки прошлых дней больше не понадобятся
+                self._blocks = {}
+            self._blocks[scope] = (next_value + 1, last_value)
+
+        number = f"{scope}-{next_value:05d}"
+        if len(number) > ORDER_NUMBER_LENGTH:
+            # Больше 10 млн заказов за день в одном филиале: номер не поместится в колонку
+            raise HTTPException(status_code=503, detail="Номера заказов на сегодня исчерпаны")
+        return number
+
+
+order_number_allocator = OrderNumberAllocator(
+    prefix=settings.ORDER_NUMBER_PREFIX,
+    block_size=settings.ORDER_NUMBER_BLOCK_SIZE
+)
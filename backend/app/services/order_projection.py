@@ -0,0 +1,109 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+import json
+
+from app.models.order import Order, OrderItem
+from app.schemas.order import OrderResponse, OrderItemResponse
+
+
+def parse_delivery_address(delivery_address_str):
+    """Парсит адрес доставки из строки или JSON."""
+    if not delivery_address_str:
+        return None, None, None, None, None
+
+    try:
+        address_data = json.loads(delivery_address_str)
+        return (
+            address_data.get('address'),
+            address_data.get('entrance'),
+            address_data.get('floor'),
+            address_data.get('apartment'),
+            address_data.get('comment')
+        )
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        # Если не JSON, то это старый формат - просто строка
+        return delivery_address_str, None, None, None, None
+
+
+def build_order_item_response(item: OrderItem) -> OrderItemResponse:
+    """Преобразование позиции заказа в схему ответа."""
+    return OrderItemResponse(
+        id=item.id,
+        dish_name=item.dish_name,
+        quantity=item.quantity,
+        price=item.price,
+        total_price=item.total_price,
+        modifiers=[mod['name'] for mod in (item.modifiers or [])]
+    )
+
+
+def build_order_response(order: Order, items: Sequence[OrderItem]) -> OrderResponse:
+    """Сборка OrderResponse из заказа и уже загруженных позиций."""
+    delivery_address, delivery_entrance, delivery_floor, delivery_apartment, delivery_comment = parse_delivery_address(order.delivery_address)
+
+    return OrderResponse(
+        id=order.id,
+        order_number=order.order_number,
+        status=order.status,
+        delivery_type=order.delivery_type,
+        payment_method=order.payment_method,
+        total_amount=order.total_amount,
+        delivery_address=delivery_address,
+        delivery_entrance=delivery_entrance,
+        delivery_floor=delivery_floor,
+        delivery_apartment=delivery_apartment,
+        delivery_comment=delivery_comment,
+        pickup_address=order.pickup_address,
+        customer_name=order.customer_name,
+        customer_phone=order.customer_phone,
+        items=[build_order_item_response(item) for item in items],
+        created_at=order.created_at.isoformat()
+    )
+
+
+async def load_order_items(db: AsyncSession, order_ids: Sequence[int]) -> Dict[int, List[OrderItem]]:
+    """
+    Загрузка позиций для набора заказов одним запросом (WHERE order_id IN (...)).
+    Возвращает словарь order_id -> список позиций в порядке их создания.
+    """
+    items_by_order: Dict[int, List[OrderItem]] = defaultdict(list)
+    if not order_ids:
+        return items_by_order
+
+    items_query = (
+        select(OrderItem)
+        .where(OrderItem.order_id.in_(set(order_ids)))
+        .order_by(OrderItem.order_id, OrderItem.id)
+    )
+    items_result = await db.execute(items_query)
+    for item in items_result.scalars().all():
+        items_by_order[item.order_id].append(item)
+
+    return items_by_order
+
+
+async def build_order_responses(db: AsyncSession, orders: Sequence[Order]) -> List[OrderResponse]:
+    """
+    Пакетная сборка ответов для страницы заказов.
+    Позиции всех заказов загружаются одним запросом вместо запроса на каждый заказ,
+    порядок заказов сохраняется.
+    """
+    items_by_order = await load_order_items(db, [order.id for order in orders])
+    return [build_order_response(order, items_by_order.get(order.id, [])) for order in orders]
+
+
+async def fetch_order_responses(db: AsyncSession, query) -> List[OrderResponse]:
+    """Выполнение запроса по заказам и пакетная сборка ответов (2 запроса на любую страницу)."""
+    result = await db.execute(query)
+    orders = result.scalars().all()
+    return await build_order_responses(db, orders)
+
+
+async def fetch_order_response(db: AsyncSession, order: Order) -> Optional[OrderResponse]:
+    """Сборка ответа для одного заказа."""
+    if order is None:
+        return None
+    responses = await build_order_responses(db, [order])
+    return responses[0]
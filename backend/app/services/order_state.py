@@ -0,0 +1,258 @@
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
+from sqlalchemy.sql import func
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+from app.models.order import Order, OrderStatus, DeliveryType
+from app.schemas.order import OrderBulkStatusResult, OrderBulkStatusUpdateResponse
+from app.services.metrics import record_status_changes
+from app.services.sales_cube import record_sales
+from app.services.geo_bins import record_geo_changes
+
+# Журнал переходов: когда заказ впервые попал в статус. Пишется тем же UPDATE, что и статус
+STATUS_TIMESTAMPS: Dict[OrderStatus, str] = {
+    OrderStatus.CONFIRMED: "confirmed_at",
+    OrderStatus.PREPARING: "preparing_at",
+    OrderStatus.READY: "ready_at",
+    OrderStatus.DELIVERING: "delivering_at",
+    OrderStatus.DELIVERED: "delivered_at",
+    OrderStatus.CANCELLED: "cancelled_at",
+}
+
+
+@dataclass(frozen=True)
+class Transition:
+    """Допустимый переход статуса и условия, которые проверяются в самом UPDATE."""
+    to_status: OrderStatus
+    from_statuses: FrozenSet[OrderStatus]
+    detail: str  # Ошибка, если заказ не в одном из from_statuses
+    delivery_type: Optional[DeliveryType] = None  # Только для заказов этого типа
+    delivery_type_detail: str = ""
+    assign_courier: bool = False  # Назначить курьера courier_id
+    require_unassigned: bool = False  # Заказ должен быть свободен (курьер берет заказ сам)
+    courier_only: bool = False  # Только курьер, назначенный на заказ
+
+
+@dataclass
+class TransitionResult:
+    order: Order  # Заказ после перехода (из RETURNING)
+    previous_status: OrderStatus
+
+
+def _transition(to_status: OrderStatus, from_statuses, detail: str, **kwargs) -> Transition:
+    return Transition(to_status, frozenset(from_statuses), detail, **kwargs)
+
+
+START_COOKING = _transition(
+    OrderStatus.PREPARING, [OrderStatus.CONFIRMED], "Можно начать готовить только подтвержденный заказ"
+)
+MARK_READY = _transition(
+    OrderStatus.READY, [OrderStatus.PREPARING], "Можно отметить готовым только готовящийся заказ"
+)
+RETURN_TO_CONFIRMED = _transition(
+    OrderStatus.CONFIRMED, [OrderStatus.PREPARING], "Вернуть в 'подтвержден' можно только готовящийся заказ"
+)
+COMPLETE_PICKUP = _transition(
+    OrderStatus.DELIVERED, [OrderStatus.READY], "Можно выдать только готовый заказ",
+    delivery_type=DeliveryType.PICKUP, delivery_type_detail="Этот endpoint только для заказов на самовывоз"
+)
+TAKE_FOR_DELIVERY = _transition(
+    OrderStatus.DELIVERING, [OrderStatus.READY], "Можно взять только готовый заказ",
+    delivery_type=DeliveryType.DELIVERY, delivery_type_detail="Можно взять только заказы на доставку",
+    assign_courier=True, require_unassigned=True
+)
+# Администратор назначает курьера и на заказ, у которого курьер уже был
+# (например, заказ вернули из доставки в 'готов')
+ASSIGN_COURIER = _transition(
+    OrderStatus.DELIVERING, [OrderStatus.READY], "Курьера можно назначить только на готовый заказ",
+    assign_courier=True
+)
+MARK_DELIVERED = _transition(
+    OrderStatus.DELIVERED, [OrderStatus.DELIVERING], "Можно отметить доставленным только заказ в доставке",
+    courier_only=True
+)
+RETURN_TO_DELIVERING = _transition(
+    OrderStatus.DELIVERING, [OrderStatus.DELIVERED], "Вернуть в доставку можно только доставленный заказ",
+    courier_only=True
+)
+CANCEL = _transition(
+    OrderStatus.CANCELLED, [OrderStatus.PENDING, OrderStatus.CONFIRMED], "Заказ нельзя отменить на текущем этапе"
+)
+
+# Переходы по целевому статусу для PATCH /status кухни и курьера
+KITCHEN_TRANSITIONS: Dict[OrderStatus, Transition] = {
+    OrderStatus.PREPARING: START_COOKING,
+    OrderStatus.READY: MARK_READY,
+    OrderStatus.CONFIRMED: RETURN_TO_CONFIRMED,
+}
+COURIER_TRANSITIONS: Dict[OrderStatus, Transition] = {
+    OrderStatus.DELIVERED: MARK_DELIVERED,
+    OrderStatus.DELIVERING: RETURN_TO_DELIVERING,
+}
+
+
+def admin_transition(to_status: OrderStatus) -> Transition:
+    """Администратор может перевести заказ в любой статус из любого."""
+    return _transition(to_status, list(OrderStatus), "")
+
+
+@dataclass
+class BulkTransitionResult:
+    applied: List[TransitionResult]  # В порядке order_ids
+    errors: Dict[int, HTTPException]  # order_id -> почему переход не применился
+
+
+async def apply_transition(
+    db: AsyncSession,
+    order_id: int,
+    transition: Transition,
+    courier_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> TransitionResult:
+    """
+    Переход статуса одного заказа одним условным UPDATE ... WHERE id = ? AND status = ? RETURNING.
+
+    Если исходный статус у перехода один, заказ заранее не читается: все проверки (статус,
+    тип доставки, свободен ли заказ, назначенный курьер, владелец) стоят в WHERE, поэтому из
+    двух одновременных запросов (например, два курьера берут один заказ) выигрывает ровно один.
+    Заказ читается, только если UPDATE ничего не изменил, — чтобы вернуть понятную ошибку.
+    Для переходов из нескольких статусов сначала читается текущий статус, и UPDATE
+    выполняется при условии, что он не изменился (оптимистичная блокировка).
+
+    courier_id — курьер, которого назначает переход (assign_courier) или который должен
+    быть назначен на заказ (courier_only); user_id — владелец заказа.
+    Commit выполняет вызывающий код.
+    """
+    result = await apply_bulk_transition(db, [order_id], transition, courier_id, user_id)
+    if result.errors:
+        raise result.errors[order_id]
+    return result.applied[0]
+
+
+async def apply_bulk_transition(
+    db: AsyncSession,
+    order_ids: Sequence[int],
+    transition: Transition,
+    courier_id: Optional[int] = None,
+    user_id: Optional[int] = None
+) -> BulkTransitionResult:
+    """
+    Один переход для набора заказов (см. apply_transition): один UPDATE ... WHERE id IN (...)
+    на каждый исходный статус, затем один SELECT по заказам, которые не изменились.
+    Заказы, которые нельзя перевести, не мешают остальным. Свертки показателей
+    обновляются одним запросом в той же транзакции.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    if len(transition.from_statuses) == 1:
+        groups = {next(iter(transition.from_statuses)): order_ids}
+    else:
+        rows = await db.execute(select(Order.id, Order.status).where(Order.id.in_(order_ids)))
+        groups: Dict[OrderStatus, List[int]] = defaultdict(list)
+        for row in rows:
+            if row.status in transition.from_statuses:
+                groups[row.status].append(row.id)
+
+    now = datetime.now()
+    values = {"status": transition.to_status, "updated_at": now}
+    timestamp = STATUS_TIMESTAMPS.get(transition.to_status)
+    if timestamp:
+        values[timestamp] = func.coalesce(getattr(Order, timestamp), now)
+    if transition.assign_courier:
+        values["assigned_courier_id"] = courier_id
+
+    conditions = []
+    if transition.delivery_type is not None:
+        conditions.append(Order.delivery_type == transition.delivery_type)
+    if transition.require_unassigned:
+        conditions.append(Order.assigned_courier_id.is_(None))
+    if transition.courier_only:
+        conditions.append(Order.assigned_courier_id == courier_id)
+    if user_id is not None:
+        conditions.append(Order.user_id == user_id)
+
+    applied: Dict[int, TransitionResult] = {}
+    for expected_status, ids in groups.items():
+        statement = (
+            update(Order)
+            .where(Order.id.in_(ids), Order.status == expected_status, *conditions)
+            .values(**values)
+            .returning(Order)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        for order in (await db.execute(statement)).scalars():
+            applied[order.id] = TransitionResult(order=order, previous_status=expected_status)
+
+    changes = [(change.order, change.previous_status) for change in applied.values()]
+    await record_status_changes(db, changes)
+    await record_sales(db, changes)
+    await record_geo_changes(db, changes)
+
+    errors: Dict[int, HTTPException] = {}
+    rejected = [order_id for order_id in order_ids if order_id not in applied]
+    if rejected:
+        rows = await db.execute(
+            select(Order.id, Order.status, Order.delivery_type, Order.assigned_courier_id, Order.user_id)
+            .where(Order.id.in_(rejected))
+        )
+        rows_by_id = {row.id: row for row in rows}
+        for order_id in rejected:
+            errors[order_id] = _transition_error(rows_by_id.get(order_id), transition, courier_id, user_id)
+
+    return BulkTransitionResult(
+        applied=[applied[order_id] for order_id in order_ids if order_id in applied],
+        errors=errors
+    )
+
+
+def build_bulk_status_response(
+    order_ids: Sequence[int],
+    status: OrderStatus,
+    result: BulkTransitionResult
+) -> OrderBulkStatusUpdateResponse:
+    """Ответ массовой смены статуса: исход для каждого заказа в порядке запроса."""
+    applied = {change.order.id: change for change in result.applied}
+    results = []
+    for order_id in dict.fromkeys(order_ids):
+        change = applied.get(order_id)
+        if change:
+            results.append(OrderBulkStatusResult(
+                order_id=order_id,
+                success=True,
+                order_number=change.order.order_number,
+                previous_status=change.previous_status,
+                new_status=change.order.status
+            ))
+        else:
+            error = result.errors[order_id]
+            results.append(OrderBulkStatusResult(
+                order_id=order_id, success=False, error_code=error.status_code, detail=error.detail
+            ))
+    return OrderBulkStatusUpdateResponse(
+        status=status,
+        updated=len(result.applied),
+        failed=len(result.errors),
+        results=results
+    )
+
+
+def _transition_error(row, transition: Transition, courier_id: Optional[int], user_id: Optional[int]) -> HTTPException:
+    """Почему переход не применился: заказ читается только на этом (редком) пути."""
+    if row is None:
+        return HTTPException(status_code=404, detail="Заказ не найден")
+    if user_id is not None and row.user_id != user_id:
+        return HTTPException(status_code=403, detail="Нет доступа к этому заказу")
+    if transition.courier_only and row.assigned_courier_id != courier_id:
+        return HTTPException(status_code=403, detail="Этот заказ назначен другому курьеру")
+    if transition.delivery_type is not None and row.delivery_type != transition.delivery_type:
+        return HTTPException(status_code=400, detail=transition.delivery_type_detail)
+    if transition.require_unassigned and row.assigned_courier_id is not None:
+        # Другой курьер успел раньше
+        return HTTPException(status_code=409, detail="Заказ уже назначен другому курьеру")
+    if row.status not in transition.from_statuses:
+        return HTTPException(status_code=400, detail=transition.detail)
+    # Статус допустим, но успел измениться между чтением и UPDATE
+    return HTTPException(status_code=409, detail="Заказ изменен другим пользователем, обновите данные")
@@ -0,0 +1,50 @@
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Sequence, Tuple
+
+from app.models.order import Order, OrderItem
+from app.services.metrics import record_order_created
+from app.services.pricing import PricedItem
+
+
+async def insert_order(db: AsyncSession, order_data: dict, items: Sequence[PricedItem]) -> Tuple[Order, List[OrderItem]]:
+    """
+    Запись заказа и всех его позиций двумя пакетными INSERT без flush и refresh.
+
+    В SQLite блокировка записи берется первым INSERT и держится до commit, поэтому
+    транзакция должна быть как можно короче: заказ вставляется одним INSERT ... RETURNING id,
+    позиции — одним многострочным INSERT ... RETURNING id на всю корзину.
+    Объекты для ответа собираются из уже известных значений, без повторного чтения из базы.
+    Свертки показателей (services/metrics) обновляются третьим запросом в той же транзакции.
+    Вызывающий код отвечает за commit.
+    """
+    order_id = (
+        await db.execute(insert(Order).values(**order_data).returning(Order.id))
+    ).scalar_one()
+
+    item_rows = [
+        {
+            "order_id": order_id,
+            "dish_id": item.dish_id,
+            "dish_name": item.dish_name,
+            "dish_price": item.dish_price,
+            "quantity": item.quantity,
+            "price": item.price,
+            "total_price": item.total_price,
+            "modifiers": item.modifiers,
+        }
+        for item in items
+    ]
+    item_ids = []
+    if item_rows:
+        # Упорядоченный RETURNING SQLAlchemy для SQLite выполняет построчно, поэтому берем
+        # неупорядоченный многострочный INSERT: строки одного INSERT получают возрастающие id
+        # в порядке VALUES, и отсортированные id соответствуют позициям корзины
+        result = await db.execute(insert(OrderItem).returning(OrderItem.id), item_rows)
+        item_ids = sorted(result.scalars().all())
+
+    # Непривязанные к сессии объекты: только для сборки ответа
+    order = Order(id=order_id, **order_data)
+    order_items = [OrderItem(id=item_id, **row) for item_id, row in zip(item_ids, item_rows)]
+    await record_order_created(db, order)
+    return order, order_items
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import time
+
+from app.core.config import settings
+
+
+class PasswordHasher:
+    """
+    Хеширование и проверка паролей bcrypt в отдельном пуле потоков.
+
+    Одна операция bcrypt занимает 100–300 мс процессорного времени; в обработчике
+    она останавливала бы event loop и все остальные запросы воркера. bcrypt отпускает
+    GIL, поэтому потоки пула считают параллельно с event loop. Одновременно выполняется
+    не больше workers операций, еще max_queue ждут свободный поток; сверх этого
+    запрос получает 429, а не растягивает очередь на десятки секунд.
+    """
+
+    def __init__(self, workers: int, max_queue: int, rounds: int, retry_after_seconds: int):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.retry_after_seconds = retry_after_seconds
+        self.context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight = 0
+        self._peak_queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._busy_seconds = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        """Операции, ожидающие свободный поток (глубина очереди)."""
+        return max(0, self._in_flight - self.workers)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def _timed(self, func: Callable, *args) -> Tuple[float, Any]:
+        started = time.perf_counter()
+        result = func(*args)
+        return time.perf_counter() - started, result
+
+    async def _run(self, func: Callable, *args) -> Any:
+        if self._in_flight >= self.workers + self.max_queue:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Слишком много одновременных входов, повторите попытку через несколько секунд",
+                headers={"Retry-After": str(self.retry_after_seconds)}
+            )
+
+        self._in_flight += 1
+        self._peak_queued = max(self._peak_queued, self.queued)
+        try:
+            elapsed, result = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), self._timed, func, *args
+            )
+        finally:
+            self._in_flight -= 1
+        self._completed += 1
+        self._busy_seconds += elapsed
+        return result
+
+    async def hash(self, password: str) -> str:
+        """Хеш пароля с текущей стоимостью bcrypt."""
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Проверка пароля. Если хеш посчитан с другой стоимостью (PASSWORD_BCRYPT_ROUNDS изменили),
+        вторым значением возвращается новый хеш того же пароля — его нужно сохранить.
+        """
+        return await self._run(self.context.verify_and_update, password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        """Загрузка пула для /health и мониторинга."""
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queued": self.queued,
+            "peak_queued": self._peak_queued,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_ms": round(self._busy_seconds * 1000 / self._completed, 1) if self._completed else None,
+        }
+
+    def shutdown(self):
+        """Остановка потоков (при завершении приложения); следующая операция создаст пул заново."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+    rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    retry_after_seconds=settings.PASSWORD_HASH_RETRY_AFTER_SECONDS
+)
@@ -0,0 +1,305 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from fastapi import HTTPException
+import hashlib
+import time
+
+from app.core.config import settings
+from app.models.order import DeliveryType
+from app.models.promo_code import PromoCode, DiscountType
+from app.schemas.order import OrderItemRequest, OrderQuoteRequest, OrderQuoteResponse, OrderQuoteItemResponse
+from app.services.menu_cache import menu_cache, load_dish_snapshots, DishSnapshot, VariantSnapshot
+
+ZERO = Decimal("0")
+CENT = Decimal("0.01")
+
+
+@dataclass
+class PricedItem:
+    """Рассчитанная позиция корзины."""
+    dish_id: int
+    dish_name: str
+    dish_price: Decimal
+    quantity: int
+    price: Decimal  # Цена единицы с вариантами и добавками
+    total_price: Decimal
+    modifiers: List[dict] = field(default_factory=list)  # Формат OrderItem.modifiers
+
+
+@dataclass
+class CartPricing:
+    """Итог расчета корзины."""
+    items: List[PricedItem]
+    subtotal: Decimal
+    discount_amount: Decimal
+    promo_code: Optional[str]
+    promo_discount: Decimal
+    delivery_fee: Decimal
+    total_amount: Decimal
+    is_min_order_met: bool
+
+
+def calculate_discount(promo: Optional[PromoCode], subtotal: Decimal) -> Decimal:
+    """Скидка по промокоду для суммы subtotal (0, если промокод не подходит)."""
+    if promo is None:
+        return ZERO
+
+    # Проверяем минимальную сумму заказа
+    if promo.min_order_amount and subtotal < promo.min_order_amount:
+        return ZERO
+
+    if promo.discount_type == DiscountType.PERCENTAGE:
+        discount = (subtotal * promo.discount_value / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+        if promo.max_discount_amount:
+            discount = min(discount, promo.max_discount_amount)
+        return discount
+
+    return min(promo.discount_value, subtotal)
+
+
+def calculate_delivery_fee(delivery_type: Optional[DeliveryType], subtotal: Decimal) -> Decimal:
+    """Стоимость доставки: бесплатно для самовывоза и для заказов от FREE_DELIVERY_AMOUNT."""
+    if delivery_type != DeliveryType.DELIVERY:
+        return ZERO
+    if subtotal >= Decimal(str(settings.FREE_DELIVERY_AMOUNT)):
+        return ZERO
+    return Decimal(str(settings.DELIVERY_FEE))
+
+
+class PricingEngine:
+    """
+    Расчет стоимости корзины.
+
+    Блюда со всеми вариантами и добавками берутся из снимка меню (без запросов к базе),
+    а при выключенном кеше или use_menu_snapshot=False загружаются пакетно одним
+    WHERE id IN (...) на всю корзину. Промокод загружается одним запросом.
+    Количество запросов не зависит от размера корзины.
+
+    Снимок меню в другом воркере может отставать на MENU_CACHE_TTL_SECONDS, поэтому
+    оформление заказа считает цены по базе (use_menu_snapshot=False), а снимок
+    используется для предварительного расчета корзины.
+    """
+
+    def __init__(self, db: AsyncSession, use_menu_snapshot: bool = True):
+        self.db = db
+        self.use_menu_snapshot = use_menu_snapshot
+
+    async def load_dishes(self, dish_ids: Sequence[int]) -> Mapping[int, DishSnapshot]:
+        """Блюда корзины по ID."""
+        if self.use_menu_snapshot and menu_cache.enabled:
+            snapshot = await menu_cache.get()
+            return snapshot.dishes_by_id
+        return await load_dish_snapshots(self.db, dish_ids)
+
+    async def load_promo(self, promo_code: Optional[str]) -> Optional[PromoCode]:
+        """Активный промокод по коду (без учета регистра)."""
+        if not promo_code:
+            return None
+
+        result = await self.db.execute(
+            select(PromoCode).where(
+                PromoCode.code == promo_code.upper(),
+                PromoCode.is_active == True
+            )
+        )
+        return result.scalar_one_or_none()
+
+    def price_item(self, dish: Optional[DishSnapshot], item: OrderItemRequest) -> PricedItem:
+        """Проверка выбранных вариантов и добавок и расчет цены одной позиции."""
+        if dish is None or not dish.is_available:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Блюдо с ID {item.dish_id} не найдено или недоступно"
+            )
+
+        variants_by_id: Dict[int, VariantSnapshot] = {
+            variant.id: variant
+            for group in dish.variant_groups
+            for variant in group.variants
+        }
+
+        selected_variants = []
+        for variant_id in dict.fromkeys(item.modifiers):
+            variant = variants_by_id.get(variant_id)
+            if variant is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Вариант с ID {variant_id} недоступен для блюда «{dish.name}»"
+                )
+            selected_variants.append(variant)
+
+        for group in dish.variant_groups:
+            chosen = [variant for variant in selected_variants if variant.group_id == group.id]
+            if len(chosen) > 1 and not group.is_multiple:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"В группе «{group.name}» блюда «{dish.name}» можно выбрать только один вариант"
+                )
+            if not chosen and group.is_required:
+                # Обязательная группа без выбора: подставляем вариант по умолчанию, если он есть
+                default = next((variant for variant in group.variants if variant.is_default), None)
+                if default is None:
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"Для блюда «{dish.name}» необходимо выбрать: {group.name}"
+                    )
+                selected_variants.append(default)
+
+        addons_by_id = {addon.id: addon for addon in dish.addons if addon.is_active}
+        selected_addons = []
+        for addon_id in dict.fromkeys(item.addons):
+            addon = addons_by_id.get(addon_id)
+            if addon is None:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Добавка с ID {addon_id} недоступна для блюда «{dish.name}»"
+                )
+            selected_addons.append(addon)
+
+        price = dish.price
+        modifiers = []
+        for variant in selected_variants:
+            price += variant.price
+            modifiers.append({"id": variant.id, "name": variant.name, "price": float(variant.price), "type": "variant"})
+        for addon in selected_addons:
+            price += addon.price
+            modifiers.append({"id": addon.id, "name": addon.name, "price": float(addon.price), "type": "addon"})
+
+        return PricedItem(
+            dish_id=dish.id,
+            dish_name=dish.name,
+            dish_price=dish.price,
+            quantity=item.quantity,
+            price=price,
+            total_price=price * item.quantity,
+            modifiers=modifiers
+        )
+
+    async def price_cart(
+        self,
+        items: Sequence[OrderItemRequest],
+        promo_code: Optional[str] = None,
+        delivery_type: Optional[DeliveryType] = None
+    ) -> CartPricing:
+        """
+        Расчет всех позиций и итогов корзины за один проход.
+        Минимальная сумма заказа и бесплатная доставка считаются от суммы позиций без скидки.
+        """
+        if not items:
+            raise HTTPException(status_code=400, detail="Корзина пуста")
+
+        dishes = await self.load_dishes([item.dish_id for item in items])
+        priced_items = [self.price_item(dishes.get(item.dish_id), item) for item in items]
+        subtotal = sum((item.total_price for item in priced_items), ZERO)
+
+        promo = await self.load_promo(promo_code)
+        discount_amount = calculate_discount(promo, subtotal)
+        delivery_fee = calculate_delivery_fee(delivery_type, subtotal)
+
+        return CartPricing(
+            items=priced_items,
+            subtotal=subtotal,
+            discount_amount=discount_amount,
+            promo_code=promo_code.upper() if promo_code else None,
+            promo_discount=promo.discount_value if promo and discount_amount else ZERO,
+            delivery_fee=delivery_fee,
+            total_amount=max(subtotal - discount_amount, ZERO) + delivery_fee,
+            is_min_order_met=subtotal >= Decimal(str(settings.MIN_ORDER_AMOUNT))
+        )
+
+
+class QuoteCache:
+    """
+    LRU-кеш расчетов корзины в памяти процесса.
+
+    Ключ — хеш корзины (позиции, промокод, тип доставки) и версия меню, поэтому
+    изменение меню сразу делает старые расчеты недостижимыми. Изменения промокодов
+    очищают кеш через clear(), TTL ограничивает расхождение между воркерами.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[float, OrderQuoteResponse]]" = OrderedDict()
+
+    @staticmethod
+    def make_key(request: OrderQuoteRequest) -> Tuple[str, int]:
+        cart = request.model_copy(update={"promo_code": request.promo_code.upper() if request.promo_code else None})
+        cart_hash = hashlib.sha256(cart.model_dump_json().encode()).hexdigest()
+        return cart_hash, menu_cache.version
+
+    def get(self, key: Tuple[str, int]) -> Optional[OrderQuoteResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, quote = entry
+        if self.ttl_seconds > 0 and time.monotonic() - stored_at >= self.ttl_seconds:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return quote
+
+    def put(self, key: Tuple[str, int], quote: OrderQuoteResponse):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic(), quote)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+quote_cache = QuoteCache(
+    max_size=settings.QUOTE_CACHE_SIZE,
+    ttl_seconds=settings.QUOTE_CACHE_TTL_SECONDS
+)
+
+
+def build_quote_response(pricing: CartPricing) -> OrderQuoteResponse:
+    """Преобразование расчета корзины в схему ответа."""
+    return OrderQuoteResponse(
+        items=[
+            OrderQuoteItemResponse(
+                dish_id=item.dish_id,
+                dish_name=item.dish_name,
+                quantity=item.quantity,
+                price=item.price,
+                total_price=item.total_price,
+                modifiers=[modifier["name"] for modifier in item.modifiers]
+            )
+            for item in pricing.items
+        ],
+        subtotal=pricing.subtotal,
+        discount_amount=pricing.discount_amount,
+        promo_code=pricing.promo_code,
+        promo_applied=pricing.discount_amount > 0,
+        delivery_fee=pricing.delivery_fee,
+        total_amount=pricing.total_amount,
+        min_order_amount=Decimal(str(settings.MIN_ORDER_AMOUNT)),
+        is_min_order_met=pricing.is_min_order_met,
+        free_delivery_amount=Decimal(str(settings.FREE_DELIVERY_AMOUNT))
+    )
+
+
+async def quote_cart(db: AsyncSession, request: OrderQuoteRequest) -> OrderQuoteResponse:
+    """Расчет корзины без записи в базу; повторные расчеты той же корзины берутся из кеша."""
+    key = quote_cache.make_key(request)
+    quote = quote_cache.get(key)
+    if quote is not None:
+        return quote
+
+    pricing = await PricingEngine(db).price_cart(request.items, request.promo_code, request.delivery_type)
+    quote = build_quote_response(pricing)
+    quote_cache.put(key, quote)
+    return quote
@@ -0,0 +1,101 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+import time
+
+from app.core.config import settings
+from app.models.user import User, UserRole
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    Пользователь, от имени которого выполняется запрос: только поля для авторизации.
+    Имена полей совпадают с атрибутами модели User, поэтому эндпоинты, которым нужны
+    current_user.id и current_user.role, работают с ним так же, как с моделью.
+    """
+    id: int
+    role: UserRole
+    is_active: bool
+    name: str
+    phone: str
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        return cls(
+            id=user.id,
+            role=UserRole(user.role),
+            is_active=bool(user.is_active),
+            name=user.name,
+            phone=user.phone
+        )
+
+
+class PrincipalCache:
+    """
+    LRU-кеш пользователей по id в памяти процесса.
+
+    Запросы с токеном авторизуются без чтения users, пока запись не устарела.
+    Изменение роли, статуса или имени вызывает invalidate(user_id) после commit;
+    TTL ограничивает, сколько другие воркеры видят прежние роль и статус.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Tuple[float, Principal]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+
+        stored_at, principal = entry
+        if self.ttl_seconds > 0 and time.monotonic() - stored_at >= self.ttl_seconds:
+            del self._entries[user_id]
+            return None
+
+        self._entries.move_to_end(user_id)
+        return principal
+
+    def put(self, principal: Principal):
+        if self.max_size <= 0:
+            return
+        self._entries[principal.id] = (time.monotonic(), principal)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Удалить пользователя из кеша (вызывается после изменения роли, статуса или профиля)."""
+        self._entries.pop(user_id, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def load(self, db: AsyncSession, user_id: int) -> Optional[Principal]:
+        """Пользователь из кеша, а при промахе — чтение только нужных колонок users."""
+        principal = self.get(user_id)
+        if principal is not None:
+            return principal
+
+        row = (await db.execute(
+            select(User.id, User.role, User.is_active, User.name, User.phone).where(User.id == user_id)
+        )).one_or_none()
+        if row is None:
+            return None
+
+        principal = Principal.from_user(row)
+        self.put(principal)
+        return principal
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE_SIZE,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
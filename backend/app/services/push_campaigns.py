@@ -0,0 +1,320 @@
+from sqlalchemy import select, update, func, or_, and_
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import secrets
+import time
+
+from app.core.config import settings
+from app.core.database import async_session_maker
+from app.models.notification import PushCampaign, PushCampaignStatus
+from app.models.user import User, UserRole
+from app.services.notifications import DeliveryError, FCM_MULTICAST_LIMIT, enqueue_push, notification_dispatcher
+
+
+class TokenBucket:
+    """Ограничение скорости: не больше rate сообщений в секунду, кратковременно — до burst сразу."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float):
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+
+def recipients_filter():
+    """Получатели рассылки: активные клиенты с зарегистрированным устройством."""
+    return (User.role == UserRole.CLIENT, User.is_active == True, User.fcm_token.is_not(None))
+
+
+class PushCampaignRunner:
+    """
+    Исполнитель push-рассылок из push_campaigns.
+
+    Рассылка забирается одним UPDATE с меткой процесса; пока она идет, heartbeat_at обновляется
+    после каждой страницы, и рассылку, чей исполнитель не отвечает дольше lease_seconds, забирает
+    другой процесс. Клиенты читаются страницами по id (keyset, без OFFSET), страница делится на
+    пакеты multicast по batch_size, пакеты отправляются не больше concurrency одновременно и
+    не быстрее rate_per_second сообщений. После страницы курсор и счетчики сохраняются одним UPDATE:
+    в памяти только одна страница, а после падения повторно отправится не больше одной страницы.
+    """
+
+    def __init__(
+        self,
+        transport=None,
+        session_maker=async_session_maker,
+        batch_size: int = FCM_MULTICAST_LIMIT,
+        concurrency: int = 4,
+        rate_per_second: float = 5000.0,
+        batch_attempts: int = 3,
+        retry_base_seconds: float = 5.0,
+        lease_seconds: float = 120.0,
+        poll_seconds: float = 2.0
+    ):
+        self._transport = transport
+        self.session_maker = session_maker
+        self.batch_size = max(1, min(batch_size, FCM_MULTICAST_LIMIT))
+        self.concurrency = max(1, concurrency)
+        self.rate_per_second = rate_per_second
+        self.batch_attempts = max(1, batch_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    @property
+    def transport(self):
+        """Транспорт очереди уведомлений, если свой не задан."""
+        return self._transport or notification_dispatcher.transport
+
+    @property
+    def page_size(self) -> int:
+        return self.batch_size * self.concurrency
+
+    # --- Жизненный цикл ---
+
+    async def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Остановка; прерванную рассылку продолжит этот или другой процесс после lease_seconds."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._wakeup = None
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                ran = await self.run_next()
+            except Exception as e:
+                print(f"⚠️ Ошибка push-рассылки: {e}")
+                ran = False
+            if not ran:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+    # --- Рассылка ---
+
+    async def claim(self) -> Optional[Tuple[PushCampaign, str]]:
+        """Забрать ожидающую рассылку или рассылку упавшего исполнителя. None — забирать нечего."""
+        token = secrets.token_hex(8)
+        now = datetime.utcnow()
+        claimable = or_(
+            PushCampaign.status == PushCampaignStatus.PENDING.value,
+            and_(
+                PushCampaign.status == PushCampaignStatus.RUNNING.value,
+                PushCampaign.heartbeat_at < now - timedelta(seconds=self.lease_seconds)
+            )
+        )
+        async with self.session_maker() as db:
+            campaign_id = (await db.execute(
+                select(PushCampaign.id).where(claimable).order_by(PushCampaign.id).limit(1)
+            )).scalar()
+            if campaign_id is None:
+                return None
+
+            result = await db.execute(
+                update(PushCampaign)
+                .where(PushCampaign.id == campaign_id, claimable)
+                .values(
+                    status=PushCampaignStatus.RUNNING.value,
+                    claimed_by=token,
+                    heartbeat_at=now,
+                    started_at=func.coalesce(PushCampaign.started_at, now)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != 1:
+                # Успел забрать другой процесс
+                await db.rollback()
+                return None
+
+            campaign = await db.get(PushCampaign, campaign_id)
+            if campaign.recipients_total is None:
+                campaign.recipients_total = (await db.execute(
+                    select(func.count(User.id)).where(*recipients_filter())
+                )).scalar()
+            await db.commit()
+            return campaign, token
+
+    async def run_next(self) -> bool:
+        """Забрать и провести одну рассылку до конца. False — забирать нечего."""
+        claimed = await self.claim()
+        if claimed is None:
+            return False
+        await self.run(*claimed)
+        return True
+
+    async def run(self, campaign: PushCampaign, token: str):
+        bucket = TokenBucket(self.rate_per_second, burst=self.batch_size)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        data = json.loads(campaign.data or "{}")
+        cursor = campaign.cursor_user_id
+
+        while True:
+            async with self.session_maker() as db:
+                page = (await db.execute(
+                    select(User.id, User.fcm_token)
+                    .where(User.id > cursor, *recipients_filter())
+                    .order_by(User.id)
+                    .limit(self.page_size)
+                )).all()
+
+            if not page:
+                await self._finish(campaign.id, token, PushCampaignStatus.COMPLETED)
+                return
+
+            batches = [page[i:i + self.batch_size] for i in range(0, len(page), self.batch_size)]
+            results = await asyncio.gather(*(
+                self._send(batch, campaign.title, campaign.body, data, bucket, semaphore) for batch in batches
+            ))
+            cursor = page[-1].id
+            status = await self._save_page(campaign, token, cursor, batches, results, data)
+            if status != PushCampaignStatus.RUNNING.value:
+                if status == PushCampaignStatus.CANCELLED.value:
+                    await self._finish(campaign.id, token, PushCampaignStatus.CANCELLED)
+                # None — рассылку забрал другой процесс (этот не обновлял heartbeat дольше аренды)
+                return
+
+    async def _send(self, batch: Sequence[Any], title: str, body: str, data: Dict[str, str],
+                    bucket: TokenBucket, semaphore: asyncio.Semaphore) -> List[Optional[DeliveryError]]:
+        """Один multicast; при сбое провайдера — повтор с удвоением паузы."""
+        tokens = [row.fcm_token for row in batch]
+        await bucket.acquire(len(tokens))
+        async with semaphore:
+            for attempt in range(1, self.batch_attempts + 1):
+                try:
+                    return await self.transport.send_push(tokens, title, body, data)
+                except Exception as e:
+                    error = e if isinstance(e, DeliveryError) else DeliveryError(str(e))
+                    if not error.retryable or attempt == self.batch_attempts:
+                        return [error] * len(tokens)
+                    await asyncio.sleep(self.retry_base_seconds * 2 ** (attempt - 1))
+
+    async def _save_page(self, campaign: PushCampaign, token: str, cursor: int,
+                         batches: Sequence[Sequence[Any]], results: Sequence[Sequence[Optional[DeliveryError]]],
+                         data: Dict[str, str]) -> Optional[str]:
+        """Курсор, счетчики, повторы и недействительные токены страницы — одной транзакцией."""
+        sent = failed = 0
+        retry: List[Tuple[int, str]] = []
+        invalid_tokens: List[str] = []
+        last_error = None
+        for batch, errors in zip(batches, results):
+            for row, error in zip(batch, errors):
+                if error is None:
+                    sent += 1
+                    continue
+                last_error = str(error)[:500]
+                if error.invalid_recipient:
+                    invalid_tokens.append(row.fcm_token)
+                elif error.retryable:
+                    retry.append((row.id, row.fcm_token))
+                else:
+                    failed += 1
+
+        async with self.session_maker() as db:
+            values = {
+                "cursor_user_id": cursor,
+                "sent_count": PushCampaign.sent_count + sent,
+                "failed_count": PushCampaign.failed_count + failed,
+                "invalid_count": PushCampaign.invalid_count + len(invalid_tokens),
+                "retried_count": PushCampaign.retried_count + len(retry),
+                "batches_count": PushCampaign.batches_count + len(batches),
+                "heartbeat_at": datetime.utcnow(),
+            }
+            if last_error:
+                values["last_error"] = last_error
+            result = await db.execute(
+                update(PushCampaign)
+                .where(PushCampaign.id == campaign.id, PushCampaign.claimed_by == token)
+                .values(**values)
+            )
+            if result.rowcount != 1:
+                await db.rollback()
+                return None
+
+            if retry:
+                # Повторы — через общую очередь уведомлений с ее паузами и лимитом попыток
+                await enqueue_push(db, retry, campaign.title, campaign.body, data)
+            if invalid_tokens:
+                await db.execute(update(User).where(User.fcm_token.in_(invalid_tokens)).values(fcm_token=None))
+            status = (await db.execute(
+                select(PushCampaign.status).where(PushCampaign.id == campaign.id)
+            )).scalar()
+            await db.commit()
+
+        if retry:
+            notification_dispatcher.wake()
+        return status
+
+    async def _finish(self, campaign_id: int, token: str, status: PushCampaignStatus):
+        async with self.session_maker() as db:
+            await db.execute(
+                update(PushCampaign)
+                .where(PushCampaign.id == campaign_id, PushCampaign.claimed_by == token)
+                .values(status=status.value, claimed_by=None, finished_at=datetime.utcnow())
+            )
+            await db.commit()
+
+
+def campaign_progress(campaign: PushCampaign) -> Dict[str, Any]:
+    """Состояние рассылки для админки."""
+    processed = campaign.sent_count + campaign.failed_count + campaign.invalid_count + campaign.retried_count
+    return {
+        "id": campaign.id,
+        "title": campaign.title,
+        "body": campaign.body,
+        "data": json.loads(campaign.data) if campaign.data else None,
+        "status": campaign.status,
+        "recipients_total": campaign.recipients_total,
+        "processed": processed,
+        "progress": round(min(1.0, processed / campaign.recipients_total), 4) if campaign.recipients_total else None,
+        "sent": campaign.sent_count,
+        "failed": campaign.failed_count,
+        "invalid_tokens": campaign.invalid_count,
+        "retried": campaign.retried_count,
+        "batches": campaign.batches_count,
+        "last_error": campaign.last_error,
+        "created_at": campaign.created_at,
+        "started_at": campaign.started_at,
+        "finished_at": campaign.finished_at,
+    }
+
+
+push_campaign_runner = PushCampaignRunner(
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    concurrency=settings.PUSH_CAMPAIGN_CONCURRENCY,
+    rate_per_second=settings.PUSH_CAMPAIGN_RATE_PER_SECOND,
+    batch_attempts=settings.PUSH_CAMPAIGN_BATCH_ATTEMPTS,
+    retry_base_seconds=settings.NOTIFICATION_RETRY_BASE_SECONDS,
+    lease_seconds=settings.NOTIFICATION_LEASE_SECONDS,
+    poll_seconds=settings.NOTIFICATION_POLL_SECONDS
+)
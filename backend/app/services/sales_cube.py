@@ -0,0 +1,174 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, insert, func
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.db_backend import upsert_statement
+from app.models.menu import Dish
+from app.models.metrics import SalesCube
+from app.models.order import Order, OrderItem, OrderStatus
+
+WEEKDAYS = ("Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс")
+CUBE_MEASURES = ("orders_count", "quantity", "revenue")
+
+# (дата, час, категория, блюдо) -> [день недели, заказы, порции, сумма]
+CubeDeltas = Dict[Tuple[date, int, int, int], List[Any]]
+
+
+def _new_deltas() -> CubeDeltas:
+    return defaultdict(lambda: [0, 0, 0, Decimal("0")])
+
+
+def _order_dish_lines():
+    """
+    Позиции доставленных заказов, сгруппированные по (заказ, блюдо): одна строка — один
+    заказ с блюдом, поэтому блюдо с разными модификаторами считается в заказе один раз.
+    Блюдо, удаленное из меню, попадает в категорию 0.
+    """
+    return (
+        select(
+            OrderItem.order_id,
+            Order.created_at,
+            OrderItem.dish_id,
+            func.coalesce(Dish.category_id, 0).label("category_id"),
+            func.sum(OrderItem.quantity).label("quantity"),
+            func.sum(OrderItem.total_price).label("revenue"),
+        )
+        .join(Order, Order.id == OrderItem.order_id)
+        .outerjoin(Dish, Dish.id == OrderItem.dish_id)
+        .group_by(OrderItem.order_id, Order.created_at, OrderItem.dish_id, Dish.category_id)
+    )
+
+
+def _add_line(deltas: CubeDeltas, line, sign: int):
+    created_at: datetime = line.created_at
+    delta = deltas[(created_at.date(), created_at.hour, line.category_id, line.dish_id)]
+    delta[0] = created_at.weekday()
+    delta[1] += sign
+    delta[2] += sign * int(line.quantity or 0)
+    delta[3] += sign * Decimal(str(line.revenue or 0))
+
+
+def _rows(deltas: CubeDeltas) -> List[Dict[str, Any]]:
+    return [
+        {
+            "sale_date": sale_date, "hour": hour, "category_id": category_id, "dish_id": dish_id,
+            "weekday": weekday, "orders_count": orders_count, "quantity": quantity, "revenue": revenue,
+        }
+        for (sale_date, hour, category_id, dish_id), (weekday, orders_count, quantity, revenue) in deltas.items()
+        if orders_count or quantity or revenue
+    ]
+
+
+async def record_sales(db: AsyncSession, changes: Iterable[Tuple[Order, Any]]):
+    """
+    Учет в кубе заказов (заказ после перехода, предыдущий статус), которые стали доставленными
+    или перестали ими быть. Вызывается в транзакции перехода: для пакета — одно чтение позиций
+    и один INSERT ... ON CONFLICT; переходы, не затрагивающие DELIVERED, запросов не делают.
+    """
+    signs: Dict[int, int] = {}
+    for order, previous_status in changes:
+        was_delivered = previous_status is not None and OrderStatus(previous_status) == OrderStatus.DELIVERED
+        is_delivered = OrderStatus(order.status) == OrderStatus.DELIVERED
+        if was_delivered != is_delivered:
+            signs[order.id] = 1 if is_delivered else -1
+    if not signs:
+        return
+
+    deltas = _new_deltas()
+    for line in (await db.execute(_order_dish_lines().where(OrderItem.order_id.in_(list(signs))))).all():
+        _add_line(deltas, line, signs[line.order_id])
+    rows = _rows(deltas)
+    if not rows:
+        return
+    statement = upsert_statement(db.bind.dialect.name, SalesCube).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[SalesCube.sale_date, SalesCube.hour, SalesCube.category_id, SalesCube.dish_id],
+        set_={name: getattr(SalesCube, name) + getattr(statement.excluded, name) for name in CUBE_MEASURES}
+    )
+    await db.execute(statement)
+
+
+async def rebuild_sales_cube(db: AsyncSession, batch_size: int = 5000) -> Dict[str, int]:
+    """Пересчет куба с нуля по доставленным заказам. Commit выполняет вызывающий код."""
+    deltas = _new_deltas()
+    lines = 0
+    result = await db.stream(
+        _order_dish_lines().where(Order.status == OrderStatus.DELIVERED, Order.created_at.is_not(None))
+        .execution_options(yield_per=batch_size)
+    )
+    async for line in result:
+        _add_line(deltas, line, 1)
+        lines += 1
+
+    await db.execute(delete(SalesCube))
+    rows = _rows(deltas)
+    for start in range(0, len(rows), batch_size):
+        await db.execute(insert(SalesCube), rows[start:start + batch_size])
+    return {"order_dishes": lines, "cube_rows": len(rows)}
+
+
+async def sales_heatmap(
+    db: AsyncSession,
+    date_from: date,
+    date_to: date,
+    measure: str,
+    category_id: Optional[int] = None,
+    dish_id: Optional[int] = None,
+    top: int = 10
+) -> Dict[str, Any]:
+    """
+    Тепловая карта день недели × час по срезу куба и самые продаваемые блюда среза.
+    Читаются только строки куба за период (не больше дней × 24 × блюд), заказы не сканируются.
+    """
+    filters = [SalesCube.sale_date >= date_from, SalesCube.sale_date <= date_to]
+    if category_id is not None:
+        filters.append(SalesCube.category_id == category_id)
+    if dish_id is not None:
+        filters.append(SalesCube.dish_id == dish_id)
+    sums = [func.sum(getattr(SalesCube, name)).label(name) for name in CUBE_MEASURES]
+
+    cells = (await db.execute(
+        select(SalesCube.weekday, SalesCube.hour, *sums).where(*filters).group_by(SalesCube.weekday, SalesCube.hour)
+    )).all()
+    dishes = (await db.execute(
+        select(SalesCube.dish_id, Dish.name, *sums)
+        .outerjoin(Dish, Dish.id == SalesCube.dish_id)
+        .where(*filters)
+        .group_by(SalesCube.dish_id, Dish.name)
+        .order_by(func.sum(getattr(SalesCube, measure)).desc(), SalesCube.dish_id)
+        .limit(top)
+    )).all()
+
+    def value(row, name):
+        return round(float(getattr(row, name) or 0), 2) if name == "revenue" else int(getattr(row, name) or 0)
+
+    matrix = [[0] * 24 for _ in WEEKDAYS]
+    totals = {name: 0 for name in CUBE_MEASURES}
+    peak = None
+    for cell in cells:
+        matrix[cell.weekday][cell.hour] = value(cell, measure)
+        for name in CUBE_MEASURES:
+            totals[name] += value(cell, name)
+        if peak is None or value(cell, measure) > peak["value"]:
+            peak = {"weekday": cell.weekday, "hour": cell.hour, "value": value(cell, measure)}
+    totals["revenue"] = round(totals["revenue"], 2)
+
+    return {
+        "period": {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()},
+        "filters": {"category_id": category_id, "dish_id": dish_id},
+        "measure": measure,
+        "weekdays": list(WEEKDAYS),
+        "hours": list(range(24)),
+        "matrix": matrix,
+        "by_weekday": [round(sum(row), 2) for row in matrix],
+        "by_hour": [round(sum(matrix[weekday][hour] for weekday in range(7)), 2) for hour in range(24)],
+        "totals": totals,
+        "peak": peak,
+        "top_dishes": [
+            {"dish_id": row.dish_id, "name": row.name, **{name: value(row, name) for name in CUBE_MEASURES}}
+            for row in dishes
+        ],
+    }
@@ -0,0 +1,187 @@
+from collections import OrderedDict
+from functools import lru_cache
+from jose import jwt
+from typing import Any, Dict, Optional, Tuple
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from app.core.config import settings
+
+
+# Алгоритмы JWT с общим секретом и соответствующие хеш-функции HMAC
+HMAC_DIGESTS = {
+    "HS256": hashlib.sha256,
+    "HS384": hashlib.sha384,
+    "HS512": hashlib.sha512,
+}
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+@lru_cache(maxsize=64)
+def _parse_header(segment: str) -> Optional[Tuple[str, str]]:
+    """
+    (alg, kid) из заголовка токена. Заголовок у всех токенов одного ключа одинаковый,
+    поэтому разбирается один раз; None — заголовок не читается.
+    """
+    try:
+        header = json.loads(_b64decode(segment))
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or not isinstance(header.get("alg"), str):
+        return None
+    kid = header.get("kid", "")
+    return (header["alg"], kid) if isinstance(kid, str) else None
+
+
+class TokenVerifier:
+    """
+    Проверка JWT (HS256/HS384/HS512) с кешем проверенных токенов.
+
+    HMAC-состояние каждого ключа считается один раз при настройке; на токен остается
+    copy() и хеширование самого токена. Проверенные claims хранятся по хешу токена
+    до его exp (LRU), повторный запрос с тем же токеном не проверяет подпись вообще.
+
+    Ротация ключей: новые токены подписываются текущим ключом с kid в заголовке,
+    прежние ключи из previous_keys продолжают проверять выданные ими токены.
+    Токен без kid проверяется ключом с пустым kid (так подписаны токены до ротации).
+    """
+
+    def __init__(
+        self,
+        secret: str,
+        algorithm: str,
+        key_id: str = "",
+        previous_keys: Optional[Dict[str, str]] = None,
+        cache_size: int = 10000
+    ):
+        if algorithm not in HMAC_DIGESTS:
+            raise ValueError(f"Неподдерживаемый алгоритм JWT: {algorithm} (нужен один из {', '.join(HMAC_DIGESTS)})")
+        self.algorithm = algorithm
+        self.cache_size = cache_size
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+        self.configure_keys(secret, key_id, previous_keys)
+
+    def configure_keys(self, secret: str, key_id: str = "", previous_keys: Optional[Dict[str, str]] = None):
+        """Установить текущий и прежние ключи; кеш сбрасывается — удаленный ключ перестает действовать сразу."""
+        keys = dict(previous_keys or {})
+        keys[key_id] = secret
+        digest = HMAC_DIGESTS[self.algorithm]
+        self.key_id = key_id
+        self._secret = secret
+        self._macs = {kid: hmac.new(key.encode(), digestmod=digest) for kid, key in keys.items()}
+        self._entries.clear()
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        """Подпись claims текущим ключом (kid в заголовке, если он задан)."""
+        headers = {"kid": self.key_id} if self.key_id else None
+        return jwt.encode(claims, self._secret, algorithm=self.algorithm, headers=headers)
+
+    def _decode(self, token: str) -> Optional[Dict[str, Any]]:
+        """Полная проверка: заголовок, подпись, exp/nbf. None — токен недействителен."""
+        parts = token.split(".")
+        if len(parts) != 3:
+            return None
+        header_segment, payload_segment, signature_segment = parts
+
+        header = _parse_header(header_segment)
+        if header is None or header[0] != self.algorithm:
+            return None
+        mac = self._macs.get(header[1])
+        if mac is None:
+            return None
+
+        mac = mac.copy()
+        mac.update(f"{header_segment}.{payload_segment}".encode("ascii", "replace"))
+        try:
+            # compare_digest не сравнивает str с не-ASCII символами (TypeError) — сравниваем байты
+            signature = signature_segment.encode("ascii")
+        except UnicodeEncodeError:
+            return None
+        if not hmac.compare_digest(_b64encode(mac.digest()).encode("ascii"), signature):
+            return None
+
+        try:
+            claims = json.loads(_b64decode(payload_segment))
+        except ValueError:
+            return None
+        if not isinstance(claims, dict):
+            return None
+
+        now = time.time()
+        try:
+            if "exp" in claims and float(claims["exp"]) <= now:
+                return None
+            if "nbf" in claims and float(claims["nbf"]) > now:
+                return None
+        except (TypeError, ValueError):
+            return None
+        return claims
+
+    def verify(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Claims проверенного токена (None — подпись неверна, токен истек или ключ неизвестен).
+        Возвращаемый словарь общий для всех запросов с этим токеном — не изменять.
+        """
+        digest = hashlib.blake2b(token.encode("utf-8", "replace"), digest_size=16).digest()
+        entry = self._entries.get(digest)
+        if entry is not None:
+            expires_at, claims = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(digest)
+                self._hits += 1
+                return claims
+            del self._entries[digest]
+
+        self._misses += 1
+        claims = self._decode(token)
+        if claims is None:
+            self._rejected += 1
+            return None
+
+        # Токены без exp не кешируются: их действие ничем не ограничено
+        if self.cache_size > 0 and "exp" in claims:
+            self._entries[digest] = (float(claims["exp"]), claims)
+            while len(self._entries) > self.cache_size:
+                self._entries.popitem(last=False)
+        return claims
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кеша для /health и мониторинга."""
+        lookups = self._hits + self._misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.cache_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "rejected": self._rejected,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else None,
+            "key_ids": sorted(self._macs),
+        }
+
+
+token_verifier = TokenVerifier(
+    secret=settings.JWT_SECRET_KEY,
+    algorithm=settings.JWT_ALGORITHM,
+    key_id=settings.JWT_KEY_ID,
+    previous_keys=settings.JWT_PREVIOUS_KEYS,
+    cache_size=settings.JWT_VERIFY_CACHE_SIZE
+)
@@ -4,6 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.core.database import get_db_session
 from app.services.auth import AuthService
+from app.services.principal_cache import Principal
 from app.models.user import User, UserRole
 
 security = HTTPBearer()
@@ -28,9 +29,32 @@ async def get_current_user(
         )
     return user
 
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db_session)
+) -> Principal:
+    """
+    Получить текущего пользователя для авторизации: id, роль, статус, имя и телефон.
+    При попадании в кеш запроса к базе нет; полную модель дает get_current_user.
+    """
+    auth_service = AuthService(db)
+    principal = await auth_service.get_current_principal(credentials.credentials)
+    if not principal:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not principal.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
+    return principal
+
 def require_roles(allowed_roles: List[UserRole]):
-    """Decorator для проверки ролей пользователя."""
-    def role_checker(current_user: User = Depends(get_current_user)) -> User:
+    """Decorator для проверки ролей пользователя (без чтения users при попадании в кеш)."""
+    def role_checker(current_user: Principal = Depends(get_current_principal)) -> Principal:
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -40,27 +64,27 @@ def require_roles(allowed_roles: List[UserRole]):
     return role_checker
 
 # Специфичные dependency для каждой роли
-def get_current_admin(current_user: User = Depends(require_roles([UserRole.ADMIN]))) -> User:
+def get_current_admin(current_user: Principal = Depends(require_roles([UserRole.ADMIN]))) -> Principal:
     """Получить текущего администратора."""
     return current_user
 
-def get_current_kitchen(current_user: User = Depends(require_roles([UserRole.KITCHEN]))) -> User:
+def get_current_kitchen(current_user: Principal = Depends(require_roles([UserRole.KITCHEN]))) -> Principal:
     """Получить текущего сотрудника кухни."""
     return current_user
 
-def get_current_courier(current_user: User = Depends(require_roles([UserRole.COURIER]))) -> User:
+def get_current_courier(current_user: Principal = Depends(require_roles([UserRole.COURIER]))) -> Principal:
     """Получить текущего курьера."""
     return current_user
 
-def get_current_client(current_user: User = Depends(require_roles([UserRole.CLIENT]))) -> User:
+def get_current_client(current_user: Principal = Depends(require_roles([UserRole.CLIENT]))) -> Principal:
     """Получить текущего клиента."""
     return current_user
 
-def get_admin_or_kitchen(current_user: User = Depends(require_roles([UserRole.ADMIN, UserRole.KITCHEN]))) -> User:
+def get_admin_or_kitchen(current_user: Principal = Depends(require_roles([UserRole.ADMIN, UserRole.KITCHEN]))) -> Principal:
     """Получить администратора или сотрудника кухни."""
     return current_user
 
-def get_admin_or_courier(current_user: User = Depends(require_roles([UserRole.ADMIN, UserRole.COURIER]))) -> User:
+def get_admin_or_courier(current_user: Principal = Depends(require_roles([UserRole.ADMIN, UserRole.COURIER]))) -> Principal:
     """Получить администратора или курьера."""
     return current_user
 
@@ -0,0 +1,37 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """Кодирование позиции keyset-пагинации (created_at, id) в непрозрачный токен."""
+    payload = json.dumps(
+        {"c": created_at.isoformat(), "i": item_id},
+        separators=(",", ":")
+    ).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    """
+    Декодирование токена курсора обратно в (created_at, id).
+    Бросает ValueError для поврежденного токена.
+    """
+    if not token:
+        return None
+
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["c"]), int(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Некорректный курсор: {e}")
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """
+    Верхняя граница для поиска по префиксу через диапазон (col >= prefix AND col < bound).
+    В отличие от LIKE 'prefix%' такой диапазон использует обычный B-tree индекс SQLite.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -5,7 +5,6 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from passlib.context import CryptContext
 from decimal import Decimal
 from datetime import datetime, timedelta
 
@@ -13,8 +12,7 @@ from app.models.user import User, UserRole
 from app.models.menu import Category, Dish, VariantGroup, Variant, Addon
 from app.models.promo_code import PromoCode, DiscountType
 from app.models.banner import Banner
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.services.password_hasher import password_hasher
 
 
 class DatabaseSeeder:
@@ -76,7 +74,7 @@ class DatabaseSeeder:
             existing_user = result.scalar_one_or_none()
             
             if existing_user is None:
-                hashed_password = pwd_context.hash(user_data["password"])
+                hashed_password = await password_hasher.hash(user_data["password"])
                 
                 user = User(
                     phone=user_data["phone"],
@@ -0,0 +1,100 @@
+from typing import Dict, List, Optional, Tuple
+
+# Геохеш: координаты в строке base32, каждый следующий символ делит ячейку на 32 части.
+# Крупная ячейка — префикс всех вложенных, поэтому ячейки внутри области находятся по индексу
+# одним диапазоном строк: geohash >= prefix AND geohash < next_prefix(prefix)
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+Bounds = Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+
+def encode(latitude: float, longitude: float, precision: int) -> str:
+    """Геохеш точки длиной precision символов."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True  # Биты чередуются: долгота, широта, долгота...
+    while len(chars) < precision:
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            value_range[0] = middle
+        else:
+            bits = bits * 2
+            value_range[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+
+def decode_bounds(geohash: str) -> Bounds:
+    """Границы ячейки геохеша."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        index = _DECODE[char]
+        for shift in range(4, -1, -1):
+            value_range = lon_range if even else lat_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if (index >> shift) & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def decode_center(geohash: str) -> Tuple[float, float]:
+    min_lat, min_lon, max_lat, max_lon = decode_bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def next_prefix(prefix: str) -> Optional[str]:
+    """
+    Первая строка после всех геохешей с префиксом prefix (None — после них ничего нет).
+    Только цифры и строчные буквы, поэтому порядок одинаков при любой сортировке строк в базе.
+    """
+    prefix = prefix.rstrip(BASE32[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[_DECODE[prefix[-1]] + 1]
+
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """Размер ячейки в градусах: (по широте, по долготе)."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def covering(bounds: Bounds, precision: int, limit: int = 1024) -> List[str]:
+    """
+    Ячейки заданной точности, покрывающие прямоугольник. Если ячеек больше limit,
+    возвращает первые limit + 1 (вызывающему коду этого достаточно, чтобы взять уровень крупнее).
+    """
+    min_lat, min_lon, max_lat, max_lon = bounds
+    lat_step, lon_step = cell_size(precision)
+    cells: Dict[str, None] = {}  # Упорядоченное множество
+    latitude = max(-90.0, min_lat)
+    while True:
+        longitude = max(-180.0, min_lon)
+        while True:
+            cells[encode(min(latitude, 90.0 - 1e-9), min(longitude, 180.0 - 1e-9), precision)] = None
+            if len(cells) > limit:
+                return list(cells)
+            if longitude >= max_lon:
+                break
+            longitude = min(longitude + lon_step, max_lon)
+        if latitude >= max_lat:
+            break
+        latitude = min(latitude + lat_step, max_lat)
+    return list(cells)
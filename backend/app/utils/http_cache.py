@@ -0,0 +1,51 @@
+from fastapi import Request, Response
+from typing import Optional
+import hashlib
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из частей версии содержимого."""
+    digest = hashlib.sha256("|".join(str(part) for part in parts).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверка заголовка If-None-Match (RFC 9110, слабое сравнение):
+    поддерживаются списки через запятую, "*" и префикс W/.
+    """
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_control(max_age: int, stale_while_revalidate: int, public: bool = True) -> str:
+    """Значение Cache-Control для кешируемых чтений."""
+    if not public:
+        # Для админских выборок: можно хранить, но перед использованием нужно перепроверить ETag
+        return "private, no-cache"
+    return f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+
+
+def conditional_response(request: Request, response: Response, etag: str, cache_control_value: str) -> Optional[Response]:
+    """
+    Условный GET: при совпадении If-None-Match возвращает готовый 304 без тела,
+    иначе проставляет ETag и Cache-Control в ответ эндпоинта и возвращает None.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control_value}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,96 @@
+"""
+Общая временная база для тестов, которые работают через приложение (main.app, app.core.database).
+
+Настройки и движки приложения создаются один раз — при первом импорте app.core.database, —
+поэтому адрес базы задается здесь, до импорта тестовых модулей. pytest загружает conftest.py
+первым; при запуске файла напрямую (python test_x.py) модуль импортирует conftest сам,
+до импорта приложения.
+
+В одном запуске pytest модули делят одну базу: перед каждым модулем схема пересоздается,
+а кеши процесса сбрасываются, поэтому данные одного модуля не видны следующему.
+
+Долгие замеры производительности помечены @pytest.mark.benchmark и по умолчанию пропускаются;
+запуск: RUN_BENCHMARKS=1 или pytest -m benchmark.
+"""
+
+import asyncio
+import atexit
+import os
+import sys
+import tempfile
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Приложение работает со своей временной базой
+APP_DB = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+APP_DB.close()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{APP_DB.name}"
+os.environ["DEBUG"] = "false"
+
+RUN_BENCHMARKS = os.environ.get("RUN_BENCHMARKS", "").lower() in ("1", "true", "yes")
+
+import pytest
+
+from app.core.database import engine, read_engine
+from app.models import Base
+from app.services.menu_cache import menu_cache
+from app.services.order_numbers import order_number_allocator
+from app.services.pricing import quote_cache
+from app.services.principal_cache import principal_cache
+from app.services.token_verifier import token_verifier
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: долгий замер производительности (RUN_BENCHMARKS=1 или -m benchmark)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if RUN_BENCHMARKS or "benchmark" in (config.getoption("markexpr") or ""):
+        return
+    skip = pytest.mark.skip(reason="замер производительности: RUN_BENCHMARKS=1 или pytest -m benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+@atexit.register
+def remove_app_database():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(APP_DB.name + suffix):
+            os.unlink(APP_DB.name + suffix)
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+
+async def recreate_schema():
+    """Пустые таблицы по текущим моделям (предыдущий модуль мог оставить данные или старую схему)."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await dispose_engines()
+
+
+def reset_process_caches():
+    """Кеши в памяти процесса держат данные прежней базы (пользователи, меню, номера заказов)."""
+    principal_cache.clear()
+    token_verifier.clear()
+    quote_cache.clear()
+    menu_cache.invalidate()
+    menu_cache.reset()
+    order_number_allocator.reset()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def app_database():
+    """Чистая база приложения и пустые кеши для каждого тестового модуля."""
+    asyncio.run(dispose_engines())
+    asyncio.run(recreate_schema())
+    reset_process_caches()
+    yield
+    reset_process_caches()
+    asyncio.run(dispose_engines())
@@ -6,9 +6,15 @@ import os
 from pathlib import Path
 
 from app.core.config import settings
-from app.core.database import engine
+from app.core.database import engine, read_engine, SQLITE_PRAGMAS
+from app.core.sqlite_profile import read_sqlite_pragmas, profile_mismatches
 from app.models import Base
 from app.api.routes import api_router
+from app.services.order_events import order_events
+from app.services.notifications import notification_dispatcher
+from app.services.password_hasher import password_hasher
+from app.services.push_campaigns import push_campaign_runner
+from app.services.token_verifier import token_verifier
 
 
 @asynccontextmanager
@@ -22,6 +28,22 @@ async def lifespan(app: FastAPI):
         await conn.run_sync(Base.metadata.create_all)
     
     print("📊 Database tables created successfully")
+
+    # Проверка, что профиль SQLite действительно применился
+    if SQLITE_PRAGMAS:
+        active = await read_sqlite_pragmas(engine, SQLITE_PRAGMAS)
+        for name, (expected, actual) in profile_mismatches(SQLITE_PRAGMAS, active).items():
+            print(f"⚠️ SQLite PRAGMA {name}: ожидалось {expected}, фактически {actual}")
+        print(f"⚙️ SQLite profile: journal_mode={active['journal_mode']}, synchronous={active['synchronous']}")
+
+    # Шина событий заказов (для бэкенда redis — подписка на общий канал)
+    await order_events.start()
+
+    # Фоновая отправка SMS и push из очереди notification_jobs
+    await notification_dispatcher.start()
+    # Push-рассылки (прерванные перезапуском продолжаются с сохраненного курсора)
+    await push_campaign_runner.start()
+
     print(f"🌐 API Documentation: http://localhost:8000/docs")
     print(f"🔗 Alternative docs: http://localhost:8000/redoc")
     
@@ -29,7 +51,13 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🛑 Shutting down APPETIT Backend...")
+    await order_events.stop()
+    await push_campaign_runner.stop()
+    await notification_dispatcher.stop()
+    password_hasher.shutdown()
     await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
 
 
 def create_application() -> FastAPI:
@@ -96,6 +124,10 @@ def create_application() -> FastAPI:
                 "name": "marketing",
                 "description": "Маркетинговые инструменты",
             },
+            {
+                "name": "events",
+                "description": "Изменения заказов в реальном времени (WebSocket/SSE)",
+            },
         ]
     )
     
@@ -137,11 +169,29 @@ def create_application() -> FastAPI:
     # Health check эндпоинт
     @app.get("/health", tags=["health"])
     async def health_check():
-        return {
+        health = {
             "status": "healthy",
             "database": "connected",
-            "version": "1.0.0"
+            "version": "1.0.0",
+            "password_hasher": password_hasher.stats(),
+            "token_verifier": token_verifier.stats(),
+            "notifications": notification_dispatcher.stats(),
+            "order_events": order_events.stats()
         }
+        if not order_events.healthy:
+            # Воркер жив, но его экраны кухни, курьеров и админки не получают события заказов
+            health["status"] = "degraded"
+        if SQLITE_PRAGMAS:
+            # Фактические PRAGMA подключения из пула — видно, если профиль не применился
+            active = await read_sqlite_pragmas(engine, SQLITE_PRAGMAS)
+            health["sqlite"] = {
+                "pragmas": active,
+                "mismatches": {
+                    name: {"expected": expected, "actual": actual}
+                    for name, (expected, actual) in profile_mismatches(SQLITE_PRAGMAS, active).items()
+                }
+            }
+        return health
     
     return app
 
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Скрипт для добавления координат адреса доставки в таблицу orders
+(delivery_latitude, delivery_longitude) для карты плотности заказов.
+Старые заказы с доставкой получают координаты текущего адреса из профиля клиента, если они есть;
+после миграции карту нужно пересчитать: python rebuild_metrics.py
+"""
+
+import sys
+import os
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text, select, update
+
+from app.core.database import sync_engine
+from app.models.order import Order, DeliveryType
+from app.models.user import User
+
+NEW_COLUMNS = ["delivery_latitude", "delivery_longitude"]
+
+
+def migrate_order_delivery_coordinates():
+    """Добавление колонок координат и заполнение их из профилей клиентов."""
+    try:
+        print("🗄️  Добавление координат доставки в таблицу orders...")
+
+        existing_columns = {column["name"] for column in inspect(sync_engine).get_columns("orders")}
+
+        with sync_engine.begin() as conn:
+            for name in NEW_COLUMNS:
+                if name in existing_columns:
+                    print(f"  ⏭️  Поле {name} уже существует")
+                    continue
+                column_type = Order.__table__.c[name].type.compile(dialect=sync_engine.dialect)
+                conn.execute(text(f"ALTER TABLE orders ADD COLUMN {name} {column_type}"))
+                print(f"  ✅ Добавлено поле: {name}")
+
+            profile = select(User.id).where(
+                User.id == Order.user_id,
+                User.address_latitude.is_not(None),
+                User.address_longitude.is_not(None)
+            )
+            result = conn.execute(
+                update(Order)
+                .where(
+                    Order.delivery_type == DeliveryType.DELIVERY,
+                    Order.delivery_latitude.is_(None),
+                    profile.exists()
+                )
+                .values(
+                    delivery_latitude=profile.with_only_columns(User.address_latitude).scalar_subquery(),
+                    delivery_longitude=profile.with_only_columns(User.address_longitude).scalar_subquery(),
+                    updated_at=Order.updated_at  # Заполнение координат не считается изменением заказа
+                )
+            )
+            print(f"  ✅ Координаты из профиля получили заказов: {result.rowcount}")
+
+        print("✅ Миграция координат доставки завершена!")
+
+    except Exception as e:
+        print(f"❌ Ошибка при миграции: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_order_delivery_coordinates()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Скрипт для создания индексов ленты заказов в существующей базе.
+create_all создает индексы только вместе с новыми таблицами, поэтому для уже
+существующих таблиц orders и order_items индексы нужно добавить отдельно.
+"""
+
+import sys
+import os
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import sync_engine
+from app.models.order import Order, OrderItem
+
+
+def migrate_order_indexes():
+    """Создание недостающих индексов таблиц orders и order_items."""
+    try:
+        print("🗄️  Создание индексов для таблиц orders и order_items...")
+
+        for table in (Order.__table__, OrderItem.__table__):
+            for index in sorted(table.indexes, key=lambda idx: idx.name):
+                index.create(sync_engine, checkfirst=True)
+                print(f"  ✅ {index.name}")
+
+        print("\n✅ Индексы успешно созданы!")
+
+    except Exception as e:
+        print(f"❌ Ошибка при создании индексов: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_order_indexes()
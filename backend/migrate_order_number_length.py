@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Скрипт для расширения колонки orders.order_number до ORDER_NUMBER_LENGTH символов.
+Номер заказа содержит префикс филиала (ORDER_NUMBER_PREFIX) и номер за день, которые
+не помещались в прежние 20 символов. SQLite длину VARCHAR не проверяет — для него
+изменений не требуется.
+"""
+
+import sys
+import os
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app.core.database import sync_engine
+from app.models.order import ORDER_NUMBER_LENGTH
+
+
+def migrate_order_number_length():
+    """Расширение колонки номера заказа."""
+    try:
+        print(f"🗄️  Расширение orders.order_number до {ORDER_NUMBER_LENGTH} символов...")
+
+        if sync_engine.dialect.name == "sqlite":
+            print("  ⏭️  SQLite не ограничивает длину VARCHAR")
+            return
+
+        column = next(column for column in inspect(sync_engine).get_columns("orders") if column["name"] == "order_number")
+        length = getattr(column["type"], "length", None)
+        if length is not None and length >= ORDER_NUMBER_LENGTH:
+            print(f"  ⏭️  Колонка уже VARCHAR({length})")
+            return
+
+        with sync_engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE orders ALTER COLUMN order_number TYPE VARCHAR({ORDER_NUMBER_LENGTH})"))
+        print("✅ Колонка order_number расширена!")
+
+    except Exception as e:
+        print(f"❌ Ошибка при миграции: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_order_number_length()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Скрипт для создания таблицы order_number_sequences в существующей базе.
+Таблица хранит последние зарезервированные номера заказов по областям (префикс и день).
+"""
+
+import sys
+import os
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import sync_engine
+from app.models.order import OrderNumberSequence
+
+
+def migrate_order_number_sequences():
+    """Создание таблицы счетчиков номеров заказов."""
+    try:
+        print("🗄️  Создание таблицы order_number_sequences...")
+
+        OrderNumberSequence.__table__.create(sync_engine, checkfirst=True)
+
+        print("✅ Таблица order_number_sequences готова!")
+
+    except Exception as e:
+        print(f"❌ Ошибка при создании таблицы: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_order_number_sequences()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Скрипт для добавления временных меток переходов статуса в таблицу orders:
+preparing_at, delivering_at и cancelled_at (confirmed_at, ready_at и delivered_at уже есть).
+Метки пишет сервис order_state тем же UPDATE, что меняет статус.
+"""
+
+import sys
+import os
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app.core.database import sync_engine
+from app.models.order import Order
+
+NEW_COLUMNS = ["preparing_at", "delivering_at", "cancelled_at"]
+
+
+def migrate_order_status_timestamps():
+    """Добавление недостающих колонок временных меток."""
+    try:
+        print("🗄️  Добавление временных меток переходов статуса в таблицу orders...")
+
+        existing_columns = {column["name"] for column in inspect(sync_engine).get_columns("orders")}
+
+        with sync_engine.begin() as conn:
+            for name in NEW_COLUMNS:
+                if name in existing_columns:
+                    print(f"  ⏭️  Поле {name} уже существует")
+                    continue
+                column_type = Order.__table__.c[name].type.compile(dialect=sync_engine.dialect)
+                conn.execute(text(f"ALTER TABLE orders ADD COLUMN {name} {column_type}"))
+                print(f"  ✅ Добавлено поле: {name}")
+
+        print("✅ Миграция временных меток завершена!")
+
+    except Exception as e:
+        print(f"❌ Ошибка при миграции: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_order_status_timestamps()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Скрипт для добавления FCM-токена устройства в таблицу users (fcm_token) для push-уведомлений.
+Таблица очереди уведомлений notification_jobs создается при запуске приложения.
+"""
+
+import sys
+import os
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+from app.core.database import sync_engine
+from app.models.user import User
+
+
+def migrate_user_fcm_token():
+    """Добавление колонки fcm_token и индекса по ней."""
+    try:
+        print("🗄️  Добавление FCM-токена в таблицу users...")
+
+        existing_columns = {column["name"] for column in inspect(sync_engine).get_columns("users")}
+        existing_indexes = {index["name"] for index in inspect(sync_engine).get_indexes("users")}
+
+        with sync_engine.begin() as conn:
+            if "fcm_token" in existing_columns:
+                print("  ⏭️  Поле fcm_token уже существует")
+            else:
+                column_type = User.__table__.c.fcm_token.type.compile(dialect=sync_engine.dialect)
+                conn.execute(text(f"ALTER TABLE users ADD COLUMN fcm_token {column_type}"))
+                print("  ✅ Добавлено поле: fcm_token")
+
+            if "ix_users_fcm_token" in existing_indexes:
+                print("  ⏭️  Индекс ix_users_fcm_token уже существует")
+            else:
+                conn.execute(text("CREATE INDEX ix_users_fcm_token ON users (fcm_token)"))
+                print("  ✅ Добавлен индекс: ix_users_fcm_token")
+
+        print("✅ Миграция FCM-токена завершена!")
+
+    except Exception as e:
+        print(f"❌ Ошибка при миграции: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    migrate_user_fcm_token()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Скрипт для пересчета сверток показателей (order_rollups, sales_cube, order_geo_bins, metric_counters) с нуля.
+Создает таблицы, если их еще нет, и удаляет прежнюю order_metrics_rollups. Запускать после миграции существующей базы,
+ручных правок заказов или пользователей в базе; во время пересчета запись заказов лучше остановить.
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+
+from app.core.database import engine, async_session_maker
+from app.models.metrics import OrderRollup, SalesCube, OrderGeoBin, MetricCounter
+from app.services.metrics import rebuild_metrics
+from app.services.sales_cube import rebuild_sales_cube
+from app.services.geo_bins import rebuild_geo_bins
+
+
+async def rebuild():
+    """Создание таблиц и пересчет сверток."""
+    try:
+        print("🗄️  Пересчет сверток показателей...")
+
+        async with engine.begin() as conn:
+            await conn.run_sync(OrderRollup.__table__.create, checkfirst=True)
+            await conn.run_sync(SalesCube.__table__.create, checkfirst=True)
+            await conn.run_sync(OrderGeoBin.__table__.create, checkfirst=True)
+            await conn.run_sync(MetricCounter.__table__.create, checkfirst=True)
+            # Свертки только по статусам заменены свертками по измерениям
+            await conn.execute(text("DROP TABLE IF EXISTS order_metrics_rollups"))
+
+        started = time.perf_counter()
+        async with async_session_maker() as db:
+            summary = await rebuild_metrics(db)
+            cube = await rebuild_sales_cube(db)
+            geo = await rebuild_geo_bins(db)
+            await db.commit()
+
+        print(f"  ✅ Заказов учтено: {summary['orders']}, строк сверток: {summary['rollup_rows']}")
+        print(f"  ✅ Куб продаж: {cube['order_dishes']} блюд в заказах, {cube['cube_rows']} строк")
+        print(f"  ✅ Карта заказов: {geo['orders']} заказов с координатами, {geo['bins']} ячеек")
+        print(f"  ✅ Активных клиентов: {summary['active_clients']}")
+        print(f"✅ Пересчет завершен за {time.perf_counter() - started:.1f} с")
+
+    except Exception as e:
+        print(f"❌ Ошибка при пересчете: {e}")
+        raise
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
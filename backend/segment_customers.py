@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Скрипт для пакетного расчета RFM-сегментов клиентов (customer_segments).
+Создает таблицу, если ее еще нет, и пересчитывает сегменты по всем доставленным заказам.
+Запускать по расписанию (например, раз в сутки ночью): давность считается на момент запуска.
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# Добавляем путь к приложению
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import engine, async_session_maker
+from app.models.customer_segment import CustomerSegment
+from app.services.customer_segments import SEGMENTS, compute_customer_segments
+
+
+async def segment():
+    """Создание таблицы и расчет сегментов."""
+    try:
+        print("🗄️  Расчет RFM-сегментов клиентов...")
+
+        async with engine.begin() as conn:
+            await conn.run_sync(CustomerSegment.__table__.create, checkfirst=True)
+
+        started = time.perf_counter()
+        async with async_session_maker() as db:
+            summary = await compute_customer_segments(db)
+            await db.commit()
+
+        print(f"  ✅ Заказов учтено: {summary['orders']}, клиентов: {summary['customers']}")
+        for key, count in summary["segments"].items():
+            print(f"     {SEGMENTS[key]}: {count}")
+        print(f"✅ Расчет завершен за {time.perf_counter() - started:.1f} с")
+
+    except Exception as e:
+        print(f"❌ Ошибка при расчете: {e}")
+        raise
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(segment())
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Тест ленты заказов администратора с keyset-пагинацией:
+- каждая запись попадает ровно в одну страницу, порядок (created_at, id) DESC;
+- фильтры работают и используют составные индексы (без сортировки во временном B-tree);
+- время ответа на глубокой странице не отличается от первой.
+
+Запуск: python test_admin_order_feed.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.models import Base
+from app.models.user import User, UserRole
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentMethod, PaymentStatus
+from app.api.endpoints.admin import get_all_orders
+
+ORDERS_COUNT = 20000
+PAGE_SIZE = 50
+
+admin = User(id=1, name="Admin", phone="+77000000001", role=UserRole.ADMIN, is_active=True, hashed_password="-")
+
+
+async def fetch_page(db: AsyncSession, cursor=None, limit=PAGE_SIZE, **filters):
+    """Вызов эндпоинта с явными значениями всех параметров."""
+    params = dict(
+        cursor=cursor, limit=limit, status=None, delivery_type=None, courier_id=None,
+        date_from=None, date_to=None, phone=None
+    )
+    params.update(filters)
+    return await get_all_orders(current_user=admin, db=db, **params)
+
+
+async def seed(session: AsyncSession):
+    """Заполнение базы заказами; часть заказов имеет одинаковое время создания."""
+    base_time = datetime(2024, 1, 1, 12, 0, 0)
+    statuses = list(OrderStatus)
+    orders = [
+        {
+            "id": i + 1,
+            "order_number": f"ORD-TEST-{i + 1:06d}",
+            "customer_name": f"Клиент {i}",
+            "customer_phone": f"+7701{i % 1000:07d}",
+            "delivery_type": DeliveryType.DELIVERY if i % 2 else DeliveryType.PICKUP,
+            "status": statuses[i % len(statuses)],
+            "payment_status": PaymentStatus.PENDING,
+            "payment_method": PaymentMethod.CASH,
+            "subtotal": Decimal("2000"),
+            "total_amount": Decimal("2000"),
+            "assigned_courier_id": 7 if i % 5 == 0 else None,
+            # По три заказа на одну и ту же минуту, чтобы проверить разрешение ничьих по id
+            "created_at": base_time + timedelta(minutes=i // 3),
+        }
+        for i in range(ORDERS_COUNT)
+    ]
+    await session.execute(insert(Order), orders)
+    await session.commit()
+
+
+async def run_tests():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_maker() as session:
+        await seed(session)
+
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    async with session_maker() as db:
+        print("🧪 1. Полный обход ленты курсором...")
+        seen_ids = []
+        cursor = None
+        pages = 0
+        while True:
+            page = await fetch_page(db, cursor=cursor, limit=500)
+            seen_ids.extend(order.id for order in page.orders)
+            pages += 1
+            if not page.has_more:
+                assert page.next_cursor is None
+                break
+            cursor = page.next_cursor
+        assert len(seen_ids) == ORDERS_COUNT, f"ожидалось {ORDERS_COUNT}, получено {len(seen_ids)}"
+        assert len(set(seen_ids)) == ORDERS_COUNT, "есть дубликаты между страницами"
+        assert seen_ids == sorted(seen_ids, reverse=True), "нарушен порядок (created_at, id) DESC"
+        print(f"✅ {pages} страниц, {len(seen_ids)} заказов, без дубликатов и пропусков")
+
+        print("\n🧪 2. Фильтры...")
+        page = await fetch_page(db, status=OrderStatus.DELIVERED, limit=100)
+        assert page.orders and all(order.status == OrderStatus.DELIVERED for order in page.orders)
+        page = await fetch_page(db, delivery_type=DeliveryType.PICKUP, limit=100)
+        assert page.orders and all(order.delivery_type == DeliveryType.PICKUP for order in page.orders)
+        page = await fetch_page(db, phone="+77010000012", limit=100)
+        assert page.orders and all(order.customer_phone.startswith("+77010000012") for order in page.orders)
+        page = await fetch_page(db, courier_id=7, limit=100)
+        assert len(page.orders) == 100
+        page = await fetch_page(
+            db,
+            date_from=datetime(2024, 1, 1, 12, 10),
+            date_to=datetime(2024, 1, 1, 12, 20),
+            limit=100
+        )
+        assert len(page.orders) == 30, len(page.orders)
+        print("✅ Фильтры по статусу, типу доставки, телефону, курьеру и датам работают")
+
+        print("\n🧪 3. Поврежденный курсор...")
+        try:
+            await fetch_page(db, cursor="not-a-cursor")
+            raise AssertionError("ожидалась ошибка 400")
+        except HTTPException as e:
+            assert e.status_code == 400
+        print("✅ Возвращается 400")
+
+        print("\n🧪 4. План запросов...")
+        some_cursor = (await fetch_page(db)).next_cursor
+        for filters in [{}, {"cursor": some_cursor}, {"status": OrderStatus.PENDING}, {"delivery_type": DeliveryType.DELIVERY}, {"courier_id": 7, "cursor": some_cursor}]:
+            statements.clear()
+            await fetch_page(db, **filters)
+            statement, parameters = statements[0]
+            connection = await db.connection()
+            plan_result = await connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            plan_rows = [row[-1] for row in plan_result.fetchall()]
+            assert not any("TEMP B-TREE" in row for row in plan_rows), f"{filters}: {plan_rows}"
+            print(f"  {', '.join(filters) or 'без фильтров':<25} {'; '.join(plan_rows)}")
+        print("✅ Сортировка выполняется по индексу")
+
+        print("\n🧪 5. Время ответа в начале и в глубине истории...")
+        first_page = await fetch_page(db)
+        cursor = None
+        for _ in range(ORDERS_COUNT // 500 - 1):
+            page = await fetch_page(db, cursor=cursor, limit=500)
+            cursor = page.next_cursor
+        deep_cursor = cursor
+
+        async def timed(cursor_value):
+            started = time.perf_counter()
+            for _ in range(20):
+                await fetch_page(db, cursor=cursor_value)
+            return (time.perf_counter() - started) / 20 * 1000
+
+        first_ms = await timed(None)
+        deep_ms = await timed(deep_cursor)
+        print(f"  первая страница: {first_ms:.2f} мс, страница после {ORDERS_COUNT - 500} заказов: {deep_ms:.2f} мс")
+        assert deep_ms < first_ms * 2, "время ответа растет с глубиной"
+        assert first_page.orders
+        print("✅ Время ответа не зависит от глубины прокрутки")
+
+    await engine.dispose()
+
+
+def test_admin_order_feed():
+    asyncio.run(run_tests())
+
+
+if __name__ == "__main__":
+    test_admin_order_feed()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Тест аналитики из сверток order_rollups (/analytics/dashboard, /analytics/orders, /analytics/utm):
+- заказ с UTM-метками и смена статуса сразу видны в отчетах;
+- итоги, сравнение с предыдущим периодом и ряды по дням, дням недели и часам суток
+  совпадают с агрегатами, посчитанными напрямую по orders;
+- отчет за год отвечает за миллисекунды и не зависит от числа заказов;
+- проверка параметров и доступа.
+
+Запуск: python test_analytics.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, insert, func
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.models.user import User, UserRole
+from app.services.analytics import resolve_range, dashboard_report
+from app.services.auth import AuthService
+from app.services.menu_cache import menu_cache
+from app.services.metrics import rebuild_metrics
+
+API = "/api/v1"
+HISTORY_ORDERS = 40_000
+TODAY = date.today()
+YEAR_START = TODAY - timedelta(days=365)
+STATUSES = [OrderStatus.DELIVERED] * 6 + [OrderStatus.CANCELLED, OrderStatus.PENDING, OrderStatus.PREPARING]
+UTM_SOURCES = ["instagram", "google", None, "2gis"]
+UTM_MEDIUMS = ["social", "cpc", None]
+ADMIN = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '1'})}"}
+CLIENT = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '3'})}"}
+
+
+def history_order(n: int) -> dict:
+    amount = Decimal(1500 + n % 4000)
+    return {
+        "order_number": f"ORD-AN-{n:06d}",
+        "customer_name": "Клиент",
+        "customer_phone": "+77010000000",
+        "delivery_type": DeliveryType.DELIVERY if n % 3 else DeliveryType.PICKUP,
+        "payment_method": PaymentMethod.CARD if n % 2 else PaymentMethod.CASH,
+        "status": STATUSES[n % len(STATUSES)],
+        "payment_status": PaymentStatus.PAID,
+        "subtotal": amount,
+        "total_amount": amount,
+        "utm_source": UTM_SOURCES[n % 4],
+        "utm_medium": UTM_MEDIUMS[n % 3],
+        "utm_campaign": f"promo-{n % 5}" if n % 7 else None,
+        # Равномерно за год, последний заказ — вчера
+        "created_at": datetime.combine(YEAR_START, datetime.min.time()) + timedelta(minutes=n * 365 * 24 * 60 // HISTORY_ORDERS),
+    }
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": 1, "name": "Админ", "phone": "+77000000001", "role": UserRole.ADMIN, "hashed_password": "-"},
+            {"id": 3, "name": "Клиент", "phone": "+77000000003", "role": UserRole.CLIENT, "hashed_password": "-"},
+        ])
+        await conn.execute(insert(Category), [{"id": 1, "name": "Бургеры"}])
+        await conn.execute(insert(Dish), [{"id": 1, "name": "Бургер", "price": Decimal("2500"), "category_id": 1}])
+        for offset in range(0, HISTORY_ORDERS, 10_000):
+            await conn.execute(insert(Order), [history_order(n) for n in range(offset, offset + 10_000)])
+
+    # История записана напрямую, как в базе до появления сверток
+    async with async_session_maker() as db:
+        await rebuild_metrics(db)
+        await db.commit()
+    await engine.dispose()
+
+
+def empty_measures():
+    return {"orders_count": 0, "total_amount": 0.0, "delivered_count": 0, "revenue": 0.0, "cancelled_count": 0}
+
+
+def add(measures, order):
+    measures["orders_count"] += 1
+    measures["total_amount"] += float(order.total_amount)
+    if order.status == OrderStatus.DELIVERED:
+        measures["delivered_count"] += 1
+        measures["revenue"] += float(order.total_amount)
+    if order.status == OrderStatus.CANCELLED:
+        measures["cancelled_count"] += 1
+
+
+async def direct_aggregates(date_from: date, date_to: date, dimension: str, bucket=None):
+    """Показатели по измерению (и корзине), посчитанные напрямую по строкам orders."""
+    async with async_session_maker() as db:
+        orders = (await db.execute(
+            select(Order).where(
+                Order.created_at >= datetime.combine(date_from, datetime.min.time()),
+                Order.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+            )
+        )).scalars().all()
+    await engine.dispose()
+
+    result = defaultdict(empty_measures)
+    for order in orders:
+        value = None if dimension == "all" else getattr(order, dimension)
+        value = value.value if hasattr(value, "value") else value
+        add(result[(bucket(order.created_at), value) if bucket else value], order)
+    return result
+
+
+def assert_measures(actual, expected, context):
+    for name, value in expected.items():
+        assert abs(actual[name] - value) < 0.01, (context, name, actual, expected)
+
+
+def check_incremental(client):
+    print("🧪 1. Новый заказ с UTM-метками и смена статуса попадают в отчеты...")
+    params = {"date_from": TODAY.isoformat(), "date_to": TODAY.isoformat()}
+    response = client.post(f"{API}/orders/", json={
+        "items": [{"dish_id": 1, "quantity": 2}],
+        "delivery_type": "pickup",
+        "payment_method": "card",
+        "name": "Гость",
+        "phone": "+77000000099",
+        "pickup_address": "ул. Абая 1",
+        "utm_source": "tiktok",
+        "utm_medium": "video",
+        "utm_campaign": "launch"
+    })
+    assert response.status_code == 200, response.text
+    order_id = response.json()["id"]
+
+    report = client.get(f"{API}/analytics/utm", params=params, headers=ADMIN).json()
+    # Источники вчерашних заказов остаются в списке с нулями за сегодня и падением к предыдущему дню
+    assert report["items"][0]["value"] == "tiktok" and report["items"][0]["share_percent"] == 100.0, report
+    assert report["items"][0]["current"]["orders_count"] == 1
+    assert all(item["change_percent"]["orders_count"] == -100.0 for item in report["items"][1:])
+
+    for status in ("confirmed", "preparing", "ready", "delivered"):
+        assert client.patch(f"{API}/admin/orders/{order_id}/status", json={"status": status}, headers=ADMIN).status_code == 200
+    summary = client.get(f"{API}/analytics/dashboard", params=params, headers=ADMIN).json()["summary"]["current"]
+    assert summary["orders_count"] == 1 and summary["delivered_count"] == 1 and summary["revenue"] == 5000.0, summary
+    by_campaign = client.get(f"{API}/analytics/utm", params={**params, "dimension": "utm_campaign"}, headers=ADMIN).json()
+    assert by_campaign["items"][0]["value"] == "launch" and by_campaign["items"][0]["current"]["revenue"] == 5000.0
+    print("✅ Заказ учтен по UTM-метке, выручка появилась после доставки")
+
+
+def check_against_orders(client):
+    print("\n🧪 2. Отчеты совпадают с агрегатами по orders...")
+    date_to = TODAY - timedelta(days=1)
+    date_from = date_to - timedelta(days=89)
+    params = {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+
+    report = client.get(f"{API}/analytics/dashboard", params=params, headers=ADMIN).json()
+    assert report["previous_period"] == {
+        "date_from": (date_from - timedelta(days=90)).isoformat(), "date_to": (date_from - timedelta(days=1)).isoformat()
+    }
+    current = asyncio.run(direct_aggregates(date_from, date_to, "all"))[None]
+    previous = asyncio.run(direct_aggregates(date_from - timedelta(days=90), date_from - timedelta(days=1), "all"))[None]
+    assert_measures(report["summary"]["current"], current, "summary")
+    assert_measures(report["summary"]["previous"], previous, "previous")
+    expected_change = round((current["revenue"] - previous["revenue"]) * 100 / previous["revenue"], 1)
+    assert report["summary"]["change_percent"]["revenue"] == expected_change
+    for value, measures in asyncio.run(direct_aggregates(date_from, date_to, "status")).items():
+        assert_measures(report["by_status"][value]["current"], measures, value)
+    assert len(report["daily"]) == 90
+
+    weekday = client.get(f"{API}/analytics/orders", params={**params, "granularity": "weekday", "dimension": "delivery_type"}, headers=ADMIN).json()
+    expected = asyncio.run(direct_aggregates(date_from, date_to, "delivery_type", bucket=lambda at: at.weekday()))
+    assert len(weekday["series"]) == len(expected) == 14
+    for point in weekday["series"]:
+        assert_measures(point, expected[(point["bucket"], point["value"])], point)
+
+    hourly = client.get(f"{API}/analytics/orders", params={**params, "granularity": "hour_of_day"}, headers=ADMIN).json()
+    expected = asyncio.run(direct_aggregates(date_from, date_to, "all", bucket=lambda at: at.hour))
+    assert [point["bucket"] for point in hourly["series"]] == list(range(24))
+    for point in hourly["series"]:
+        assert_measures(point, expected[(point["bucket"], None)], point)
+
+    utm = client.get(f"{API}/analytics/utm", params={**params, "dimension": "utm_medium"}, headers=ADMIN).json()
+    expected = asyncio.run(direct_aggregates(date_from, date_to, "utm_medium"))
+    assert {item["value"] for item in utm["items"]} == set(expected)
+    for item in utm["items"]:
+        assert_measures(item["current"], expected[item["value"]], item["value"])
+    assert abs(sum(item["share_percent"] for item in utm["items"]) - 100) < 0.2
+    print("✅ Итоги, предыдущий период, ряды по дням недели и часам суток и UTM совпадают")
+
+
+async def check_speed():
+    print(f"\n🧪 4. Отчет за год при {HISTORY_ORDERS} заказах...")
+    report_range = resolve_range(YEAR_START, TODAY)
+    async with async_session_maker() as db:
+        await dashboard_report(db, report_range)  # прогрев
+        started = time.perf_counter()
+        for _ in range(5):
+            report = await dashboard_report(db, report_range)
+        rollup_ms = (time.perf_counter() - started) * 1000 / 5
+
+        started = time.perf_counter()
+        for _ in range(5):
+            await db.execute(
+                select(Order.status, Order.delivery_type, Order.payment_method, func.count(Order.id), func.sum(Order.total_amount))
+                .where(Order.created_at >= report_range.previous().start, Order.created_at < report_range.end)
+                .group_by(Order.status, Order.delivery_type, Order.payment_method)
+            )
+        scan_ms = (time.perf_counter() - started) * 1000 / 5
+    await engine.dispose()
+
+    assert report["summary"]["current"]["orders_count"] == HISTORY_ORDERS + 1
+    assert rollup_ms < scan_ms, (rollup_ms, scan_ms)
+    print(f"✅ Дашборд за год из сверток: {rollup_ms:.1f} мс (одна группировка по orders: {scan_ms:.1f} мс)")
+
+
+def check_analytics():
+    with TestClient(app) as client:
+        check_incremental(client)
+        check_against_orders(client)
+
+        print("\n🧪 3. Проверка параметров и доступа...")
+        assert client.get(f"{API}/analytics/dashboard", params={"date_from": "2025-02-01", "date_to": "2025-01-01"}, headers=ADMIN).status_code == 400
+        assert client.get(f"{API}/analytics/orders", params={"date_from": "2020-01-01"}, headers=ADMIN).status_code == 400
+        assert client.get(f"{API}/analytics/orders", params={"granularity": "hour", "date_from": (TODAY - timedelta(days=40)).isoformat()}, headers=ADMIN).status_code == 400
+        assert client.get(f"{API}/analytics/orders", params={"granularity": "hour", "date_from": TODAY.isoformat()}, headers=ADMIN).status_code == 200
+        assert client.get(f"{API}/analytics/orders", params={"granularity": "minute"}, headers=ADMIN).status_code == 422
+        assert client.get(f"{API}/analytics/utm", params={"dimension": "status"}, headers=ADMIN).status_code == 422
+        assert client.get(f"{API}/analytics/dashboard", headers=CLIENT).status_code == 403
+        print("✅ Неверный период — 400, неизвестная гранулярность — 422, клиент — 403")
+
+
+def test_analytics():
+    asyncio.run(seed())
+    menu_cache.reset()
+    check_analytics()
+    asyncio.run(check_speed())
+
+
+if __name__ == "__main__":
+    test_analytics()
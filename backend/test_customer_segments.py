@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Тест пакетной RFM-сегментации (app/services/customer_segments.py):
+- квинтильные оценки и сетка сегментов;
+- накопители по клиентам совпадают с GROUP BY по доставленным заказам при чтении мелкими порциями;
+- имя и аккаунт берутся из последнего заказа, отмененные заказы не учитываются;
+- /analytics/rfm отдает сводку и клиентов сегмента;
+- пиковая память задачи не растет с числом заказов (250 тыс. и 1 млн заказов; замер идет
+  несколько минут и запускается отдельно).
+
+Запуск: python test_customer_segments.py  (или через pytest)
+Замер памяти: RUN_BENCHMARKS=1 python test_customer_segments.py  (или pytest -m benchmark)
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, insert, delete, func
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.customer_segment import CustomerSegment
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.customer_segments import (
+    RFMAccumulator, SEGMENT_KEYS, SEGMENT_GRID, quintile_scores, compute_customer_segments
+)
+
+API = "/api/v1"
+NOW = datetime(2025, 6, 1, 12, 0)
+CUSTOMERS = 100
+BENCHMARK_CUSTOMERS = 50_000
+ADMIN = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '1'})}"}
+
+
+def make_order(n: int, phone: str, created_at: datetime, amount, status=OrderStatus.DELIVERED, name="Клиент", user_id=None) -> dict:
+    return {
+        "order_number": f"ORD-RFM-{n:07d}",
+        "user_id": user_id,
+        "customer_name": name,
+        "customer_phone": phone,
+        "delivery_type": DeliveryType.DELIVERY,
+        "payment_method": PaymentMethod.CARD,
+        "status": status,
+        "payment_status": PaymentStatus.PAID,
+        "subtotal": Decimal(amount),
+        "total_amount": Decimal(amount),
+        "created_at": created_at,
+    }
+
+
+def check_scoring():
+    print("🧪 1. Квинтильные оценки и сетка сегментов...")
+    values = np.arange(1, 11, dtype=np.float64)
+    assert quintile_scores(values).tolist() == [1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+    assert quintile_scores(values, higher_is_better=False).tolist() == [5, 5, 4, 4, 3, 3, 2, 2, 1, 1]
+    # Большинство с одним заказом: совпадающие значения получают одну, самую низкую оценку
+    assert quintile_scores(np.array([1, 1, 1, 1, 1, 1, 1, 2, 3, 9])).tolist() == [1] * 7 + [4, 5, 5]
+    assert SEGMENT_KEYS[SEGMENT_GRID[4, 4]] == "champions" and SEGMENT_KEYS[SEGMENT_GRID[0, 0]] == "hibernating"
+    assert SEGMENT_KEYS[SEGMENT_GRID[4, 0]] == "new_customers" and SEGMENT_KEYS[SEGMENT_GRID[0, 4]] == "cant_lose"
+
+    accumulator = RFMAccumulator(capacity=2)
+    stamp = datetime(2025, 1, 1)
+    accumulator.add_chunk([("+1", None, "А", stamp, Decimal("10")), ("+2", 5, "Б", stamp, Decimal("20"))])
+    accumulator.add_chunk([("+3", None, "В", stamp, Decimal("5")), ("+1", 7, "А2", stamp + timedelta(days=1), Decimal("1.5"))])
+    assert len(accumulator) == 3 and accumulator.orders == 4
+    assert accumulator.frequency[:3].tolist() == [2, 1, 1]
+    assert accumulator.monetary[:3].tolist() == [11.5, 20.0, 5.0]
+    assert accumulator.user_ids[:3].tolist() == [7, 5, -1] and accumulator.names[0] == "А2"
+    print("✅ Оценки 1..5, одинаковые значения — одна оценка, накопители растут по мере появления клиентов")
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": 1, "name": "Админ", "phone": "+77000000001", "role": UserRole.ADMIN, "hashed_password": "-"},
+            {"id": 2, "name": "Постоянный", "phone": "+77000000002", "role": UserRole.CLIENT, "hashed_password": "-"},
+        ])
+        orders = []
+        for c in range(CUSTOMERS):
+            # Клиент c: c % 7 + 1 заказов, последний — c дней назад
+            for k in range(c % 7 + 1):
+                orders.append(make_order(len(orders), f"+7701{c:07d}", NOW - timedelta(days=c + 30 * k), 1000 + 37 * c + k))
+        # Лучший клиент: заказы каждую неделю, последний под аккаунтом и с новым именем
+        for k in range(30):
+            orders.append(make_order(len(orders), "+77000000002", NOW - timedelta(days=7 * k + 1), 9000, name="Гость"))
+        orders[-30].update(user_id=2, customer_name="Постоянный")
+        # Давний разовый гость и отмененные заказы, которые не учитываются
+        orders.append(make_order(len(orders), "+77000000003", NOW - timedelta(days=400), 800))
+        orders += [make_order(len(orders) + k, "+77000000003", NOW, 99999, status=OrderStatus.CANCELLED) for k in range(3)]
+        orders += [make_order(len(orders) + k, "+77000000004", NOW, 5000, status=OrderStatus.PENDING) for k in range(2)]
+        await conn.execute(insert(Order), orders)
+    await engine.dispose()
+
+
+async def check_against_group_by():
+    print("\n🧪 2. Расчет порциями совпадает с GROUP BY по заказам...")
+    async with async_session_maker() as db:
+        summary = await compute_customer_segments(db, as_of=NOW, chunk_size=37)
+        await db.commit()
+
+        expected = {
+            row.customer_phone: row
+            for row in (await db.execute(
+                select(
+                    Order.customer_phone,
+                    func.count(Order.id).label("frequency"),
+                    func.sum(Order.total_amount).label("monetary"),
+                    func.max(Order.created_at).label("last_order_at"),
+                ).where(Order.status == OrderStatus.DELIVERED).group_by(Order.customer_phone)
+            )).all()
+        }
+        segments = {row.customer_phone: row for row in (await db.execute(select(CustomerSegment))).scalars()}
+    await engine.dispose()
+
+    assert summary["customers"] == len(expected) == CUSTOMERS + 2, summary
+    assert summary["orders"] == sum(row.frequency for row in expected.values())
+    assert set(segments) == set(expected)
+    for phone, row in expected.items():
+        actual = segments[phone]
+        assert actual.frequency == row.frequency and actual.monetary == row.monetary, (phone, actual, row)
+        assert actual.last_order_at.replace(tzinfo=None) == row.last_order_at.replace(tzinfo=None)
+        assert abs(actual.recency_days - (NOW - row.last_order_at).total_seconds() / 86400) < 0.01
+
+    best, lapsed = segments["+77000000002"], segments["+77000000003"]
+    assert (best.segment, best.user_id, best.customer_name) == ("champions", 2, "Постоянный"), best
+    assert (best.r_score, best.f_score, best.m_score) == (5, 5, 5)
+    assert lapsed.segment == "hibernating" and lapsed.user_id is None and lapsed.monetary == Decimal("800")
+    assert sum(summary["segments"].values()) == summary["customers"]
+    print(f"✅ {summary['customers']} клиентов по {summary['orders']} заказам, порции по 37 строк")
+    print("✅ Постоянный клиент — champions с аккаунтом из последнего заказа, давний гость — hibernating")
+
+
+def check_endpoint():
+    print("\n🧪 3. /analytics/rfm...")
+    with TestClient(app) as client:
+        report = client.get(f"{API}/analytics/rfm", headers=ADMIN).json()
+        assert report["customers_total"] == CUSTOMERS + 2
+        assert sum(item["customers"] for item in report["segments"]) == report["customers_total"]
+        assert [item["segment"] for item in report["segments"]] == SEGMENT_KEYS
+        assert report["customers"][0]["phone"] == "+77000000002" and report["customers"][0]["rfm"] == "555"
+        assert report["computed_at"].startswith("2025-06-01")
+
+        hibernating = client.get(f"{API}/analytics/rfm", params={"segment": "hibernating", "limit": 100}, headers=ADMIN).json()
+        assert hibernating["customers"] and all(c["segment"] == "hibernating" for c in hibernating["customers"])
+        count = next(item["customers"] for item in report["segments"] if item["segment"] == "hibernating")
+        assert len(hibernating["customers"]) == count
+        assert client.get(f"{API}/analytics/rfm", params={"segment": "vip"}, headers=ADMIN).status_code == 400
+    print("✅ Сводка по 10 сегментам, клиенты по убыванию суммы, фильтр по сегменту")
+
+
+async def insert_history(start: int, stop: int):
+    async with engine.begin() as conn:
+        for offset in range(start, stop, 50_000):
+            await conn.execute(insert(Order), [
+                make_order(
+                    10_000_000 + n, f"+7702{n % BENCHMARK_CUSTOMERS:07d}",
+                    NOW - timedelta(minutes=(n * 7919) % (365 * 24 * 60)), 1000 + n % 9000
+                )
+                for n in range(offset, min(offset + 50_000, stop))
+            ])
+    await engine.dispose()
+
+
+async def measure_job():
+    tracemalloc.start()
+    started = time.perf_counter()
+    async with async_session_maker() as db:
+        summary = await compute_customer_segments(db, as_of=NOW)
+        await db.commit()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await engine.dispose()
+    return summary, elapsed, peak / 1024 / 1024
+
+
+async def clear_orders():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(delete(CustomerSegment))
+        await conn.execute(delete(Order))
+    await engine.dispose()
+
+
+def check_bounded_memory():
+    print("\n🧪 4. Память задачи при росте числа заказов...")
+    asyncio.run(clear_orders())
+    results = []
+    for total in (250_000, 1_000_000):
+        asyncio.run(insert_history(results[-1][0] if results else 0, total))
+        summary, elapsed, peak_mb = asyncio.run(measure_job())
+        assert summary["customers"] == BENCHMARK_CUSTOMERS
+        results.append((total, peak_mb))
+        print(f"✅ {summary['orders']} заказов, {summary['customers']} клиентов: {elapsed:.1f} с, пик памяти {peak_mb:.0f} МБ")
+    # Заказов вчетверо больше, клиентов столько же — память почти не меняется
+    assert results[1][1] < results[0][1] * 1.3, results
+
+
+def test_customer_segments():
+    check_scoring()
+    asyncio.run(seed())
+    asyncio.run(check_against_group_by())
+    check_endpoint()
+
+
+@pytest.mark.benchmark
+def test_customer_segments_memory():
+    check_bounded_memory()
+
+
+if __name__ == "__main__":
+    test_customer_segments()
+    if conftest.RUN_BENCHMARKS:
+        test_customer_segments_memory()
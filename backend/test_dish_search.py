@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Тест поискового индекса блюд:
+- нормализация регистра, ё/е и казахских букв;
+- поиск по префиксу, с опечаткой и ранжирование (название важнее описания);
+- индекс синхронизирован с созданием, изменением и удалением блюд;
+- поиск по каталогу из 10 000 блюд занимает меньше миллисекунды.
+
+Запуск: python test_dish_search.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from main import app
+from app.core.database import async_session_maker, get_db_session, get_read_db_session
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.services.dish_search import DishSearchIndex, normalize_text
+from app.services.menu_cache import menu_cache
+
+CATALOG_SIZE = 10000
+
+DishRow = namedtuple("DishRow", "id name description")
+
+NAME_WORDS = [
+    "Пицца", "Бургер", "Шаурма", "Лагман", "Манты", "Бешбармак", "Плов", "Самса", "Кесме", "Баурсаки",
+    "Қуырдақ", "Сорпа", "Салат", "Суп", "Ролл", "Стейк", "Паста", "Лимонад", "Айран", "Қымыз",
+]
+DESCRIPTION_WORDS = [
+    "острый", "сырный", "говядина", "курица", "баранина", "грибы", "томаты", "зелень", "домашний",
+    "ёжик", "соус", "картофель", "лук", "перец", "сметана", "тесто", "классический", "фирменный",
+]
+
+
+def build_catalog(size: int):
+    rnd = random.Random(42)
+    return [
+        DishRow(
+            id=i,
+            name=f"{rnd.choice(NAME_WORDS)} {rnd.choice(DESCRIPTION_WORDS)} №{i}",
+            description=" ".join(rnd.sample(DESCRIPTION_WORDS, 5))
+        )
+        for i in range(1, size + 1)
+    ]
+
+
+def test_matching_and_ranking():
+    print("🧪 1. Нормализация, префиксы, опечатки и ранжирование...")
+    assert normalize_text("Ёжик ҚЫМЫЗ Әже") == "ежик кымыз аже"
+
+    index = DishSearchIndex([
+        DishRow(1, "Сырный суп", "Крем-суп из трех сыров"),
+        DishRow(2, "Бургер", "Котлета, сыр чеддер, соус"),
+        DishRow(3, "Қымыз", "Кобылье молоко"),
+        DishRow(4, "Ёжики в сметане", "Тефтели из говядины"),
+        DishRow(5, "Сыр косичка", None),
+    ])
+
+    # Точное слово в названии, затем префикс в названии, затем описание
+    assert index.search("СЫР") == [5, 1, 2], "ранжирование по полю и типу совпадения"
+    assert index.search("сырн") == [1], "поиск по префиксу"
+    assert index.search("кымыз") == [3] and index.search("қымыз") == [3], "казахские буквы"
+    assert index.search("ежики") == [4], "ё и е"
+    assert index.search("бургре") == [2], "перестановка букв"
+    assert index.search("бургерр") == [2], "лишняя буква"
+    assert index.search("бурер") == [2], "пропущенная буква"
+    assert index.search("сметане ежики") == [4], "несколько слов"
+    assert index.search("сырный бургер") == [], "все слова запроса должны совпасть"
+    assert index.search("  ,.  ") == []
+    print("✅ Все виды совпадений работают")
+
+
+def test_search_speed():
+    print(f"\n🧪 2. Скорость поиска на {CATALOG_SIZE} блюдах...")
+    catalog = build_catalog(CATALOG_SIZE)
+
+    started = time.perf_counter()
+    index = DishSearchIndex(catalog)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"  построение индекса: {build_ms:.1f} мс")
+
+    queries = ["пицца", "пиц", "бешбармак", "бешбармк", "кымыз", "острый лагман", "сырный", "ёжик", "№9999", "несуществующее"]
+    for query in queries:
+        index.search(query)
+
+    rounds = 200
+    timings = {}
+    for query in queries:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            results = index.search(query)
+        timings[query] = (time.perf_counter() - started) / rounds * 1000
+        print(f"  {query:<16} найдено: {len(results):>5}  {timings[query]:.3f} мс")
+
+    # Сверка со сканированием по подстроке: индекс находит все блюда, где слово входит в название
+    expected = {dish.id for dish in catalog if "бешбармак" in normalize_text(dish.name)}
+    assert expected and expected <= set(index.search("бешбармак"))
+
+    slowest = max(timings, key=timings.get)
+    assert timings[slowest] < 1.0, f"{slowest}: поиск медленнее 1 мс ({timings[slowest]:.3f} мс)"
+    print("✅ Поиск быстрее миллисекунды")
+
+
+async def run_sync_tests():
+    print("\n🧪 3. Индекс синхронизирован с изменениями меню...")
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        session.add(Category(id=1, name="Горячее"))
+        session.add(Category(id=2, name="Напитки"))
+        session.add(Dish(id=1, name="Плов узбекский", description="Баранина, рис", price=Decimal("2500"), category_id=1))
+        session.add(Dish(id=2, name="Айран", description="Домашний", price=Decimal("500"), category_id=2))
+        await session.commit()
+
+    async def override_db_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = override_db_session
+    app.dependency_overrides[get_read_db_session] = override_db_session
+    menu_cache.enabled = True
+    menu_cache.reset()
+    menu_cache.session_maker = session_maker  # Снимок меню собирается из тестовой базы
+    menu_cache.invalidate()
+
+    async def search(client, query, **params):
+        response = await client.get("/api/v1/menu/dishes", params={"search": query, **params})
+        assert response.status_code == 200
+        return [dish["id"] for dish in response.json()]
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            assert await search(client, "пло") == [1]
+            assert await search(client, "плов", category_id=2) == []
+
+            response = await client.post("/api/v1/menu/dishes", json={"name": "Қуырдақ", "description": "Баранина", "price": "3000", "category_id": 1})
+            assert response.status_code == 201
+            new_id = response.json()["id"]
+            assert await search(client, "куырдак") == [new_id]
+            assert await search(client, "баранина") == [1, new_id]
+
+            response = await client.put(f"/api/v1/menu/dishes/{new_id}", json={"name": "Бешбармак"})
+            assert response.status_code == 200
+            assert await search(client, "куырдак") == []
+            assert await search(client, "бешбар") == [new_id]
+
+            response = await client.patch("/api/v1/menu/dishes/1/toggle-availability")
+            assert response.status_code == 200
+            assert await search(client, "плов") == []
+            assert await search(client, "плов", show_all="true") == [1]
+
+            response = await client.delete(f"/api/v1/menu/dishes/{new_id}")
+            assert response.status_code == 204
+            assert await search(client, "бешбармак") == []
+        print("✅ Создание, изменение и удаление блюд сразу видны в поиске")
+    finally:
+        app.dependency_overrides.clear()
+        menu_cache.session_maker = async_session_maker
+        menu_cache.reset()
+        await engine.dispose()
+        os.unlink(db_file.name)
+
+
+def test_index_sync():
+    asyncio.run(run_sync_tests())
+
+
+if __name__ == "__main__":
+    test_matching_and_ranking()
+    test_search_speed()
+    test_index_sync()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Тест карты плотности заказов (order_geo_bins) и тайлов /analytics/geo/tiles/{zoom}/{x}/{y}:
+- геохеш: известные значения, префиксы, покрытие прямоугольника;
+- доставка заказа с координатами добавляет его во все уровни ячеек, возврат — вычитает,
+  самовывоз и заказы без координат не учитываются; лишних запросов переход не делает;
+- пересчет с нуля совпадает с инкрементальными ячейками;
+- тайл совпадает с прямым подсчетом заказов в его границах, фильтр по месяцам;
+- на максимальном приближении в каждом тайле есть центры ячеек, заказы в нем не теряются;
+- время тайла не растет с числом заказов.
+
+Запуск: python test_geo_bins.py  (или через pytest)
+"""
+
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, insert, func
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.metrics import OrderGeoBin
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.geo_bins import GEO_PRECISIONS, ALL_TIME, MAX_ZOOM, geo_tile, rebuild_geo_bins, tile_bounds
+from app.services.menu_cache import menu_cache
+from app.utils.geohash import encode, decode_bounds, decode_center, next_prefix, covering
+
+API = "/api/v1"
+ALMATY = (43.2389, 76.8897)
+# Тайлы z=12 и z=9 с центром Алматы
+TILE = (12, 2922, 1501)
+CITY_TILE = (9, 365, 187)
+ADMIN = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '1'})}"}
+KITCHEN = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '2'})}"}
+CLIENT = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '3'})}"}
+
+
+def check_geohash():
+    print("🧪 1. Геохеш...")
+    assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert encode(*ALMATY, 7).startswith(encode(*ALMATY, 4))
+    min_lat, min_lon, max_lat, max_lon = decode_bounds(encode(*ALMATY, 7))
+    assert min_lat <= ALMATY[0] < max_lat and min_lon <= ALMATY[1] < max_lon
+    latitude, longitude = decode_center(encode(*ALMATY, 7))
+    assert abs(latitude - ALMATY[0]) < 0.001 and abs(longitude - ALMATY[1]) < 0.001
+
+    bounds = (43.2, 76.8, 43.3, 77.0)
+    cells = covering(bounds, 5)
+    rng = random.Random(1)
+    for _ in range(1000):
+        point = (rng.uniform(43.2, 43.3), rng.uniform(76.8, 77.0))
+        assert encode(*point, 5) in cells
+    assert len(covering(bounds, 7, limit=10)) == 11
+    assert next_prefix("txwt") == "txwu" and next_prefix("txz") == "ty" and next_prefix("zz") is None
+    assert "txwt" < encode(*ALMATY, 7) < next_prefix("txwt")
+    print(f"✅ Известные значения, вложенность префиксов, покрытие {len(cells)} ячейками")
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": 1, "name": "Админ", "phone": "+77000000001", "role": UserRole.ADMIN, "hashed_password": "-"},
+            {"id": 2, "name": "Кухня", "phone": "+77000000002", "role": UserRole.KITCHEN, "hashed_password": "-"},
+        ])
+        await conn.execute(insert(User).values(
+            id=3, name="Клиент", phone="+77000000003", role=UserRole.CLIENT, hashed_password="-",
+            address_latitude=43.22, address_longitude=76.87
+        ))
+        await conn.execute(insert(Category), [{"id": 1, "name": "Бургеры"}])
+        await conn.execute(insert(Dish), [{"id": 1, "name": "Бургер", "price": Decimal("3000"), "category_id": 1}])
+    await engine.dispose()
+
+
+async def bins_snapshot():
+    async with async_session_maker() as db:
+        rows = (await db.execute(select(OrderGeoBin))).scalars().all()
+    await engine.dispose()
+    return {
+        (row.precision, row.month, row.geohash): (row.orders_count, round(float(row.revenue), 2))
+        for row in rows
+        if row.orders_count or row.revenue
+    }
+
+
+def create_order(client, delivery_type="delivery", coordinates=None, headers=None):
+    payload = {
+        "items": [{"dish_id": 1, "quantity": 1}],
+        "delivery_type": delivery_type,
+        "payment_method": "cash",
+        "name": "Гость",
+        "phone": "+77000000099",
+    }
+    if delivery_type == "delivery":
+        payload["delivery_address"] = "ул. Абая 1"
+    else:
+        payload["pickup_address"] = "ул. Абая 1"
+    if coordinates:
+        payload["delivery_latitude"], payload["delivery_longitude"] = coordinates
+    response = client.post(f"{API}/orders/", json=payload, headers=headers or {})
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def check_incremental():
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        # Опросы фоновых воркеров приложения (очередь уведомлений, push-рассылки) не относятся к запросу
+        if "notification_jobs" not in statement and "push_campaigns" not in statement:
+            statements.append(statement.split()[0].upper())
+
+    print("\n🧪 2. Доставка, возврат и заказы без координат...")
+    with TestClient(app) as client:
+        guest = create_order(client, coordinates=ALMATY)
+        profile = create_order(client, headers=CLIENT)  # Координаты из адреса профиля
+        pickup = create_order(client, delivery_type="pickup", coordinates=ALMATY)
+        unknown = create_order(client)
+        orders = [guest, profile, pickup, unknown]
+        assert client.get(f"{API}/kitchen/orders", headers=KITCHEN).status_code == 200
+
+        for order_id in orders:
+            assert client.patch(f"{API}/admin/orders/{order_id}/status", json={"status": "confirmed"}, headers=ADMIN).status_code == 200
+            event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+            assert client.patch(f"{API}/kitchen/orders/{order_id}/start-cooking", headers=KITCHEN).status_code == 200
+            event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        # Переход без доставки не трогает карту (пользователь из кеша, SELECT — событие)
+        assert statements == ["UPDATE", "INSERT", "SELECT"] * 4, statements
+
+        response = client.patch(f"{API}/admin/orders/bulk-status", json={"status": "delivered", "order_ids": orders}, headers=ADMIN)
+        assert response.json()["updated"] == 4
+
+        month = date.today().replace(day=1)
+        snapshot = asyncio.run(bins_snapshot())
+        expected = {}
+        for point in (ALMATY, (43.22, 76.87)):
+            for precision in GEO_PRECISIONS:
+                for bucket in (ALL_TIME, month):
+                    count, revenue = expected.get((precision, bucket, encode(*point, precision)), (0, 0.0))
+                    expected[(precision, bucket, encode(*point, precision))] = (count + 1, revenue + 3000.0)
+        assert snapshot == expected, snapshot
+
+        tile = client.get(f"{API}/analytics/geo/tiles/{TILE[0]}/{TILE[1]}/{TILE[2]}", headers=ADMIN).json()
+        assert sum(item["orders_count"] for item in tile["bins"]) == 2 and tile["max_count"] == 1, tile
+        world = client.get(f"{API}/analytics/geo/tiles/0/0/0", headers=ADMIN).json()
+        assert [(item["orders_count"], item["revenue"]) for item in world["bins"]] == [(2, 6000.0)], world
+        assert world["precision"] == min(GEO_PRECISIONS) and tile["precision"] > world["precision"]
+
+        # Администратор возвращает доставленный заказ: его ячейки вычитаются
+        assert client.patch(f"{API}/admin/orders/{guest}/status", json={"status": "ready"}, headers=ADMIN).status_code == 200
+        world = client.get(f"{API}/analytics/geo/tiles/0/0/0", headers=ADMIN).json()
+        assert world["max_count"] == 1 and world["bins"][0]["revenue"] == 3000.0
+        assert client.patch(f"{API}/admin/orders/{guest}/status", json={"status": "delivered"}, headers=ADMIN).status_code == 200
+
+        assert client.get(f"{API}/analytics/geo/tiles/2/4/0", headers=ADMIN).status_code == 400
+        assert client.get(f"{API}/analytics/geo/tiles/30/0/0", headers=ADMIN).status_code == 400
+        assert client.get(f"{API}/analytics/geo/tiles/0/0/0", headers=KITCHEN).status_code == 403
+    print("✅ Заказ с координатами — по ячейке на уровень и месяц, самовывоз и заказы без координат не учитываются")
+    print("✅ Возврат из доставленного вычитает, переход без доставки — 2 запроса")
+
+
+async def check_rebuild():
+    print("\n🧪 3. Пересчет с нуля совпадает с инкрементальными ячейками...")
+    incremental = await bins_snapshot()
+    async with async_session_maker() as db:
+        summary = await rebuild_geo_bins(db)
+        await db.commit()
+    await engine.dispose()
+    assert summary["orders"] == 2 and incremental == await bins_snapshot()
+    print(f"✅ {len(incremental)} ячеек совпадают")
+
+
+async def insert_history(start: int, stop: int):
+    """Доставленные заказы вокруг Алматы за последние 6 месяцев."""
+    rng = random.Random(start)
+    first_day = datetime.combine(date.today().replace(day=1), datetime.min.time()) - timedelta(days=150)
+    async with engine.begin() as conn:
+        for offset in range(start, stop, 20_000):
+            await conn.execute(insert(Order), [
+                {
+                    "order_number": f"ORD-GEO-{n:07d}", "customer_name": "Клиент", "customer_phone": "+77010000000",
+                    "delivery_type": DeliveryType.DELIVERY, "payment_method": PaymentMethod.CARD,
+                    "status": OrderStatus.DELIVERED, "payment_status": PaymentStatus.PAID,
+                    "subtotal": Decimal(1000 + n % 50), "total_amount": Decimal(1000 + n % 50),
+                    "delivery_latitude": rng.gauss(ALMATY[0], 0.08), "delivery_longitude": rng.gauss(ALMATY[1], 0.12),
+                    "created_at": first_day + timedelta(minutes=rng.randrange(180 * 24 * 60)),
+                }
+                for n in range(offset, min(offset + 20_000, stop))
+            ])
+    await engine.dispose()
+
+
+async def direct_count(zoom, x, y, precision, date_from=None) -> int:
+    """Заказы, чья ячейка (по центру) попадает в тайл, — прямым сканированием заказов."""
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(zoom, x, y)
+    query = select(Order.delivery_latitude, Order.delivery_longitude).where(
+        Order.status == OrderStatus.DELIVERED, Order.delivery_latitude.is_not(None)
+    )
+    if date_from:
+        query = query.where(Order.created_at >= datetime.combine(date_from, datetime.min.time()))
+    async with async_session_maker() as db:
+        rows = (await db.execute(query)).all()
+    await engine.dispose()
+    count = 0
+    for latitude, longitude in rows:
+        center_lat, center_lon = decode_center(encode(latitude, longitude, precision))
+        count += min_lat <= center_lat < max_lat and min_lon <= center_lon < max_lon
+    return count
+
+
+async def measure_tile():
+    async with async_session_maker() as db:
+        await geo_tile(db, *TILE)  # прогрев
+        started = time.perf_counter()
+        for _ in range(5):
+            tile = await geo_tile(db, *TILE)
+        tile_ms = (time.perf_counter() - started) * 1000 / 5
+        bins = (await db.execute(select(func.count()).select_from(OrderGeoBin))).scalar()
+    await engine.dispose()
+    return tile, tile_ms, bins
+
+
+async def check_tiles():
+    print("\n🧪 4. Тайл совпадает с заказами в его границах, время не растет с числом заказов...")
+    results = []
+    for total in (20_000, 120_000):
+        await insert_history(results[-1][0] if results else 0, total)
+        async with async_session_maker() as db:
+            await rebuild_geo_bins(db)
+            await db.commit()
+        await engine.dispose()
+        tile, tile_ms, bins = await measure_tile()
+
+        min_lat, min_lon, max_lat, max_lon = tile_bounds(*TILE)
+        expected = await direct_count(*TILE, tile["precision"])
+        assert sum(item["orders_count"] for item in tile["bins"]) == expected > 0, (expected, tile["max_count"])
+        assert all(min_lat <= item["lat"] < max_lat and min_lon <= item["lng"] < max_lon for item in tile["bins"])
+        results.append((total, tile_ms))
+        print(f"✅ {total} заказов: {bins} ячеек, тайл z={TILE[0]} — {len(tile['bins'])} ячеек за {tile_ms:.1f} мс")
+
+    (_, small_ms), (_, large_ms) = results
+    assert large_ms < small_ms * 2 + 5, results
+
+    # Фильтр по месяцам: только текущий месяц
+    month = date.today().replace(day=1)
+    async with async_session_maker() as db:
+        recent = await geo_tile(db, *CITY_TILE, date_from=month)
+        all_time = await geo_tile(db, *CITY_TILE)
+    await engine.dispose()
+    assert sum(item["orders_count"] for item in recent["bins"]) == await direct_count(*CITY_TILE, recent["precision"], month)
+    assert sum(item["orders_count"] for item in all_time["bins"]) == await direct_count(*CITY_TILE, all_time["precision"])
+    print("✅ Заказов в 6 раз больше — время тайла не растет; фильтр по месяцам")
+
+
+def tile_at(latitude: float, longitude: float, zoom: int):
+    """Тайл XYZ, в который попадает точка."""
+    tiles = 2 ** zoom
+    x = int((longitude + 180.0) / 360.0 * tiles)
+    y = int((1 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2 * tiles)
+    return zoom, x, y
+
+
+async def check_max_zoom():
+    print(f"\n🧪 5. Тайлы максимального приближения z={MAX_ZOOM}...")
+    precision = max(GEO_PRECISIONS)
+    # Соседние тайлы на широте Алматы и у 60°: в каждом есть центр ячейки
+    for latitude in (ALMATY[0], 60.0):
+        _, x0, y0 = tile_at(latitude, ALMATY[1], MAX_ZOOM)
+        for x in range(x0 - 2, x0 + 3):
+            for y in range(y0 - 2, y0 + 3):
+                min_lat, min_lon, max_lat, max_lon = tile_bounds(MAX_ZOOM, x, y)
+                centers = [decode_center(cell) for cell in covering((min_lat, min_lon, max_lat, max_lon), precision)]
+                assert any(min_lat <= lat < max_lat and min_lon <= lon < max_lon for lat, lon in centers), (latitude, x, y)
+
+    # Тайл с самой заполненной ячейкой города
+    async with async_session_maker() as db:
+        city = await geo_tile(db, *CITY_TILE)
+        densest = max(city["bins"], key=lambda item: item["orders_count"])
+        location = tile_at(densest["lat"], densest["lng"], MAX_ZOOM)
+        tile = await geo_tile(db, *location)
+    await engine.dispose()
+    assert tile["precision"] == precision
+    expected = await direct_count(*location, precision)
+    assert sum(item["orders_count"] for item in tile["bins"]) == expected > 0, (expected, tile)
+    with TestClient(app) as client:
+        assert client.get(f"{API}/analytics/geo/tiles/{MAX_ZOOM + 1}/0/0", headers=ADMIN).status_code == 400
+    print(f"✅ 50 тайлов z={MAX_ZOOM} не пустые, {expected} заказов в тайле самой заполненной ячейки")
+
+
+def test_geo_bins():
+    check_geohash()
+    asyncio.run(seed())
+    menu_cache.reset()
+    check_incremental()
+    asyncio.run(check_rebuild())
+    asyncio.run(check_tiles())
+    asyncio.run(check_max_zoom())
+
+
+if __name__ == "__main__":
+    test_geo_bins()
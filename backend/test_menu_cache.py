@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Тест снимка меню в памяти:
+- ответы /menu/categories, /menu/dishes и /menu/dishes/{id} совпадают с ответами из базы;
+- повторные чтения не выполняют SQL-запросов;
+- изменения меню (блюда, доступность, добавки) сразу видны в следующем чтении;
+- параллельные запросы после инвалидации пересобирают снимок один раз.
+
+Запуск: python test_menu_cache.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from main import app
+from app.core.database import async_session_maker, get_db_session, get_read_db_session
+from app.models import Base
+from app.models.menu import Category, Dish, VariantGroup, Variant, Addon, dish_variant_table, dish_addon_table
+from app.services.menu_cache import menu_cache
+
+
+async def seed(session: AsyncSession):
+    """Небольшое меню с группами вариантов и добавками."""
+    session.add_all([
+        Category(id=1, name="Пицца", sort_order=1),
+        Category(id=2, name="Напитки", sort_order=2),
+        Category(id=3, name="Архив", sort_order=3, is_active=False),
+        VariantGroup(id=1, name="Размер", is_required=True, sort_order=1),
+        VariantGroup(id=2, name="Тесто", is_required=False, sort_order=2),
+        Variant(id=1, name="25 см", price=Decimal("0"), group_id=1, is_default=True, sort_order=1),
+        Variant(id=2, name="30 см", price=Decimal("500"), group_id=1, sort_order=2),
+        Variant(id=3, name="Тонкое", price=Decimal("0"), group_id=2, sort_order=1),
+        Addon(id=1, name="Сыр", price=Decimal("300"), category="сыры"),
+        Addon(id=2, name="Халапеньо", price=Decimal("200"), category="овощи"),
+    ])
+    for i in range(1, 31):
+        session.add(Dish(
+            id=i,
+            name=f"Pizza {i:02d}" if i <= 20 else f"Lemonade {i:02d}",
+            description="Классический рецепт" if i % 2 else "Spicy",
+            price=Decimal(1000 + i * 10),
+            category_id=1 if i <= 20 else 2,
+            is_available=i % 7 != 0,
+            sort_order=i % 3
+        ))
+    await session.flush()
+    await session.execute(insert(dish_variant_table), [
+        {"dish_id": dish_id, "variant_id": variant_id}
+        for dish_id in range(1, 21) for variant_id in (1, 2, 3)
+    ])
+    await session.execute(insert(dish_addon_table), [
+        {"dish_id": dish_id, "addon_id": addon_id}
+        for dish_id in range(1, 21) for addon_id in (1, 2)
+    ])
+    await session.commit()
+
+
+async def run_tests():
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        await seed(session)
+
+    async def override_db_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = override_db_session
+    app.dependency_overrides[get_read_db_session] = override_db_session
+    menu_cache.session_maker = session_maker  # Снимок меню собирается из тестовой базы
+
+    queries = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    read_urls = [
+        "/api/v1/menu/categories",
+        "/api/v1/menu/dishes",
+        "/api/v1/menu/dishes?category_id=1&page=2&limit=5",
+        "/api/v1/menu/dishes?show_all=true&limit=100",
+        "/api/v1/menu/dishes?search=pizza",
+        "/api/v1/menu/dishes/1",
+        "/api/v1/menu/dishes/25",
+        "/api/v1/menu/addons",
+        "/api/v1/menu/addons?show_all=true",
+        "/api/v1/menu/addons?category=сыры",
+        "/api/v1/menu/addons/2",
+    ]
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            print("🧪 1. Ответы из снимка совпадают с ответами из базы...")
+            menu_cache.enabled = False
+            from_db = {url: (await client.get(url)).json() for url in read_urls}
+            menu_cache.enabled = True
+            menu_cache.reset()
+            menu_cache.invalidate()
+            from_snapshot = {url: (await client.get(url)).json() for url in read_urls}
+            for url in read_urls:
+                assert from_db[url] == from_snapshot[url], f"{url}:\n{from_db[url]}\n!=\n{from_snapshot[url]}"
+            print(f"✅ {len(read_urls)} эндпоинтов отдают одинаковые данные")
+
+            print("\n🧪 2. Повторные чтения не обращаются к базе...")
+            queries.clear()
+            for url in read_urls:
+                assert (await client.get(url)).status_code == 200
+            assert queries == [], queries
+            print("✅ 0 SQL-запросов на чтение меню")
+
+            print("\n🧪 3. Изменения меню сразу видны...")
+            response = await client.put("/api/v1/menu/dishes/1", json={"name": "Маргарита", "price": "2500"})
+            assert response.status_code == 200
+            dish = (await client.get("/api/v1/menu/dishes/1")).json()
+            assert dish["name"] == "Маргарита" and Decimal(dish["price"]) == Decimal("2500")
+
+            response = await client.patch("/api/v1/menu/dishes/2/toggle-availability")
+            assert response.status_code == 200
+            ids = [d["id"] for d in (await client.get("/api/v1/menu/dishes?limit=100")).json()]
+            assert 2 not in ids
+
+            response = await client.put("/api/v1/menu/addons/1", json={"price": "450"})
+            assert response.status_code == 200
+            dish = (await client.get("/api/v1/menu/dishes/3")).json()
+            assert any(Decimal(addon["price"]) == Decimal("450") for addon in dish["addons"])
+
+            response = await client.post("/api/v1/menu/dishes", json={"name": "Новая пицца", "price": "3000", "category_id": 1})
+            assert response.status_code == 201
+            new_id = response.json()["id"]
+            assert (await client.get(f"/api/v1/menu/dishes/{new_id}")).status_code == 200
+
+            response = await client.delete(f"/api/v1/menu/dishes/{new_id}")
+            assert response.status_code == 204
+            assert (await client.get(f"/api/v1/menu/dishes/{new_id}")).status_code == 404
+            print("✅ Создание, изменение, удаление блюд и добавок инвалидируют снимок")
+
+            print("\n🧪 4. Параллельные запросы после инвалидации...")
+            menu_cache.invalidate()
+            queries.clear()
+            responses = await asyncio.gather(*[client.get("/api/v1/menu/dishes") for _ in range(20)])
+            assert all(r.status_code == 200 for r in responses)
+            category_selects = [q for q in queries if "FROM categories" in q and "JOIN" not in q and "IN (" not in q]
+            assert len(category_selects) == 1, f"снимок пересобран {len(category_selects)} раз"
+            print(f"✅ Снимок пересобран один раз ({len(queries)} запросов на 20 параллельных чтений)")
+    finally:
+        app.dependency_overrides.clear()
+        menu_cache.session_maker = async_session_maker
+        menu_cache.reset()
+        await engine.dispose()
+        os.unlink(db_file.name)
+
+
+def test_menu_cache():
+    asyncio.run(run_tests())
+
+
+if __name__ == "__main__":
+    test_menu_cache()
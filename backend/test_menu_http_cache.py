@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Тест условных GET-запросов к меню:
+- ответы содержат сильный ETag и Cache-Control со stale-while-revalidate;
+- совпадающий If-None-Match возвращает 304 без тела и без SQL-запросов;
+- после изменения меню ETag меняется и клиент получает новое тело;
+- поддерживаются W/-префикс, списки ETag и "*".
+
+Запуск: python test_menu_http_cache.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from main import app
+from app.core.config import settings
+from app.core.database import async_session_maker, get_db_session, get_read_db_session
+from app.models import Base
+from app.models.menu import Category, Dish, Addon, dish_addon_table
+from app.services.menu_cache import menu_cache
+from app.utils.http_cache import etag_matches
+
+
+async def seed(session: AsyncSession):
+    """Минимальное меню с добавками."""
+    session.add_all([
+        Category(id=1, name="Бургеры", sort_order=1),
+        Addon(id=1, name="Сыр", price=Decimal("300"), category="сыры"),
+        Addon(id=2, name="Бекон", price=Decimal("500"), category="мясо"),
+        Addon(id=3, name="Старый соус", price=Decimal("100"), is_active=False),
+    ])
+    for i in range(1, 11):
+        session.add(Dish(id=i, name=f"Бургер {i}", price=Decimal(1500 + i * 100), category_id=1))
+    await session.flush()
+    await session.execute(insert(dish_addon_table), [
+        {"dish_id": dish_id, "addon_id": addon_id}
+        for dish_id in range(1, 11) for addon_id in (1, 2)
+    ])
+    await session.commit()
+
+
+async def run_tests():
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        await seed(session)
+
+    async def override_db_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = override_db_session
+    app.dependency_overrides[get_read_db_session] = override_db_session
+    menu_cache.enabled = True
+    menu_cache.reset()
+    menu_cache.session_maker = session_maker  # Снимок меню собирается из тестовой базы
+    menu_cache.invalidate()
+
+    queries = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    read_urls = [
+        "/api/v1/menu/categories",
+        "/api/v1/menu/dishes",
+        "/api/v1/menu/dishes?category_id=1&limit=5",
+        "/api/v1/menu/dishes/3",
+        "/api/v1/menu/addons",
+        "/api/v1/menu/addons/1",
+    ]
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            print("🧪 1. Заголовки кеширования...")
+            etags = {}
+            for url in read_urls:
+                response = await client.get(url)
+                assert response.status_code == 200, url
+                etag = response.headers.get("etag")
+                assert etag and etag.startswith('"') and not etag.startswith("W/"), f"{url}: {etag}"
+                assert response.headers["cache-control"] == (
+                    f"public, max-age={settings.MENU_HTTP_MAX_AGE}, "
+                    f"stale-while-revalidate={settings.MENU_HTTP_STALE_WHILE_REVALIDATE}"
+                ), url
+                etags[url] = etag
+            assert len(set(etags.values())) == len(read_urls), "разные представления должны иметь разные ETag"
+
+            response = await client.get("/api/v1/menu/addons?show_all=true")
+            assert response.headers["cache-control"] == "private, no-cache"
+            assert len(response.json()) == 3
+            print(f"✅ ETag и Cache-Control на {len(read_urls)} эндпоинтах, админские выборки не кешируются публично")
+
+            print("\n🧪 2. 304 Not Modified без обращения к базе...")
+            queries.clear()
+            for url in read_urls:
+                response = await client.get(url, headers={"If-None-Match": etags[url]})
+                assert response.status_code == 304, f"{url}: {response.status_code}"
+                assert response.content == b""
+                assert response.headers["etag"] == etags[url]
+                assert "cache-control" in response.headers
+            assert queries == [], queries
+            print(f"✅ {len(read_urls)} ответов 304, 0 SQL-запросов")
+
+            print("\n🧪 3. Изменение меню меняет ETag...")
+            url = "/api/v1/menu/dishes/3"
+            response = await client.put(url, json={"price": "9900"})
+            assert response.status_code == 200
+            response = await client.get(url, headers={"If-None-Match": etags[url]})
+            assert response.status_code == 200
+            assert Decimal(response.json()["price"]) == Decimal("9900")
+            assert response.headers["etag"] != etags[url]
+
+            # Повторная проверка с новым ETag снова бесплатна
+            new_etag = response.headers["etag"]
+            queries.clear()
+            response = await client.get(url, headers={"If-None-Match": new_etag})
+            assert response.status_code == 304 and queries == []
+            print("✅ После изменения клиент получает новое тело и новый ETag")
+
+            print("\n🧪 4. Формы заголовка If-None-Match...")
+            etag = new_etag
+            assert etag_matches(f"W/{etag}", etag)
+            assert etag_matches(f'"other", {etag}', etag)
+            assert etag_matches("*", etag)
+            assert not etag_matches('"other"', etag)
+            assert not etag_matches(None, etag)
+            response = await client.get(url, headers={"If-None-Match": f'"stale", W/{etag}'})
+            assert response.status_code == 304
+            print("✅ W/, списки и * обрабатываются")
+
+            print("\n🧪 5. 404 не кешируется...")
+            response = await client.get("/api/v1/menu/dishes/999")
+            assert response.status_code == 404
+            assert "etag" not in response.headers
+            print("✅ Ошибки отдаются без ETag")
+
+            print("\n🧪 6. Без снимка меню ETag не выдается...")
+            menu_cache.enabled = False
+            response = await client.get("/api/v1/menu/dishes", headers={"If-None-Match": etags["/api/v1/menu/dishes"]})
+            assert response.status_code == 200 and "etag" not in response.headers
+            print("✅ При CACHE_ENABLED=False ответы всегда читаются из базы")
+    finally:
+        app.dependency_overrides.clear()
+        menu_cache.session_maker = async_session_maker
+        menu_cache.enabled = True
+        menu_cache.reset()
+        await engine.dispose()
+        os.unlink(db_file.name)
+
+
+def test_menu_http_cache():
+    asyncio.run(run_tests())
+
+
+if __name__ == "__main__":
+    test_menu_http_cache()
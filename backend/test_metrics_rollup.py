@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Тест сверток показателей (app/services/metrics.py):
+- создание заказа, одиночные и массовые переходы обновляют свертки в той же транзакции;
+- счетчик активных клиентов следует за регистрацией, ролью, блокировкой и удалением;
+- пересчет с нуля (rebuild_metrics) дает те же строки, что и инкрементальные обновления;
+- /admin/dashboard отдает те же числа, что прежние агрегаты по всей таблице orders,
+  и не зависит от объема истории.
+
+Запуск: python test_metrics_rollup.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, func, insert, and_
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.metrics import OrderRollup, MetricCounter
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.menu_cache import menu_cache
+from app.services.metrics import dashboard_statistics, rebuild_metrics, ACTIVE_CLIENTS
+
+API = "/api/v1"
+HISTORY_ORDERS = 100_000
+ADMIN_TOKEN = AuthService(None).create_access_token(data={"sub": "1"})
+KITCHEN_TOKEN = AuthService(None).create_access_token(data={"sub": "2"})
+
+
+async def legacy_statistics(db):
+    """Прежние агрегаты панели администратора по всей истории."""
+    total_orders = (await db.execute(select(func.count(Order.id)))).scalar() or 0
+    total_revenue = (await db.execute(
+        select(func.sum(Order.total_amount)).where(Order.status == OrderStatus.DELIVERED)
+    )).scalar() or 0
+    active_users = (await db.execute(
+        select(func.count(User.id)).where(and_(User.is_active == True, User.role == UserRole.CLIENT))
+    )).scalar() or 0
+    avg_check = (await db.execute(
+        select(func.avg(Order.total_amount)).where(Order.status == OrderStatus.DELIVERED)
+    )).scalar() or 0
+    return {
+        "total_orders": total_orders,
+        "total_revenue": float(total_revenue),
+        "active_users": active_users,
+        "average_check": float(avg_check)
+    }
+
+
+def assert_same_statistics(actual, expected):
+    assert actual["total_orders"] == expected["total_orders"], (actual, expected)
+    assert actual["active_users"] == expected["active_users"], (actual, expected)
+    assert abs(actual["total_revenue"] - expected["total_revenue"]) < 0.01, (actual, expected)
+    assert abs(actual["average_check"] - expected["average_check"]) < 0.01, (actual, expected)
+
+
+async def rollup_snapshot(db):
+    rows = (await db.execute(select(OrderRollup))).scalars().all()
+    return {
+        (row.period, row.dimension, row.bucket_start.replace(tzinfo=None), row.value): (
+            row.orders_count, round(float(row.total_amount), 2), row.delivered_count, round(float(row.revenue), 2), row.cancelled_count
+        )
+        for row in rows
+        if row.orders_count or row.total_amount or row.delivered_count or row.revenue or row.cancelled_count
+    }
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session_maker() as db:
+        db.add_all([
+            User(id=1, name="Админ", phone="+77000000001", role=UserRole.ADMIN, hashed_password="-"),
+            User(id=2, name="Кухня", phone="+77000000002", role=UserRole.KITCHEN, hashed_password="-"),
+        ])
+        db.add_all([User(id=10 + n, name=f"Клиент {n}", phone=f"+7701000000{n}", hashed_password="-") for n in range(5)])
+        db.add(Category(id=1, name="Бургеры"))
+        db.add(Dish(id=1, name="Бургер", price=Decimal("2500"), category_id=1))
+        await db.commit()
+    await engine.dispose()
+
+
+async def check_user_counter():
+    print("\n🧪 2. Счетчик активных клиентов...")
+    async with async_session_maker() as db:
+        counter = lambda: db.execute(select(MetricCounter.value).where(MetricCounter.name == ACTIVE_CLIENTS))
+        assert (await counter()).scalar() == 5
+
+        users = {user.id: user for user in (await db.execute(select(User).where(User.id >= 10))).scalars()}
+        users[10].is_active = False
+        users[11].role = UserRole.COURIER
+        users[12].name = "Клиент 2 (переименован)"
+        await db.commit()
+        assert (await counter()).scalar() == 3
+
+        users[10].is_active = True
+        await db.delete(users[13])
+        await db.commit()
+        assert (await counter()).scalar() == 3
+        assert_same_statistics(await dashboard_statistics(db), await legacy_statistics(db))
+    await engine.dispose()
+    print("✅ Блокировка, смена роли и удаление меняют счетчик, переименование — нет")
+
+
+async def check_rebuild_matches():
+    async with async_session_maker() as db:
+        incremental = await rollup_snapshot(db)
+        await rebuild_metrics(db)
+        await db.commit()
+        rebuilt = await rollup_snapshot(db)
+        assert incremental == rebuilt, (incremental, rebuilt)
+        assert_same_statistics(await dashboard_statistics(db), await legacy_statistics(db))
+    await engine.dispose()
+
+
+async def check_history_scaling():
+    print(f"\n🧪 4. Панель при {HISTORY_ORDERS} заказах в истории...")
+    start = datetime.now() - timedelta(days=365)
+    statuses = [OrderStatus.DELIVERED] * 7 + [OrderStatus.CANCELLED, OrderStatus.PENDING, OrderStatus.CONFIRMED]
+    async with engine.begin() as conn:
+        for offset in range(0, HISTORY_ORDERS, 10_000):
+            await conn.execute(insert(Order), [
+                {
+                    "order_number": f"ORD-HIST-{n:07d}",
+                    "customer_name": "Клиент",
+                    "customer_phone": "+77010000000",
+                    "delivery_type": DeliveryType.DELIVERY if n % 3 else DeliveryType.PICKUP,
+                    "payment_method": PaymentMethod.CARD,
+                    "status": statuses[n % len(statuses)],
+                    "payment_status": PaymentStatus.PAID,
+                    "subtotal": Decimal(1000 + n % 5000),
+                    "total_amount": Decimal(1000 + n % 5000),
+                    "created_at": start + timedelta(minutes=5 * n),
+                }
+                for n in range(offset, min(offset + 10_000, HISTORY_ORDERS))
+            ])
+
+    # История записана напрямую, без обновления сверток — как в базе до миграции
+    started = time.perf_counter()
+    async with async_session_maker() as db:
+        summary = await rebuild_metrics(db)
+        await db.commit()
+    rebuild_s = time.perf_counter() - started
+
+    async with async_session_maker() as db:
+        await legacy_statistics(db)  # прогрев
+        started = time.perf_counter()
+        for _ in range(5):
+            legacy = await legacy_statistics(db)
+        legacy_ms = (time.perf_counter() - started) * 1000 / 5
+
+        started = time.perf_counter()
+        for _ in range(5):
+            rolled_up = await dashboard_statistics(db)
+        rollup_ms = (time.perf_counter() - started) * 1000 / 5
+    await engine.dispose()
+
+    assert_same_statistics(rolled_up, legacy)
+    assert rollup_ms * 5 < legacy_ms, (rollup_ms, legacy_ms)
+    print(f"✅ Пересчет {summary['orders']} заказов в {summary['rollup_rows']} строк: {rebuild_s:.1f} с")
+    print(f"✅ Показатели: агрегаты по orders {legacy_ms:.1f} мс, из сверток {rollup_ms:.2f} мс")
+
+
+def check_order_flow():
+    with TestClient(app) as client:
+        print("🧪 1. Заказы и переходы обновляют свертки...")
+        order_ids = []
+        for _ in range(4):
+            response = client.post(f"{API}/orders/", json={
+                "items": [{"dish_id": 1, "quantity": 1}],
+                "delivery_type": "pickup",
+                "payment_method": "cash",
+                "name": "Гость",
+                "phone": "+77000000099",
+                "pickup_address": "ул. Абая 1"
+            })
+            assert response.status_code == 200, response.text
+            order_ids.append(response.json()["id"])
+
+        admin = {"Authorization": f"Bearer {ADMIN_TOKEN}"}
+        kitchen = {"Authorization": f"Bearer {KITCHEN_TOKEN}"}
+        assert client.patch(f"{API}/admin/orders/bulk-status", json={"status": "confirmed", "order_ids": order_ids}, headers=admin).json()["updated"] == 4
+        assert client.patch(f"{API}/kitchen/orders/bulk-status", json={"status": "preparing", "order_ids": order_ids[:3]}, headers=kitchen).json()["updated"] == 3
+        for order_id in order_ids[:2]:
+            assert client.patch(f"{API}/kitchen/orders/{order_id}/mark-ready", headers=kitchen).status_code == 200
+            assert client.patch(f"{API}/kitchen/orders/{order_id}/pickup-complete", headers=kitchen).status_code == 200
+        assert client.patch(f"{API}/admin/orders/{order_ids[3]}/status", json={"status": "cancelled"}, headers=admin).status_code == 200
+        # Возврат доставленного заказа администратором уменьшает выручку
+        assert client.patch(f"{API}/admin/orders/{order_ids[1]}/status", json={"status": "ready"}, headers=admin).status_code == 200
+
+        statistics = client.get(f"{API}/admin/dashboard").json()["statistics"]
+        assert statistics["total_orders"] == 4
+        assert statistics["total_revenue"] == 2500.0 and statistics["average_check"] == 2500.0, statistics
+        assert statistics["active_users"] == 5
+    print("✅ 4 заказа, 1 доставлен: выручка 2500, средний чек 2500")
+
+    asyncio.run(check_user_counter())
+
+    print("\n🧪 3. Пересчет с нуля...")
+    asyncio.run(check_rebuild_matches())
+    print("✅ Пересчитанные свертки совпадают с инкрементальными")
+
+
+def test_metrics_rollup():
+    asyncio.run(seed())
+    menu_cache.reset()
+    check_order_flow()
+    asyncio.run(check_history_scaling())
+
+
+if __name__ == "__main__":
+    test_metrics_rollup()
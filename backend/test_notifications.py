@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Тест очереди уведомлений (app/services/notifications.py):
+- запрос SMS-кода не ждет провайдера, SMS отправляет фоновый воркер; на номер без аккаунта SMS не уходит;
+- push с одинаковым содержимым уходят multicast-пакетами по batch_size токенов;
+- повтор с экспоненциальной паузой, failed после max_attempts и при неисправимой ошибке
+  (текст неотправленного SMS стирается);
+- недействительный FCM-токен удаляется у пользователя;
+- задание упавшего воркера снова доступно после аренды, но не раньше;
+- выборка не больше, чем воркеры отправят за аренду; пакет с истекшей арендой не отправляется,
+  а результат не перезаписывает задание, забранное другой выборкой;
+- регистрация и отключение устройства через /users/me/fcm-token.
+
+Запуск: python test_notifications.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, insert, delete
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.notification import NotificationJob, NotificationJobStatus
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.notifications import (
+    CLAIM_BATCHES_PER_WORKER, LocalTransport, NotificationDispatcher, SMS_BODY_REMOVED, enqueue_push, enqueue_sms,
+    notification_dispatcher
+)
+
+API = "/api/v1"
+PUSH_DEVICES = 1200
+
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': str(user_id)})}"}
+
+
+def dispatcher(transport, **options) -> NotificationDispatcher:
+    return NotificationDispatcher(transport, workers=4, **options)
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": n, "name": f"Клиент {n}", "phone": f"+7701{n:07d}", "role": UserRole.CLIENT,
+             "hashed_password": "-", "fcm_token": f"token-{n}"}
+            for n in range(1, PUSH_DEVICES + 1)
+        ])
+    await engine.dispose()
+
+
+async def jobs():
+    async with async_session_maker() as db:
+        return (await db.execute(select(NotificationJob).order_by(NotificationJob.id))).scalars().all()
+
+
+async def clear_jobs():
+    async with async_session_maker() as db:
+        await db.execute(delete(NotificationJob))
+        await db.commit()
+
+
+async def add_sms(phone: str = "+77010000001", text: str = "Тест"):
+    async with async_session_maker() as db:
+        await enqueue_sms(db, phone, text)
+        await db.commit()
+
+
+def check_sms_request():
+    print("🧪 1. Запрос SMS-кода не ждет провайдера...")
+    transport = LocalTransport(latency=1.0)
+    previous = notification_dispatcher.transport
+    notification_dispatcher.transport = transport
+    try:
+        with TestClient(app) as client:
+            started = time.perf_counter()
+            response = client.post(f"{API}/auth/request-sms", json={"phone": "+77010000001"})
+            elapsed = time.perf_counter() - started
+            assert response.status_code == 200, response.text
+            assert elapsed < 0.5, elapsed  # Провайдер отвечает секунду
+
+            deadline = time.perf_counter() + 5
+            while not transport.sms and time.perf_counter() < deadline:
+                time.sleep(0.05)
+            phone, text = transport.sms[0]
+            code = asyncio.run(sms_code(1))
+            assert phone == "+77010000001" and text.endswith(code), (text, code)
+            assert asyncio.run(jobs()) == []  # Отправленное задание удалено
+
+            health = client.get("/health").json()["notifications"]
+            assert health["running"] and health["sent"] >= 1, health
+
+            # Номер без аккаунта: тот же ответ, но SMS не отправляется
+            response = client.post(f"{API}/auth/request-sms", json={"phone": "+77779999999"})
+            assert response.status_code == 200, response.text
+            assert asyncio.run(jobs()) == [] and len(transport.sms) == 1
+    finally:
+        notification_dispatcher.transport = previous
+    asyncio.run(engine.dispose())
+    print(f"✅ Ответ за {elapsed * 1000:.0f} мс при задержке провайдера 1 с, SMS отправлено воркером")
+
+
+async def sms_code(user_id: int) -> str:
+    async with async_session_maker() as db:
+        return (await db.execute(select(User.verification_code).where(User.id == user_id))).scalar_one()
+
+
+async def check_push_batches():
+    print("\n🧪 2. Push multicast-пакетами...")
+    transport = LocalTransport()
+    worker = dispatcher(transport, batch_size=500)
+    async with async_session_maker() as db:
+        recipients = [(n, f"token-{n}") for n in range(1, PUSH_DEVICES + 1)]
+        await enqueue_push(db, recipients, "Скидка", "−20% на пиццу", {"screen": "menu"})
+        await enqueue_sms(db, "+77010000002", "Ваш заказ готов")
+        await db.commit()
+
+    claimed = []
+    while (count := await worker.run_once()):
+        claimed.append(count)
+    assert claimed == [500, 500, 201], claimed
+    assert sorted(len(tokens) for tokens, *_ in transport.pushes) == [200, 500, 500]
+    assert transport.pushes[0][1:] == ("Скидка", "−20% на пиццу", {"screen": "menu"})
+    assert transport.sms == [("+77010000002", "Ваш заказ готов")]
+    assert await jobs() == [] and worker.stats()["batches"] == 4
+    await engine.dispose()
+    print(f"✅ {PUSH_DEVICES} push — 3 запроса к FCM, SMS — отдельно")
+
+
+async def check_retries():
+    print("\n🧪 3. Повторы с экспоненциальной паузой...")
+    transport = LocalTransport()
+    worker = dispatcher(transport, max_attempts=3, retry_base_seconds=0.2)
+    await add_sms()
+
+    transport.fail(2)
+    assert await worker.run_once() == 1
+    [job] = await jobs()
+    delay = (job.next_attempt_at - datetime.utcnow()).total_seconds()
+    assert job.status == NotificationJobStatus.PENDING.value and job.attempts == 1 and 0.1 < delay <= 0.24, delay
+    assert job.last_error == "Провайдер недоступен"
+    assert await worker.run_once() == 0  # Пауза еще не прошла
+
+    await asyncio.sleep(0.25)
+    assert await worker.run_once() == 1
+    [job] = await jobs()
+    delay = (job.next_attempt_at - datetime.utcnow()).total_seconds()
+    assert job.attempts == 2 and 0.25 < delay <= 0.48, delay  # Вторая пауза вдвое длиннее
+
+    await asyncio.sleep(0.5)
+    assert await worker.run_once() == 1 and await jobs() == [] and len(transport.sms) == 1
+
+    # Исчерпаны попытки / ошибка, которую повтор не исправит
+    await add_sms(text="Исчерпаны попытки")
+    transport.fail(3)
+    for _ in range(3):
+        await asyncio.sleep(0.5)
+        await worker.run_once()
+    await add_sms(text="Неверный номер")
+    transport.fail(1, retryable=False, message="Неверный номер")
+    await worker.run_once()
+    failed = await jobs()
+    assert [(job.status, job.attempts) for job in failed] == [("failed", 3), ("failed", 1)], failed
+    assert failed[1].last_error == "Неверный номер"
+    assert all(job.body == SMS_BODY_REMOVED for job in failed)  # Код из SMS не хранится
+    stats = worker.stats()
+    assert (stats["sent"], stats["retried"], stats["failed"]) == (1, 4, 2), stats
+    await clear_jobs()
+    await engine.dispose()
+    print("✅ Паузы 0.2 и 0.4 с, после 3 попыток и при неисправимой ошибке — failed")
+
+
+async def check_invalid_tokens():
+    print("\n🧪 4. Недействительный FCM-токен...")
+    transport = LocalTransport()
+    transport.invalid_tokens = {"token-2"}
+    worker = dispatcher(transport)
+    async with async_session_maker() as db:
+        await enqueue_push(db, [(1, "token-1"), (2, "token-2"), (3, "token-3")], None, "Заказ в пути")
+        await db.commit()
+    await worker.run_once()
+
+    [job] = await jobs()
+    assert (job.recipient, job.status) == ("token-2", "failed"), job
+    async with async_session_maker() as db:
+        tokens = dict((await db.execute(select(User.id, User.fcm_token).where(User.id <= 3))).all())
+    assert tokens == {1: "token-1", 2: None, 3: "token-3"}, tokens
+    await clear_jobs()
+    await engine.dispose()
+    print("✅ Токен удален у пользователя, остальные устройства получили уведомление")
+
+
+async def check_lease():
+    print("\n🧪 5. Задания упавшего воркера возвращаются после аренды...")
+    transport = LocalTransport()
+    crashed = dispatcher(transport, lease_seconds=0.3)
+    await add_sms()
+    assert len(await crashed.claim()) == 1  # Забрал и «упал», не отправив
+
+    other = dispatcher(transport, lease_seconds=0.3)
+    assert await other.run_once() == 0
+    await asyncio.sleep(0.35)
+    assert await other.run_once() == 1 and len(transport.sms) == 1 and await jobs() == []
+    await engine.dispose()
+    print("✅ До конца аренды задание не отдается другому воркеру, после — отправляется")
+
+
+async def check_claim_limit():
+    print("\n🧪 6. Выборка по силам воркеров и истекшая аренда...")
+    transport = LocalTransport()
+    worker = dispatcher(transport, batch_size=500)
+    limit = worker.workers * CLAIM_BATCHES_PER_WORKER
+    async with async_session_maker() as db:
+        for n in range(limit * 2):
+            await enqueue_sms(db, f"+7701{n:07d}", f"SMS {n}")
+        await enqueue_push(db, [(1, "token-1"), (2, "token-2")], None, "Заказ в пути")
+        await db.commit()
+    claimed = []
+    while (count := await worker.run_once()):
+        claimed.append(count)
+    # Забирается только то, что воркеры отправят сразу, а не batch_size заданий; push — одним пакетом
+    assert claimed == [limit, limit, 2], claimed
+    assert len(transport.sms) == limit * 2 and len(transport.pushes) == 1 and await jobs() == []
+
+    # Пакет пролежал в очереди дольше аренды: задание забрала другая выборка
+    stale = dispatcher(transport, lease_seconds=0.2)
+    await add_sms(text="Код 1234")
+    [batch] = await stale.claim()
+    await asyncio.sleep(0.25)
+    other = dispatcher(transport, lease_seconds=0.2)
+    [fresh] = await other.claim()
+    await stale.deliver(batch)
+    assert len(transport.sms) == limit * 2 and stale.stats()["expired"] == 1
+    await stale._record(batch, [None])  # Запоздалый результат прежней выборки
+    [job] = await jobs()
+    assert job.claimed_by == fresh[0].claimed_by and job.status == NotificationJobStatus.SENDING.value, job
+    await other.deliver(fresh)
+    assert transport.sms[-1] == ("+77010000001", "Код 1234") and await jobs() == []
+    await engine.dispose()
+    print(f"✅ По {limit} пакетов за выборку, SMS с истекшей арендой отправлено один раз")
+
+
+def check_fcm_token_endpoint():
+    print("\n🧪 7. Регистрация устройства...")
+    with TestClient(app) as client:
+        response = client.put(f"{API}/users/me/fcm-token", json={"token": "token-5"}, headers=auth(4))
+        assert response.status_code == 200, response.text
+        assert client.put(f"{API}/users/me/fcm-token", json={"token": ""}, headers=auth(4)).status_code == 422
+        assert client.delete(f"{API}/users/me/fcm-token", headers=auth(6)).status_code == 200
+
+    async def tokens():
+        async with async_session_maker() as db:
+            return dict((await db.execute(select(User.id, User.fcm_token).where(User.id.in_([4, 5, 6])))).all())
+
+    assert asyncio.run(tokens()) == {4: "token-5", 5: None, 6: None}
+    asyncio.run(engine.dispose())
+    print("✅ Токен привязан к новому аккаунту и снят с прежнего, DELETE отключает push")
+
+
+def test_notifications():
+    asyncio.run(seed())
+    check_sms_request()
+    asyncio.run(check_push_batches())
+    asyncio.run(check_retries())
+    asyncio.run(check_invalid_tokens())
+    asyncio.run(check_lease())
+    asyncio.run(check_claim_limit())
+    check_fcm_token_endpoint()
+
+
+if __name__ == "__main__":
+    test_notifications()
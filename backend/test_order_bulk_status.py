@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Тест массовой смены статуса заказов:
+- PATCH /kitchen/orders/bulk-status переводит сотни заказов одним UPDATE в одной транзакции;
+- для каждого заказа возвращается исход: примененный переход или ошибка одиночного PATCH /status;
+- PATCH /admin/orders/bulk-status переводит заказы из разных статусов и сообщает предыдущий;
+- события уходят по каждому измененному заказу;
+- сравнение с последовательными одиночными PATCH.
+
+Запуск: python test_order_bulk_status.py  (или через pytest)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+
+from main import app
+from app.core.database import engine
+from app.models import Base
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+
+API = "/api/v1"
+BULK_SIZE = 300
+USERS = [
+    {"id": 1, "name": "Админ", "phone": "+77000000001", "role": UserRole.ADMIN, "hashed_password": "-"},
+    {"id": 2, "name": "Кухня", "phone": "+77000000002", "role": UserRole.KITCHEN, "hashed_password": "-"},
+]
+TOKENS = {
+    "admin": AuthService(None).create_access_token(data={"sub": "1"}),
+    "kitchen": AuthService(None).create_access_token(data={"sub": "2"}),
+}
+
+
+def auth(name):
+    return {"Authorization": f"Bearer {TOKENS[name]}"}
+
+
+def make_order(n: int, status: OrderStatus) -> dict:
+    return {
+        "id": n,
+        "order_number": f"ORD-BULK-{n:05d}",
+        "customer_name": f"Клиент {n}",
+        "customer_phone": f"+7701{n:07d}",
+        "delivery_type": DeliveryType.PICKUP,
+        "payment_method": PaymentMethod.CASH,
+        "status": status,
+        "payment_status": PaymentStatus.PENDING,
+        "subtotal": Decimal("3000"),
+        "total_amount": Decimal("3000"),
+        "created_at": datetime.now(),
+    }
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), USERS)
+        orders = [make_order(n, OrderStatus.CONFIRMED) for n in range(1, 2 * BULK_SIZE + 1)]
+        orders += [make_order(1001, OrderStatus.PENDING), make_order(1002, OrderStatus.PREPARING)]
+        orders += [make_order(n, OrderStatus.CONFIRMED) for n in range(2001, 2004)]
+        await conn.execute(insert(Order), orders)
+    await engine.dispose()
+
+
+def check_bulk_status():
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        # Только запросы к заказам: фоновые воркеры приложения (очередь уведомлений) ходят в базу параллельно
+        if " orders" in statement:
+            statements.append(statement.split()[0].upper())
+
+    with TestClient(app) as client:
+        print(f"🧪 1. Кухня начинает готовить {BULK_SIZE} заказов одним запросом...")
+        order_ids = list(range(1, BULK_SIZE + 1)) + [999999, 1001, 1]
+        event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+        started = time.perf_counter()
+        response = client.patch(
+            f"{API}/kitchen/orders/bulk-status",
+            json={"status": "preparing", "order_ids": order_ids},
+            headers=auth("kitchen")
+        )
+        bulk_ms = (time.perf_counter() - started) * 1000
+        event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        assert response.status_code == 200, response.text
+        body = response.json()
+        assert body["updated"] == BULK_SIZE and body["failed"] == 2, {k: body[k] for k in ("updated", "failed")}
+        results = body["results"]
+        assert [r["order_id"] for r in results] == order_ids[:-1], "исходы в порядке запроса, без повторов"
+        assert all(r["success"] and r["previous_status"] == "confirmed" and r["new_status"] == "preparing" for r in results[:BULK_SIZE])
+        assert results[BULK_SIZE] == {
+            "order_id": 999999, "success": False, "order_number": None, "previous_status": None,
+            "new_status": None, "error_code": 404, "detail": "Заказ не найден"
+        }
+        assert results[BULK_SIZE + 1]["error_code"] == 400
+        assert results[BULK_SIZE + 1]["detail"] == "Можно начать готовить только подтвержденный заказ"
+        assert statements.count("UPDATE") == 1, statements
+        print(f"✅ {BULK_SIZE} переходов одним UPDATE за {bulk_ms:.0f} мс, ошибки 404 и 400 — по заказам")
+
+        print("\n🧪 2. Те же переходы одиночными PATCH...")
+        started = time.perf_counter()
+        for order_id in range(BULK_SIZE + 1, 2 * BULK_SIZE + 1):
+            assert client.patch(f"{API}/kitchen/orders/{order_id}/status", json={"status": "preparing"}, headers=auth("kitchen")).status_code == 200
+        single_ms = (time.perf_counter() - started) * 1000
+        assert bulk_ms < single_ms
+        print(f"✅ Одиночные запросы: {single_ms:.0f} мс, массовый быстрее в {single_ms / bulk_ms:.1f} раза")
+
+        print("\n🧪 3. Администратор подтверждает заказы из разных статусов...")
+        response = client.patch(
+            f"{API}/admin/orders/bulk-status",
+            json={"status": "confirmed", "order_ids": [1001, 1002, 999999]},
+            headers=auth("admin")
+        )
+        assert response.status_code == 200, response.text
+        results = {r["order_id"]: r for r in response.json()["results"]}
+        assert results[1001]["previous_status"] == "pending" and results[1001]["new_status"] == "confirmed"
+        assert results[1002]["previous_status"] == "preparing"
+        assert results[999999]["error_code"] == 404
+        print("✅ Предыдущий статус возвращается по каждому заказу")
+
+        print("\n🧪 4. Проверка запроса...")
+        assert client.patch(f"{API}/kitchen/orders/bulk-status", json={"status": "delivered", "order_ids": [1]}, headers=auth("kitchen")).status_code == 400
+        assert client.patch(f"{API}/kitchen/orders/bulk-status", json={"status": "preparing", "order_ids": []}, headers=auth("kitchen")).status_code == 422
+        assert client.patch(f"{API}/admin/orders/bulk-status", json={"status": "confirmed", "order_ids": list(range(501))}, headers=auth("admin")).status_code == 422
+        assert client.patch(f"{API}/admin/orders/bulk-status", json={"status": "confirmed", "order_ids": [1]}, headers=auth("kitchen")).status_code == 403
+        print("✅ Недопустимый статус — 400, пустой список и больше 500 заказов — 422, чужая роль — 403")
+
+        print("\n🧪 5. События по каждому заказу...")
+        with client.websocket_connect(f"{API}/events/orders/ws?token={TOKENS['kitchen']}") as ws:
+            response = client.patch(
+                f"{API}/kitchen/orders/bulk-status",
+                json={"status": "preparing", "order_ids": [2001, 2002, 2003]},
+                headers=auth("kitchen")
+            )
+            assert response.json()["updated"] == 3
+            events = [json.loads(ws.receive_text()) for _ in range(3)]
+        assert [(e["order_id"], e["previous_status"], e["status"]) for e in events] == [
+            (n, "confirmed", "preparing") for n in (2001, 2002, 2003)
+        ]
+        assert events[0]["order"]["order_number"] == "ORD-BULK-02001"
+        print("✅ Кухня получила 3 события status_changed")
+
+
+def test_order_bulk_status():
+    asyncio.run(seed())
+    check_bulk_status()
+
+
+if __name__ == "__main__":
+    test_order_bulk_status()
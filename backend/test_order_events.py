@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Тест событий заказов в реальном времени:
+- смены статуса в роутерах orders, admin, kitchen и courier публикуют события;
+- каждая роль получает только заказы своего экрана (кухня, курьеры, клиент), администратор — все;
+- WebSocket и SSE доставляют события, переподключение с Last-Event-ID отдает пропущенные;
+- медленный подписчик получает resync, а не тормозит остальных;
+- через Redis Pub/Sub (локальная замена Redis — fakeredis) события доходят до подписчиков другого воркера;
+- битое сообщение в канале не останавливает слушателя Redis; пока соединения с Redis нет, /health
+  показывает degraded, после переподключения подписчики получают resync и события снова доходят.
+
+Запуск: python test_order_events.py  (или через pytest)
+"""
+
+import asyncio
+import json
+import os
+import sys
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+import httpx
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.menu_cache import menu_cache
+from app.services.order_events import (
+    order_events, OrderEventBus, OrderEvent, InMemoryEventBackend, RedisEventBackend, RESYNC
+)
+from app.api.endpoints.events import stream_order_events
+
+USERS = {
+    "admin": User(id=1, name="Админ", phone="+77000000001", role=UserRole.ADMIN, hashed_password="-"),
+    "kitchen": User(id=2, name="Кухня", phone="+77000000002", role=UserRole.KITCHEN, hashed_password="-"),
+    "courier1": User(id=3, name="Курьер 1", phone="+77000000003", role=UserRole.COURIER, hashed_password="-"),
+    "courier2": User(id=4, name="Курьер 2", phone="+77000000004", role=UserRole.COURIER, hashed_password="-"),
+    "client": User(id=5, name="Клиент", phone="+77000000005", role=UserRole.CLIENT, hashed_password="-"),
+}
+TOKENS = {name: AuthService(None).create_access_token(data={"sub": str(user.id)}) for name, user in USERS.items()}
+API = "/api/v1"
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session_maker() as session:
+        session.add_all(list(USERS.values()))
+        session.add(Category(id=1, name="Бургеры"))
+        session.add(Dish(id=1, name="Бургер", price=Decimal("2500"), category_id=1))
+        await session.commit()
+    await engine.dispose()
+
+
+def auth(name):
+    return {"Authorization": f"Bearer {TOKENS[name]}"}
+
+
+def drain(ws, count):
+    """Получение count сообщений WebSocket (TestClient читает их синхронно)."""
+    return [json.loads(ws.receive_text()) for _ in range(count)]
+
+
+def create_order(client, delivery_type):
+    body = {
+        "items": [{"dish_id": 1, "quantity": 1}],
+        "delivery_type": delivery_type,
+        "payment_method": "cash",
+        "name": "Клиент",
+        "phone": "+77000000005",
+    }
+    if delivery_type == "pickup":
+        body["pickup_address"] = "ул. Абая 1"
+    else:
+        body["delivery_address"] = json.dumps({"address": "ул. Сатпаева 10"})
+    response = client.post(f"{API}/orders/", json=body, headers=auth("client"))
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def check_role_streams():
+    with TestClient(app) as client:
+        sockets = {}
+        try:
+            for name in TOKENS:
+                sockets[name] = client.websocket_connect(f"{API}/events/orders/ws?token={TOKENS[name]}").__enter__()
+
+            print("🧪 1. Самовывоз: создание, подтверждение, приготовление, выдача...")
+            pickup_id = create_order(client, "pickup")
+            assert client.patch(f"{API}/admin/orders/{pickup_id}/status", json={"status": "confirmed"}, headers=auth("admin")).status_code == 200
+            assert client.patch(f"{API}/kitchen/orders/{pickup_id}/start-cooking", headers=auth("kitchen")).status_code == 200
+            assert client.patch(f"{API}/kitchen/orders/{pickup_id}/mark-ready", headers=auth("kitchen")).status_code == 200
+            assert client.patch(f"{API}/kitchen/orders/{pickup_id}/pickup-complete", headers=auth("kitchen")).status_code == 200
+
+            admin_events = drain(sockets["admin"], 5)
+            assert [e["type"] for e in admin_events] == ["created"] + ["status_changed"] * 4
+            assert [e["status"] for e in admin_events] == ["pending", "confirmed", "preparing", "ready", "delivered"]
+            assert admin_events[0]["order"]["items"][0]["dish_name"] == "Бургер", "событие несет представление заказа"
+
+            # Кухня: заказ появился (confirmed), менялся и ушел с экрана (delivered)
+            kitchen_events = drain(sockets["kitchen"], 4)
+            assert [e["status"] for e in kitchen_events] == ["confirmed", "preparing", "ready", "delivered"]
+            client_events = drain(sockets["client"], 5)
+            assert [e["status"] for e in client_events] == ["pending", "confirmed", "preparing", "ready", "delivered"]
+            print("✅ Администратор и клиент получили все 5 событий, кухня — 4 события своего экрана")
+
+            print("\n🧪 2. Доставка: два курьера...")
+            delivery_id = create_order(client, "delivery")
+            for status in ("confirmed", "preparing", "ready"):
+                assert client.patch(f"{API}/admin/orders/{delivery_id}/status", json={"status": status}, headers=auth("admin")).status_code == 200
+            assert client.patch(f"{API}/courier/orders/{delivery_id}/take", headers=auth("courier1")).status_code == 200
+            assert client.patch(f"{API}/courier/orders/{delivery_id}/delivered", headers=auth("courier1")).status_code == 200
+
+            # Курьеры: заказ стал свободным (ready), затем его забрал первый курьер
+            courier1_events = drain(sockets["courier1"], 3)
+            assert [(e["type"], e["status"]) for e in courier1_events] == [
+                ("status_changed", "ready"), ("courier_assigned", "delivering"), ("status_changed", "delivered")
+            ]
+            courier2_events = drain(sockets["courier2"], 2)
+            assert [e["status"] for e in courier2_events] == ["ready", "delivering"], "второй курьер убирает заказ из свободных"
+            # Кухня видит доставку до готовности: confirmed, preparing, ready (заказ уходит с экрана)
+            kitchen_events = drain(sockets["kitchen"], 3)
+            assert [e["status"] for e in kitchen_events] == ["confirmed", "preparing", "ready"]
+            assert all(e["order_id"] == delivery_id for e in kitchen_events + courier2_events)
+            for name in ("admin", "client"):
+                assert [e["order_id"] for e in drain(sockets[name], 6)] == [delivery_id] * 6
+            print("✅ Курьеры получают только свободные и свои заказы, кухня — только свой экран")
+
+            print("\n🧪 3. Лишние события не доходят...")
+            # Проверочный заказ: если роль получила что-то лишнее раньше, первым придет не он
+            marker_id = create_order(client, "delivery")
+            for status in ("confirmed", "preparing", "ready"):
+                assert client.patch(f"{API}/admin/orders/{marker_id}/status", json={"status": status}, headers=auth("admin")).status_code == 200
+            first = {name: drain(sockets[name], 1)[0] for name in sockets}
+            assert all(event["order_id"] == marker_id for event in first.values()), first
+            assert first["admin"]["status"] == first["client"]["status"] == "pending"
+            assert first["kitchen"]["status"] == "confirmed"
+            assert first["courier1"]["status"] == first["courier2"]["status"] == "ready"
+            print("✅ Лишних событий нет")
+
+            print("\n🧪 4. Неверный токен...")
+            try:
+                with client.websocket_connect(f"{API}/events/orders/ws?token=bad") as ws:
+                    ws.receive_text()
+            except Exception as e:
+                assert getattr(e, "code", None) == 4401, e
+            else:
+                raise AssertionError("ожидалось закрытие соединения")
+            assert client.get(f"{API}/events/orders/stream").status_code == 401
+            print("✅ Подключение без действительного токена отклоняется")
+        finally:
+            for ws in sockets.values():
+                ws.__exit__(None, None, None)
+
+
+def make_event(n: int, status: str = "confirmed") -> OrderEvent:
+    return OrderEvent(
+        type="status_changed", order_id=n, order_number=f"ORD-{n}", status=status, previous_status="pending",
+        delivery_type="pickup", assigned_courier_id=None, user_id=None, order=None, occurred_at="2024-01-15T12:00:00"
+    )
+
+
+async def check_sse_and_replay():
+    print("\n🧪 5. SSE и Last-Event-ID...")
+    await order_events.use_backend(InMemoryEventBackend())
+    disconnected = False
+
+    async def receive():
+        return {"type": "http.disconnect"} if disconnected else {"type": "http.request", "body": b"", "more_body": True}
+
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": []}, receive)
+    response = await stream_order_events(request=request, token=TOKENS["kitchen"], last_event_id=None, credentials=None)
+    stream = response.body_iterator
+    assert (await stream.__anext__()).startswith("retry:")
+
+    first = await order_events.publish(make_event(101))
+    chunk = await stream.__anext__()
+    assert chunk.startswith(f"id: {first.id}\nevent: status_changed\ndata: ")
+    assert json.loads(chunk.split("data: ", 1)[1])["order_id"] == 101
+
+    # Клиент отключился, пока публиковались два события, и переподключился с Last-Event-ID
+    disconnected = True
+    await stream.aclose()
+    assert order_events.subscribers_count == 0
+    await order_events.publish(make_event(102))
+    await order_events.publish(make_event(103, status="delivering"))  # не для кухни
+    await order_events.publish(make_event(104))
+
+    disconnected = False
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": []}, receive)
+    response = await stream_order_events(request=request, token=TOKENS["kitchen"], last_event_id=first.id, credentials=None)
+    stream = response.body_iterator
+    await stream.__anext__()
+    replayed = [json.loads((await stream.__anext__()).split("data: ", 1)[1])["order_id"] for _ in range(2)]
+    assert replayed == [102, 104], replayed
+    await stream.aclose()
+
+    # Неизвестный Last-Event-ID (история уже вытеснена) — resync
+    subscription = order_events.subscribe(lambda event: True, last_event_id="0-unknown")
+    assert await subscription.get(timeout=1) == (None, RESYNC)
+    subscription.close()
+    print("✅ SSE отдает события с id, пропущенные события возвращаются после переподключения")
+
+    print("\n🧪 6. Медленный подписчик...")
+    bus = OrderEventBus(queue_size=5)
+    slow = bus.subscribe(lambda event: True)
+    fast = bus.subscribe(lambda event: True)
+    for n in range(8):
+        await bus.publish(make_event(n))
+        await fast.get(timeout=1)
+    assert await slow.get(timeout=1) == (None, RESYNC), "переполненная очередь заменяется на resync"
+    slow.close()
+    fast.close()
+    print("✅ Переполнение очереди одного клиента не задерживает остальных")
+
+
+async def check_redis_fanout():
+    print("\n🧪 7. Рассылка между воркерами через Redis...")
+    try:
+        import fakeredis
+    except ImportError:
+        print("⏭️ fakeredis не установлен, проверка пропущена")
+        return
+
+    server = fakeredis.FakeServer()
+    workers = [
+        OrderEventBus(backend=RedisEventBackend(channel="test:orders", client=fakeredis.FakeAsyncRedis(server=server)))
+        for _ in range(2)
+    ]
+    for bus in workers:
+        await bus.start()
+    try:
+        subscriptions = [bus.subscribe(lambda event: event.status == "confirmed") for bus in workers]
+        await workers[0].publish(make_event(201))
+        await workers[1].publish(make_event(202, status="delivering"))
+        await workers[1].publish(make_event(203))
+        for subscription in subscriptions:
+            received = [(await subscription.get(timeout=2))[0].order_id for _ in range(2)]
+            assert received == [201, 203], received
+            assert await subscription.get(timeout=0.2) is None
+        print("✅ Оба воркера получают события, опубликованные любым из них")
+    finally:
+        for bus in workers:
+            await bus.stop()
+
+
+async def check_redis_listener_errors():
+    print("\n🧪 8. Ошибки слушателя Redis...")
+    try:
+        import fakeredis
+    except ImportError:
+        print("⏭️ fakeredis не установлен, проверка пропущена")
+        return
+
+    server = fakeredis.FakeServer()
+    backend = RedisEventBackend(
+        channel="test:orders", client=fakeredis.FakeAsyncRedis(server=server), reconnect_min_seconds=0.05
+    )
+    previous = order_events.backend
+    await order_events.use_backend(backend)
+    try:
+        subscription = order_events.subscribe(lambda event: True)
+        await backend.publish("не JSON")
+        await order_events.publish(make_event(301))
+        event, _ = await subscription.get(timeout=2)
+        assert event.order_id == 301
+        stats = order_events.stats()
+        assert stats["listening"] and stats["delivery_errors"] == 1 and "JSONDecodeError" in stats["last_error"], stats
+        subscription.close()
+
+        # Соединение с Redis потеряно: пока сервер недоступен, /health показывает degraded
+        before = event.id
+        subscription = order_events.subscribe(lambda event: True)
+
+        async def connection_lost(*args, **kwargs):
+            raise ConnectionError("Connection closed by server")
+
+        backend._pubsub.parse_response = connection_lost
+        await order_events.publish(make_event(302))  # Будит слушателя, следующее чтение падает
+        server.connected = False  # Переподписаться пока не удается
+        event, _ = await subscription.get(timeout=2)
+        assert event.order_id == 302
+        for _ in range(100):
+            if not backend.listening:
+                break
+            await asyncio.sleep(0.02)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            health = (await client.get("/health")).json()
+        assert health["status"] == "degraded", health
+        assert health["order_events"]["backend"] == "redis" and not health["order_events"]["listening"], health
+        assert "Connection" in health["order_events"]["last_error"], health
+        await asyncio.sleep(0.2)
+        assert not backend.listening and "emulating a connection error" in backend.stats()["last_error"]
+
+        # Redis снова доступен: слушатель переподписывается, подписчики перечитывают списки
+        server.connected = True
+        assert await subscription.get(timeout=5) == (None, RESYNC)
+        await order_events.publish(make_event(303))
+        event, _ = await subscription.get(timeout=2)
+        assert event.order_id == 303
+        # История до разрыва неполная: переподключение с Last-Event-ID из нее — resync
+        assert await order_events.subscribe(lambda event: True, last_event_id=before).get(timeout=1) == (None, RESYNC)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            health = (await client.get("/health")).json()
+        assert health["status"] == "healthy" and health["order_events"]["reconnects"] == 1, health
+        print("✅ Битое сообщение пропущено; без Redis — status degraded, после переподключения — resync и события")
+    finally:
+        server.connected = True
+        await order_events.use_backend(previous)
+
+
+def test_order_events():
+    asyncio.run(seed())
+    menu_cache.reset()
+    check_role_streams()
+    asyncio.run(check_sse_and_replay())
+    asyncio.run(check_redis_fanout())
+    asyncio.run(check_redis_listener_errors())
+
+
+if __name__ == "__main__":
+    test_order_events()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Тест выдачи номеров заказов:
+- формат ORD-ГГГГММДД-NNNNN и последовательная нумерация в пределах дня;
+- блок номеров резервируется одним запросом, остальные номера выдаются из памяти;
+- несколько воркеров (разные экземпляры аллокатора) никогда не получают одинаковых номеров;
+- с новым днем и для другого филиала нумерация начинается заново;
+- номер с самым длинным префиксом филиала и шестизначным номером за день помещается
+  в orders.order_number, слишком длинный префикс отклоняется при запуске.
+
+Запуск: python test_order_numbers.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+from datetime import date
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.models import Base
+from app.models.order import Order, OrderNumberSequence
+from app.services.order_numbers import OrderNumberAllocator, ORDER_NUMBER_PREFIX_MAX_LENGTH
+
+BLOCK_SIZE = 20
+WORKERS = 4
+NUMBERS_PER_WORKER = 250
+
+
+async def run_tests():
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}", connect_args={"timeout": 30})
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    queries = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    day = date(2024, 1, 15)
+
+    try:
+        print("🧪 1. Формат и последовательность...")
+        allocator = OrderNumberAllocator(prefix="ORD", block_size=BLOCK_SIZE)
+        async with session_maker() as db:
+            queries.clear()
+            numbers = [await allocator.next_number(db, day) for _ in range(BLOCK_SIZE * 3)]
+        assert numbers[0] == "ORD-20240115-00001"
+        assert all(re.fullmatch(r"ORD-20240115-\d{5}", number) for number in numbers)
+        assert [int(number[-5:]) for number in numbers] == list(range(1, BLOCK_SIZE * 3 + 1))
+        assert len(queries) == 3, f"ожидалось 3 резервирования блока, выполнено {len(queries)} запросов"
+        print(f"✅ {len(numbers)} номеров за {len(queries)} запроса (по одному на блок из {BLOCK_SIZE})")
+
+        print(f"\n🧪 2. {WORKERS} воркера выдают номера одновременно...")
+        workers = [OrderNumberAllocator(prefix="ORD", block_size=BLOCK_SIZE) for _ in range(WORKERS)]
+
+        async def worker_numbers(worker):
+            async with session_maker() as db:
+                return await asyncio.gather(*[worker.next_number(db, day) for _ in range(NUMBERS_PER_WORKER)])
+
+        results = await asyncio.gather(*[worker_numbers(worker) for worker in workers])
+        issued = numbers + [number for result in results for number in result]
+        assert len(issued) == len(set(issued)), "выданы повторяющиеся номера"
+        for result in results:
+            values = [int(number[-5:]) for number in result]
+            assert values == sorted(values), "номера одного воркера должны возрастать"
+        print(f"✅ {len(issued)} уникальных номеров, повторов нет")
+
+        print("\n🧪 3. Новый день и другой филиал...")
+        async with session_maker() as db:
+            assert await allocator.next_number(db, date(2024, 1, 16)) == "ORD-20240116-00001"
+            branch = OrderNumberAllocator(prefix="AST", block_size=BLOCK_SIZE)
+            assert await branch.next_number(db, day) == "AST-20240115-00001"
+        print("✅ Нумерация ведется отдельно по дням и филиалам")
+
+        print("\n🧪 4. Длина номера...")
+        column_length = Order.__table__.c.order_number.type.length
+        prefix = "F" * ORDER_NUMBER_PREFIX_MAX_LENGTH
+        async with session_maker() as db:
+            # Шестизначный номер за день
+            await db.execute(insert(OrderNumberSequence).values(scope=f"{prefix}-20240115", last_value=99_999))
+            await db.commit()
+            number = await OrderNumberAllocator(prefix=prefix, block_size=BLOCK_SIZE).next_number(db, day)
+        assert number == f"{prefix}-20240115-100000" and len(number) <= column_length, (number, column_length)
+        for bad_prefix in ("", "F" * (ORDER_NUMBER_PREFIX_MAX_LENGTH + 1)):
+            try:
+                OrderNumberAllocator(prefix=bad_prefix, block_size=BLOCK_SIZE)
+            except ValueError as e:
+                assert "ORDER_NUMBER_PREFIX" in str(e)
+            else:
+                raise AssertionError(f"префикс {bad_prefix!r} должен отклоняться")
+        print(f"✅ {number} — {len(number)} из {column_length} символов, длинный префикс отклоняется")
+    finally:
+        await engine.dispose()
+        os.unlink(db_file.name)
+
+
+def test_order_numbers():
+    asyncio.run(run_tests())
+
+
+if __name__ == "__main__":
+    test_order_numbers()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пакетной сборки заказов: количество SQL-запросов в списках заказов
+не должно зависеть от количества заказов (раньше было 1 + N запросов).
+
+Запуск: python test_order_projection.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.models import Base
+from app.models.user import User, UserRole
+from app.models.menu import Category, Dish
+from app.models.order import Order, OrderItem, OrderStatus, DeliveryType, PaymentMethod, PaymentStatus
+from app.api.endpoints.admin import get_all_orders
+from app.api.endpoints.kitchen import get_kitchen_orders
+from app.api.endpoints.courier import get_available_orders
+
+
+async def get_admin_orders_page(current_user: User, db: AsyncSession):
+    """Первая страница ленты администратора (без фильтров)."""
+    feed = await get_all_orders(
+        cursor=None, limit=100, status=None, delivery_type=None, courier_id=None,
+        date_from=None, date_to=None, phone=None, current_user=current_user, db=db
+    )
+    return feed.orders
+
+
+ORDER_COUNTS = [10, 100, 1000]
+ITEMS_PER_ORDER = 3
+
+
+async def seed(session: AsyncSession, orders_count: int):
+    """Заполнение базы тестовыми заказами."""
+    session.add(Category(id=1, name="Блюда"))
+    session.add(Dish(id=1, name="Бургер", price=Decimal("1500"), category_id=1))
+    await session.flush()
+
+    now = datetime.now()
+    orders = []
+    for i in range(orders_count):
+        orders.append({
+            "id": i + 1,
+            "order_number": f"ORD-TEST-{i + 1:06d}",
+            "customer_name": f"Клиент {i}",
+            "customer_phone": f"+7700{i:07d}",
+            "delivery_type": DeliveryType.DELIVERY if i % 2 else DeliveryType.PICKUP,
+            "status": OrderStatus.READY if i % 3 == 0 else OrderStatus.CONFIRMED,
+            "payment_status": PaymentStatus.PENDING,
+            "payment_method": PaymentMethod.CARD,
+            "subtotal": Decimal("4500"),
+            "total_amount": Decimal("4500"),
+            "delivery_address": '{"address": "ул. Абая 1", "floor": "2"}',
+            "created_at": now - timedelta(minutes=i),
+            "confirmed_at": now - timedelta(minutes=i),
+            "ready_at": now - timedelta(minutes=i),
+        })
+    await session.execute(insert(Order), orders)
+
+    items = [
+        {
+            "order_id": order_id,
+            "dish_id": 1,
+            "dish_name": "Бургер",
+            "dish_price": Decimal("1500"),
+            "quantity": 1,
+            "price": Decimal("1500"),
+            "total_price": Decimal("1500"),
+            "modifiers": [{"id": 1, "name": "Сырный соус", "price": 0}],
+        }
+        for order_id in range(1, orders_count + 1)
+        for _ in range(ITEMS_PER_ORDER)
+    ]
+    await session.execute(insert(OrderItem), items)
+    await session.commit()
+
+
+async def measure(orders_count: int):
+    """Подсчет запросов для списков заказов на базе из orders_count заказов."""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with session_maker() as session:
+        await seed(session, orders_count)
+
+    queries = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    admin = User(id=1, name="Admin", phone="+77000000001", role=UserRole.ADMIN, is_active=True, hashed_password="-")
+    kitchen = User(id=2, name="Kitchen", phone="+77000000002", role=UserRole.KITCHEN, is_active=True, hashed_password="-")
+    courier = User(id=3, name="Courier", phone="+77000000003", role=UserRole.COURIER, is_active=True, hashed_password="-")
+
+    results = {}
+    for name, endpoint, user in [
+        ("admin.get_all_orders", get_admin_orders_page, admin),
+        ("kitchen.get_kitchen_orders", get_kitchen_orders, kitchen),
+        ("courier.get_available_orders", get_available_orders, courier),
+    ]:
+        async with session_maker() as session:
+            queries.clear()
+            started = time.perf_counter()
+            response = await endpoint(current_user=user, db=session)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            assert all(len(order.items) == ITEMS_PER_ORDER for order in response)
+            results[name] = (len(response), len(queries), elapsed_ms)
+
+    await engine.dispose()
+    return results
+
+
+async def run_benchmark():
+    print("📊 Количество SQL-запросов в списках заказов")
+    query_counts = {}
+    for orders_count in ORDER_COUNTS:
+        results = await measure(orders_count)
+        print(f"\n🧾 Заказов в базе: {orders_count}")
+        for name, (rows, queries_count, elapsed_ms) in results.items():
+            print(f"  {name:<30} заказов: {rows:>5}  запросов: {queries_count}  время: {elapsed_ms:8.1f} мс")
+            query_counts.setdefault(name, set()).add(queries_count)
+
+    # Количество запросов не должно расти вместе с количеством заказов
+    for name, counts in query_counts.items():
+        assert len(counts) == 1, f"{name}: количество запросов растет с объемом ({sorted(counts)})"
+        assert max(counts) <= 2, f"{name}: ожидалось не более 2 запросов, получено {max(counts)}"
+
+    print("\n✅ Количество запросов постоянно и не зависит от количества заказов")
+
+
+def test_order_projection_query_count_is_flat():
+    asyncio.run(run_benchmark())
+
+
+if __name__ == "__main__":
+    test_order_projection_query_count_is_flat()
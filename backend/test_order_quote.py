@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Тест расчета корзины POST /orders/quote:
+- сумма, скидка, доставка (с порогом бесплатной доставки) и итог;
+- итог расчета совпадает с суммой созданного заказа;
+- повторные расчеты той же корзины не обращаются к базе;
+- изменения меню и промокодов сразу отражаются в расчете.
+
+Запуск: python test_order_quote.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from main import app
+from app.core.config import settings
+from app.core.database import async_session_maker, get_db_session
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.promo_code import PromoCode, DiscountType
+from app.services.menu_cache import menu_cache
+from app.services.order_numbers import order_number_allocator
+from app.services.pricing import QuoteCache, quote_cache
+
+
+async def seed(session: AsyncSession):
+    session.add_all([
+        Category(id=1, name="Бургеры"),
+        Dish(id=1, name="Чизбургер", price=Decimal("800"), category_id=1),
+        Dish(id=2, name="Двойной бургер", price=Decimal("1800"), category_id=1),
+        PromoCode(id=1, code="SALE10", name="Скидка 10%", discount_type=DiscountType.PERCENTAGE, discount_value=Decimal("10")),
+    ])
+    await session.commit()
+
+
+def test_quote_cache_lru():
+    print("🧪 1. LRU-вытеснение...")
+    cache = QuoteCache(max_size=2, ttl_seconds=60)
+    cache.put(("a", 0), "A")
+    cache.put(("b", 0), "B")
+    assert cache.get(("a", 0)) == "A"  # "a" становится самым свежим
+    cache.put(("c", 0), "C")
+    assert cache.get(("b", 0)) is None and cache.get(("a", 0)) == "A" and len(cache) == 2
+
+    expired = QuoteCache(max_size=2, ttl_seconds=0.0001)
+    expired.put(("a", 0), "A")
+    time.sleep(0.001)
+    assert expired.get(("a", 0)) is None
+    print("✅ Вытесняется самый давний расчет, устаревшие записи не отдаются")
+
+
+async def run_tests():
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        await seed(session)
+
+    async def override_db_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_db_session] = override_db_session
+    menu_cache.reset()
+    menu_cache.session_maker = session_maker  # Снимок меню собирается из тестовой базы
+    menu_cache.invalidate()
+    order_number_allocator.reset()
+    quote_cache.clear()
+
+    queries = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    delivery_fee = Decimal(str(settings.DELIVERY_FEE))
+
+    def cart(*items, delivery_type="delivery", promo_code=None):
+        return {
+            "items": [{"dish_id": dish_id, "quantity": quantity} for dish_id, quantity in items],
+            "delivery_type": delivery_type,
+            "promo_code": promo_code
+        }
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            print("\n🧪 2. Сумма, доставка и минимальный заказ...")
+            quote = (await client.post("/api/v1/orders/quote", json=cart((1, 1)))).json()
+            assert Decimal(quote["subtotal"]) == 800
+            assert Decimal(quote["delivery_fee"]) == delivery_fee
+            assert Decimal(quote["total_amount"]) == 800 + delivery_fee
+            assert quote["is_min_order_met"] is False
+
+            quote = (await client.post("/api/v1/orders/quote", json=cart((1, 1), delivery_type="pickup"))).json()
+            assert Decimal(quote["delivery_fee"]) == 0
+
+            quote = (await client.post("/api/v1/orders/quote", json=cart((2, 2), promo_code="sale10"))).json()
+            assert Decimal(quote["subtotal"]) == 3600
+            assert Decimal(quote["discount_amount"]) == 360 and quote["promo_applied"] is True
+            assert Decimal(quote["delivery_fee"]) == 0, "бесплатная доставка от FREE_DELIVERY_AMOUNT"
+            assert Decimal(quote["total_amount"]) == 3240
+            print("✅ Доставка, порог бесплатной доставки и промокод учитываются")
+
+            print("\n🧪 3. Итог расчета совпадает с суммой заказа...")
+            order_cart = cart((1, 1), (2, 1), promo_code="SALE10")
+            quote = (await client.post("/api/v1/orders/quote", json=order_cart)).json()
+            order_request = {
+                **order_cart,
+                "payment_method": "cash",
+                "delivery_address": '{"address": "ул. Абая 1"}',
+                "name": "Гость",
+                "phone": "+77001112233"
+            }
+            response = await client.post("/api/v1/orders/", json=order_request)
+            assert response.status_code == 200, response.text
+            assert Decimal(response.json()["total_amount"]) == Decimal(quote["total_amount"])
+
+            small_order = {**order_request, "items": [{"dish_id": 1, "quantity": 1}], "promo_code": None}
+            response = await client.post("/api/v1/orders/", json=small_order)
+            assert response.status_code == 400, "заказ меньше MIN_ORDER_AMOUNT отклоняется"
+            print(f"✅ Заказ создан на {quote['total_amount']} ₸ — как в расчете")
+
+            print("\n🧪 4. Повторный расчет без обращения к базе...")
+            quote_cache.clear()
+            body = cart((1, 2), (2, 1), promo_code="SALE10")
+            queries.clear()
+            first = (await client.post("/api/v1/orders/quote", json=body)).json()
+            first_queries = len(queries)
+            queries.clear()
+            for _ in range(10):
+                assert (await client.post("/api/v1/orders/quote", json=body)).json() == first
+            assert queries == [], queries
+            print(f"✅ Первый расчет: {first_queries} запросов, следующие 10: 0 запросов")
+
+            print("\n🧪 5. Изменения меню и промокодов...")
+            response = await client.put("/api/v1/menu/dishes/1", json={"price": "900"})
+            assert response.status_code == 200
+            quote = (await client.post("/api/v1/orders/quote", json=body)).json()
+            assert Decimal(quote["subtotal"]) == 900 * 2 + 1800
+
+            response = await client.patch("/api/v1/promo-codes/1/toggle")
+            assert response.status_code == 200
+            quote = (await client.post("/api/v1/orders/quote", json=body)).json()
+            assert Decimal(quote["discount_amount"]) == 0 and quote["promo_applied"] is False
+            print("✅ Новая цена блюда и отключенный промокод видны сразу")
+    finally:
+        app.dependency_overrides.clear()
+        menu_cache.session_maker = async_session_maker
+        menu_cache.reset()
+        quote_cache.clear()
+        await engine.dispose()
+        os.unlink(db_file.name)
+
+
+def test_order_quote():
+    asyncio.run(run_tests())
+
+
+if __name__ == "__main__":
+    test_quote_cache_lru()
+    test_order_quote()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Тест машины состояний заказа (app/services/order_state.py):
+- переход из одного статуса — один условный UPDATE ... RETURNING без предварительного SELECT
+  (и обновление сверток показателей);
+- из 10 курьеров, одновременно берущих один заказ, выигрывает ровно один, остальные получают 409;
+- администратор переназначает курьера на заказ, возвращенный из доставки в 'готов';
+- ошибки (нет заказа, неверный статус, чужой курьер, тип доставки, чужой заказ) прежние;
+- временные метки переходов пишутся тем же UPDATE и фиксируют первое попадание в статус;
+- migrate_order_status_timestamps добавляет колонки в существующую базу.
+
+База: TEST_DATABASE_URL (например PostgreSQL) или временный файл SQLite.
+Запуск: python test_order_state.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi import HTTPException
+from sqlalchemy import event, insert, select, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import database
+from app.core.config import Settings
+from app.core.db_backend import create_engines, is_sqlite
+from app.models import Base
+from app.models.order import Order, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.models.user import User, UserRole
+from app.services.order_state import (
+    apply_transition, admin_transition, START_COOKING, MARK_READY, RETURN_TO_CONFIRMED,
+    COMPLETE_PICKUP, TAKE_FOR_DELIVERY, ASSIGN_COURIER, MARK_DELIVERED, CANCEL
+)
+
+COURIERS = 10
+
+
+def make_order(n: int, delivery_type: DeliveryType, status: OrderStatus, user_id=None) -> dict:
+    return {
+        "id": n,
+        "order_number": f"ORD-STATE-{n:05d}",
+        "user_id": user_id,
+        "customer_name": f"Клиент {n}",
+        "customer_phone": f"+7701{n:07d}",
+        "delivery_type": delivery_type,
+        "payment_method": PaymentMethod.CASH,
+        "status": status,
+        "payment_status": PaymentStatus.PENDING,
+        "subtotal": Decimal("3000"),
+        "total_amount": Decimal("3000"),
+        "created_at": datetime.now(),
+    }
+
+
+async def expect_error(coroutine, status_code: int, detail: str = None):
+    try:
+        await coroutine
+    except HTTPException as e:
+        assert e.status_code == status_code, (e.status_code, e.detail)
+        assert detail is None or e.detail == detail, e.detail
+        return e
+    raise AssertionError(f"ожидалась ошибка {status_code}")
+
+
+async def run_tests(database_url: str):
+    test_settings = Settings(DEBUG=False)
+    engine, sync_engine = create_engines(database_url, test_settings)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split()[0].upper())
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(User), [
+                {"id": 100 + n, "name": f"Курьер {n}", "phone": f"+7702{n:07d}", "role": UserRole.COURIER, "hashed_password": "-"}
+                for n in range(COURIERS)
+            ] + [{"id": 200, "name": "Клиент", "phone": "+77030000000", "role": UserRole.CLIENT, "hashed_password": "-"}])
+            await conn.execute(insert(Order), [
+                make_order(1, DeliveryType.PICKUP, OrderStatus.CONFIRMED),
+                make_order(2, DeliveryType.DELIVERY, OrderStatus.READY),
+                make_order(3, DeliveryType.PICKUP, OrderStatus.READY),
+                make_order(4, DeliveryType.DELIVERY, OrderStatus.PENDING, user_id=200),
+            ])
+
+        print("🧪 1. Переход без предварительного чтения...")
+        event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+        async with session_maker() as db:
+            result = await apply_transition(db, 1, START_COOKING)
+            await db.commit()
+        event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        # UPDATE статуса и INSERT ... ON CONFLICT сверток показателей, без чтения заказа
+        assert [s for s in statements if s not in ("BEGIN", "COMMIT")] == ["UPDATE", "INSERT"], statements
+        assert result.previous_status == OrderStatus.CONFIRMED
+        assert result.order.status == OrderStatus.PREPARING and result.order.order_number == "ORD-STATE-00001"
+        assert result.order.preparing_at is not None
+        print(f"✅ Без чтения заказа: {statements}")
+
+        print(f"\n🧪 2. {COURIERS} курьеров одновременно берут один заказ...")
+
+        async def take(courier_id: int):
+            async with session_maker() as db:
+                try:
+                    result = await apply_transition(db, 2, TAKE_FOR_DELIVERY, courier_id=courier_id)
+                    await db.commit()
+                    return result.order.assigned_courier_id
+                except HTTPException as e:
+                    await db.rollback()
+                    return e.status_code
+
+        outcomes = await asyncio.gather(*(take(100 + n) for n in range(COURIERS)))
+        winners = [o for o in outcomes if o != 409]
+        assert len(winners) == 1 and winners[0] >= 100, outcomes
+        async with session_maker() as db:
+            order = (await db.execute(select(Order).where(Order.id == 2))).scalar_one()
+        assert order.status == OrderStatus.DELIVERING and order.assigned_courier_id == winners[0]
+        assert order.delivering_at is not None
+        print(f"✅ Заказ достался курьеру {winners[0]}, остальные {COURIERS - 1} получили 409")
+
+        print("\n🧪 3. Ошибки переходов...")
+        async with session_maker() as db:
+            await expect_error(apply_transition(db, 999, START_COOKING), 404, "Заказ не найден")
+            await expect_error(apply_transition(db, 3, START_COOKING), 400, START_COOKING.detail)
+            await expect_error(apply_transition(db, 3, TAKE_FOR_DELIVERY, courier_id=100), 400, TAKE_FOR_DELIVERY.delivery_type_detail)
+            loser = 101 if winners[0] != 101 else 102
+            await expect_error(apply_transition(db, 2, MARK_DELIVERED, courier_id=loser), 403)
+            await expect_error(apply_transition(db, 4, CANCEL, user_id=201), 403, "Нет доступа к этому заказу")
+            await expect_error(apply_transition(db, 2, COMPLETE_PICKUP), 400, COMPLETE_PICKUP.delivery_type_detail)
+            await db.rollback()
+        print("✅ 404, 400, 403 и сообщения совпадают с прежними проверками в роутерах")
+
+        print("\n🧪 4. Журнал переходов...")
+        async with session_maker() as db:
+            confirmed_at = (await apply_transition(db, 4, admin_transition(OrderStatus.CONFIRMED))).order.confirmed_at
+            await apply_transition(db, 4, START_COOKING)
+            back = await apply_transition(db, 4, RETURN_TO_CONFIRMED)
+            await apply_transition(db, 4, START_COOKING)
+            ready = await apply_transition(db, 4, MARK_READY)
+            await db.commit()
+        assert back.previous_status == OrderStatus.PREPARING
+        assert back.order.confirmed_at == confirmed_at, "повторное подтверждение не переписывает первую метку"
+        order = ready.order
+        assert order.confirmed_at <= order.preparing_at <= order.ready_at
+        async with session_maker() as db:
+            result = await apply_transition(db, 4, admin_transition(OrderStatus.CANCELLED))
+            await db.commit()
+        assert result.previous_status == OrderStatus.READY and result.order.cancelled_at is not None
+        print("✅ confirmed_at, preparing_at, ready_at и cancelled_at заполнены в порядке переходов")
+
+        print("\n🧪 5. Переназначение курьера администратором...")
+        async with session_maker() as db:
+            await apply_transition(db, 2, admin_transition(OrderStatus.READY))
+            await db.commit()
+            # Курьер остался записан на заказе: сам взять его другой курьер не может, администратор — назначает
+            await expect_error(apply_transition(db, 2, TAKE_FOR_DELIVERY, courier_id=loser), 409)
+            await db.rollback()
+            result = await apply_transition(db, 2, ASSIGN_COURIER, courier_id=loser)
+            await db.commit()
+        assert result.previous_status == OrderStatus.READY
+        assert result.order.status == OrderStatus.DELIVERING and result.order.assigned_courier_id == loser
+        print(f"✅ Заказ возвращен в 'готов' и назначен курьеру {loser}")
+    finally:
+        await engine.dispose()
+        sync_engine.dispose()
+
+
+def check_migration():
+    print("\n🧪 6. Миграция существующей базы...")
+    from migrate_order_status_timestamps import migrate_order_status_timestamps, NEW_COLUMNS
+
+    engine = database.sync_engine
+    try:
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for name in NEW_COLUMNS:
+                conn.execute(text(f"ALTER TABLE orders DROP COLUMN {name}"))
+
+        migrate_order_status_timestamps()
+        migrate_order_status_timestamps()  # повторный запуск ничего не меняет
+        columns = {column["name"] for column in inspect(engine).get_columns("orders")}
+        assert set(NEW_COLUMNS) <= columns
+        print("✅ Колонки добавлены, повторный запуск безопасен")
+    finally:
+        engine.dispose()
+
+
+def test_order_state():
+    database_url = Settings().TEST_DATABASE_URL
+    db_file = None
+    if not database_url:
+        db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        db_file.close()
+        database_url = f"sqlite+aiosqlite:///{db_file.name}"
+    print(f"🗄️ База: {'SQLite' if is_sqlite(database_url) else database_url.split('://')[0]}")
+    try:
+        asyncio.run(run_tests(database_url))
+    finally:
+        if db_file:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_file.name + suffix):
+                    os.unlink(db_file.name + suffix)
+    check_migration()
+
+
+if __name__ == "__main__":
+    test_order_state()
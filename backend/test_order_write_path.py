@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк записи заказа при 50 одновременных оформлениях:
+сравнение прежнего пути (flush заказа, позиции по одной, refresh после commit)
+с пакетным insert_order (INSERT ... RETURNING + один пакетный INSERT позиций
++ один INSERT ... ON CONFLICT сверток показателей).
+
+Измеряется время удержания блокировки записи SQLite — от первого INSERT
+транзакции до завершения commit — и общее время 50 оформлений.
+
+Запуск: python test_order_write_path.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.order import Order, OrderItem, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.services.metrics import record_order_created
+from app.services.order_writer import insert_order
+from app.services.pricing import PricedItem
+
+CONCURRENT_CHECKOUTS = 50
+ITEMS_PER_ORDER = 8
+
+
+def make_order_data(n: int, prefix: str) -> dict:
+    return {
+        "order_number": f"ORD-{prefix}-{n:06d}",
+        "customer_name": f"Клиент {n}",
+        "customer_phone": f"+7701{n:07d}",
+        "delivery_type": DeliveryType.PICKUP,
+        "payment_method": PaymentMethod.CASH,
+        "pickup_address": "ул. Абая 1",
+        "status": OrderStatus.PENDING,
+        "payment_status": PaymentStatus.PENDING,
+        "subtotal": Decimal("12000"),
+        "discount_amount": Decimal("0"),
+        "delivery_fee": Decimal("0"),
+        "total_amount": Decimal("12000"),
+        "promo_discount": Decimal("0"),
+        "created_at": datetime.now(),
+    }
+
+
+ITEMS = [
+    PricedItem(
+        dish_id=1,
+        dish_name="Бургер",
+        dish_price=Decimal("1500"),
+        quantity=1,
+        price=Decimal("1500"),
+        total_price=Decimal("1500"),
+        modifiers=[{"id": 1, "name": "Сыр", "price": 300.0, "type": "addon"}]
+    )
+    for _ in range(ITEMS_PER_ORDER)
+]
+
+
+async def legacy_checkout(db: AsyncSession, n: int):
+    """Прежний путь create_order (с обновлением сверток, как у insert_order)."""
+    order = Order(**make_order_data(n, "OLD"))
+    db.add(order)
+    await db.flush()
+    for item in ITEMS:
+        db.add(OrderItem(
+            order_id=order.id,
+            dish_id=item.dish_id,
+            dish_name=item.dish_name,
+            dish_price=item.dish_price,
+            quantity=item.quantity,
+            price=item.price,
+            total_price=item.total_price,
+            modifiers=item.modifiers
+        ))
+    await db.flush()
+    # Свертки показателей обновляются при любом способе записи заказа
+    await record_order_created(db, order)
+    info = (await db.connection()).info
+    await db.commit()
+    lock_ms = (time.perf_counter() - info.pop("write_started")) * 1000
+    await db.refresh(order)
+    return lock_ms
+
+
+async def bulk_checkout(db: AsyncSession, n: int):
+    """Новый путь create_order."""
+    await insert_order(db, make_order_data(n, "NEW"), ITEMS)
+    info = (await db.connection()).info
+    await db.commit()
+    return (time.perf_counter() - info.pop("write_started")) * 1000
+
+
+async def run_concurrent(session_maker, checkout):
+    async def one(n):
+        async with session_maker() as db:
+            return await checkout(db, n)
+
+    started = time.perf_counter()
+    lock_times = await asyncio.gather(*[one(n) for n in range(CONCURRENT_CHECKOUTS)])
+    wall_ms = (time.perf_counter() - started) * 1000
+    return lock_times, wall_ms
+
+
+async def run_benchmark():
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}", connect_args={"timeout": 30})
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        session.add(Category(id=1, name="Бургеры"))
+        session.add(Dish(id=1, name="Бургер", price=Decimal("1500"), category_id=1))
+        await session.commit()
+
+    statements_per_order = {}
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def mark_write(conn, cursor, statement, parameters, context, executemany):
+        # Блокировка записи берется первым INSERT транзакции
+        if statement.lstrip().upper().startswith("INSERT"):
+            conn.info.setdefault("write_started", time.perf_counter())
+        key = conn.info.get("checkout")
+        if key:
+            statements_per_order[key] = statements_per_order.get(key, 0) + 1
+
+    print(f"📊 {CONCURRENT_CHECKOUTS} одновременных оформлений по {ITEMS_PER_ORDER} позиций")
+    results = {}
+    for name, checkout in [("прежний путь", legacy_checkout), ("insert_order", bulk_checkout)]:
+        lock_times, wall_ms = await run_concurrent(session_maker, checkout)
+        lock_times = sorted(lock_times)
+        p95 = lock_times[int(len(lock_times) * 0.95) - 1]
+        results[name] = (statistics.median(lock_times), p95, wall_ms)
+        print(f"  {name:<14} блокировка: медиана {results[name][0]:6.2f} мс, p95 {p95:6.2f} мс; все оформления: {wall_ms:7.1f} мс")
+
+    # Количество запросов одного оформления
+    for name, checkout in [("прежний путь", legacy_checkout), ("insert_order", bulk_checkout)]:
+        async with session_maker() as db:
+            (await db.connection()).info["checkout"] = name
+            await checkout(db, 10_000)
+            (await db.connection()).info.pop("checkout", None)
+    print("  запросов на оформление: " + ", ".join(f"{name}: {count}" for name, count in statements_per_order.items()))
+
+    async with session_maker() as db:
+        orders_count = (await db.execute(select(func.count(Order.id)))).scalar()
+        items_count = (await db.execute(select(func.count(OrderItem.id)))).scalar()
+    expected_orders = 2 * (CONCURRENT_CHECKOUTS + 1)
+    assert orders_count == expected_orders, orders_count
+    assert items_count == expected_orders * ITEMS_PER_ORDER, items_count
+
+    await engine.dispose()
+    os.unlink(db_file.name)
+
+    assert statements_per_order["insert_order"] == 3, statements_per_order
+    assert results["insert_order"][0] < results["прежний путь"][0], "пакетная запись должна держать блокировку меньше"
+    print("\n✅ Заказ и позиции записываются двумя запросами, блокировка удерживается меньше")
+
+
+def test_order_write_path():
+    asyncio.run(run_benchmark())
+
+
+if __name__ == "__main__":
+    test_order_write_path()
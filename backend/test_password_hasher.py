@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Тест пула bcrypt (app/services/password_hasher.py):
+- вход, регистрация и проверка пароля работают через пул;
+- хеш с устаревшей стоимостью пересчитывается при успешном входе;
+- при переполнении очереди — 429 с Retry-After, счетчики в /health;
+- бенчмарк: p99 задержки посторонних запросов во время волны входов
+  при bcrypt в пуле и при bcrypt прямо в обработчике (как было раньше).
+
+Запуск: python test_password_hasher.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+import httpx
+from passlib.context import CryptContext
+from sqlalchemy import select, insert
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.user import User, UserRole
+from app.services.password_hasher import PasswordHasher, password_hasher
+
+API = "/api/v1"
+PASSWORD = "secret123"
+STORM_USERS = 12
+
+
+def client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def login(http: httpx.AsyncClient, n: int):
+    return http.post(f"{API}/auth/login", json={"phone": f"+7701{n:07d}", "password": PASSWORD})
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def seed():
+    current_hash = await password_hasher.hash(PASSWORD)
+    # Хеш, посчитанный с меньшей стоимостью (до изменения PASSWORD_BCRYPT_ROUNDS)
+    legacy_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash(PASSWORD)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {
+                "id": n + 1, "name": f"Клиент {n}", "phone": f"+7701{n:07d}", "role": UserRole.CLIENT,
+                "hashed_password": legacy_hash if n == 0 else current_hash, "is_active": True, "is_verified": True,
+            }
+            for n in range(STORM_USERS)
+        ])
+    await engine.dispose()
+
+
+async def check_login_and_rehash():
+    print("🧪 1. Вход, неверный пароль, регистрация и пересчет устаревшего хеша...")
+    async with client() as http:
+        response = await login(http, 0)
+        assert response.status_code == 200, response.text
+        async with async_session_maker() as db:
+            hashed = (await db.execute(select(User.hashed_password).where(User.id == 1))).scalar_one()
+        assert hashed.startswith("$2b$12$") and password_hasher.context.verify(PASSWORD, hashed), hashed
+        assert (await login(http, 0)).status_code == 200
+
+        response = await http.post(f"{API}/auth/login", json={"phone": "+77010000001", "password": "wrong-password"})
+        assert response.status_code == 401
+        response = await http.post(f"{API}/auth/register", json={"phone": "+77020000000", "name": "Новый", "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        assert (await http.post(f"{API}/auth/login", json={"phone": "+77020000000", "password": PASSWORD})).status_code == 200
+    await engine.dispose()
+    print("✅ Хеш со стоимостью 4 заменен хешем со стоимостью 12 при первом входе")
+
+
+async def check_backpressure():
+    print("\n🧪 2. Переполнение очереди — 429...")
+    hasher = PasswordHasher(workers=1, max_queue=1, rounds=10, retry_after_seconds=3)
+    results = await asyncio.gather(*(hasher.hash(PASSWORD) for _ in range(5)), return_exceptions=True)
+    rejected = [result for result in results if not isinstance(result, str)]
+    assert len(rejected) == 3 and all(error.status_code == 429 for error in rejected)
+    assert rejected[0].headers == {"Retry-After": "3"}
+    stats = hasher.stats()
+    assert (stats["completed"], stats["rejected"], stats["peak_queued"], stats["in_flight"]) == (2, 3, 1, 0), stats
+    hasher.shutdown()
+
+    max_queue = password_hasher.max_queue
+    password_hasher.max_queue = 1
+    try:
+        async with client() as http:
+            responses = await asyncio.gather(*(login(http, n) for n in range(1, 7)))
+            codes = sorted(response.status_code for response in responses)
+            assert codes == [200] * (password_hasher.workers + 1) + [429] * (5 - password_hasher.workers), codes
+            assert next(r for r in responses if r.status_code == 429).headers["retry-after"] == "2"
+            health = (await http.get("/health")).json()["password_hasher"]
+            assert health["rejected"] >= 5 - password_hasher.workers and health["in_flight"] == 0, health
+    finally:
+        password_hasher.max_queue = max_queue
+    await engine.dispose()
+    print(f"✅ {password_hasher.workers} потока + 1 место в очереди: остальные входы получают 429 с Retry-After")
+
+
+async def inline_login(http: httpx.AsyncClient, n: int):
+    """Прежний путь входа: bcrypt прямо в обработчике, event loop занят на время проверки."""
+    async with async_session_maker() as db:
+        hashed = (await db.execute(select(User.hashed_password).where(User.phone == f"+7701{n:07d}"))).scalar_one()
+    assert password_hasher.context.verify(PASSWORD, hashed)
+
+
+async def probe_during(storm, interval: float = 0.02) -> list:
+    """
+    Задержки GET /menu/categories по расписанию (каждые interval секунд), пока идет волна входов.
+    Задержка считается от запланированного момента отправки: запрос, который не смог уйти,
+    потому что event loop был занят, тоже ждет.
+    """
+    latencies = []
+    async with client() as http:
+        await http.get(f"{API}/menu/categories")  # прогрев
+        task = asyncio.ensure_future(storm(http))
+        planned = time.perf_counter()
+        while not task.done():
+            await asyncio.sleep(max(0.0, planned - time.perf_counter()))
+            assert (await http.get(f"{API}/menu/categories")).status_code == 200
+            latencies.append((time.perf_counter() - planned) * 1000)
+            planned = max(planned + interval, time.perf_counter())
+        await task
+    await engine.dispose()
+    return latencies
+
+
+async def check_storm_latency():
+    print("\n🧪 3. Задержка посторонних запросов во время волны входов...")
+
+    async def pooled_storm(http):
+        responses = await asyncio.gather(*(login(http, n) for n in range(STORM_USERS)))
+        assert all(response.status_code == 200 for response in responses)
+
+    async def inline_storm(http):
+        await asyncio.gather(*(inline_login(http, n) for n in range(STORM_USERS)))
+
+    started = time.perf_counter()
+    pooled = await probe_during(pooled_storm)
+    pooled_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    inline = await probe_during(inline_storm)
+    inline_seconds = time.perf_counter() - started
+
+    pooled_p99, inline_p99 = percentile(pooled, 0.99), percentile(inline, 0.99)
+    print(f"✅ bcrypt в пуле: {STORM_USERS} входов за {pooled_seconds:.1f} с, {len(pooled)} запросов меню, "
+          f"p50 {percentile(pooled, 0.5):.0f} мс, p99 {pooled_p99:.0f} мс")
+    print(f"✅ bcrypt в обработчике: {STORM_USERS} входов за {inline_seconds:.1f} с, {len(inline)} запросов меню, "
+          f"p50 {percentile(inline, 0.5):.0f} мс, p99 {inline_p99:.0f} мс")
+    # Одна проверка bcrypt — сотни миллисекунд: в обработчике на столько встает весь воркер
+    assert pooled_p99 * 3 < inline_p99, (pooled_p99, inline_p99)
+
+
+def test_password_hasher():
+    try:
+        asyncio.run(seed())
+        asyncio.run(check_login_and_rehash())
+        asyncio.run(check_backpressure())
+        asyncio.run(check_storm_latency())
+    finally:
+        password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    test_password_hasher()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Тест движка расчета цен корзины:
+- цена позиции учитывает варианты и добавки, итог учитывает промокод;
+- варианты и добавки проверяются на принадлежность блюду, обязательные группы — на заполненность;
+- количество SQL-запросов при оформлении заказа не зависит от размера корзины
+  (раньше было по два запроса на каждую позицию);
+- оформление заказа берет цены и доступность блюд из базы, даже если снимок меню устарел.
+
+Запуск: python test_pricing_engine.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.database import async_session_maker
+from app.models import Base
+from app.models.menu import Category, Dish, VariantGroup, Variant, Addon, dish_variant_table, dish_addon_table
+from app.models.order import OrderItem, DeliveryType
+from app.models.promo_code import PromoCode, DiscountType
+from app.schemas.order import OrderItemRequest, OrderCreateRequest, PaymentMethod
+from app.services.menu_cache import menu_cache
+from app.services.order_numbers import order_number_allocator
+from app.services.pricing import PricingEngine
+from app.api.endpoints.orders import create_order
+
+DISHES_COUNT = 60
+CART_SIZES = [1, 15, 50]
+
+
+async def seed(session: AsyncSession):
+    """Меню: у каждого блюда обязательный размер, необязательное тесто и две добавки."""
+    session.add_all([
+        Category(id=1, name="Пицца"),
+        VariantGroup(id=1, name="Размер", is_required=True, sort_order=1),
+        VariantGroup(id=2, name="Тесто", is_required=False, sort_order=2),
+        VariantGroup(id=3, name="Соус", is_required=True, sort_order=3),
+        Variant(id=1, name="25 см", price=Decimal("0"), group_id=1, is_default=True),
+        Variant(id=2, name="30 см", price=Decimal("500"), group_id=1),
+        Variant(id=3, name="Тонкое", price=Decimal("100"), group_id=2),
+        Variant(id=4, name="Острый", price=Decimal("50"), group_id=3),
+        Addon(id=1, name="Сыр", price=Decimal("300")),
+        Addon(id=2, name="Бекон", price=Decimal("400")),
+        Addon(id=3, name="Снятая добавка", price=Decimal("100"), is_active=False),
+        Dish(id=1000, name="Снято с продажи", price=Decimal("1000"), category_id=1, is_available=False),
+        Dish(id=2000, name="Пицца с соусом", price=Decimal("2000"), category_id=1),
+        PromoCode(id=1, code="SALE10", name="Скидка 10%", discount_type=DiscountType.PERCENTAGE,
+                  discount_value=Decimal("10"), max_discount_amount=Decimal("5000")),
+        PromoCode(id=2, code="MINUS500", name="Минус 500", discount_type=DiscountType.FIXED,
+                  discount_value=Decimal("500"), min_order_amount=Decimal("3000")),
+    ])
+    for i in range(1, DISHES_COUNT + 1):
+        session.add(Dish(id=i, name=f"Пицца {i}", price=Decimal(2000 + i), category_id=1))
+    await session.flush()
+    await session.execute(insert(dish_variant_table), [
+        {"dish_id": dish_id, "variant_id": variant_id}
+        for dish_id in range(1, DISHES_COUNT + 1) for variant_id in (1, 2, 3)
+    ] + [{"dish_id": 2000, "variant_id": 4}])
+    await session.execute(insert(dish_addon_table), [
+        {"dish_id": dish_id, "addon_id": addon_id}
+        for dish_id in range(1, DISHES_COUNT + 1) for addon_id in (1, 2, 3)
+    ])
+    await session.commit()
+
+
+async def expect_error(coro, status_code: int):
+    try:
+        await coro
+    except HTTPException as e:
+        assert e.status_code == status_code, (e.status_code, e.detail)
+        return e.detail
+    raise AssertionError(f"ожидалась ошибка {status_code}")
+
+
+async def run_tests():
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{db_file.name}")
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_maker() as session:
+        await seed(session)
+
+    queries = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        queries.append(statement)
+
+    menu_cache.reset()
+    menu_cache.session_maker = session_maker  # Снимок меню собирается из тестовой базы
+    menu_cache.invalidate()
+    order_number_allocator.reset()
+
+    try:
+        async with session_maker() as db:
+            engine_ = PricingEngine(db)
+
+            print("🧪 1. Расчет цены позиции и корзины...")
+            pricing = await engine_.price_cart([
+                OrderItemRequest(dish_id=1, quantity=2, modifiers=[2, 3], addons=[1]),
+                OrderItemRequest(dish_id=2, quantity=1),
+            ], promo_code="sale10")
+            first, second = pricing.items
+            assert first.price == Decimal("2001") + 500 + 100 + 300
+            assert first.total_price == first.price * 2
+            assert [m["name"] for m in first.modifiers] == ["30 см", "Тонкое", "Сыр"]
+            # Обязательный размер не выбран — подставляется вариант по умолчанию
+            assert second.price == Decimal("2002") and [m["name"] for m in second.modifiers] == ["25 см"]
+            assert pricing.subtotal == first.total_price + second.total_price
+            assert pricing.discount_amount == (pricing.subtotal * Decimal("0.1")).quantize(Decimal("0.01"))
+            assert pricing.total_amount == pricing.subtotal - pricing.discount_amount
+            assert pricing.promo_code == "SALE10"
+
+            small = await engine_.price_cart([OrderItemRequest(dish_id=1, quantity=1)], promo_code="MINUS500")
+            assert small.discount_amount == 0, "минимальная сумма промокода не достигнута"
+            big = await engine_.price_cart([OrderItemRequest(dish_id=1, quantity=2)], promo_code="MINUS500")
+            assert big.discount_amount == Decimal("500")
+            print("✅ Варианты, добавки, количество и промокоды учитываются")
+
+            print("\n🧪 2. Проверка корзины...")
+            await expect_error(engine_.price_cart([OrderItemRequest(dish_id=1000, quantity=1)]), 404)
+            await expect_error(engine_.price_cart([OrderItemRequest(dish_id=99999, quantity=1)]), 404)
+            await expect_error(engine_.price_cart([OrderItemRequest(dish_id=1, quantity=1, modifiers=[4])]), 400)
+            await expect_error(engine_.price_cart([OrderItemRequest(dish_id=1, quantity=1, modifiers=[1, 2])]), 400)
+            await expect_error(engine_.price_cart([OrderItemRequest(dish_id=1, quantity=1, addons=[3])]), 400)
+            await expect_error(engine_.price_cart([OrderItemRequest(dish_id=2000, quantity=1, addons=[1])]), 400)
+            detail = await expect_error(engine_.price_cart([OrderItemRequest(dish_id=2000, quantity=1)]), 400)
+            assert "Соус" in detail
+            await expect_error(engine_.price_cart([]), 400)
+            print("✅ Чужие варианты и добавки, группы и недоступные блюда отклоняются")
+
+        print("\n🧪 3. Количество запросов при оформлении заказа...")
+        for cache_enabled in (True, False):
+            menu_cache.enabled = cache_enabled
+            counts = {}
+            for cart_size in CART_SIZES:
+                request = OrderCreateRequest(
+                    items=[
+                        OrderItemRequest(dish_id=i, quantity=1, modifiers=[2], addons=[1, 2])
+                        for i in range(1, cart_size + 1)
+                    ],
+                    delivery_type=DeliveryType.PICKUP,
+                    payment_method=PaymentMethod.CASH,
+                    pickup_address="ул. Абая 1",
+                    name="Гость",
+                    phone="+77001112233",
+                    promo_code="SALE10"
+                )
+                async with session_maker() as db:
+                    queries.clear()
+                    response = await create_order(request=request, current_user=None, db=db)
+                    pricing_queries = [q for q in queries if not q.lstrip().upper().startswith("INSERT")]
+                    counts[cart_size] = len(pricing_queries)
+                    assert len(response.items) == cart_size
+
+                async with session_maker() as db:
+                    result = await db.execute(select(OrderItem).where(OrderItem.order_id == response.id))
+                    items = result.scalars().all()
+                    assert [len(item.modifiers) for item in items] == [3] * cart_size
+
+            mode = "снимок меню" if cache_enabled else "без кеша"
+            print(f"  {mode:<12} " + "  ".join(f"{size} поз.: {count} запросов" for size, count in counts.items()))
+            assert len(set(counts.values())) == 1, f"{mode}: запросы растут с размером корзины {counts}"
+        print("✅ Количество запросов постоянно")
+
+        print("\n🧪 4. Меню изменено через другой воркер...")
+        menu_cache.enabled = True
+        async with session_maker() as db:
+            await PricingEngine(db).load_dishes([])  # Снимок этого воркера собран до изменения
+            await db.execute(update(Dish).where(Dish.id == 5).values(price=Decimal("9999")))
+            await db.execute(update(Dish).where(Dish.id == 6).values(is_available=False))
+            await db.commit()
+
+        def order_request(dish_id: int) -> OrderCreateRequest:
+            return OrderCreateRequest(
+                items=[OrderItemRequest(dish_id=dish_id, quantity=1)],
+                delivery_type=DeliveryType.PICKUP,
+                payment_method=PaymentMethod.CASH,
+                pickup_address="ул. Абая 1",
+                name="Гость",
+                phone="+77001112233"
+            )
+
+        async with session_maker() as db:
+            quote = await PricingEngine(db).price_cart(order_request(5).items)
+            assert quote.subtotal == Decimal("2005"), "предварительный расчет идет по снимку"
+            response = await create_order(request=order_request(5), current_user=None, db=db)
+            assert response.total_amount == Decimal("9999"), response.total_amount
+            await expect_error(create_order(request=order_request(6), current_user=None, db=db), 404)
+        print("✅ Заказ оформлен по цене из базы, отключенное блюдо отклонено")
+    finally:
+        menu_cache.enabled = True
+        menu_cache.session_maker = async_session_maker
+        menu_cache.reset()
+        await engine.dispose()
+        os.unlink(db_file.name)
+
+
+def test_pricing_engine():
+    asyncio.run(run_tests())
+
+
+if __name__ == "__main__":
+    test_pricing_engine()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Тест кеша пользователей для авторизации (app/services/principal_cache.py):
+- LRU-вытеснение, TTL и invalidate;
+- повторные запросы кухни и администратора авторизуются без SELECT из users;
+- смена роли, блокировка и изменение имени сразу видны в этом процессе;
+- изменение в базе в обход API (другой воркер) видно после TTL.
+
+Запуск: python test_principal_cache.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, update
+
+from main import app
+from app.core.database import engine
+from app.models import Base
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.principal_cache import Principal, PrincipalCache, principal_cache
+
+API = "/api/v1"
+
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': str(user_id)})}"}
+
+
+def check_cache():
+    print("🧪 1. LRU, TTL и invalidate...")
+    cache = PrincipalCache(max_size=2, ttl_seconds=0.2)
+    principals = [Principal(id=n, role=UserRole.CLIENT, is_active=True, name=f"Клиент {n}", phone=f"+7700000000{n}") for n in range(3)]
+    cache.put(principals[0])
+    cache.put(principals[1])
+    assert cache.get(0) is principals[0]  # 0 становится самым свежим
+    cache.put(principals[2])
+    assert cache.get(1) is None and cache.get(0) is principals[0] and len(cache) == 2
+
+    cache.invalidate(0)
+    assert cache.get(0) is None
+    time.sleep(0.25)
+    assert cache.get(2) is None and len(cache) == 0
+
+    disabled = PrincipalCache(max_size=0, ttl_seconds=30)
+    disabled.put(principals[0])
+    assert disabled.get(0) is None
+    print("✅ Вытесняется самый давний, записи устаревают по TTL, размер 0 отключает кеш")
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": 1, "name": "Админ", "phone": "+77000000001", "role": UserRole.ADMIN, "hashed_password": "-"},
+            {"id": 2, "name": "Кухня", "phone": "+77000000002", "role": UserRole.KITCHEN, "hashed_password": "-"},
+            {"id": 3, "name": "Курьер", "phone": "+77000000003", "role": UserRole.COURIER, "hashed_password": "-"},
+        ])
+    await engine.dispose()
+
+
+async def change_in_database(user_id: int, **values):
+    """Изменение пользователя в обход API — как если бы его сделал другой воркер."""
+    async with engine.begin() as conn:
+        await conn.execute(update(User).where(User.id == user_id).values(**values))
+    await engine.dispose()
+
+
+def check_requests():
+    user_reads = []
+
+    def count_user_reads(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            user_reads.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_user_reads)
+    try:
+        with TestClient(app) as client:
+            print("\n🧪 2. Повторные запросы без чтения users...")
+            for _ in range(5):
+                assert client.get(f"{API}/kitchen/orders", headers=auth(2)).status_code == 200
+                assert client.get(f"{API}/admin/orders", headers=auth(1)).status_code == 200
+            # По одному чтению на пользователя — при первом запросе
+            assert len(user_reads) == 2, user_reads
+            assert user_reads[0].split("FROM")[0].count(",") == 4  # Только поля для авторизации
+            assert client.get(f"{API}/admin/orders", headers=auth(2)).status_code == 403
+            assert client.get(f"{API}/kitchen/orders", headers={"Authorization": "Bearer invalid"}).status_code == 401
+            assert client.get(f"{API}/kitchen/orders", headers=auth(99)).status_code == 401
+            print("✅ 10 запросов кухни и администратора — 2 чтения users, чужая роль — 403")
+
+            print("\n🧪 3. Смена роли, блокировка и имени сбрасывают кеш...")
+            response = client.put(f"{API}/users/2/role", json={"role": "courier"}, headers=auth(1))
+            assert response.status_code == 200, response.text
+            assert client.get(f"{API}/kitchen/orders", headers=auth(2)).status_code == 403
+            assert client.get(f"{API}/courier/available-orders", headers=auth(2)).status_code == 200
+
+            assert client.get(f"{API}/courier/available-orders", headers=auth(3)).status_code == 200
+            response = client.put(f"{API}/users/3/status", json={"is_active": False}, headers=auth(1))
+            assert response.status_code == 200, response.text
+            assert client.get(f"{API}/courier/available-orders", headers=auth(3)).status_code == 400
+            assert client.put(f"{API}/users/3/status", json={"is_active": True}, headers=auth(1)).status_code == 200
+            assert client.get(f"{API}/courier/available-orders", headers=auth(3)).status_code == 200
+
+            assert client.put(f"{API}/users/me/profile", json={"name": "Курьер Иван"}, headers=auth(3)).status_code == 200
+            assert principal_cache.get(3) is None
+            assert client.get(f"{API}/courier/available-orders", headers=auth(3)).status_code == 200
+            assert principal_cache.get(3).name == "Курьер Иван"
+            print("✅ Новая роль и блокировка действуют со следующего запроса")
+
+            print("\n🧪 4. Изменение в другом воркере видно после TTL...")
+            ttl_seconds = principal_cache.ttl_seconds
+            principal_cache.ttl_seconds = 0.3
+            try:
+                asyncio.run(change_in_database(3, is_active=False))
+                # Пока запись свежая, процесс о блокировке не знает
+                assert client.get(f"{API}/courier/available-orders", headers=auth(3)).status_code == 200
+                time.sleep(0.35)
+                assert client.get(f"{API}/courier/available-orders", headers=auth(3)).status_code == 400
+            finally:
+                principal_cache.ttl_seconds = ttl_seconds
+            print("✅ Расхождение между воркерами ограничено PRINCIPAL_CACHE_TTL_SECONDS")
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count_user_reads)
+
+
+def test_principal_cache():
+    try:
+        check_cache()
+        asyncio.run(seed())
+        principal_cache.clear()
+        check_requests()
+    finally:
+        principal_cache.clear()
+
+
+if __name__ == "__main__":
+    test_principal_cache()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Тест push-рассылок (app/services/push_campaigns.py):
+- ограничение скорости (token bucket);
+- рассылка через /marketing/push-campaigns доходит до всех активных клиентов с устройством,
+  прогресс и недействительные токены записываются в push_campaigns;
+- сбой пакета повторяется, отказ по отдельным токенам уходит в очередь notification_jobs;
+- отмена идущей рассылки;
+- рассылка упавшего процесса продолжается с курсора после аренды;
+- 500 000 получателей: память не растет с числом клиентов.
+
+Запуск: python test_push_campaigns.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select, insert, delete, update
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.notification import NotificationJob, PushCampaign
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.notifications import DeliveryError, LocalTransport, notification_dispatcher
+from app.services.push_campaigns import PushCampaignRunner, TokenBucket
+
+API = "/api/v1"
+CLIENTS = 2000
+LARGE_CLIENTS = 500_000
+
+
+def auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': str(user_id)})}"}
+
+
+class CountingTransport:
+    """Провайдер, который только считает сообщения (ничего не хранит) и может зависнуть или отказать."""
+
+    def __init__(self, hang_after: int = 0, retry_tokens=(), latency: float = 0.0):
+        self.hang_after = hang_after
+        self.retry_tokens = set(retry_tokens)
+        self.latency = latency
+        self.calls = 0
+        self.messages = 0
+        self.tokens = None  # Список токенов, если нужно проверить получателей
+
+    async def send_push(self, tokens, title, body, data):
+        self.calls += 1
+        if self.hang_after and self.calls > self.hang_after:
+            await asyncio.Event().wait()  # «Процесс упал» посреди рассылки
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += len(tokens)
+        if self.tokens is not None:
+            self.tokens.extend(tokens)
+        return [DeliveryError("Квота исчерпана") if token in self.retry_tokens else None for token in tokens]
+
+
+def client_rows(start: int, count: int):
+    return [
+        {"id": n, "name": f"Клиент {n}", "phone": f"+7{n:010d}", "role": UserRole.CLIENT,
+         "hashed_password": "-", "is_active": True, "fcm_token": f"token-{n}"}
+        for n in range(start, start + count)
+    ]
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": 1, "name": "Админ", "phone": "+77000000001", "role": UserRole.ADMIN, "hashed_password": "-", "fcm_token": "admin"},
+        ])
+        await conn.execute(insert(User), client_rows(10, CLIENTS))
+        # Не получают рассылку: заблокированные и клиенты без устройства
+        await conn.execute(update(User).where(User.id % 10 == 3).values(is_active=False))
+        await conn.execute(update(User).where(User.id % 10 == 7).values(fcm_token=None))
+    await engine.dispose()
+
+
+async def eligible_tokens():
+    async with async_session_maker() as db:
+        return set((await db.execute(
+            select(User.fcm_token).where(User.role == UserRole.CLIENT, User.is_active == True, User.fcm_token.is_not(None))
+        )).scalars())
+
+
+async def campaign(campaign_id: int) -> PushCampaign:
+    async with async_session_maker() as db:
+        return await db.get(PushCampaign, campaign_id)
+
+
+async def create_campaign(title: str = "Акция") -> int:
+    async with async_session_maker() as db:
+        campaign = PushCampaign(title=title, body="−20% на пиццу")
+        db.add(campaign)
+        await db.commit()
+        return campaign.id
+
+
+async def check_token_bucket():
+    print("🧪 1. Ограничение скорости...")
+    bucket = TokenBucket(rate=2000, burst=500)
+    started = time.perf_counter()
+    for _ in range(6):
+        await bucket.acquire(500)
+    elapsed = time.perf_counter() - started
+    # 500 сразу, остальные 2500 — со скоростью 2000 в секунду
+    assert 1.2 < elapsed < 1.5, elapsed
+    print(f"✅ 3000 сообщений при 2000/с и запасе 500 — {elapsed:.2f} с")
+
+
+def check_broadcast():
+    print("\n🧪 2. Рассылка через API...")
+    transport = LocalTransport()
+    transport.invalid_tokens = {"token-10", "token-11"}
+    previous = notification_dispatcher.transport
+    notification_dispatcher.transport = transport
+    expected = asyncio.run(eligible_tokens())
+    try:
+        with TestClient(app) as client:
+            assert client.post(f"{API}/marketing/push-campaigns", json={"title": "x", "body": "y"}, headers=auth(10)).status_code == 403
+            response = client.post(
+                f"{API}/marketing/push-campaigns",
+                json={"title": "Акция", "body": "−20% на пиццу", "data": {"screen": "menu"}},
+                headers=auth(1)
+            )
+            assert response.status_code == 201, response.text
+            campaign_id = response.json()["id"]
+
+            deadline = time.perf_counter() + 20
+            while time.perf_counter() < deadline:
+                progress = client.get(f"{API}/marketing/push-campaigns/{campaign_id}", headers=auth(1)).json()
+                if progress["status"] == "completed":
+                    break
+                time.sleep(0.05)
+            assert progress["status"] == "completed", progress
+            assert client.post(f"{API}/marketing/push-campaigns/{campaign_id}/cancel", headers=auth(1)).status_code == 400
+            listed = client.get(f"{API}/marketing/push-campaigns", headers=auth(1)).json()["campaigns"]
+            assert listed[0]["id"] == campaign_id
+    finally:
+        notification_dispatcher.transport = previous
+
+    delivered = [token for tokens, *_ in transport.pushes for token in tokens]
+    assert sorted(delivered) == sorted(expected), (len(delivered), len(expected))
+    assert all(len(tokens) <= 500 for tokens, *_ in transport.pushes)
+    assert transport.pushes[0][1:] == ("Акция", "−20% на пиццу", {"screen": "menu"})
+    assert (progress["recipients_total"], progress["processed"], progress["progress"]) == (len(expected), len(expected), 1.0)
+    assert (progress["sent"], progress["invalid_tokens"], progress["failed"]) == (len(expected) - 2, 2, 0), progress
+    assert progress["batches"] == len(transport.pushes)
+    remaining = asyncio.run(eligible_tokens())
+    assert "token-10" not in remaining and len(remaining) == len(expected) - 2
+    asyncio.run(engine.dispose())
+    print(f"✅ {len(expected)} из {CLIENTS} клиентов (без заблокированных и без устройства), "
+          f"{progress['batches']} пакетов, 2 недействительных токена удалены")
+
+
+async def check_failures():
+    print("\n🧪 3. Сбой пакета и отказы по отдельным токенам...")
+    transport = LocalTransport()
+    transport.fail(2)  # Первый пакет: два сбоя провайдера подряд, третья попытка успешна
+    runner = PushCampaignRunner(transport, batch_size=500, concurrency=1, rate_per_second=0, retry_base_seconds=0.05)
+    campaign_id = await create_campaign()
+    assert await runner.run_next()
+    progress = await campaign(campaign_id)
+    assert progress.status == "completed" and progress.sent_count == progress.recipients_total, progress
+
+    retry_tokens = {"token-12", "token-14"}
+    counting = CountingTransport(retry_tokens=retry_tokens)
+    runner = PushCampaignRunner(counting, batch_size=500, concurrency=2, rate_per_second=0)
+    campaign_id = await create_campaign()
+    assert await runner.run_next()
+    progress = await campaign(campaign_id)
+    assert (progress.retried_count, progress.last_error) == (2, "Квота исчерпана"), progress
+    async with async_session_maker() as db:
+        queued = set((await db.execute(select(NotificationJob.recipient))).scalars())
+        await db.execute(delete(NotificationJob))
+        await db.commit()
+    assert queued == retry_tokens, queued
+    await engine.dispose()
+    print("✅ Пакет отправлен с третьей попытки, 2 отказанных токена переданы в очередь повторов")
+
+
+async def check_cancel():
+    print("\n🧪 4. Отмена идущей рассылки...")
+    runner = PushCampaignRunner(CountingTransport(latency=0.05), batch_size=100, concurrency=1, rate_per_second=0)
+    campaign_id = await create_campaign()
+    task = asyncio.create_task(runner.run_next())
+    while (await campaign(campaign_id)).cursor_user_id == 0:
+        await asyncio.sleep(0.02)
+    with TestClient(app) as client:
+        response = client.post(f"{API}/marketing/push-campaigns/{campaign_id}/cancel", headers=auth(1))
+        assert response.status_code == 200, response.text
+    await task
+    progress = await campaign(campaign_id)
+    assert progress.status == "cancelled" and progress.finished_at is not None, progress
+    assert 0 < progress.sent_count < progress.recipients_total, progress
+    await engine.dispose()
+    print(f"✅ Остановлена после {progress.sent_count} из {progress.recipients_total} сообщений")
+
+
+async def check_resume():
+    print("\n🧪 5. Продолжение рассылки упавшего процесса...")
+    campaign_id = await create_campaign()
+    crashed = CountingTransport(hang_after=5)
+    crashed.tokens = []
+    runner = PushCampaignRunner(crashed, batch_size=100, concurrency=2, rate_per_second=0, lease_seconds=0.5)
+    task = asyncio.create_task(runner.run_next())
+    while crashed.calls <= 5:
+        await asyncio.sleep(0.01)
+    task.cancel()  # Процесс упал посреди третьей страницы
+    await asyncio.gather(task, return_exceptions=True)
+    cursor = (await campaign(campaign_id)).cursor_user_id
+    assert cursor > 0
+
+    resumed = CountingTransport()
+    resumed.tokens = []
+    other = PushCampaignRunner(resumed, batch_size=100, concurrency=2, rate_per_second=0, lease_seconds=0.5)
+    assert not await other.run_next()  # Аренда еще действует
+    await asyncio.sleep(0.55)
+    assert await other.run_next()
+
+    progress = await campaign(campaign_id)
+    expected = await eligible_tokens()
+    assert progress.status == "completed" and set(crashed.tokens) | set(resumed.tokens) == expected
+    assert min(int(token.split("-")[1]) for token in resumed.tokens) > cursor  # С курсора, а не с начала
+    duplicates = len(crashed.tokens) + len(resumed.tokens) - len(expected)
+    assert duplicates <= other.page_size, duplicates
+    assert progress.sent_count == len(expected), progress  # Счетчики незавершенной страницы не записаны
+    await engine.dispose()
+    print(f"✅ Продолжена с id {cursor}, повторно отправлено {duplicates} сообщений (не больше страницы)")
+
+
+async def seed_large():
+    async with engine.begin() as conn:
+        for start in range(10_000, 10_000 + LARGE_CLIENTS, 50_000):
+            await conn.execute(insert(User), client_rows(start, 50_000))
+    await engine.dispose()
+
+
+async def check_large_broadcast():
+    print(f"\n🧪 6. Рассылка на {LARGE_CLIENTS} клиентов...")
+    await seed_large()
+    total = len(await eligible_tokens())
+
+    # Для сравнения: все получатели в памяти разом
+    tracemalloc.start()
+    async with async_session_maker() as db:
+        rows = (await db.execute(select(User.id, User.fcm_token).where(User.fcm_token.is_not(None)))).all()
+    all_rows_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del rows
+
+    transport = CountingTransport()
+    runner = PushCampaignRunner(transport, batch_size=500, concurrency=4, rate_per_second=0)
+    campaign_id = await create_campaign()
+    tracemalloc.start()
+    started = time.perf_counter()
+    assert await runner.run_next()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    progress = await campaign(campaign_id)
+    assert progress.status == "completed" and progress.sent_count == total == transport.messages, progress
+    print(f"✅ {total} сообщений, {progress.batches_count} пакетов за {elapsed:.1f} с; "
+          f"пик памяти {peak / 2**20:.1f} МБ (все получатели разом — {all_rows_peak / 2**20:.0f} МБ)")
+    assert peak * 10 < all_rows_peak, (peak, all_rows_peak)
+    await engine.dispose()
+
+
+def test_push_campaigns():
+    asyncio.run(seed())
+    asyncio.run(check_token_bucket())
+    check_broadcast()
+    asyncio.run(check_failures())
+    asyncio.run(check_cancel())
+    asyncio.run(check_resume())
+    asyncio.run(check_large_broadcast())
+
+
+if __name__ == "__main__":
+    test_push_campaigns()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Тест разделения чтения и записи:
+- для файла SQLite путь чтения — тот же файл, открытый с mode=ro; запись через него невозможна;
+- чтение через движок только для чтения не ждет открытую транзакцию записи (WAL);
+- GET-эндпоинты меню и админки получают сессию get_read_db_session, изменяющие — get_db_session;
+- снимок меню собирается из основной базы, даже если реплика для чтения отстает.
+
+Запуск: python test_read_routing.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import select, func, insert, update, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from main import app
+from app.core.config import Settings
+from app.core.database import async_session_maker, get_db_session, get_read_db_session
+from app.core.db_backend import create_engines, create_read_engine, read_only_database_url
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.services.menu_cache import menu_cache
+
+
+def check_read_only_urls():
+    assert str(read_only_database_url("sqlite+aiosqlite:///./database.db")) == \
+        "sqlite+aiosqlite:///file:./database.db?mode=ro&uri=true"
+    assert str(read_only_database_url("sqlite:////srv/appetit/database.db")) == \
+        "sqlite+aiosqlite:///file:/srv/appetit/database.db?mode=ro&uri=true"
+    assert read_only_database_url("sqlite+aiosqlite://") is None
+    assert read_only_database_url("postgresql://appetit@db.local/appetit") is None
+
+
+def route_db_dependencies():
+    """(метод, путь) -> зависимости сессии, объявленные самим эндпоинтом (без вложенных, например авторизации)."""
+    routes = {}
+    for route in app.routes:
+        if not hasattr(route, "dependant") or not route.path.startswith(("/api/v1/menu", "/api/v1/admin")):
+            continue
+        calls = {dependency.call for dependency in route.dependant.dependencies}
+        session_calls = calls & {get_db_session, get_read_db_session}
+        for method in route.methods:
+            routes[(method, route.path)] = session_calls
+    return routes
+
+
+async def run_tests():
+    print("🧪 1. URL только для чтения...")
+    check_read_only_urls()
+    print("✅ Файл SQLite открывается с mode=ro, для памяти и PostgreSQL без реплики — основной движок")
+
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    database_url = f"sqlite+aiosqlite:///{db_file.name}"
+    test_settings = Settings(DEBUG=False)
+    engine, sync_engine = create_engines(database_url, test_settings)
+    read_engine = create_read_engine(database_url, "", test_settings)
+
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(insert(Category).values(id=1, name="Бургеры"))
+            await conn.execute(insert(Dish).values(id=1, name="Бургер", price=Decimal("1500"), category_id=1))
+
+        print("\n🧪 2. Движок только для чтения...")
+        async with read_engine.connect() as conn:
+            assert (await conn.execute(select(func.count(Dish.id)))).scalar() == 1
+            assert (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar() == "wal"
+            assert (await conn.exec_driver_sql("PRAGMA busy_timeout")).scalar() == test_settings.SQLITE_BUSY_TIMEOUT_MS
+        try:
+            async with read_engine.begin() as conn:
+                await conn.execute(insert(Dish).values(id=2, name="Чизбургер", price=Decimal("1700"), category_id=1))
+        except OperationalError as e:
+            assert "readonly" in str(e), e
+        else:
+            raise AssertionError("запись через движок только для чтения должна завершаться ошибкой")
+        print("✅ Данные видны, запись отклоняется, профиль PRAGMA применен")
+
+        print("\n🧪 3. Чтение во время открытой транзакции записи...")
+        async with engine.connect() as writer:
+            await writer.execute(text("BEGIN IMMEDIATE"))
+            await writer.execute(insert(Dish).values(id=3, name="Двойной", price=Decimal("2100"), category_id=1))
+            started = time.perf_counter()
+            async with read_engine.connect() as conn:
+                count = (await conn.execute(select(func.count(Dish.id)))).scalar()
+            read_ms = (time.perf_counter() - started) * 1000
+            await writer.commit()
+        assert count == 1, "незафиксированная запись не должна быть видна"
+        assert read_ms < 1000, f"чтение ждало блокировку записи: {read_ms:.0f} мс"
+        async with read_engine.connect() as conn:
+            assert (await conn.execute(select(func.count(Dish.id)))).scalar() == 2
+        print(f"✅ Чтение заняло {read_ms:.1f} мс и видит только зафиксированные данные")
+    finally:
+        await read_engine.dispose()
+        await engine.dispose()
+        sync_engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_file.name + suffix):
+                os.unlink(db_file.name + suffix)
+
+    print("\n🧪 4. Маршрутизация эндпоинтов...")
+    routes = route_db_dependencies()
+    for (method, path), calls in sorted(routes.items()):
+        if not calls:
+            continue
+        expected = get_read_db_session if method == "GET" else get_db_session
+        assert calls == {expected}, f"{method} {path}: {calls}"
+    assert routes[("GET", "/api/v1/menu/dishes")] == {get_read_db_session}
+    assert routes[("GET", "/api/v1/admin/orders")] == {get_read_db_session}
+    assert routes[("PATCH", "/api/v1/admin/orders/{order_id}/status")] == {get_db_session}
+    reads = sum(1 for (method, _), calls in routes.items() if method == "GET" and calls)
+    print(f"✅ {reads} GET-эндпоинтов меню и админки читают через get_read_db_session, изменения — через get_db_session")
+
+
+async def check_lagging_replica():
+    print("\n🧪 5. Снимок меню при отстающей реплике...")
+    files = []
+    engines = []
+    try:
+        # Основная база и «реплика» с состоянием до изменения цены
+        for _ in range(2):
+            db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+            db_file.close()
+            files.append(db_file.name)
+            engine, sync_engine = create_engines(f"sqlite+aiosqlite:///{db_file.name}", Settings(DEBUG=False))
+            sync_engine.dispose()
+            engines.append(engine)
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.execute(insert(Category).values(id=1, name="Бургеры"))
+                await conn.execute(insert(Dish).values(id=1, name="Бургер", price=Decimal("1500"), category_id=1))
+        primary, replica = (async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False) for engine in engines)
+
+        async def replica_session():
+            async with replica() as session:
+                yield session
+
+        app.dependency_overrides[get_read_db_session] = replica_session
+        menu_cache.session_maker = primary
+        menu_cache.enabled = True
+        menu_cache.reset()
+
+        # Цена изменена в основной базе, реплика изменение еще не получила
+        async with primary() as session:
+            await session.execute(update(Dish).where(Dish.id == 1).values(price=Decimal("1700")))
+            await session.commit()
+        menu_cache.invalidate()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/v1/menu/dishes/1")
+        assert response.status_code == 200, response.text
+        assert Decimal(str(response.json()["price"])) == Decimal("1700"), response.json()
+        assert (await menu_cache.get()).version == menu_cache.version
+        print("✅ Новая версия снимка собрана из основной базы, а не из отстающей реплики")
+    finally:
+        app.dependency_overrides.clear()
+        menu_cache.session_maker = async_session_maker
+        menu_cache.reset()
+        for engine in engines:
+            await engine.dispose()
+        for name in files:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(name + suffix):
+                    os.unlink(name + suffix)
+
+
+def test_read_routing():
+    asyncio.run(run_tests())
+    asyncio.run(check_lagging_replica())
+
+
+if __name__ == "__main__":
+    test_read_routing()
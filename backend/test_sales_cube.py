@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Тест куба продаж (sales_cube) и тепловой карты /analytics/sales-heatmap:
+- доставка заказа добавляет его блюда в куб, возврат из доставленного — вычитает, отмена не учитывается;
+- переходы, не затрагивающие доставку, не делают лишних запросов;
+- пересчет с нуля совпадает с инкрементальными изменениями и с агрегатом по заказам;
+- срез по категории и блюду;
+- время среза не растет с числом заказов: строк куба не больше дней × часов × блюд.
+
+Запуск: python test_sales_cube.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select, insert, func
+
+from main import app
+from app.core.database import engine, async_session_maker
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.metrics import SalesCube
+from app.models.order import Order, OrderItem, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.menu_cache import menu_cache
+from app.services.sales_cube import rebuild_sales_cube, sales_heatmap
+
+API = "/api/v1"
+DISHES = 8
+HISTORY_DAYS = 90
+HISTORY_HOURS = range(10, 22)
+ADMIN = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '1'})}"}
+KITCHEN = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '2'})}"}
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": 1, "name": "Админ", "phone": "+77000000001", "role": UserRole.ADMIN, "hashed_password": "-"},
+            {"id": 2, "name": "Кухня", "phone": "+77000000002", "role": UserRole.KITCHEN, "hashed_password": "-"},
+        ])
+        await conn.execute(insert(Category), [{"id": 1, "name": "Бургеры"}, {"id": 2, "name": "Напитки"}, {"id": 3, "name": "Десерты"}])
+        await conn.execute(insert(Dish), [
+            {"id": n, "name": f"Блюдо {n}", "price": Decimal(1000 + 100 * n), "category_id": n % 3 + 1}
+            for n in range(1, DISHES + 1)
+        ])
+    await engine.dispose()
+
+
+async def cube_snapshot():
+    async with async_session_maker() as db:
+        rows = (await db.execute(select(SalesCube))).scalars().all()
+    await engine.dispose()
+    return {
+        (row.sale_date, row.hour, row.category_id, row.dish_id): (row.weekday, row.orders_count, row.quantity, round(float(row.revenue), 2))
+        for row in rows
+        if row.orders_count or row.quantity or row.revenue
+    }
+
+
+def create_order(client, items):
+    response = client.post(f"{API}/orders/", json={
+        "items": items,
+        "delivery_type": "pickup",
+        "payment_method": "cash",
+        "name": "Гость",
+        "phone": "+77000000099",
+        "pickup_address": "ул. Абая 1"
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def check_incremental():
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        # Опросы фоновых воркеров приложения (очередь уведомлений, push-рассылки) не относятся к запросу
+        if "notification_jobs" not in statement and "push_campaigns" not in statement:
+            statements.append(statement.split()[0].upper())
+
+    with TestClient(app) as client:
+        print("🧪 1. Доставка, возврат и отмена заказа...")
+        # Блюдо 1 двумя строками (как с разными модификаторами): один заказ, три порции
+        first = create_order(client, [{"dish_id": 1, "quantity": 2}, {"dish_id": 1, "quantity": 1}, {"dish_id": 2, "quantity": 1}])
+        second = create_order(client, [{"dish_id": 1, "quantity": 1}])
+        cancelled = create_order(client, [{"dish_id": 3, "quantity": 5}])
+        today = date.today().isoformat()
+        params = {"date_from": today, "date_to": today, "measure": "quantity"}
+        # Пользователь кухни попадает в кеш авторизации, дальше токен проверяется без запроса к users
+        assert client.get(f"{API}/kitchen/orders", headers=KITCHEN).status_code == 200
+
+        for order_id in (first, second):
+            assert client.patch(f"{API}/admin/orders/{order_id}/status", json={"status": "confirmed"}, headers=ADMIN).status_code == 200
+            event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+            assert client.patch(f"{API}/kitchen/orders/{order_id}/start-cooking", headers=KITCHEN).status_code == 200
+            event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+            assert client.patch(f"{API}/kitchen/orders/{order_id}/mark-ready", headers=KITCHEN).status_code == 200
+        # Переход без доставки пишет только статус и свертки показателей (SELECT — событие)
+        assert statements == ["UPDATE", "INSERT", "SELECT"] * 2, statements
+
+        statements.clear()
+        event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+        response = client.patch(
+            f"{API}/admin/orders/bulk-status", json={"status": "delivered", "order_ids": [first, second]}, headers=ADMIN
+        )
+        event.remove(engine.sync_engine, "before_cursor_execute", count_statement)
+        assert response.json()["updated"] == 2
+        # Оба заказа (после чтения статусов администраторского перехода): один UPDATE,
+        # свертки, одно чтение позиций и один INSERT в куб
+        assert statements == ["SELECT", "UPDATE", "INSERT", "SELECT", "INSERT", "SELECT"], statements
+        assert client.patch(f"{API}/admin/orders/{cancelled}/status", json={"status": "cancelled"}, headers=ADMIN).status_code == 200
+
+        heatmap = client.get(f"{API}/analytics/sales-heatmap", params=params, headers=ADMIN).json()
+        now = datetime.now()
+        assert heatmap["totals"] == {"orders_count": 3, "quantity": 5, "revenue": 5600.0}, heatmap["totals"]
+        assert heatmap["matrix"][now.weekday()][now.hour] == 5 and heatmap["peak"]["value"] == 5
+        assert [(d["dish_id"], d["quantity"], d["orders_count"]) for d in heatmap["top_dishes"]] == [(1, 4, 2), (2, 1, 1)]
+
+        category = client.get(f"{API}/analytics/sales-heatmap", params={**params, "category_id": 2}, headers=ADMIN).json()
+        assert category["totals"]["quantity"] == 4 and [d["dish_id"] for d in category["top_dishes"]] == [1]
+        dish = client.get(f"{API}/analytics/sales-heatmap", params={**params, "dish_id": 2, "measure": "revenue"}, headers=ADMIN).json()
+        assert dish["totals"]["revenue"] == 1200.0 and dish["matrix"][now.weekday()][now.hour] == 1200.0
+
+        # Администратор возвращает доставленный заказ: его блюда вычитаются
+        assert client.patch(f"{API}/admin/orders/{first}/status", json={"status": "ready"}, headers=ADMIN).status_code == 200
+        heatmap = client.get(f"{API}/analytics/sales-heatmap", params=params, headers=ADMIN).json()
+        assert heatmap["totals"] == {"orders_count": 1, "quantity": 1, "revenue": 1100.0}, heatmap["totals"]
+        assert client.patch(f"{API}/admin/orders/{first}/status", json={"status": "delivered"}, headers=ADMIN).status_code == 200
+
+        assert client.get(f"{API}/analytics/sales-heatmap", params={"measure": "margin"}, headers=ADMIN).status_code == 422
+        assert client.get(f"{API}/analytics/sales-heatmap", headers=KITCHEN).status_code == 403
+    print("✅ Блюдо двумя строками — один заказ и три порции, возврат вычитает, отмена не учитывается")
+    print("✅ Переход без доставки — 2 запроса, массовая доставка — 4 запроса на весь пакет")
+
+
+async def check_rebuild():
+    print("\n🧪 2. Пересчет с нуля совпадает с инкрементальным кубом...")
+    incremental = await cube_snapshot()
+    async with async_session_maker() as db:
+        await rebuild_sales_cube(db)
+        await db.commit()
+    await engine.dispose()
+    assert incremental == await cube_snapshot()
+    print(f"✅ {len(incremental)} строк куба совпадают")
+
+
+async def insert_history(start: int, stop: int):
+    """Доставленные заказы по 2 блюда за HISTORY_DAYS дней в часы HISTORY_HOURS."""
+    first_day = datetime.combine(date.today() - timedelta(days=HISTORY_DAYS + 1), datetime.min.time())
+    rng = random.Random(start)
+    async with engine.begin() as conn:
+        for offset in range(start, stop, 20_000):
+            numbers = range(offset, min(offset + 20_000, stop))
+            orders = []
+            for n in numbers:
+                created_at = first_day + timedelta(
+                    days=rng.randrange(HISTORY_DAYS), hours=rng.choice(HISTORY_HOURS), minutes=rng.randrange(60)
+                )
+                orders.append({
+                    "id": 100_000 + n, "order_number": f"ORD-CUBE-{n:07d}", "customer_name": "Клиент",
+                    "customer_phone": "+77010000000", "delivery_type": DeliveryType.PICKUP,
+                    "payment_method": PaymentMethod.CARD, "status": OrderStatus.DELIVERED,
+                    "payment_status": PaymentStatus.PAID, "subtotal": Decimal("3000"), "total_amount": Decimal("3000"),
+                    "created_at": created_at,
+                })
+            await conn.execute(insert(Order), orders)
+            await conn.execute(insert(OrderItem), [
+                {
+                    "order_id": 100_000 + n, "dish_id": dish_id, "dish_name": f"Блюдо {dish_id}",
+                    "dish_price": Decimal("1000"), "quantity": 1 + n % 2, "price": Decimal("1000"),
+                    "total_price": Decimal(1000 * (1 + n % 2)),
+                }
+                for n in numbers
+                for dish_id in (n % DISHES + 1, (n + 3) % DISHES + 1)
+            ])
+    await engine.dispose()
+
+
+async def measure_slice():
+    date_to = date.today() - timedelta(days=1)
+    date_from = date_to - timedelta(days=HISTORY_DAYS + 1)
+    async with async_session_maker() as db:
+        cube_rows = (await db.execute(select(func.count()).select_from(SalesCube))).scalar()
+        await sales_heatmap(db, date_from, date_to, "quantity")  # прогрев
+        started = time.perf_counter()
+        for _ in range(5):
+            heatmap = await sales_heatmap(db, date_from, date_to, "quantity", category_id=2)
+        slice_ms = (time.perf_counter() - started) * 1000 / 5
+
+        started = time.perf_counter()
+        direct = (await db.execute(
+            select(func.sum(OrderItem.quantity))
+            .join(Order, Order.id == OrderItem.order_id)
+            .join(Dish, Dish.id == OrderItem.dish_id)
+            .where(Order.status == OrderStatus.DELIVERED, Dish.category_id == 2, Order.created_at < datetime.combine(date.today(), datetime.min.time()))
+        )).scalar()
+        scan_ms = (time.perf_counter() - started) * 1000
+    await engine.dispose()
+    assert heatmap["totals"]["quantity"] == direct, (heatmap["totals"], direct)
+    return cube_rows, slice_ms, scan_ms
+
+
+async def check_volume_independence():
+    print("\n🧪 3. Время среза при росте числа заказов...")
+    results = []
+    for total in (20_000, 120_000):
+        await insert_history(results[-1][0] if results else 0, total)
+        async with async_session_maker() as db:
+            await rebuild_sales_cube(db)
+            await db.commit()
+        await engine.dispose()
+        cube_rows, slice_ms, scan_ms = await measure_slice()
+        results.append((total, cube_rows, slice_ms))
+        print(f"✅ {total} заказов: {cube_rows} строк куба, срез {slice_ms:.1f} мс (агрегат по заказам {scan_ms:.0f} мс)")
+
+    (_, small_rows, small_ms), (_, large_rows, large_ms) = results
+    cells = HISTORY_DAYS * len(HISTORY_HOURS) * DISHES
+    assert small_rows <= large_rows <= cells + 10, (small_rows, large_rows, cells)
+    assert large_ms < small_ms * 2 + 5, (small_ms, large_ms)
+    print(f"✅ Заказов в 6 раз больше — строк куба не больше {cells}, время среза не растет")
+
+
+def test_sales_cube():
+    asyncio.run(seed())
+    menu_cache.reset()
+    check_incremental()
+    asyncio.run(check_rebuild())
+    asyncio.run(check_volume_independence())
+
+
+if __name__ == "__main__":
+    test_sales_cube()
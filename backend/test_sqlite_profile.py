@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Тест профиля производительности SQLite:
+- некорректные значения PRAGMA в настройках останавливают запуск;
+- профиль применяется к каждому подключению aiosqlite (раньше не применялся даже foreign_keys);
+- /health показывает фактические PRAGMA;
+- бенчмарк смешанной нагрузки: писатели оформляют заказы, пока читатели читают ленту заказов,
+  в режиме rollback journal по умолчанию и с профилем (WAL, synchronous=NORMAL, busy_timeout).
+
+Запуск: python test_sqlite_profile.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+import httpx
+from sqlalchemy import create_engine, select, func, insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from main import app
+from app.core.config import Settings, settings
+from app.core.database import engine as app_engine
+from app.core.sqlite_profile import sqlite_pragmas, install_sqlite_profile, read_sqlite_pragmas, profile_mismatches
+from app.models import Base
+from app.models.menu import Category, Dish
+from app.models.order import Order, OrderItem, OrderStatus, DeliveryType, PaymentStatus, PaymentMethod
+
+WRITERS = 4
+READERS = 4
+BENCHMARK_SECONDS = 2.0
+HISTORY_ORDERS = 3000
+ITEMS_PER_ORDER = 5
+
+ITEM_ROW = {
+    "dish_id": 1,
+    "dish_name": "Бургер",
+    "dish_price": Decimal("1500"),
+    "quantity": 1,
+    "price": Decimal("1500"),
+    "total_price": Decimal("1500"),
+    "modifiers": [],
+}
+
+
+def make_order_data(writer: int, n: int) -> dict:
+    return {
+        "order_number": f"ORD-{writer}-{n:06d}",
+        "customer_name": f"Клиент {n}",
+        "customer_phone": f"+7701{n:07d}",
+        "delivery_type": DeliveryType.PICKUP,
+        "payment_method": PaymentMethod.CASH,
+        "pickup_address": "ул. Абая 1",
+        "status": OrderStatus.PENDING,
+        "payment_status": PaymentStatus.PENDING,
+        "subtotal": Decimal("7500"),
+        "discount_amount": Decimal("0"),
+        "delivery_fee": Decimal("0"),
+        "total_amount": Decimal("7500"),
+        "promo_discount": Decimal("0"),
+        "created_at": datetime.now(),
+    }
+
+
+def mixed_workload(pragmas):
+    """
+    Писатели оформляют заказы, пока читатели строят отчет по продажам блюд (полный проход
+    по истории заказов, как в аналитике). Потоки с собственными подключениями работают
+    BENCHMARK_SECONDS секунд: так измеряется сама база, без накладных расходов event loop.
+    Возвращает (записей в секунду, чтений в секунду, ошибок блокировки).
+    """
+    db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    db_file.close()
+    engine = create_engine(
+        f"sqlite:///{db_file.name}",
+        connect_args={"check_same_thread": False},
+        pool_size=WRITERS + READERS
+    )
+    if pragmas:
+        install_sqlite_profile(engine, pragmas)
+
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(Category).values(id=1, name="Бургеры"))
+        conn.execute(insert(Dish).values(id=1, name="Бургер", price=Decimal("1500"), category_id=1))
+        conn.execute(insert(Order), [make_order_data(-1, n) for n in range(HISTORY_ORDERS)])
+        conn.execute(insert(OrderItem), [
+            dict(ITEM_ROW, order_id=order_id)
+            for order_id in range(1, HISTORY_ORDERS + 1) for _ in range(ITEMS_PER_ORDER)
+        ])
+
+    stop = threading.Event()
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    counts_lock = threading.Lock()
+
+    def count(key):
+        with counts_lock:
+            counts[key] += 1
+
+    def writer(w):
+        n = 0
+        while not stop.is_set():
+            try:
+                # Тот же путь, что insert_order: заказ с RETURNING id и пакет позиций
+                with engine.begin() as conn:
+                    order_id = conn.execute(insert(Order).values(**make_order_data(w, n)).returning(Order.id)).scalar_one()
+                    conn.execute(insert(OrderItem), [dict(ITEM_ROW, order_id=order_id)] * ITEMS_PER_ORDER)
+                count("writes")
+                n += 1
+            except OperationalError:
+                count("locked")
+
+    def reader():
+        while not stop.is_set():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        select(OrderItem.dish_name, func.count(OrderItem.id), func.sum(OrderItem.total_price))
+                        .group_by(OrderItem.dish_name)
+                    ).all()
+                count("reads")
+            except OperationalError:
+                count("locked")
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(WRITERS)]
+    threads += [threading.Thread(target=reader) for _ in range(READERS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(BENCHMARK_SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with engine.connect() as conn:
+        orders_count = conn.execute(select(func.count(Order.id))).scalar()
+    assert orders_count == HISTORY_ORDERS + counts["writes"], orders_count
+
+    engine.dispose()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_file.name + suffix):
+            os.unlink(db_file.name + suffix)
+
+    return counts["writes"] / elapsed, counts["reads"] / elapsed, counts["locked"]
+
+
+async def run_tests():
+    try:
+        print("🧪 1. Проверка настроек профиля...")
+        try:
+            sqlite_pragmas(Settings(SQLITE_JOURNAL_MODE="fast", SQLITE_SYNCHRONOUS="sometimes", SQLITE_BUSY_TIMEOUT_MS=-1))
+        except ValueError as e:
+            message = str(e)
+            assert "SQLITE_JOURNAL_MODE" in message and "SQLITE_SYNCHRONOUS" in message
+            assert "SQLITE_BUSY_TIMEOUT_MS" in message
+        else:
+            raise AssertionError("ожидалась ошибка настроек")
+        assert dict(sqlite_pragmas(Settings(SQLITE_JOURNAL_MODE="wal")))["journal_mode"] == "WAL"
+        print("✅ Некорректные значения отклоняются все сразу")
+
+        print("\n🧪 2. Профиль на подключениях aiosqlite...")
+        pragmas = sqlite_pragmas(settings)
+        async with app_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        active = await read_sqlite_pragmas(app_engine, pragmas)
+        assert profile_mismatches(pragmas, active) == {}, profile_mismatches(pragmas, active)
+        assert active["journal_mode"] == "WAL" and active["synchronous"] == "NORMAL"
+        assert active["foreign_keys"] == "ON" and active["temp_store"] == "MEMORY"
+        assert active["busy_timeout"] == settings.SQLITE_BUSY_TIMEOUT_MS
+        print(f"✅ {active}")
+
+        print("\n🧪 3. /health...")
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/health")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["sqlite"]["pragmas"]["journal_mode"] == "WAL"
+        assert body["sqlite"]["mismatches"] == {}
+
+        # База в памяти не поддерживает WAL — расхождение видно в отчете
+        memory_engine = create_async_engine("sqlite+aiosqlite://")
+        install_sqlite_profile(memory_engine, pragmas)
+        mismatches = profile_mismatches(pragmas, await read_sqlite_pragmas(memory_engine, pragmas))
+        await memory_engine.dispose()
+        assert mismatches["journal_mode"] == ("WAL", "MEMORY"), mismatches
+        print("✅ Фактические PRAGMA и расхождения с настройками видны в /health")
+
+        print(f"\n📊 4. Смешанная нагрузка {BENCHMARK_SECONDS:.0f} с: {WRITERS} писателя заказов, {READERS} читателей отчета")
+        results = {}
+        for name, profile in [("rollback journal", []), ("профиль WAL", pragmas)]:
+            results[name] = mixed_workload(profile)
+            writes, reads, locked = results[name]
+            print(f"  {name:<17} заказов/с: {writes:8.1f}  отчетов/с: {reads:7.1f}  ошибок блокировки: {locked}")
+
+        baseline, tuned = results["rollback journal"], results["профиль WAL"]
+        assert tuned[0] > baseline[0], "профиль должен ускорить запись при параллельном чтении"
+        # Чтения упираются в процессор (GIL), а не в блокировки: их скорость заметно меняться не должна
+        assert tuned[1] > baseline[1] * 0.5, "чтение не должно деградировать"
+        assert tuned[2] == 0, "с busy_timeout и WAL ошибок блокировки быть не должно"
+        print("\n✅ С WAL-профилем читатели не блокируют запись заказов")
+    finally:
+        await app_engine.dispose()
+
+
+def test_sqlite_profile():
+    asyncio.run(run_tests())
+
+
+if __name__ == "__main__":
+    test_sqlite_profile()
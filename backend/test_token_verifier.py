@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Тест проверки JWT с кешем (app/services/token_verifier.py):
+- токены совместимы с python-jose в обе стороны, поддельные и истекшие отклоняются
+  (в том числе с не-ASCII символами в подписи — 401, а не 500);
+- проверенный токен берется из кеша до exp, счетчики попаданий в /health;
+- ротация ключей через kid: прежний ключ проверяет свои токены, удаленный — нет;
+- бенчмарк: проверка токена и авторизация запроса через python-jose и через кеш.
+
+Запуск: python test_token_verifier.py  (или через pytest)
+"""
+
+import asyncio
+import os
+import sys
+import time
+import timeit
+from datetime import datetime, timedelta
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Временная база приложения задается в conftest.py до импорта main
+import conftest  # noqa: F401
+
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import insert
+
+from main import app
+from app.core.config import settings
+from app.core.database import engine
+from app.models import Base
+from app.models.user import User, UserRole
+from app.services.auth import AuthService
+from app.services.principal_cache import principal_cache
+from app.services.token_verifier import TokenVerifier, token_verifier
+
+API = "/api/v1"
+SECRET = settings.JWT_SECRET_KEY
+
+
+def claims(user_id: int = 1, minutes: float = 10) -> dict:
+    return {"sub": str(user_id), "exp": datetime.utcnow() + timedelta(minutes=minutes)}
+
+
+def check_compatibility():
+    print("🧪 1. Совместимость с python-jose и отклонение поддельных токенов...")
+    verifier = TokenVerifier(SECRET, "HS256")
+    token = jwt.encode(claims(7), SECRET, algorithm="HS256")
+    assert verifier.verify(token) == jwt.decode(token, SECRET, algorithms=["HS256"])
+    assert jwt.decode(verifier.encode(claims(8)), SECRET, algorithms=["HS256"])["sub"] == "8"
+
+    header, payload, signature = token.split(".")
+    forged_payload = jwt.encode(claims(1), SECRET, algorithm="HS256").split(".")[1]
+    rejected = [
+        jwt.encode(claims(7), "другой секрет", algorithm="HS256"),
+        jwt.encode(claims(7, minutes=-1), SECRET, algorithm="HS256"),
+        jwt.encode(claims(7), SECRET, algorithm="HS512"),
+        f"{header}.{forged_payload}.{signature}",
+        f"{header}.{payload}.{signature[:-2]}",
+        f"{header}.{payload}.{signature[:-1]}\xe9",
+        f"{header}.{payload}é.{signature}",
+        f"{header}é.{payload}.{signature}",
+        "eyJhbGciOiJub25lIn0." + payload + ".",
+        "not-a-token",
+        "",
+    ]
+    for bad in rejected:
+        assert verifier.verify(bad) is None, bad
+    assert verifier.stats()["rejected"] == len(rejected) and len(verifier) == 1
+    print(f"✅ Claims совпадают с jwt.decode, {len(rejected)} недействительных токенов отклонены")
+
+
+def check_cache():
+    print("\n🧪 2. Кеш проверенных токенов до exp...")
+    verifier = TokenVerifier(SECRET, "HS256", cache_size=2)
+    tokens = [verifier.encode(claims(n)) for n in range(3)]
+    first = verifier.verify(tokens[0])
+    assert verifier.verify(tokens[0]) is first  # из кеша, без повторной проверки
+    verifier.verify(tokens[1])
+    verifier.verify(tokens[2])  # вытесняет tokens[0]
+    assert len(verifier) == 2 and verifier.verify(tokens[0]) is not first
+    stats = verifier.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 4), stats
+
+    short = verifier.encode({"sub": "5", "exp": time.time() + 1})
+    assert verifier.verify(short)["sub"] == "5"
+    time.sleep(1.05)
+    assert verifier.verify(short) is None  # истек, хотя лежал в кеше
+
+    no_exp = verifier.encode({"sub": "6"})
+    size = len(verifier)
+    assert verifier.verify(no_exp)["sub"] == "6" and len(verifier) == size
+
+    disabled = TokenVerifier(SECRET, "HS256", cache_size=0)
+    assert disabled.verify(tokens[1])["sub"] == "1" and len(disabled) == 0
+    print("✅ Повторный токен — попадание в кеш, истекший отклоняется, LRU ограничивает размер")
+
+
+def check_rotation():
+    print("\n🧪 3. Ротация ключей через kid...")
+    verifier = TokenVerifier("секрет-0", "HS256")
+    legacy = verifier.encode(claims(1))
+    assert "kid" not in jwt.get_unverified_header(legacy)
+
+    verifier.configure_keys("секрет-1", "k1", {"": "секрет-0"})
+    first = verifier.encode(claims(2))
+    assert jwt.get_unverified_header(first)["kid"] == "k1"
+    assert verifier.verify(legacy)["sub"] == "1" and verifier.verify(first)["sub"] == "2"
+
+    verifier.configure_keys("секрет-2", "k2", {"k1": "секрет-1"})
+    second = verifier.encode(claims(3))
+    assert verifier.verify(first)["sub"] == "2" and verifier.verify(second)["sub"] == "3"
+    assert verifier.verify(legacy) is None  # ключ токенов без kid удален
+    # Подпись ключом k1 с заголовком k2 не проходит
+    swapped = jwt.encode(claims(4), "секрет-1", algorithm="HS256", headers={"kid": "k2"})
+    assert verifier.verify(swapped) is None
+
+    verifier.configure_keys("секрет-2", "k2")
+    assert verifier.verify(first) is None  # кеш сброшен вместе с ключом
+    assert verifier.stats()["key_ids"] == ["k2"]
+    print("✅ Прежний ключ действует, пока указан в JWT_PREVIOUS_KEYS, удаление отзывает его токены")
+
+
+async def seed():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User), [
+            {"id": 1, "name": "Кухня", "phone": "+77000000001", "role": UserRole.KITCHEN, "hashed_password": "-"},
+        ])
+    await engine.dispose()
+
+
+def check_requests():
+    print("\n🧪 4. Авторизация запросов через кеш токенов...")
+    token_verifier.clear()
+    before = token_verifier.stats()
+    headers = {"Authorization": f"Bearer {AuthService(None).create_access_token(data={'sub': '1'})}"}
+    with TestClient(app) as client:
+        for _ in range(5):
+            assert client.get(f"{API}/kitchen/orders", headers=headers).status_code == 200
+        assert client.get(f"{API}/kitchen/orders", headers={"Authorization": "Bearer invalid"}).status_code == 401
+        # Не-ASCII символ в подписи (заголовок приходит в latin-1)
+        non_ascii = {"Authorization": (headers["Authorization"][:-1] + "\xe9").encode("latin-1")}
+        assert client.get(f"{API}/admin/orders", headers=non_ascii).status_code == 401
+        stats = client.get("/health").json()["token_verifier"]
+    assert stats["hits"] - before["hits"] == 4 and stats["misses"] - before["misses"] == 3, stats
+    assert stats["rejected"] - before["rejected"] == 2 and stats["size"] == 1, stats
+    print("✅ 5 запросов с одним токеном — 1 проверка подписи, 4 попадания")
+
+
+def check_benchmark():
+    print("\n🧪 5. Бенчмарк: python-jose и кеш проверенных токенов...")
+    token = token_verifier.encode(claims(1))
+    number = 20000
+
+    def jose_decode():
+        return int(jwt.decode(token, SECRET, algorithms=["HS256"])["sub"])
+
+    cold = TokenVerifier(SECRET, "HS256", cache_size=0)
+    timings = {
+        "python-jose": timeit.timeit(jose_decode, number=number),
+        "без кеша": timeit.timeit(lambda: cold.verify(token), number=number),
+        "кеш": timeit.timeit(lambda: token_verifier.verify(token), number=number),
+    }
+    for name, seconds in timings.items():
+        print(f"   проверка токена, {name}: {seconds * 1e6 / number:.1f} мкс")
+
+    # Авторизация запроса целиком: токен -> Principal при теплом кеше пользователей
+    service = AuthService(None)
+
+    async def authorize(decode, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            assert (await principal_cache.load(None, decode(token))).id == 1
+        return time.perf_counter() - started
+
+    before = asyncio.run(authorize(lambda _: jose_decode(), number))
+    after = asyncio.run(authorize(service.decode_user_id, number))
+    print(f"✅ Авторизация запроса: {before * 1e6 / number:.1f} мкс до, {after * 1e6 / number:.1f} мкс после")
+    assert timings["без кеша"] < timings["python-jose"]
+    assert timings["кеш"] * 5 < timings["python-jose"], timings
+    assert after * 3 < before, (before, after)
+
+
+def test_token_verifier():
+    try:
+        check_compatibility()
+        check_cache()
+        check_rotation()
+        asyncio.run(seed())
+        principal_cache.clear()
+        check_requests()
+        check_benchmark()
+    finally:
+        principal_cache.clear()
+        token_verifier.clear()
+
+
+if __name__ == "__main__":
+    test_token_verifier()
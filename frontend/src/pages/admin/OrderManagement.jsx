@@ -21,33 +21,68 @@ import OrderDetailsModal from '../../components/common/OrderDetailsModal'
 import { toast } from 'react-hot-toast'
 import styles from './OrderManagement.module.css'
 
+const ORDERS_PAGE_SIZE = 50
+
 function OrderManagement() {
   const [orders, setOrders] = useState([])
   const [loading, setLoading] = useState(true)
   const [searchTerm, setSearchTerm] = useState('')
   const [statusFilter, setStatusFilter] = useState('all')
+  const [courierFilter, setCourierFilter] = useState('all')
+  const [dateFilter, setDateFilter] = useState('')
+  const [phoneFilter, setPhoneFilter] = useState('')
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [selectedOrder, setSelectedOrder] = useState(null)
   const [couriers, setCouriers] = useState([])
   const [showCourierModal, setShowCourierModal] = useState(false)
   const [selectedOrderForCourier, setSelectedOrderForCourier] = useState(null)
 
   useEffect(() => {
-    fetchOrders()
     fetchCouriers()
+  }, [])
+
+  useEffect(() => {
+    // Телефон вводится посимвольно - запрос уходит после паузы в наборе
+    const timeout = setTimeout(() => fetchOrders(), phoneFilter ? 400 : 0)
     
     // Автообновление каждые 30 секунд
     const interval = setInterval(() => {
-      fetchOrders()
+      refreshOrders()
     }, 30000)
     
-    return () => clearInterval(interval)
-  }, [])
+    return () => {
+      clearTimeout(timeout)
+      clearInterval(interval)
+    }
+  }, [statusFilter, courierFilter, dateFilter, phoneFilter])
+
+  // Фильтры выполняет сервер - в запрос попадают только выбранные
+  const buildOrderParams = (cursor = null) => {
+    const params = { limit: ORDERS_PAGE_SIZE }
+    if (cursor) params.cursor = cursor
+    if (statusFilter !== 'all') params.status = statusFilter
+    if (courierFilter !== 'all') params.courier_id = courierFilter
+    if (dateFilter) {
+      // Границы выбранного дня по местному времени
+      const dayStart = new Date(`${dateFilter}T00:00:00`)
+      const dayEnd = new Date(dayStart)
+      dayEnd.setDate(dayEnd.getDate() + 1)
+      params.date_from = dayStart.toISOString()
+      params.date_to = dayEnd.toISOString()
+    }
+    const phone = phoneFilter.replace(/[^\d+]/g, '')
+    if (phone) params.phone = phone
+    return params
+  }
 
   const fetchOrders = async () => {
     try {
-      setLoading(true)
-      const response = await adminAPI.getAllOrders()
-      setOrders(response.data)
+      // Лента постраничная (keyset-курсор) - первая страница с текущими фильтрами.
+      // Спиннер только при первой загрузке, чтобы поля фильтров не теряли фокус
+      const response = await adminAPI.getAllOrders(buildOrderParams())
+      setOrders(response.data.orders)
+      setNextCursor(response.data.next_cursor)
     } catch (error) {
       console.error('Ошибка загрузки заказов:', error)
       toast.error('Ошибка загрузки заказов')
@@ -56,6 +91,36 @@ function OrderManagement() {
     }
   }
 
+  const loadMoreOrders = async () => {
+    if (!nextCursor) return
+    try {
+      setLoadingMore(true)
+      const response = await adminAPI.getAllOrders(buildOrderParams(nextCursor))
+      setOrders(prev => {
+        const loadedIds = new Set(prev.map(order => order.id))
+        return [...prev, ...response.data.orders.filter(order => !loadedIds.has(order.id))]
+      })
+      setNextCursor(response.data.next_cursor)
+    } catch (error) {
+      console.error('Ошибка загрузки заказов:', error)
+      toast.error('Ошибка загрузки заказов')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  const refreshOrders = async () => {
+    try {
+      // Новые и измененные заказы первой страницы; загруженные ранее страницы и курсор остаются
+      const response = await adminAPI.getAllOrders(buildOrderParams())
+      const fresh = response.data.orders
+      const freshIds = new Set(fresh.map(order => order.id))
+      setOrders(prev => [...fresh, ...prev.filter(order => !freshIds.has(order.id))])
+    } catch (error) {
+      console.error('Ошибка обновления заказов:', error)
+    }
+  }
+
   const fetchCouriers = async () => {
     try {
       const response = await adminAPI.getCouriers()
@@ -152,19 +217,14 @@ function OrderManagement() {
     return date.toLocaleDateString()
   }
 
-  const filteredOrders = orders
-    .filter(order => {
-      const matchesSearch = order.customer_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-                           order.order_number.includes(searchTerm)
-      const matchesStatus = statusFilter === 'all' || order.status === statusFilter
-      return matchesSearch && matchesStatus
-    })
-    .sort((a, b) => {
-      // Сортировка по дате создания (новые сначала)
-      const dateA = new Date(a.created_at)
-      const dateB = new Date(b.created_at)
-      return dateB - dateA
-    })
+  // Сервер уже отфильтровал и отсортировал ленту (новые сначала); здесь - поиск среди загруженных
+  // и скрытие заказов, чей статус изменили на этой странице
+  const filteredOrders = orders.filter(order => {
+    const matchesSearch = order.customer_name.toLowerCase().includes(searchTerm.toLowerCase()) ||
+                         order.order_number.includes(searchTerm)
+    const matchesStatus = statusFilter === 'all' || order.status === statusFilter
+    return matchesSearch && matchesStatus
+  })
 
   if (loading) {
     return <LoadingSpinner />
@@ -207,6 +267,41 @@ function OrderManagement() {
             <option value="cancelled">Отменен</option>
           </select>
         </div>
+
+        <div className={styles.statusFilter}>
+          <Truck className={styles.filterIcon} />
+          <select
+            value={courierFilter}
+            onChange={(e) => setCourierFilter(e.target.value)}
+            className={styles.filterSelect}
+          >
+            <option value="all">Все курьеры</option>
+            {couriers.map(courier => (
+              <option key={courier.id} value={courier.id}>{courier.name}</option>
+            ))}
+          </select>
+        </div>
+
+        <div className={styles.statusFilter}>
+          <Clock className={styles.filterIcon} />
+          <input
+            type="date"
+            value={dateFilter}
+            onChange={(e) => setDateFilter(e.target.value)}
+            className={styles.filterSelect}
+          />
+        </div>
+
+        <div className={styles.statusFilter}>
+          <Phone className={styles.filterIcon} />
+          <input
+            type="tel"
+            placeholder="Телефон клиента"
+            value={phoneFilter}
+            onChange={(e) => setPhoneFilter(e.target.value)}
+            className={styles.filterSelect}
+          />
+        </div>
       </div>
 
       {/* Список заказов */}
@@ -283,7 +378,19 @@ function OrderManagement() {
         ))}
       </div>
 
-      {filteredOrders.length === 0 && !loading && (
+      {nextCursor && (
+        <div className={styles.loadMore}>
+          <button
+            className={styles.actionButton}
+            onClick={loadMoreOrders}
+            disabled={loadingMore}
+          >
+            {loadingMore ? 'Загрузка...' : 'Показать еще'}
+          </button>
+        </div>
+      )}
+
+      {filteredOrders.length === 0 && !nextCursor && !loading && (
         <div className={styles.emptyState}>
           <ShoppingBag size={48} />
           <h3>Заказов не найдено</h3>
@@ -7,6 +7,7 @@ import { CreditCard, Wallet, MapPin, Edit2, User, Phone, MessageSquare } from 'l
 import AddressModal from '../../components/common/AddressModal'
 import LoadingSpinner from '../../components/common/LoadingSpinner'
 import Toast from '../../components/common/Toast'
+import { ordersAPI } from '../../services/api'
 import styles from './CheckoutPage.module.css'
 
 function CheckoutPage() {
@@ -33,8 +34,36 @@ function CheckoutPage() {
   const [toast, setToast] = useState({ isVisible: false, message: '', type: 'success' })
   const [pickupAddressError, setPickupAddressError] = useState(false)
 
-  const deliveryFee = deliveryType === 'delivery' ? 199 : 0
-  const finalTotal = total + deliveryFee
+  const [quote, setQuote] = useState(null)
+
+  // Суммы считает сервер, чтобы на экране был тот же итог, что будет в заказе
+  const subtotal = quote ? Number(quote.subtotal) : total
+  const discount = quote ? Number(quote.discount_amount) : discountAmount
+  const deliveryFee = quote ? Number(quote.delivery_fee) : 0
+  const finalTotal = quote ? Number(quote.total_amount) : total
+
+  useEffect(() => {
+    if (items.length === 0) return
+
+    let cancelled = false
+    ordersAPI.quoteOrder({
+      items: items.map(item => ({
+        dish_id: item.dishId,
+        quantity: item.quantity,
+        modifiers: item.modifiers.map(mod => mod.id),
+        addons: (item.addons || []).map(addon => addon.id)
+      })),
+      delivery_type: deliveryType,
+      promo_code: promoCode || undefined
+    })
+      .then(response => { if (!cancelled) setQuote(response.data) })
+      .catch(error => {
+        console.error('Ошибка расчета стоимости:', error)
+        if (!cancelled) setQuote(null)
+      })
+
+    return () => { cancelled = true }
+  }, [items, deliveryType, promoCode])
 
   // Загружаем адрес пользователя при загрузке компонента
   useEffect(() => {
@@ -174,7 +203,8 @@ function CheckoutPage() {
         items: items.map(item => ({
           dish_id: item.dishId,
           quantity: item.quantity,
-          modifiers: item.modifiers.map(mod => mod.id)
+          modifiers: item.modifiers.map(mod => mod.id),
+          addons: (item.addons || []).map(addon => addon.id)
         })),
         delivery_type: deliveryType,
         payment_method: paymentMethod,
@@ -475,13 +505,13 @@ function CheckoutPage() {
                 <div className={styles.orderTotals}>
                   <div className={styles.totalRow}>
                     <span>Сумма заказа:</span>
-                    <span>{total} ₸</span>
+                    <span>{subtotal} ₸</span>
                   </div>
                   
-                  {discountAmount > 0 && (
+                  {discount > 0 && (
                     <div className={`${styles.totalRow} ${styles.discount}`}>
                       <span>Скидка {promoCode ? `(${promoCode})` : ''}:</span>
-                      <span>-{discountAmount} ₸</span>
+                      <span>-{discount} ₸</span>
                     </div>
                   )}
                   
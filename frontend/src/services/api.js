@@ -89,6 +89,7 @@ export const menuAPI = {
 // Заказы
 export const ordersAPI = {
   createOrder: (orderData) => api.post('/api/v1/orders', orderData),
+  quoteOrder: (cartData) => api.post('/api/v1/orders/quote', cartData),
   getOrders: (params = {}) => api.get('/api/v1/orders', { params }),
   getMyOrders: () => api.get('/api/v1/users/me/orders'), // Новый метод для получения заказов пользователя
   getOrder: (orderId) => api.get(`/api/v1/orders/${orderId}`),
@@ -100,7 +101,7 @@ export const ordersAPI = {
 // Админ API
 export const adminAPI = {
   // Заказы
-  getAllOrders: () => api.get('/api/v1/admin/orders'),
+  getAllOrders: (params = {}) => api.get('/api/v1/admin/orders', { params }),
   updateOrderStatus: (orderId, status) => api.patch(`/api/v1/admin/orders/${orderId}/status`, { status }),
   assignCourier: (orderId, courierId) => api.patch(`/api/v1/admin/orders/${orderId}/assign-courier`, { courier_id: courierId }),
   getCouriers: () => api.get('/api/v1/admin/couriers'),